@@ -73,8 +73,9 @@ WebSocket事件处理模块 (websocket_events.py)
 - 错误事件统一处理
 """
 
+from flask import request
 from flask_socketio import emit, join_room, leave_room
-from app.utils.websocket_utils import socketio
+from app.utils.websocket_utils import socketio, track_video_viewer
 from app.services.statistics_service import StatisticsService
 
 def _log_connection_status(status, namespace):
@@ -147,6 +148,7 @@ def handle_video_connect():
 @socketio.on('disconnect', namespace='/video')
 def handle_video_disconnect():
     """处理视频流断开事件"""
+    track_video_viewer(request.sid)  # type: ignore
     _log_connection_status("disconnected from", "/video")
 
 @socketio.on('join_stream', namespace='/video')
@@ -161,6 +163,7 @@ def handle_join_stream(data):
     if camera_id:
         room = f'camera_{camera_id}'
         join_room(room)
+        track_video_viewer(request.sid, camera_id)  # type: ignore
         emit('joined_stream', {'camera_id': camera_id}, namespace='/video')
 
 @socketio.on('leave_stream', namespace='/video')
@@ -175,6 +178,7 @@ def handle_leave_stream(data):
     if camera_id:
         room = f'camera_{camera_id}'
         leave_room(room)
+        track_video_viewer(request.sid, camera_id, joined=False)  # type: ignore
         emit('left_stream', {'camera_id': camera_id}, namespace='/video')
 
 @socketio.on('video_frame', namespace='/video')
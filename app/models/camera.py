@@ -10,6 +10,10 @@
     -帧率
     -编码格式
     -模型路径
+    -推理后端(pytorch/onnx/onnx-int8)
+    -关键帧间隔
+    -运动门控阈值
+    -推理区域(ROI)
     -跟踪算法配置路径
     -是否启用
     -状态
@@ -40,6 +44,10 @@ class Camera(db.Model):
     
     # 模型和跟踪配置信息
     model = db.Column(db.String(255))  # 模型路径
+    inference_backend = db.Column(db.String(20), default='pytorch')  # 推理后端: pytorch/onnx/onnx-int8
+    keyframe_interval = db.Column(db.Integer, default=1)  # 关键帧间隔，每N帧检测一次
+    motion_gate_threshold = db.Column(db.Float, default=0.0)  # 运动门控阈值(变化像素占比)，0表示关闭
+    worker_group = db.Column(db.String(50))  # 检测工作进程分组(进程模式)，为空表示单独一个进程
     tracking_config = db.Column(db.String(255))  # 跟踪算法配置路径
 
     # 摄像头状态信息
@@ -49,6 +57,14 @@ class Camera(db.Model):
     # 禁停区域 - 存储格式：JSON字符串 
     # 示例: [{"id": 1, "points": [[x1,y1], [x2,y2], ...]}, {"id": 2, "points": [...]}]
     restricted_areas = db.Column(db.JSON)
+
+    # 推理区域 - 为空表示整帧推理
+    # 示例: [x1, y1, x2, y2] 或 "auto"(取禁停区域外接矩形并外扩)
+    inference_roi = db.Column(db.JSON)
+
+    # 推理配置 - 为空表示使用默认推理尺寸和阈值
+    # 示例: {"imgsz": 320, "conf": 0.4, "classes": ["car", "bus"], "latency_budget_ms": 80}
+    inference_profile = db.Column(db.JSON)
     
     # 关联的检测记录反向引用
     detections = db.relationship('Detection', backref='camera', lazy=True)
@@ -57,7 +73,10 @@ class Camera(db.Model):
                  resolution: Optional[str] = None, frame_rate: Optional[int] = None,
                  encoding_format: Optional[str] = None, model: Optional[str] = None,
                  tracking_config: Optional[str] = None, is_active: bool = True,
-                 status: str = 'offline', restricted_areas: Optional[Any] = None):
+                 status: str = 'offline', restricted_areas: Optional[Any] = None,
+                 inference_backend: str = 'pytorch', keyframe_interval: int = 1,
+                 motion_gate_threshold: float = 0.0, inference_roi: Optional[Any] = None,
+                 inference_profile: Optional[Any] = None, worker_group: Optional[str] = None):
         self.name = name
         self.ip_address = ip_address
         self.port = port
@@ -66,10 +85,16 @@ class Camera(db.Model):
         self.frame_rate = frame_rate
         self.encoding_format = encoding_format
         self.model = model
+        self.inference_backend = inference_backend
+        self.keyframe_interval = keyframe_interval
+        self.motion_gate_threshold = motion_gate_threshold
+        self.worker_group = worker_group
         self.tracking_config = tracking_config
         self.is_active = is_active
         self.status = status
         self.restricted_areas = restricted_areas
+        self.inference_roi = inference_roi
+        self.inference_profile = inference_profile
 
     def __repr__(self):
         return f"<Camera {self.name} ({self.ip_address}:{self.port})>"
@@ -19,6 +19,13 @@ REST API接口：
      "resolution": "1920x1080",
      "frame_rate": 30,
      "encoding_format": "H.264",
+     "model": "yolov8n.pt",
+     "inference_backend": "onnx",
+     "keyframe_interval": 3,
+     "motion_gate_threshold": 0.002,
+     "inference_roi": "auto",
+     "inference_profile": {"imgsz": 320, "conf": 0.4, "latency_budget_ms": 80},
+     "worker_group": "overview",
      "restricted_areas": [
        {
          "id": 1,
@@ -1,7 +1,16 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, Response
+from app.services.detection_service import DetectionService
 
 connect_blueprint = Blueprint('connect', __name__)
 
 @connect_blueprint.route('/api/test')
 def test():
-    return jsonify({'message': 'Backend server is running'})
\ No newline at end of file
+    return jsonify({'message': 'Backend server is running'})
+
+@connect_blueprint.route('/metrics')
+def get_metrics():
+    """Prometheus指标(阶段耗时直方图、队列深度、丢帧、活跃摄像头、数据库写入)"""
+    try:
+        return Response(DetectionService.get_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -19,6 +19,18 @@ REST API接口：
      "stream_url": "rtsp://192.168.1.100:554/stream1",
      "model_path": "yolov8n.pt",
      "tracking_config": "botsort.yaml",
+     "inference_mode": "batched",
+     "keyframe_interval": 3,
+     "keyframe_motion_threshold": 0.1,
+     "motion_gate_threshold": 0.002,
+     "inference_roi": [0, 360, 1920, 1080],
+     "inference_profile": {"imgsz": 640, "classes": ["car", "bus", "truck"]},
+     "decode_max_size": "auto",
+     "decode_threads": 2,
+     "record": true,
+     "annotate": true,
+     "worker_mode": "process",
+     "worker_group": "gate",
      "output_path": "streams/1/live.mp4",
      "retention_days": 30
    }
@@ -46,8 +58,33 @@ REST API接口：
    {
      "source": "/path/to/video.mp4",
      "model": "yolov8n.pt",
-     "tracker_type": "botsort"
+     "tracker_type": "botsort",
+     "parallel": true,           # 长视频分段并行分析(可选)
+     "workers": 4,
+     "chunk_seconds": 120,
+     "overlap_seconds": 2,
+     "save_video": true,
+     "wait": false               # true时同步等待分析完成(可选)
    }
+   图片集批量分析：source为图片目录、通配符路径或图片路径列表
+   {
+     "source": "/data/snapshots",
+     "model": "yolov8n.pt",
+     "batch_size": 16,
+     "decode_threads": 4,
+     "save_images": false
+   }
+   响应：202 {"job_id": "...", "status": "queued", "progress": {...}}
+   任务查询：
+   GET /analyze/jobs                    # 任务列表及队列状态
+   GET /analyze/jobs/<job_id>           # 状态和进度(已处理帧数/总帧数/帧率)
+   GET /analyze/jobs/<job_id>/result    # 分析结果(未完成返回409)
+   POST /analyze/jobs/<job_id>/cancel   # 取消任务
+   分析结果中的detections_path为逐帧检测结果文件(NDJSON)，通过以下接口分页查询：
+   GET /analyze/detections?path=outputs/video_20260101083000_3f9c2a1b_detections.ndjson&offset=0&limit=100
+   GET /analyze/detections?job_id=<job_id>&offset=0&limit=100   # 按任务定位结果文件(任务完成后)
+   path必须位于分析输出目录(ANALYSIS_OUTPUT_DIR，默认outputs)下，否则返回403
+   响应：{"total": 5400, "offset": 0, "limit": 100, "next_offset": 100, "frames": [{"frame": 0, "detections": [...]}]}
 
 4. 配置特殊车辆：
    POST /special-vehicles/config
@@ -56,7 +93,40 @@ REST API接口：
      "7": {"name": "truck", "color": [255,0,0]}
    }
 
-5. 配置视频流：
+5. 获取已加载模型：
+   GET /models
+   响应：200 OK
+   {
+     "max_memory_mb": 2048,
+     "used_memory_mb": 12.4,
+     "models": [{"model_path": ".../yolov8n.pt", "device": "cpu", "backend": "pytorch", "ref_count": 3}],
+     "engines": [{"model_path": ".../yolov8n.pt", "cameras": 3, "batches": 1200, "avg_batch": 2.9}]
+   }
+
+6. 生成INT8量化模型：
+   POST /quantize
+   请求体格式：
+   {
+     "model": "yolov8n.pt",
+     "save_dir": "recordings",
+     "camera_ids": [1, 2],
+     "calibration_frames": 200,
+     "eval_frames": 100
+   }
+   响应：200 OK
+   {
+     "success": true,
+     "report": {
+       "int8_path": ".../yolov8n_<hash>_640.int8.onnx",
+       "calibration_frames": 200,
+       "cameras": {
+         "1": {"fp32_fps": 9.8, "int8_fps": 17.1, "speedup": 1.745,
+               "classes": {"car": {"fp32": 812, "int8": 798, "matched": 781, "agreement": 0.97}}}
+       }
+     }
+   }
+
+7. 配置视频流：
    POST /stream/config
    {
      "max_width": 1280,
@@ -116,6 +186,7 @@ REST API接口：
 
 from flask import Blueprint, request, jsonify, send_file
 from app.services.detection_service import DetectionService
+from app.utils.analysis_jobs import AnalysisQueueFull
 from app.utils.websocket_utils import VideoStreamConfig
 
 detection_blueprint = Blueprint('detection', __name__)
@@ -155,11 +226,73 @@ def analyze_file():
     """
     分析外部文件接口
     请求体包括：文件路径、模型路径、跟踪算法配置路径
-    响应包括：分析结果
+    响应包括：分析任务(202)；请求体wait为true时同步返回分析结果(200)
     """
     data = request.json
-    results = DetectionService.analyze_file(data)
-    return jsonify(results), 200
+    if data.get('wait'):
+        results = DetectionService.analyze_file(data)
+        return jsonify(results), 200
+    try:
+        job = DetectionService.submit_analysis(data)
+        return jsonify(job), 202
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except AnalysisQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+
+@detection_blueprint.route('/analyze/jobs', methods=['GET'])
+def list_analysis_jobs():
+    """获取分析任务列表及队列状态"""
+    return jsonify(DetectionService.list_analysis_jobs()), 200
+
+@detection_blueprint.route('/analyze/jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """获取分析任务状态和进度"""
+    job = DetectionService.get_analysis_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Analysis job not found: {job_id}"}), 404
+    return jsonify(job), 200
+
+@detection_blueprint.route('/analyze/jobs/<job_id>/result', methods=['GET'])
+def get_analysis_result(job_id):
+    """获取分析任务结果，任务未完成时返回409"""
+    job = DetectionService.get_analysis_job(job_id, include_result=True)
+    if job is None:
+        return jsonify({"error": f"Analysis job not found: {job_id}"}), 404
+    if job['status'] != 'completed':
+        return jsonify({"error": f"Analysis job is {job['status']}", "job": job}), 409
+    return jsonify(job['result']), 200
+
+@detection_blueprint.route('/analyze/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_analysis_job(job_id):
+    """取消分析任务"""
+    job = DetectionService.cancel_analysis_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Analysis job not found: {job_id}"}), 404
+    return jsonify(job), 200
+
+@detection_blueprint.route('/analyze/detections', methods=['GET'])
+def get_analysis_detections():
+    """
+    分页查询文件分析的逐帧检测结果
+    查询参数：job_id(异步分析任务ID)或path(分析结果中的detections_path，须位于分析输出目录下)、offset、limit
+    """
+    try:
+        result = DetectionService.get_analysis_detections(
+            request.args.get('path', ''),
+            offset=request.args.get('offset', 0, type=int),
+            limit=request.args.get('limit', type=int),
+            job_id=request.args.get('job_id')
+        )
+        return jsonify(result), 200
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 403
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
 
 @detection_blueprint.route('/results/<path:filename>')
 def get_results(filename):
@@ -171,10 +304,26 @@ def get_results(filename):
 
 @detection_blueprint.route('/status', methods=['GET'])
 def get_processing_status():
-    """获取所有处理线程的状态"""
+    """获取所有处理线程的状态，包含各阶段队列深度和丢帧数"""
     status = DetectionService.get_processing_status()
     return jsonify(status), 200
 
+@detection_blueprint.route('/models', methods=['GET'])
+def get_loaded_models():
+    """获取已加载(共享)的模型及内存占用"""
+    models = DetectionService.get_loaded_models()
+    return jsonify(models), 200
+
+@detection_blueprint.route('/quantize', methods=['POST'])
+def quantize_model():
+    """
+    生成INT8量化模型接口
+    使用录像校准，返回按摄像头的FP32/INT8帧率和各类别一致性对比
+    """
+    data = request.json
+    result = DetectionService.quantize_model(data)
+    return jsonify(result), 200
+
 @detection_blueprint.route('/special-vehicles/config', methods=['POST'])
 def configure_special_vehicles():
     """配置特殊车辆"""
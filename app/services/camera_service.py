@@ -68,6 +68,7 @@ Frontend -> REST API -> CameraService -> Database
 
 配置管理：
 - 默认模型：yolov8n.pt
+- 默认推理后端：pytorch(无GPU设备可设为onnx)
 - 默认跟踪器：botsort.yaml
 - 视频存储路径：streams/<camera_id>/
 
@@ -78,13 +79,19 @@ Frontend -> REST API -> CameraService -> Database
 """
 
 # 摄像头管理服务
-import cv2
 import os
 from datetime import datetime
 from app.models.camera import Camera
 from app.models.detection import Detection
 from app import db
 from app.services.detection_service import DetectionService
+from app.utils.roi import InferenceROI
+from app.utils.inference_profile import InferenceProfile
+from app.utils.lazy_import import LazyImport
+
+# 连接测试和类别校验时导入
+cv2 = LazyImport('cv2')
+YOLOIntegration = LazyImport('app.utils.yolo_integration', 'YOLOIntegration')
 
 class CameraService:
    
@@ -143,6 +150,13 @@ class CameraService:
                           for point in area.get('points', [])):
                     raise ValueError("Invalid area points format")
             
+            # 验证推理区域
+            InferenceROI.resolve(data.get('inference_roi'), restricted_areas)
+            
+            # 验证推理配置
+            InferenceProfile.from_config(data.get('inference_profile'),
+                                         target_classes=YOLOIntegration.TARGET_CLASSES)
+            
             # 测试摄像头连接
             CameraService.test_camera_connection(data['url'])
             
@@ -156,6 +170,12 @@ class CameraService:
                 frame_rate=data['frame_rate'],
                 encoding_format=data['encoding_format'],
                 model=data.get('model', 'yolov8n.pt'),  # 默认模型
+                inference_backend=data.get('inference_backend', 'pytorch'),  # 推理后端
+                keyframe_interval=data.get('keyframe_interval', 1),  # 关键帧间隔
+                motion_gate_threshold=data.get('motion_gate_threshold', 0.0),  # 运动门控阈值
+                inference_roi=data.get('inference_roi'),  # 推理区域
+                inference_profile=data.get('inference_profile'),  # 推理配置
+                worker_group=data.get('worker_group'),  # 工作进程分组
                 tracking_config=data.get('tracking_config', 'botsort.yaml'),  # 默认跟踪配置
                 status='online',
                 restricted_areas=restricted_areas
@@ -195,6 +215,13 @@ class CameraService:
                 "stream_url": camera.url,
                 "model_path": camera.model,
                 "tracking_config": camera.tracking_config,
+                "backend": camera.inference_backend,
+                "keyframe_interval": camera.keyframe_interval,
+                "motion_gate_threshold": camera.motion_gate_threshold,
+                "inference_roi": camera.inference_roi,
+                "restricted_areas": camera.restricted_areas,
+                "inference_profile": camera.inference_profile,
+                "worker_group": camera.worker_group,
                 "output_path": f"streams/{camera.id}/live.mp4"
             }
             
@@ -28,7 +28,10 @@
    - POST /detection/detect: 启动检测
    - GET /detection/detections: 获取检测记录
    - POST /detection/analyze: 分析外部文件
-   - GET /detection/status: 获取处理状态
+   - GET /detection/status: 获取处理状态(含工作进程)
+   - GET /metrics: Prometheus格式的阶段耗时、队列和数据库写入指标
+   - GET /detection/models: 获取已加载模型
+   - POST /detection/quantize: 生成INT8量化模型及对比报告
 
 数据流向：
 1. 视频流处理：
@@ -48,8 +51,14 @@
    - 创建处理线程
    - 启动清理线程
    
-2. 视频处理：
-   - 控制帧率
+2. 视频处理(分阶段流水线，阶段之间通过有界队列连接)：
+   - 采集线程读取视频帧，推理只取最新帧
+   - 可选关键帧模式：每N帧检测一次，其余帧由跟踪器外推
+   - 可选运动门控：画面静止时跳过检测，复用上一帧结果
+   - 可选ROI推理：只检测禁停区域附近，结果映射回整帧坐标
+   - 可选两级级联：nano模型逐帧检测，更大的模型限频复检低置信度目标和禁停区域(见ModelCascade)
+   - 实时推送阶段按目标帧率跳帧，不阻塞推理
+   - 事件阶段和录制阶段不丢帧
    - 检测目标
    - 识别特殊车辆
    - 检查违规行为
@@ -62,7 +71,8 @@
    - 清理数据库记录
 
 异常处理：
-- 视频流中断处理
+- 视频流中断处理：实时流断线后按指数退避自动重连，模型、跟踪器、录像分段和违规缓存保持不变(见StreamReconnector)
+- 工作进程异常退出(进程模式)
 - 数据库操作异常
 - 文件系统异常
 - 模型加载异常
@@ -75,30 +85,62 @@
 
 性能优化：
 - 使用线程池处理多路视频流
+- 可选进程模式(worker_mode='process')：摄像头在独立工作进程中运行，
+  标注、编码、数据库写入不占用Web进程的GIL，结果和提醒经管道传回(见WorkerSupervisor)
+- 采集/推理/输出解耦，数据库或编码变慢不会阻塞采集
+- 推理线程数按全局核心预算分配给各摄像头(或工作进程)，摄像头启停时重新分配，避免多路推理超额占用CPU(见CoreBudget)
+- 标注画面每帧只渲染一次，实时推送和录制共享；无观看者且不录制时不渲染(见FrameAnnotator)
 - 控制视频帧率降低资源占用
+- 各阶段(解码/推理/跟踪/违规/标注/编码/录制/数据库提交)按摄像头记录耗时直方图，定位瓶颈阶段(见PipelineMetrics)
 - 定期清理过期数据
 - 异常自动恢复机制
 """
 
 # 车辆检测服务
 import os
-import cv2
 import threading
 import glob
 import time
 from datetime import datetime, timedelta
+from flask import current_app, has_app_context
 from app.models.detection import Detection
 from app.models.camera import Camera
-from app.utils.yolo_integration import YOLOIntegration
+from app.utils.lazy_import import LazyImport
+from app.utils.model_registry import model_registry
+from app.utils.inference_engine import inference_engines
+from app.utils.pipeline import StreamPipeline
+from app.utils.analysis_jobs import analysis_jobs
+from app.utils.metrics import metrics, render_metrics
+from app.utils.detection_workers import WorkerSupervisor, worker_supervisor
+from app.utils.cpu_budget import core_budget
+from app.services.violation_service import ViolationService
 from app import db
-from app.utils.websocket_utils import emit_violation_alert, emit_special_vehicle_alert, emit_video_frame
-from app.utils.websocket_utils import VideoStreamConfig
+from app.utils.websocket_utils import emit_violation_alert, emit_special_vehicle_alert
+from app.utils.websocket_utils import encode_video_frame, emit_encoded_frame
+from app.utils.websocket_utils import VideoStreamConfig, has_video_viewers
 from app.utils.websocket_utils import emit_streaming_result
 
+# 检测和分析依赖(cv2/torch/ultralytics)在首次使用时导入
+cv2 = LazyImport('cv2')
+YOLOIntegration = LazyImport('app.utils.yolo_integration', 'YOLOIntegration')
+FrameDetections = LazyImport('app.utils.detections', 'FrameDetections')
+FrameAnnotator = LazyImport('app.utils.annotation', 'FrameAnnotator')
+AnnotatedFrame = LazyImport('app.utils.annotation', 'AnnotatedFrame')
+ChunkedVideoAnalyzer = LazyImport('app.utils.chunked_analysis', 'ChunkedVideoAnalyzer')
+DetectionArtifact = LazyImport('app.utils.detection_artifact', 'DetectionArtifact')
+ImageBatchAnalyzer = LazyImport('app.utils.image_batch', 'ImageBatchAnalyzer')
+ModelQuantizer = LazyImport('app.utils.quantization', 'ModelQuantizer')
+
 class DetectionService:
-    # 存储活跃的处理线程
+    # 存储活跃的处理线程(进程模式下为工作进程中的摄像头)
     active_threads = {}
     
+    # 事件出口：为空时直接通过WebSocket推送；工作进程中设置为管道发送
+    event_sink = None
+    
+    # 文件分析默认输出目录，按路径分页查询检测结果时只允许读取该目录下的文件
+    ANALYSIS_OUTPUT_DIR = os.getenv('ANALYSIS_OUTPUT_DIR', 'outputs')
+    
     @staticmethod
     def start_detection(data):
         """
@@ -108,8 +150,24 @@ class DetectionService:
                 - camera_id: 摄像头ID
                 - stream_url: 视频流URL
                 - model_path: YOLO模型路径
-                - tracker_type: 跟踪器类型
+                - tracker_type: 跟踪器类型 bytetrack/botsort/iou/custom(iou仅batched模式)
                 - tracking_config: 自定义跟踪配置路径(可选)
+                - inference_mode: 推理模式 batched/stream(可选)
+                - backend: 推理后端 pytorch/onnx/onnx-int8(可选)
+                - keyframe_interval: 关键帧间隔，每N帧检测一次(可选)
+                - keyframe_motion_threshold: 触发关键帧的运动分数(可选)
+                - motion_gate_threshold: 运动门控阈值，静止画面跳过检测(可选)
+                - inference_roi: 推理区域 [x1, y1, x2, y2] 或 "auto"(可选)
+                - restricted_areas: 禁停区域，inference_roi为auto或级联复检禁停区域时使用(可选，默认读取摄像头配置)
+                - inference_profile: 推理配置 imgsz/conf/iou/max_det/classes/latency_budget_ms(可选)
+                - capture_process: 是否在独立进程中解码，帧经共享内存传递(可选，默认DETECTION_CAPTURE_PROCESS)
+                - decode_max_size: 降分辨率解码的帧长边上限，"auto"为推理尺寸(可选，默认DETECTION_DECODE_MAX_SIZE)
+                - decode_threads: 解码线程数(可选，默认FRAME_DECODE_THREADS)
+                - cascade: 两级级联 model_path/conf_threshold/interval/areas/imgsz/conf/max_crops/padding(可选)
+                - record: 是否录制视频(可选，默认True)
+                - annotate: 实时画面和录像是否绘制检测框(可选，默认True)
+                - worker_mode: 运行方式 thread/process(可选，默认DETECTION_WORKER_MODE)
+                - worker_group: 进程模式下的分组，同组摄像头共享一个工作进程(可选，默认每个摄像头一个)
                 - save_dir: 视频保存目录
                 - retention_days: 视频保存天数(可选)
         """
@@ -124,11 +182,29 @@ class DetectionService:
                     "message": f"Camera {camera_id} is already being processed"
                 }
             
+            worker_mode = data.get('worker_mode') or WorkerSupervisor.MODE
+            if worker_mode not in WorkerSupervisor.WORKER_MODES:
+                raise ValueError(f"Invalid worker mode: {worker_mode}")
+            if worker_mode == 'process':
+                return DetectionService._start_detection_process(data)
+            
             # 初始化YOLO和跟踪器
             yolo = YOLOIntegration(
                 model_path=data['model_path'],
                 tracker_type=data.get('tracker_type', 'bytetrack'),
-                tracking_config=data.get('tracking_config')
+                tracking_config=data.get('tracking_config'),
+                inference_mode=data.get('inference_mode'),
+                backend=data.get('backend'),
+                keyframe_interval=data.get('keyframe_interval'),
+                keyframe_motion_threshold=data.get('keyframe_motion_threshold'),
+                motion_gate_threshold=data.get('motion_gate_threshold'),
+                roi=data.get('inference_roi'),
+                restricted_areas=DetectionService._get_restricted_areas(data),
+                profile=data.get('inference_profile'),
+                capture_process=data.get('capture_process'),
+                decode_max_size=data.get('decode_max_size'),
+                decode_threads=data.get('decode_threads'),
+                cascade=data.get('cascade')
             )
             
             # 创建存储目录
@@ -140,12 +216,12 @@ class DetectionService:
             
             # 启动视频处理和清理线程
             process_thread = threading.Thread(
-                target=DetectionService._process_and_save_stream,
+                target=DetectionService._with_app_context(DetectionService._process_and_save_stream),
                 args=(yolo, data),
                 daemon=True
             )
             cleanup_thread = threading.Thread(
-                target=DetectionService._cleanup_old_videos,
+                target=DetectionService._with_app_context(DetectionService._cleanup_old_videos),
                 args=(data['save_dir'], data['camera_id'], retention_days),
                 daemon=True
             )
@@ -156,10 +232,13 @@ class DetectionService:
                 'status': 'starting'
             }
             
+            # 从核心预算中分得推理线程数，其他摄像头在下一帧按新分配调整
+            core_budget.acquire(camera_id)
+            
             process_thread.start()
             cleanup_thread.start()
             
-            emit_streaming_result(camera_id, 'started')
+            DetectionService._publish_event('streaming_result', camera_id, 'started')
             
             return {
                 "success": True,
@@ -170,132 +249,265 @@ class DetectionService:
             
         except Exception as e:
             if camera_id is not None:
-                emit_streaming_result(camera_id, 'stopped')
+                DetectionService._publish_event('streaming_result', camera_id, 'stopped')
                 if camera_id in DetectionService.active_threads:
                     del DetectionService.active_threads[camera_id]
+                    DetectionService._release_cores(camera_id)
             raise Exception(f"Detection start failed: {str(e)}")
 
+    @staticmethod
+    def _start_detection_process(data):
+        """在工作进程中启动检测，工作进程内以线程模式运行"""
+        camera_id = data['camera_id']
+        DetectionService.active_threads[camera_id] = {'status': 'starting'}
+        # 同一工作进程的摄像头共同占用一份核心，工作进程内再分配给各摄像头
+        core_budget.acquire(camera_id, unit=DetectionService._worker_unit(WorkerSupervisor.group_of(data)))
+        database_uri = current_app.config.get('SQLALCHEMY_DATABASE_URI') if has_app_context() else None
+        worker, result = worker_supervisor.start_camera(
+            data,
+            database_uri=database_uri,
+            on_event=lambda kind, args: DetectionService._publish_event(kind, *args),
+            on_finished=DetectionService._on_worker_camera_finished,
+            resources=DetectionService._worker_resources,
+            viewers=has_video_viewers
+        )
+        if not result.get('success'):
+            del DetectionService.active_threads[camera_id]
+            DetectionService._release_cores(camera_id)
+            raise RuntimeError(result.get('message', 'worker failed to start camera'))
+        
+        DetectionService.active_threads[camera_id] = {
+            'worker': worker,
+            'status': 'running'
+        }
+        worker_supervisor.update_resources(DetectionService._worker_resources)
+        return dict(result, worker={'group': worker.group, 'pid': worker.pid})
+
+    @staticmethod
+    def _on_worker_camera_finished(worker, camera_id):
+        """工作进程中的摄像头处理结束或进程退出"""
+        info = DetectionService.active_threads.get(camera_id)
+        if info is not None and info.get('worker') is worker:
+            del DetectionService.active_threads[camera_id]
+            DetectionService._release_cores(camera_id)
+        if worker.exitcode:
+            print(f"Detection worker {worker.group} exited with code {worker.exitcode}")
+            DetectionService._publish_event('streaming_result', camera_id, 'stopped')
+
+    @staticmethod
+    def _worker_unit(group):
+        """工作进程分组在核心预算中的单元名"""
+        return f"worker:{group}"
+
+    @staticmethod
+    def _worker_resources(group):
+        """工作进程分组的核心分配(下发给工作进程)"""
+        return core_budget.unit_allocation(DetectionService._worker_unit(group))
+
+    @staticmethod
+    def _release_cores(camera_id):
+        """归还摄像头的核心，剩余工作进程按新分配调整"""
+        core_budget.release(camera_id)
+        worker_supervisor.update_resources(DetectionService._worker_resources)
+
+    @staticmethod
+    def _publish_event(kind, *args):
+        """
+        推送检测事件
+        工作进程中经管道发送回Web进程，Web进程中直接通过WebSocket推送
+        Args:
+            kind: video_frame / violation_alert / special_vehicle_alert / streaming_result
+        """
+        if DetectionService.event_sink is not None:
+            DetectionService.event_sink(kind, args)
+        elif kind == 'video_frame':
+            emit_encoded_frame(*args)
+        elif kind == 'violation_alert':
+            emit_violation_alert(*args)
+        elif kind == 'special_vehicle_alert':
+            emit_special_vehicle_alert(*args)
+        elif kind == 'streaming_result':
+            emit_streaming_result(*args)
+
+    @staticmethod
+    def _get_restricted_areas(data):
+        """获取推导ROI或级联复检所需的禁停区域(仅inference_roi为auto或级联复检禁停区域时需要)"""
+        cascade = data.get('cascade') or {}
+        if data.get('inference_roi') != 'auto' and not (cascade and cascade.get('areas', True)):
+            return None
+        if data.get('restricted_areas') is not None:
+            return data['restricted_areas']
+        camera = Camera.query.get(data['camera_id'])
+        return camera.restricted_areas if camera else None
+
+    @staticmethod
+    def _with_app_context(target):
+        """将线程函数绑定到当前应用上下文(子线程访问数据库需要)"""
+        if not has_app_context():
+            return target
+        app = current_app._get_current_object()  # type: ignore
+
+        def run(*args, **kwargs):
+            with app.app_context():
+                return target(*args, **kwargs)
+        return run
+
+    # 流水线各阶段队列容量
+    LIVE_QUEUE_SIZE = 2      # 实时推送：只保留最新帧
+    EVENTS_QUEUE_SIZE = 64   # 违规/特殊车辆/数据库：不丢帧
+    RECORD_QUEUE_SIZE = 32   # 视频录制：不丢帧
+
     @staticmethod
     def _process_and_save_stream(yolo, data):
-        """处理视频流并按小时存储"""
+        """
+        处理视频流并按小时存储
+        推理线程只负责采集和推理，实时推送、事件处理、视频录制在独立阶段线程中执行：
+            live   - latest策略，推送跟不上时丢弃旧帧
+            events - block策略，违规检测、特殊车辆记录、数据库写入
+            record - block策略，按小时切分写入视频文件(record为False时不创建)
+        实时推送和录制共享每帧的标注画面(AnnotatedFrame)，首个使用的阶段渲染一次
+        """
         camera_id = data['camera_id']
         stream_url = data['stream_url']
         save_dir = data['save_dir']
+        pipeline = None
+        recorder = None
         
         try:
             DetectionService.active_threads[camera_id]['status'] = 'running'
-            results_generator = yolo.run_tracker_in_thread(camera_id, stream_url)
+            # 先按分配设置当前线程，之后创建的采集和阶段线程继承亲和性
+            core_budget.sync(camera_id)
             
             # 获取摄像头信息
             camera = Camera.query.get(camera_id)
+            violation_service = ViolationService()
+            if data.get('record', True):
+                recorder = _HourlyVideoRecorder(save_dir, camera_id)
+            live_state = {'last_emit': 0.0}
             
-            # 初始化视频写入器
-            current_hour = datetime.now().hour
-            output_path = DetectionService._get_video_path(save_dir, camera_id, current_hour)
-            out: cv2.VideoWriter | None = None
+            # 标注画面：每帧最多渲染一次，输出缓冲区复用
+            annotator = None
+            if data.get('annotate', True):
+                annotator = FrameAnnotator(yolo.TARGET_CLASSES, yolo.special_vehicles, camera_id=camera_id)
             
-            # 帧率控制
-            frame_interval = 1.0 / VideoStreamConfig.TARGET_FPS
-            last_frame_time = time.time()
+            # 组装流水线
+            pipeline = StreamPipeline(camera_id, wrap=DetectionService._with_app_context)
+            pipeline.add_stage(
+                'live',
+                lambda item: DetectionService._emit_live_frame(camera_id, item[2], live_state),
+                maxsize=DetectionService.LIVE_QUEUE_SIZE,
+                policy='latest'
+            )
+            pipeline.add_stage(
+                'events',
+                lambda item: DetectionService._handle_frame_events(
+                    camera_id, camera, item[0], violation_service, yolo.special_vehicles,
+                    yolo.frame_scale),
+                maxsize=DetectionService.EVENTS_QUEUE_SIZE,
+                policy='block'
+            )
+            if recorder is not None:
+                pipeline.add_stage(
+                    'record',
+                    lambda item: recorder.write(item[2]),
+                    maxsize=DetectionService.RECORD_QUEUE_SIZE,
+                    policy='block'
+                )
+            if annotator is not None:
+                pipeline.register_stats('annotation', annotator.stats)
+            pipeline.register_stats('metrics', lambda: metrics.snapshot(camera_id))
+            DetectionService.active_threads[camera_id]['pipeline'] = pipeline
+            pipeline.start()
+            
+            results_generator = yolo.run_tracker_in_thread(
+                camera_id, stream_url, check_violations=False, pipeline=pipeline)
             
             for results, violations in results_generator:
-                current_time = time.time()
-                time_diff = current_time - last_frame_time
-                
-                # 控制帧率
-                if (time_diff < frame_interval):
-                    time.sleep(frame_interval - time_diff)
-                    
                 if results and results.boxes is not None:
-                    # 检查特殊车辆
-                    special_vehicles = DetectionService._check_special_vehicles(
-                        results, camera, yolo.special_vehicles)
-                    
-                    # 获取带检测框的帧
-                    frame = results.plot()
-                    
-                    # 推送到前端
-                    emit_video_frame(camera_id, frame)
-                    last_frame_time = time.time()
-                    
-                    # 发送特殊车辆通知
-                    if special_vehicles:
-                        emit_special_vehicle_alert({
-                            'camera_name': camera.name if camera else 'Unknown',  # type: ignore
-                            'vehicles': special_vehicles,
-                            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        })
-                    
-                    if results:
-                        # 发送违规提醒
-                        if violations:
-                            for violation in violations:
-                                emit_violation_alert(violation)
-                        
-                        # 检查是否需要创建新的视频文件
-                        now = datetime.now()
-                        if now.hour != current_hour:
-                            if out:
-                                out.release()
-                            current_hour = now.hour
-                            output_path = DetectionService._get_video_path(save_dir, camera_id, current_hour)
-                            
-                            # 更新数据库
-                            DetectionService._update_detection_record(camera_id, output_path)
-                        
-                        # 确保视频写入器已初始化
-                        if out is None:
-                            frame = results.plot()  # 获取带有检测框的帧
-                            height, width = frame.shape[:2]
-                            out = cv2.VideoWriter(
-                                output_path, 
-                                cv2.VideoWriter_fourcc(*'mp4v'),  # type: ignore
-                                30, 
-                                (width, height)
-                            )
-                            
-                            # 创建初始数据库记录
-                            DetectionService._update_detection_record(camera_id, output_path)
-                        
-                        # 写入帧
-                        out.write(results.plot())
+                    pipeline.publish((results, violations, AnnotatedFrame(results, annotator)))
                     
         except Exception as e:
             print(f"Stream processing error: {str(e)}")
             DetectionService.active_threads[camera_id]['status'] = 'error'
         finally:
-            if out:  # type: ignore
-                out.release()
+            if pipeline is not None:
+                pipeline.close()
+            if recorder is not None:
+                recorder.close()
+            metrics.remove(camera_id)
             if camera_id in DetectionService.active_threads:
                 del DetectionService.active_threads[camera_id]
+            DetectionService._release_cores(camera_id)
+
+    @staticmethod
+    def _emit_live_frame(camera_id, annotated, state):
+        """实时推送阶段：按目标帧率推送，超出帧率的帧直接跳过而不是等待"""
+        # 无人观看时不渲染、不编码(工作进程中的观看状态由Web进程经管道同步)
+        if not has_video_viewers(camera_id):
+            return
+        now = time.time()
+        if now - state['last_emit'] < 1.0 / VideoStreamConfig.TARGET_FPS:
+            return
+        state['last_emit'] = now
+        
+        # 获取带检测框的帧(与录制阶段共享)，在当前进程内完成JPEG编码后推送到前端
+        try:
+            image = annotated.image()
+            started = time.perf_counter()
+            jpeg = encode_video_frame(image)
+            metrics.observe(camera_id, 'encode', time.perf_counter() - started)
+            DetectionService._publish_event('video_frame', camera_id, jpeg)
+        except Exception as e:
+            print(f"Error sending video frame: {str(e)}")
+
+    @staticmethod
+    def _handle_frame_events(camera_id, camera, results, violation_service, special_vehicles, scale=1.0):
+        """事件阶段：检查违规和特殊车辆，写入数据库并推送提醒(scale为降分辨率解码的缩放比例)"""
+        # 检查特殊车辆
+        detections = DetectionService._check_special_vehicles(results, camera, special_vehicles, scale)
+        
+        # 发送特殊车辆通知
+        if detections:
+            DetectionService._publish_event('special_vehicle_alert', {
+                'camera_name': camera.name if camera else 'Unknown',  # type: ignore
+                'vehicles': detections,
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+        
+        # 检查违规并发送提醒(含违规记录提交)
+        started = time.perf_counter()
+        violations = violation_service.check_violations(camera_id, results, scale)
+        metrics.observe(camera_id, 'violations', time.perf_counter() - started)
+        for violation in violations:
+            DetectionService._publish_event('violation_alert', violation)
 
     @staticmethod
-    def _check_special_vehicles(results, camera, special_vehicles):
-        """检查特殊车辆"""
+    def _check_special_vehicles(results, camera, special_vehicles, scale=1.0):
+        """检查特殊车辆(位置换算回原始画面坐标)"""
         special_detections = []
         
         if results.boxes is not None:
-            boxes = results.boxes.xywh.cpu()
-            cls_ids = results.boxes.cls.cpu().tolist()
-            track_ids = results.boxes.id.int().cpu().tolist()
+            # 与违规检测共享同一帧的检测数组，只处理特殊车辆类别
+            frame_detections = FrameDetections.of(results)
+            mask = frame_detections.class_mask(special_vehicles)
+            centers = frame_detections.centers(scale)[mask]
+            cls_ids = frame_detections.cls[mask]
+            track_ids = frame_detections.track_ids[mask]
             
-            for box, cls_id, track_id in zip(boxes, cls_ids, track_ids):
-                cls_id = int(cls_id)
-                if cls_id in special_vehicles:
-                    x, y = int(box[0].item()), int(box[1].item())
-                    detection = {
-                        'vehicle_type': special_vehicles[cls_id]['name'],
-                        'track_id': track_id,
-                        'location': {'x': x, 'y': y}
-                    }
-                    special_detections.append(detection)
-                    
-                    # 记录到数据库
-                    DetectionService._save_special_vehicle_detection(
-                        camera.id,
-                        detection
-                    )
-                    
+            for (x, y), cls_id, track_id in zip(centers.tolist(), cls_ids.tolist(), track_ids.tolist()):
+                detection = {
+                    'vehicle_type': special_vehicles[cls_id]['name'],
+                    'track_id': track_id,
+                    'location': {'x': int(x), 'y': int(y)}
+                }
+                special_detections.append(detection)
+                
+                # 记录到数据库
+                DetectionService._save_special_vehicle_detection(
+                    camera.id,
+                    detection
+                )
+                
         return special_detections
 
     @staticmethod
@@ -310,7 +522,10 @@ class DetectionService:
                 is_violation=False  # 特殊车辆不一定违规
             )
             db.session.add(record)
+            started = time.perf_counter()
             db.session.commit()
+            metrics.observe(camera_id, 'db_commit', time.perf_counter() - started)
+            metrics.count(camera_id, 'db_writes.detections')
         except Exception as e:
             db.session.rollback()
             print(f"Failed to save special vehicle detection: {str(e)}")
@@ -381,6 +596,7 @@ class DetectionService:
             )
             db.session.add(detection)
             db.session.commit()
+            metrics.count(camera_id, 'db_writes.detections')
         except Exception as e:
             db.session.rollback()
             print(f"Failed to update detection record: {str(e)}")
@@ -394,43 +610,116 @@ class DetectionService:
         return [detection.to_dict() for detection in detections]
 
     @staticmethod
-    def analyze_file(data):
+    def submit_analysis(data):
+        """
+        提交异步文件分析任务(参数同analyze_file)
+        Returns:
+            dict: 任务信息(job_id/status/progress)
+        Raises:
+            FileNotFoundError / ValueError: 输入文件不存在或类型不支持
+            AnalysisQueueFull: 排队任务数达到上限
+        """
+        DetectionService._validate_analysis_source(data['source'])
+        job = analysis_jobs.submit(DetectionService.analyze_file, data)
+        return job.to_dict()
+
+    @staticmethod
+    def get_analysis_job(job_id, include_result=False):
+        """获取分析任务状态和进度，任务不存在返回None"""
+        job = analysis_jobs.get(job_id)
+        return job.to_dict(include_result=include_result) if job is not None else None
+
+    @staticmethod
+    def list_analysis_jobs():
+        """获取所有分析任务及队列状态"""
+        return {
+            **analysis_jobs.stats(),
+            'jobs': [job.to_dict() for job in analysis_jobs.list()]
+        }
+
+    @staticmethod
+    def cancel_analysis_job(job_id):
+        """取消分析任务，任务不存在返回None"""
+        job = analysis_jobs.cancel(job_id)
+        return job.to_dict() if job is not None else None
+
+    @staticmethod
+    def _validate_analysis_source(source):
+        # 图片集：目录或图片路径列表
+        if ImageBatchAnalyzer.is_image_set(source):
+            ImageBatchAnalyzer.list_images(source)
+            return
+
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Source file not found: {source}")
+
+        # 验证文件类型
+        valid_extensions = ('.mp4', '.avi', '.jpg', '.jpeg', '.png')
+        if not source.lower().endswith(valid_extensions):
+            raise ValueError(f"Unsupported file type. Supported: {valid_extensions}")
+
+    @staticmethod
+    def analyze_file(data, progress=None):
         """
         分析外部视频/图片文件
         Args:
             data (dict): {
-                'source': 文件路径,
+                'source': 文件路径、图片目录、通配符路径或图片路径列表,
                 'model': 模型路径,
                 'tracker_type': 跟踪器类型,
                 'tracking_config': 跟踪配置(可选),
-                'save_dir': 保存目录(可选)
+                'backend': 推理后端 pytorch/onnx/onnx-int8(可选),
+                'save_dir': 保存目录(可选),
+                'parallel': 视频分段并行分析(可选，默认ANALYSIS_PARALLEL),
+                'workers': 并行工作进程数(可选),
+                'chunk_seconds': 分段时长(可选),
+                'overlap_seconds': 分段重叠时长(可选),
+                'save_video': 是否输出标注视频(可选，仅并行模式，默认True),
+                'batch_size': 图片集批次大小(可选),
+                'decode_threads': 图片集解码线程数(可选),
+                'save_images': 是否输出标注图片(可选，仅图片集，默认False)
             }
+            progress: 进度回调 progress(已处理帧数, 总帧数)(异步任务使用)
         Returns:
             dict: 分析结果
         """
         try:
             source = data['source']
-            if not os.path.exists(source):
-                raise FileNotFoundError(f"Source file not found: {source}")
-            
-            # 验证文件类型
-            valid_extensions = ('.mp4', '.avi', '.jpg', '.jpeg', '.png')
-            if not source.lower().endswith(valid_extensions):
-                raise ValueError(f"Unsupported file type. Supported: {valid_extensions}")
+            DetectionService._validate_analysis_source(source)
             
             # 创建保存目录
-            save_dir = data.get('save_dir', 'outputs')
+            save_dir = data.get('save_dir', DetectionService.ANALYSIS_OUTPUT_DIR)
             os.makedirs(save_dir, exist_ok=True)
             
             # 初始化YOLO
             yolo = YOLOIntegration(
                 model_path=data['model'],
                 tracker_type=data.get('tracker_type', 'bytetrack'),
-                tracking_config=data.get('tracking_config')
+                tracking_config=data.get('tracking_config'),
+                backend=data.get('backend')
             )
             
-            # 处理文件
-            results = yolo.process_source(source, save_dir)
+            # 处理文件：图片集批量分析，长视频可分段并行分析，单个文件按顺序分析
+            parallel = data.get('parallel', ChunkedVideoAnalyzer.ENABLED)
+            if ImageBatchAnalyzer.is_image_set(source):
+                results = yolo.process_images(
+                    source, save_dir,
+                    batch_size=data.get('batch_size'),
+                    decode_threads=data.get('decode_threads'),
+                    save_images=data.get('save_images', False),
+                    progress=progress
+                )
+            elif parallel and source.lower().endswith(('.mp4', '.avi')):
+                results = yolo.process_source_parallel(
+                    source, save_dir,
+                    workers=data.get('workers'),
+                    chunk_seconds=data.get('chunk_seconds'),
+                    overlap_seconds=data.get('overlap_seconds'),
+                    save_video=data.get('save_video', True),
+                    progress=progress
+                )
+            else:
+                results = yolo.process_source(source, save_dir, progress=progress)
             
             return {
                 "success": True,
@@ -441,13 +730,168 @@ class DetectionService:
         except Exception as e:
             raise Exception(f"File analysis failed: {str(e)}")
 
+    @staticmethod
+    def get_analysis_detections(path=None, offset=0, limit=None, job_id=None):
+        """
+        分页读取文件分析的逐帧检测结果
+        Args:
+            path: 分析结果中的detections_path(须位于ANALYSIS_OUTPUT_DIR下)
+            offset: 起始行(有检测结果的帧)
+            limit: 每页帧数
+            job_id: 异步分析任务ID，指定时读取该任务结果中的检测结果文件(不限输出目录)
+        Returns:
+            dict: {"path", "offset", "limit", "total", "next_offset", "frames"}
+        Raises:
+            FileNotFoundError: 任务或结果文件不存在
+            PermissionError: path不在分析输出目录下
+            ValueError: 任务尚未完成
+        """
+        if job_id:
+            job = analysis_jobs.get(job_id)
+            if job is None:
+                raise FileNotFoundError(f"Analysis job not found: {job_id}")
+            if job.status != 'completed':
+                raise ValueError(f"Analysis job is {job.status}")
+            path = job.result['results']['detections_path']
+        else:
+            # 调用方提供的路径必须解析到分析输出目录内(防止读取任意文件)
+            root = os.path.realpath(DetectionService.ANALYSIS_OUTPUT_DIR)
+            resolved = os.path.realpath(path or '')
+            if os.path.commonpath([root, resolved]) != root:
+                raise PermissionError(f"Detection artifact outside analysis output directory: {path}")
+        return DetectionArtifact.read_page(path, offset, limit)
+
+    @staticmethod
+    def quantize_model(data):
+        """
+        使用摄像头录像校准生成INT8量化模型，并输出与FP32模型的对比报告
+        Args:
+            data (dict): {
+                'model': 模型文件名,
+                'save_dir': 录像目录(检测时的save_dir),
+                'camera_ids': 参与校准和评估的摄像头(可选，默认全部),
+                'calibration_frames': 校准帧数(可选),
+                'eval_frames': 每个摄像头的评估帧数(可选)
+            }
+        Returns:
+            dict: 按摄像头的帧率和各类别一致性报告
+        """
+        try:
+            save_dir = data['save_dir']
+            if not os.path.isdir(save_dir):
+                raise FileNotFoundError(f"Recording directory not found: {save_dir}")
+
+            yolo = YOLOIntegration(model_path=data['model'], backend='onnx')
+            report = ModelQuantizer.build_report(
+                yolo.model_path,
+                save_dir,
+                classes=yolo.TARGET_CLASSES,
+                camera_ids=data.get('camera_ids'),
+                calibration_frames=data.get('calibration_frames'),
+                eval_frames=data.get('eval_frames')
+            )
+
+            return {
+                "success": True,
+                "message": "Quantization completed successfully",
+                "report": report
+            }
+
+        except Exception as e:
+            raise Exception(f"Model quantization failed: {str(e)}")
+
     @staticmethod
     def get_processing_status():
-        """获取所有处理线程的状态"""
+        """
+        获取所有处理线程(及工作进程)的状态
+        Returns:
+            dict: {camera_id: {'status': 状态, 'pipeline': 各队列深度、丢帧、关键帧和运动门控跳帧统计、阶段耗时直方图,
+                               'cpu': 推理线程数和核心分配,
+                               'worker': 工作进程信息及其核心分配(仅进程模式)}}
+        """
+        status = {}
+        for camera_id, info in list(DetectionService.active_threads.items()):
+            camera_status = {'status': info['status']}
+            pipeline = info.get('pipeline')
+            if pipeline is not None:
+                camera_status['pipeline'] = pipeline.stats()
+                # 断线重连期间模型和跟踪器保持加载，状态显示为reconnecting
+                reconnect = (camera_status['pipeline'].get('source') or {}).get('reconnect')
+                if reconnect and reconnect['state'] == 'reconnecting' and info['status'] == 'running':
+                    camera_status['status'] = 'reconnecting'
+            allocation = core_budget.allocation(camera_id)
+            if allocation is not None:
+                camera_status['cpu'] = allocation
+            worker = info.get('worker')
+            if worker is not None:
+                # 工作进程定期上报的状态快照
+                camera_status.update(worker.camera_status(camera_id) or {})
+                camera_status['worker'] = worker.info()
+            status[camera_id] = camera_status
+        return status
+
+
+
+
+
+    @staticmethod
+    def get_metrics():
+        """
+        获取Prometheus文本格式的指标
+        阶段耗时直方图、队列深度和丢帧、活跃摄像头、数据库写入(进程模式来自工作进程的状态快照)及分析任务
+        """
+        return render_metrics(DetectionService.get_processing_status(), analysis_jobs.stats())
+
+    @staticmethod
+    def get_loaded_models():
+        """获取模型注册表中已加载的模型及批量推理引擎状态"""
         return {
-            camera_id: info['status']
-            for camera_id, info in DetectionService.active_threads.items()
+            **model_registry.stats(),
+            'engines': inference_engines.stats()
         }
 
 
 
+class _HourlyVideoRecorder:
+    """按小时切分的视频录制器(仅在录制阶段线程中使用)"""
+
+    def __init__(self, save_dir, camera_id):
+        self.save_dir = save_dir
+        self.camera_id = camera_id
+        self.current_hour = datetime.now().hour
+        self.output_path = DetectionService._get_video_path(save_dir, camera_id, self.current_hour)
+        self.out: cv2.VideoWriter | None = None
+
+    def write(self, annotated):
+        """写入一帧标注画面(AnnotatedFrame)"""
+        # 检查是否需要创建新的视频文件
+        now = datetime.now()
+        if now.hour != self.current_hour:
+            self.close()
+            self.current_hour = now.hour
+            self.output_path = DetectionService._get_video_path(self.save_dir, self.camera_id, self.current_hour)
+        
+        # 确保视频写入器已初始化(按原始帧尺寸，无需先渲染)
+        if self.out is None:
+            height, width = annotated.shape[:2]
+            self.out = cv2.VideoWriter(
+                self.output_path,
+                cv2.VideoWriter_fourcc(*'mp4v'),  # type: ignore
+                30,
+                (width, height)
+            )
+            
+            # 创建初始数据库记录
+            DetectionService._update_detection_record(self.camera_id, self.output_path)
+        
+        # 写入帧(与实时推送共享同一次渲染，渲染耗时计入annotate)
+        image = annotated.image()
+        started = time.perf_counter()
+        self.out.write(image)
+        metrics.observe(self.camera_id, 'record', time.perf_counter() - started)
+
+    def close(self):
+        """释放视频写入器"""
+        if self.out is not None:
+            self.out.release()
+            self.out = None
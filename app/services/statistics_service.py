@@ -80,9 +80,12 @@ from app.models.statistics import StatisticsModel
 from app.config.scheduler_config import scheduler
 from app.utils.websocket_utils import socketio
 from app import db
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+from app.utils.lazy_import import LazyImport
+
+# 图表依赖在首次生成图表时导入
+pd = LazyImport('pandas')
+px = LazyImport('plotly.express')
+go = LazyImport('plotly.graph_objects')
 
 class StatisticsService:
     @staticmethod
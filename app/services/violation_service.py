@@ -63,18 +63,23 @@
 3. 可以扩展支持更多类型的违规行为
 4. 考虑添加批量导出违规记录功能
 """                                      
+import time
 from datetime import datetime
-from app.utils.violation_utils import ViolationDetector
+from app.utils.lazy_import import LazyImport
 from app.models.camera import Camera
 from app import db
 from app.models.violation import Violation
+from app.utils.metrics import metrics
+
+# 禁停区域判断依赖(numpy/shapely/torch)在首次检查违规时导入
+ViolationDetector = LazyImport('app.utils.violation_utils', 'ViolationDetector')
 
 class ViolationService:
     def __init__(self):
         self.violation_cache = {}  # 用于存储已提醒的违规记录
         
-    def check_violations(self, camera_id, detection_result):
-        """检查当前帧是否存在违规情况"""
+    def check_violations(self, camera_id, detection_result, scale=1.0):
+        """检查当前帧是否存在违规情况(scale为检测帧相对原始画面的缩放比例)"""
         try:
             camera = Camera.query.get(camera_id)
             if not camera or not camera.restricted_areas:
@@ -82,7 +87,7 @@ class ViolationService:
                 
             # 检查违规
             violations = ViolationDetector.check_vehicle_violation(
-                detection_result, camera.restricted_areas)
+                detection_result, camera.restricted_areas, scale)
             
             # 过滤并记录违规信息
             new_violations = []
@@ -114,7 +119,10 @@ class ViolationService:
                     new_violations.append(violation_record.to_dict())
             
             if new_violations:
+                started = time.perf_counter()
                 db.session.commit()
+                metrics.observe(camera_id, 'db_commit', time.perf_counter() - started)
+                metrics.count(camera_id, 'db_writes.violations', len(new_violations))
                 
             return new_violations
             
@@ -0,0 +1,255 @@
+"""
+文件分析任务队列 (AnalysisJobQueue)
+
+主要功能：
+1. 异步执行：
+   - /detection/analyze提交任务后立即返回任务ID，分析在后台线程池中执行
+   - HTTP请求不再等待分析完成，客户端超时不影响任务
+   - 排队任务数有上限，队列满时拒绝提交
+
+2. 进度与结果：
+   - 分析过程逐帧上报进度：已处理帧数、总帧数、处理帧率
+   - 完成后保存汇总结果(逐帧明细在检测结果文件中)
+   - 保留最近的已结束任务，超出数量后淘汰最早结束的任务
+
+3. 取消：
+   - 排队中的任务直接取消
+   - 运行中的任务在下一次上报进度时中止(AnalysisCancelled)
+
+4. CPU让步：
+   - 同时运行的任务数由ANALYSIS_JOB_WORKERS限制(默认1)
+   - 任务线程及分段分析的工作进程降低调度优先级(nice)，CPU紧张时实时摄像头优先
+
+工作流程：
+   job = analysis_jobs.submit(runner, data)   # runner(data, progress)
+   -> analysis_jobs.get(job.id).to_dict()
+   -> analysis_jobs.cancel(job.id)
+
+配置项：
+- ANALYSIS_JOB_WORKERS: 同时运行的分析任务数，默认1
+- ANALYSIS_JOB_QUEUE_SIZE: 排队任务数上限，默认16
+- ANALYSIS_JOB_RETENTION: 保留的已结束任务数，默认100
+- ANALYSIS_NICE: 分析线程/进程的nice值，默认10(0表示不调整)
+
+关联模块：
+- [`DetectionService`](app/services/detection_service.py): 提交和查询任务
+- [`YOLOIntegration`](app/utils/yolo_integration.py): process_source上报进度
+- [`ChunkedVideoAnalyzer`](app/utils/chunked_analysis.py): 分段分析上报进度
+
+注意事项：
+1. 任务保存在Web进程内存中，服务重启后丢失
+2. nice只在Linux上按线程生效，其他平台忽略
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AnalysisCancelled(Exception):
+    """分析任务被取消"""
+
+
+class AnalysisQueueFull(Exception):
+    """排队任务数达到上限"""
+
+
+def lower_priority(nice):
+    """
+    降低当前线程的调度优先级(Linux上nice按线程生效，子进程继承)
+    Args:
+        nice: 目标nice值，不会提高已有的nice值
+    """
+    if not nice:
+        return
+    try:
+        thread_id = threading.get_native_id()
+        current = os.getpriority(os.PRIO_PROCESS, thread_id)
+        if nice > current:
+            os.setpriority(os.PRIO_PROCESS, thread_id, nice)
+    except (AttributeError, OSError):
+        pass
+
+
+class AnalysisJob:
+    """单个文件分析任务"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+    def __init__(self, data):
+        self.id = uuid.uuid4().hex
+        source = data.get('source')
+        # 图片路径列表只记录数量
+        self.source = f"{len(source)} images" if isinstance(source, (list, tuple)) else source
+        self.status = self.QUEUED
+        self.frames_done = 0
+        self.total_frames = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._future = None
+
+    def progress(self, frames_done, total_frames=None):
+        """
+        上报进度(由分析过程调用)
+        Raises:
+            AnalysisCancelled: 任务已被取消
+        """
+        self.frames_done = frames_done
+        if total_frames:
+            self.total_frames = total_frames
+        if self._cancel.is_set():
+            raise AnalysisCancelled(f"Analysis job {self.id} cancelled")
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def fps(self):
+        if self.started_at is None or not self.frames_done:
+            return None
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return round(self.frames_done / elapsed, 2) if elapsed > 0 else None
+
+    def to_dict(self, include_result=False):
+        data = {
+            'job_id': self.id,
+            'source': self.source,
+            'status': self.status,
+            'progress': {
+                'frames_done': self.frames_done,
+                'total_frames': self.total_frames,
+                'percent': round(min(100.0, self.frames_done / self.total_frames * 100), 1)
+                if self.total_frames else None,
+                'fps': self.fps
+            },
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if include_result:
+            data['result'] = self.result
+        return data
+
+
+class AnalysisJobQueue:
+    """有界的文件分析任务线程池"""
+
+    # 同时运行的任务数
+    MAX_WORKERS = int(os.getenv('ANALYSIS_JOB_WORKERS', '1'))
+    # 排队任务数上限
+    MAX_PENDING = int(os.getenv('ANALYSIS_JOB_QUEUE_SIZE', '16'))
+    # 保留的已结束任务数
+    RETENTION = int(os.getenv('ANALYSIS_JOB_RETENTION', '100'))
+    # 分析线程/进程的nice值
+    NICE = int(os.getenv('ANALYSIS_NICE', '10'))
+
+    def __init__(self, max_workers=None, max_pending=None, retention=None, nice=None):
+        self.max_workers = max(1, int(max_workers or self.MAX_WORKERS))
+        self.max_pending = self.MAX_PENDING if max_pending is None else int(max_pending)
+        self.retention = self.RETENTION if retention is None else int(retention)
+        self.nice = self.NICE if nice is None else int(nice)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def submit(self, runner, data):
+        """
+        提交分析任务
+        Args:
+            runner: 分析函数 runner(data, progress) -> 汇总结果
+            data: 请求参数
+        Returns:
+            AnalysisJob
+        Raises:
+            AnalysisQueueFull: 排队任务数达到上限
+        """
+        job = AnalysisJob(data)
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j.status == AnalysisJob.QUEUED)
+            if queued >= self.max_pending:
+                raise AnalysisQueueFull(f"Analysis queue is full ({self.max_pending} jobs queued)")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='analysis-job')
+            self._jobs[job.id] = job
+            self._evict()
+            job._future = self._executor.submit(self._run, job, runner, data)
+        return job
+
+    def _run(self, job, runner, data):
+        with self._lock:
+            if job.status != AnalysisJob.QUEUED:
+                return
+            job.status = AnalysisJob.RUNNING
+            job.started_at = time.time()
+        lower_priority(self.nice)
+        try:
+            job.result = runner(data, job.progress)
+            status = AnalysisJob.COMPLETED
+        except Exception as e:
+            # 取消引起的异常可能被分析过程包装，以取消标记为准
+            status = AnalysisJob.CANCELLED if job.cancel_requested else AnalysisJob.FAILED
+            job.error = None if job.cancel_requested else str(e)
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+            self._evict()
+
+    def _evict(self):
+        """淘汰超出保留数量的已结束任务"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in AnalysisJob.FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        取消任务
+        Returns:
+            AnalysisJob: 任务不存在返回None
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in AnalysisJob.FINISHED:
+                return job
+            job._cancel.set()
+            if job.status == AnalysisJob.QUEUED:
+                job._future.cancel()
+                job.status = AnalysisJob.CANCELLED
+                job.finished_at = time.time()
+        return job
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'queued': statuses.count(AnalysisJob.QUEUED),
+            'running': statuses.count(AnalysisJob.RUNNING)
+        }
+
+
+# 全局任务队列(Web进程内共享)
+analysis_jobs = AnalysisJobQueue()
@@ -0,0 +1,190 @@
+"""
+画面标注 (FrameAnnotator)
+
+主要功能：
+1. 单次渲染：
+   - 每帧最多渲染一次标注画面(AnnotatedFrame)，实时推送和视频录制共享同一结果
+   - 首个需要画面的阶段负责渲染，其他阶段直接复用
+   - 没有阶段需要画面时(无观看者且不录制)完全不渲染
+
+2. 快速标注：
+   - 基于FrameDetections数组绘制检测框和标签，不调用Results.plot()
+   - 颜色规则与YOLOIntegration.visualize_results一致：特殊车辆使用配置颜色，其余为绿色
+
+3. 输出缓冲区复用(FrameBufferPool)：
+   - 渲染结果写入预分配的整帧缓冲区，不为每帧分配新图像
+   - AnnotatedFrame释放后缓冲区自动归还
+
+工作流程：
+   annotator = FrameAnnotator(class_names, special_vehicles)
+   -> annotated = AnnotatedFrame(results, annotator)
+   -> 实时推送阶段：annotated.image() -> JPEG编码
+   -> 录制阶段：annotated.image() -> VideoWriter.write
+
+配置项：
+- ANNOTATION_POOL_SIZE: 每个摄像头保留的空闲输出缓冲区数量，默认4
+
+关联模块：
+- [`DetectionService`](app/services/detection_service.py): 实时推送和录制阶段
+- [`FrameDetections`](app/utils/detections.py): 检测框数组
+- [`YOLOIntegration`](app/utils/yolo_integration.py): visualize_results
+
+注意事项：
+1. image()返回的数组属于缓冲区池，只能在持有AnnotatedFrame期间使用，不能长期保存
+2. 不同阶段线程可同时调用image()，渲染由锁保护
+"""
+
+import os
+import threading
+import time
+import weakref
+import cv2
+import numpy as np
+from app.utils.detections import FrameDetections
+from app.utils.metrics import metrics
+
+
+class FrameBufferPool:
+    """整帧输出缓冲区池"""
+
+    # 保留的空闲缓冲区数量
+    MAX_FREE = int(os.getenv('ANNOTATION_POOL_SIZE', '4'))
+
+    def __init__(self, max_free=None):
+        self.max_free = self.MAX_FREE if max_free is None else int(max_free)
+        self._free = []
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, shape, owner):
+        """
+        获取缓冲区，owner被回收时自动归还
+        Args:
+            shape: 图像尺寸
+            owner: 持有缓冲区的对象
+        Returns:
+            numpy.ndarray: 未初始化的uint8缓冲区
+        """
+        shape = tuple(shape)
+        buffer = None
+        with self._lock:
+            while self._free:
+                candidate = self._free.pop()
+                if candidate.shape == shape:
+                    buffer = candidate
+                    self.reused += 1
+                    break
+            if buffer is None:
+                self.allocated += 1
+        if buffer is None:
+            buffer = np.empty(shape, dtype=np.uint8)
+        weakref.finalize(owner, self._release, buffer)
+        return buffer
+
+    def _release(self, buffer):
+        with self._lock:
+            if len(self._free) < self.max_free:
+                self._free.append(buffer)
+
+    def stats(self):
+        with self._lock:
+            return {'allocated': self.allocated, 'reused': self.reused, 'free': len(self._free)}
+
+
+class FrameAnnotator:
+    """基于检测框数组的画面标注"""
+
+    DEFAULT_COLOR = (0, 255, 0)
+
+    def __init__(self, class_names, special_vehicles=None, pool=None, camera_id=None):
+        """
+        Args:
+            class_names: 需要标注的类别 {cls_id: 名称}
+            special_vehicles: 特殊车辆配置 {cls_id: {'name', 'color'}}
+            pool: 输出缓冲区池
+            camera_id: 摄像头ID(记录annotate阶段耗时，None表示不记录)
+        """
+        self.class_names = class_names
+        self.special_vehicles = special_vehicles or {}
+        self.pool = pool or FrameBufferPool()
+        self.rendered = 0
+        self._timing = metrics.histogram(camera_id, 'annotate')
+
+    def draw(self, frame, detections):
+        """
+        在frame上原地绘制检测框和标签
+        Args:
+            frame: BGR图像
+            detections: FrameDetections
+        Returns:
+            numpy.ndarray: frame
+        """
+        mask = detections.class_mask(self.class_names)
+        if not mask.any():
+            return frame
+        boxes = detections.xywh[mask].astype(np.int32).tolist()
+
+        for (x, y, w, h), track_id, cls_id in zip(boxes, detections.track_ids[mask].tolist(),
+                                                  detections.cls[mask].tolist()):
+            # 使用特殊颜色标记特殊车辆
+            special = self.special_vehicles.get(cls_id)
+            color = special['color'] if special else self.DEFAULT_COLOR
+
+            # 绘制边界框
+            cv2.rectangle(frame, (x-w//2, y-h//2), (x+w//2, y+h//2), color, 2)
+
+            # 添加标签
+            label = f'{self.class_names[cls_id]} #{track_id} ({x},{y})'
+            cv2.putText(frame, label, (x-w//2, y-h//2-10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        return frame
+
+    def render(self, frame, detections, owner):
+        """
+        将frame复制到池中的缓冲区后绘制(不修改原始帧)
+        Args:
+            owner: 缓冲区持有者，被回收时缓冲区归还
+        """
+        started = time.perf_counter()
+        output = self.pool.acquire(frame.shape, owner)
+        np.copyto(output, frame)
+        self.rendered += 1
+        output = self.draw(output, detections)
+        self._timing.observe(time.perf_counter() - started)
+        return output
+
+    def stats(self):
+        return {'rendered': self.rendered, **self.pool.stats()}
+
+
+class AnnotatedFrame:
+    """单帧的标注画面，首次使用时渲染，各阶段共享"""
+
+    __slots__ = ('results', '_annotator', '_image', '_lock', '__weakref__')
+
+    def __init__(self, results, annotator=None):
+        """
+        Args:
+            results: 检测结果(Results)
+            annotator: FrameAnnotator，None表示不标注(直接使用原始帧)
+        """
+        self.results = results
+        self._annotator = annotator
+        self._image = None
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.results.orig_img.shape
+
+    def image(self):
+        """获取标注画面(只渲染一次)"""
+        with self._lock:
+            if self._image is None:
+                frame = self.results.orig_img
+                if self._annotator is None:
+                    self._image = frame
+                else:
+                    self._image = self._annotator.render(frame, FrameDetections.of(self.results), self)
+            return self._image
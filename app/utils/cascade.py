@@ -0,0 +1,399 @@
+"""
+两级检测级联 (ModelCascade)
+
+主要功能：
+1. 先廉价后精确：
+   - 第一级：摄像头的主模型(通常为nano模型)在每个关键帧上批量推理
+   - 第二级：更大的模型只复检局部区域，且每个摄像头最多每interval帧运行一次
+     - 低置信度目标：置信度低于conf_threshold的检测框(外扩padding后裁剪)
+     - 禁停区域：区域内有低置信度目标时复检整个区域的外接矩形(外扩padding后裁剪)，同时发现区域内第一级漏检的车辆
+   - 没有低置信度目标的帧不运行第二级
+   - 第二级推理尺寸不低于imgsz，并按裁剪区域放大，使裁剪区域的有效分辨率不低于第一级整帧推理
+   - 复检区域内以第二级结果为准：中心落在区域内的第一级检测被第二级检测替换
+
+2. 与流水线衔接：
+   - 在推理引擎线程中、跟踪器更新之前执行，跟踪、违规检测和画面标注使用合并后的结果
+   - 同一引擎周期内所有摄像头的裁剪区域按模型和推理参数合并为一次第二级推理
+   - 引擎先完成不需要复检的帧，再执行第二级，不复检的摄像头不等待第二级
+   - 第二级模型通过模型注册表共享，多个摄像头使用同一个大模型时只加载一次
+
+3. 统计：
+   - 第一级帧数、第二级运行次数和比例、按原因统计的裁剪数、因频率限制跳过的帧数、替换和新增的检测数
+   - 第二级耗时记录为cascade阶段(见PipelineMetrics)
+
+配置格式：
+   {
+     "model_path": "yolov8m.pt",  # 第二级模型(模型目录下)，必填
+     "conf_threshold": 0.5,       # 低于该置信度的第一级检测送第二级复检
+     "interval": 5,               # 第二级最多每N个第一级帧运行一次
+     "areas": true,               # 是否复检禁停区域(区域内有低置信度目标时)
+     "imgsz": 320,                # 第二级最小推理尺寸(大裁剪区域按第一级分辨率放大)
+     "conf": 0.25,                # 第二级置信度阈值，默认同摄像头推理配置
+     "max_crops": 4,              # 每次最多复检的低置信度目标数
+     "padding": 0.25              # 裁剪外扩比例(相对目标或区域的长边)
+   }
+
+工作流程：
+   cascade = ModelCascade.from_config(config, restricted_areas)
+   -> cascade.open(handle, device)
+   -> 引擎：run = cascade.plan(result, frame, options)
+            -> ModelCascade.predict(同组runs) -> cascade.apply(run, results) -> 跟踪器更新
+   (单独使用时 result = cascade.refine(result, frame, options))
+   -> cascade.close()
+
+配置项：
+- CASCADE_CONF_THRESHOLD: 低置信度阈值默认值，默认0.5
+- CASCADE_INTERVAL: 第二级运行间隔默认值(帧)，默认5
+- CASCADE_IMGSZ: 第二级最小推理尺寸默认值，默认320
+- CASCADE_MAX_CROPS: 每次最多复检的低置信度目标数默认值，默认4
+- CASCADE_PADDING: 裁剪外扩比例默认值，默认0.25
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 解析配置、获取第二级模型
+- [`BatchInferenceEngine`](app/utils/inference_engine.py): 第一级批量推理后调用plan/apply，合并第二级推理
+- [`ModelRegistry`](app/utils/model_registry.py): 第二级模型共享
+
+注意事项：
+1. 仅batched实时检测支持级联；关键帧模式下外推帧不经过引擎，也不触发第二级
+2. 第一级模型的置信度阈值需低于conf_threshold，否则没有可复检的低置信度目标
+3. 第二级与第一级的类别编号需一致(同一数据集训练的模型)
+"""
+
+import os
+import numpy as np
+from app.utils.iou_tracker import iou_matrix
+
+
+class CascadeRun:
+    """单帧待执行的第二级推理"""
+
+    def __init__(self, cascade, handle, result, data, centers, cores, crops, images, imgsz, options):
+        self.cascade = cascade
+        self.handle = handle
+        self.result = result
+        # 第一级检测(xyxy, conf, cls)及中心点
+        self.data = data
+        self.centers = centers
+        # 复检区域及外扩后的裁剪框
+        self.cores = cores
+        self.crops = crops
+        self.images = images
+        self.imgsz = imgsz
+        self.options = options
+
+    @property
+    def key(self):
+        """合并推理的分组键：同一模型、设备和推理参数的复检可合并为一次推理"""
+        options = tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                               for name, value in self.options.items()))
+        return id(self.handle.model), self.cascade.device, self.imgsz, options
+
+
+class ModelCascade:
+    """单个摄像头的两级检测级联"""
+
+    # 支持的配置字段
+    FIELDS = ('model_path', 'conf_threshold', 'interval', 'areas', 'imgsz', 'conf', 'max_crops', 'padding')
+    # 低置信度阈值
+    CONF_THRESHOLD = float(os.getenv('CASCADE_CONF_THRESHOLD', '0.5'))
+    # 第二级运行间隔(帧)
+    INTERVAL = int(os.getenv('CASCADE_INTERVAL', '5'))
+    # 第二级最小推理尺寸
+    IMGSZ = int(os.getenv('CASCADE_IMGSZ', '320'))
+    # 推理尺寸对齐步长
+    STRIDE = 32
+    # 每次最多复检的低置信度目标数
+    MAX_CROPS = int(os.getenv('CASCADE_MAX_CROPS', '4'))
+    # 裁剪外扩比例
+    PADDING = float(os.getenv('CASCADE_PADDING', '0.25'))
+    # 裁剪区域最小边长(像素)
+    MIN_CROP = 32
+    # 第二级结果去重的IoU阈值
+    DEDUP_IOU = 0.6
+
+    def __init__(self, model_path, conf_threshold=None, interval=None, areas=None, imgsz=None, conf=None,
+                 max_crops=None, padding=None):
+        """
+        Args:
+            model_path: 第二级模型路径
+            areas: 需要复检的禁停区域(原始画面坐标)，None表示不复检区域
+        """
+        self.model_path = model_path
+        self.conf_threshold = self.CONF_THRESHOLD if conf_threshold is None else float(conf_threshold)
+        self.interval = self.INTERVAL if interval is None else int(interval)
+        self.imgsz = int(imgsz or self.IMGSZ)
+        self.conf = conf
+        self.max_crops = self.MAX_CROPS if max_crops is None else int(max_crops)
+        self.padding = self.PADDING if padding is None else float(padding)
+        self.areas = [area['points'] for area in areas or [] if area.get('points')]
+
+        if not 0 < self.conf_threshold <= 1:
+            raise ValueError(f"Invalid cascade conf threshold: {self.conf_threshold}")
+        if self.interval < 1:
+            raise ValueError(f"Invalid cascade interval: {self.interval}")
+        if conf is not None and not 0 < conf < 1:
+            raise ValueError(f"Invalid cascade conf: {conf}")
+        if self.max_crops < 0 or self.padding < 0:
+            raise ValueError("Invalid cascade crop settings")
+
+        # 降分辨率解码的缩放比例(打开视频流后设置)
+        self.scale = 1.0
+        self.handle = None
+        self.device = None
+        self._area_boxes = {}
+        self._since_run = None
+
+        # 统计信息
+        self.frames = 0
+        self.runs = 0
+        self.low_conf_crops = 0
+        self.area_crops = 0
+        self.rate_limited = 0
+        self.replaced = 0
+        self.added = 0
+
+    @staticmethod
+    def from_config(config, restricted_areas=None):
+        """
+        根据启动参数创建级联
+        Args:
+            config: 配置字典，为空表示不启用
+            restricted_areas: 摄像头的禁停区域(areas为true时复检)
+        Returns:
+            ModelCascade: 未配置时返回None
+        """
+        if not config:
+            return None
+        config = dict(config)
+        unknown = set(config) - set(ModelCascade.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown cascade fields: {sorted(unknown)}")
+        if not config.get('model_path'):
+            raise ValueError("Cascade requires model_path")
+        return ModelCascade(
+            config['model_path'],
+            conf_threshold=config.get('conf_threshold'),
+            interval=config.get('interval'),
+            areas=restricted_areas if config.get('areas', True) else None,
+            imgsz=config.get('imgsz'),
+            conf=config.get('conf'),
+            max_crops=config.get('max_crops'),
+            padding=config.get('padding')
+        )
+
+    def open(self, handle, device='cpu'):
+        """
+        绑定第二级模型句柄
+        Args:
+            handle: 模型注册表句柄
+            device: 推理设备
+        """
+        self.handle = handle
+        self.device = device
+        return self
+
+    def close(self):
+        """归还第二级模型句柄"""
+        handle, self.handle = self.handle, None
+        if handle is not None:
+            handle.release()
+
+    def refine(self, result, frame, options=None, input_shape=None):
+        """
+        第一级结果复检(单独使用时；推理引擎按plan/predict/apply跨摄像头合并第二级推理)
+        Args:
+            result: 第一级检测结果(Results，整帧坐标，无跟踪ID)
+            frame: 整帧图像
+            options: 第一级推理参数(imgsz/classes/conf/iou/max_det)，第二级沿用，推理尺寸和置信度按级联配置
+            input_shape: 第一级输入图像尺寸(ROI推理时为裁剪区域)，默认整帧
+        Returns:
+            Results: 复检区域替换为第二级结果后的检测结果；未运行第二级时原样返回
+        """
+        run = self.plan(result, frame, options, input_shape)
+        if run is None:
+            return result
+        return self.apply(run, self.predict([run])[0])
+
+    def plan(self, result, frame, options=None, input_shape=None):
+        """
+        确定本帧的复检区域(推理引擎线程调用)
+        Args:
+            同refine
+        Returns:
+            CascadeRun: 待执行的第二级推理；本帧不运行第二级时返回None
+        """
+        self.frames += 1
+        self._since_run = None if self._since_run is None else self._since_run + 1
+        # 摄像头停止时句柄可能被并发归还，本次复检使用取到的句柄
+        handle = self.handle
+        if handle is None:
+            return None
+
+        data = result.boxes.data.cpu().numpy() if result.boxes is not None else np.zeros((0, 6), np.float32)
+        height, width = frame.shape[:2]
+        low_conf = np.flatnonzero(data[:, 4] < self.conf_threshold)
+        if not len(low_conf):
+            return None
+        if self._since_run is not None and self._since_run < self.interval:
+            self.rate_limited += 1
+            return None
+
+        # 复检区域：含低置信度目标的禁停区域整体复检，区域内的低置信度目标不再单独裁剪
+        centers = (data[:, :2] + data[:, 2:4]) / 2
+        areas = [area for area in self._areas_for(frame.shape) if self._inside_all(centers[low_conf], area).any()]
+        cores = list(areas)
+        for index in low_conf[np.argsort(data[low_conf, 4])]:
+            if len(cores) - len(areas) >= self.max_crops:
+                break
+            if not any(self._inside(centers[index], core) for core in cores):
+                cores.append(tuple(float(v) for v in data[index, :4]))
+        self.area_crops += len(areas)
+        self.low_conf_crops += len(cores) - len(areas)
+        if not cores:
+            return None
+
+        crops = [self._pad(core, width, height) for core in cores]
+        first_imgsz = (options or {}).get('imgsz')
+        options = {name: value for name, value in (options or {}).items() if name != 'imgsz'}
+        if self.conf is not None:
+            options['conf'] = self.conf
+        self.runs += 1
+        self._since_run = 0
+        return CascadeRun(
+            self, handle, result, data, centers, cores, crops,
+            [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in crops],
+            self.imgsz_for(crops, input_shape or frame.shape, first_imgsz),
+            options
+        )
+
+    @staticmethod
+    def predict(runs):
+        """
+        合并执行第二级推理
+        Args:
+            runs: 推理参数相同(CascadeRun.key一致)的待执行复检
+        Returns:
+            list: 每个复检对应的裁剪区域结果列表
+        """
+        first = runs[0]
+        results = first.handle.model.predict(
+            [image for run in runs for image in run.images],
+            imgsz=first.imgsz,
+            device=first.cascade.device,
+            verbose=False,
+            **first.options
+        )
+        split, start = [], 0
+        for run in runs:
+            split.append(results[start:start + len(run.images)])
+            start += len(run.images)
+        return split
+
+    def apply(self, run, results):
+        """
+        将第二级结果合并回第一级结果
+        Args:
+            run: plan返回的复检
+            results: 各裁剪区域的第二级结果
+        Returns:
+            Results: 复检区域替换为第二级结果后的检测结果
+        """
+        data, centers = run.data, run.centers
+        keep = np.ones(len(data), dtype=bool)
+        found = []
+        for core, crop, crop_result in zip(run.cores, run.crops, results):
+            keep &= ~self._inside_all(centers, core)
+            boxes = crop_result.boxes.data.cpu().numpy().copy() if crop_result.boxes is not None else None
+            if boxes is None or not len(boxes):
+                continue
+            boxes[:, [0, 2]] += crop[0]
+            boxes[:, [1, 3]] += crop[1]
+            # 只保留中心在复检区域内的目标，外扩部分只提供上下文
+            found.append(boxes[self._inside_all((boxes[:, :2] + boxes[:, 2:4]) / 2, core)])
+
+        found = self._dedupe(np.concatenate(found)[:, :6]) if found else np.zeros((0, 6), np.float32)
+        self.replaced += int((~keep).sum())
+        self.added += len(found)
+
+        import torch
+        result = run.result
+        merged = np.concatenate([data[keep][:, :6], found]).astype(np.float32)
+        result.update(boxes=torch.as_tensor(merged))
+        return result
+
+    def imgsz_for(self, crops, input_shape, first_imgsz=None):
+        """
+        第二级推理尺寸：不低于imgsz，且最大裁剪区域的有效分辨率不低于第一级
+        Args:
+            crops: 裁剪框(x1, y1, x2, y2)
+            input_shape: 第一级输入图像尺寸
+            first_imgsz: 第一级推理尺寸，未知时使用imgsz
+        """
+        if not first_imgsz:
+            return self.imgsz
+        ratio = first_imgsz / max(input_shape[:2])
+        longest = max(max(x2 - x1, y2 - y1) for x1, y1, x2, y2 in crops)
+        return max(self.imgsz, int(np.ceil(longest * ratio / self.STRIDE)) * self.STRIDE)
+
+    def stats(self):
+        """获取级联统计"""
+        return {
+            'model': os.path.basename(self.model_path),
+            'interval': self.interval,
+            'conf_threshold': self.conf_threshold,
+            'frames': self.frames,
+            'runs': self.runs,
+            'run_ratio': round(self.runs / self.frames, 3) if self.frames else 0,
+            'crops': {'low_conf': self.low_conf_crops, 'area': self.area_crops},
+            'rate_limited': self.rate_limited,
+            'replaced': self.replaced,
+            'added': self.added
+        }
+
+    def _areas_for(self, shape):
+        """禁停区域外接矩形(按解码缩放比例换算，裁剪到画面内)"""
+        key = (shape[0], shape[1], self.scale)
+        if key not in self._area_boxes:
+            height, width = shape[:2]
+            boxes = []
+            for points in self.areas:
+                xs = [p[0] * self.scale for p in points]
+                ys = [p[1] * self.scale for p in points]
+                x1, y1 = max(0.0, min(xs)), max(0.0, min(ys))
+                x2, y2 = min(float(width), max(xs)), min(float(height), max(ys))
+                if x2 > x1 and y2 > y1:
+                    boxes.append((x1, y1, x2, y2))
+            self._area_boxes[key] = boxes
+        return self._area_boxes[key]
+
+    def _pad(self, core, width, height):
+        """复检区域外扩为裁剪框(整数像素，不小于MIN_CROP)"""
+        x1, y1, x2, y2 = core
+        pad = max(x2 - x1, y2 - y1) * self.padding
+        half = self.MIN_CROP / 2
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        x1, x2 = min(x1 - pad, cx - half), max(x2 + pad, cx + half)
+        y1, y2 = min(y1 - pad, cy - half), max(y2 + pad, cy + half)
+        return (max(0, int(x1)), max(0, int(y1)), min(width, int(np.ceil(x2))), min(height, int(np.ceil(y2))))
+
+    @staticmethod
+    def _inside(point, box):
+        return box[0] <= point[0] <= box[2] and box[1] <= point[1] <= box[3]
+
+    @staticmethod
+    def _inside_all(points, box):
+        return ((points[:, 0] >= box[0]) & (points[:, 0] <= box[2])
+                & (points[:, 1] >= box[1]) & (points[:, 1] <= box[3]))
+
+    def _dedupe(self, boxes):
+        """相邻复检区域重复检出的同类目标只保留置信度最高的一个"""
+        if len(boxes) < 2:
+            return boxes
+        boxes = boxes[np.argsort(-boxes[:, 4])]
+        iou = iou_matrix(boxes[:, :4], boxes[:, :4])
+        same_class = boxes[:, 5][:, None] == boxes[:, 5][None, :]
+        keep = np.ones(len(boxes), dtype=bool)
+        for i in range(len(boxes)):
+            if keep[i]:
+                keep[i + 1:] &= ~((iou[i, i + 1:] > self.DEDUP_IOU) & same_class[i, i + 1:])
+        return boxes[keep]
@@ -0,0 +1,443 @@
+"""
+视频文件分段并行分析 (ChunkedVideoAnalyzer)
+
+主要功能：
+1. 分段：
+   - 按时长将视频切分为若干段，除第一段外每段从起点前的重叠帧开始分析，作为跟踪器预热
+   - 每段由进程池中的一个工作进程独立解码、推理和跟踪
+   - 工作进程启动时加载一次模型，之后处理多个分段
+
+2. 跨段轨迹拼接：
+   - 重叠帧(后一段起点之前的帧)同时被前后两段分析
+   - 同类别、IoU超过阈值的检测框在重叠帧中投票，票数足够的轨迹对视为同一目标
+   - 拼接后按首次出现顺序分配全局跟踪ID
+   - 重叠帧归属前一段(跟踪器已稳定)，后一段在重叠帧上冷启动的结果只用于拼接，不计入结果
+
+3. 结果：
+   - 汇总格式与YOLOIntegration.process_source一致(detections_path/total_frames/total_objects)
+   - 各分段的检测行写入临时文件，拼接时逐段读取并写入检测结果文件(DetectionArtifact)
+   - 可选输出标注视频：与拼接同步顺序解码一次，按全局跟踪ID绘制并编码
+
+工作流程：
+   ChunkedVideoAnalyzer(yolo, workers=4).analyze(source, save_dir)
+   -> plan_chunks(总帧数, 帧率)
+   -> 进程池：_analyze_chunk(分段) -> 检测行文件 [frame, track_id, cls, cx, cy, w, h]
+   -> stitch_tracks(逐段拼接)
+   -> 检测结果文件 / 标注视频 / 汇总
+
+配置项：
+- ANALYSIS_NICE: 工作进程的nice值(见AnalysisJobQueue)
+- ANALYSIS_PARALLEL: /detection/analyze默认是否分段并行分析，默认false
+- ANALYSIS_WORKERS: 工作进程数，默认min(4, CPU核数)
+- ANALYSIS_CHUNK_SECONDS: 分段时长(秒)，默认120
+- ANALYSIS_CHUNK_OVERLAP_SECONDS: 相邻分段重叠时长(秒)，默认2
+- ANALYSIS_STITCH_IOU: 拼接时判定为同一目标的IoU阈值，默认0.5
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 模型加载、跟踪配置
+- [`FrameSource`](app/utils/frame_source.py): 分段定位和解码
+- [`FrameAnnotator`](app/utils/annotation.py): 标注视频
+
+注意事项：
+1. 仅支持视频文件；不足两个分段的视频按顺序分析更快
+2. 进度按各工作进程已处理帧数汇总上报；取消时工作进程在下一帧停止
+3. 每个工作进程单独加载模型，GPU显存和内存占用按进程数增加
+4. 重叠时长需覆盖跟踪器的冷启动，过短时跨段轨迹可能拼接失败(产生新的跟踪ID)
+"""
+
+import os
+import math
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait
+import cv2
+import numpy as np
+from app.utils.frame_source import FrameSource
+from app.utils.detections import FrameDetections
+from app.utils.annotation import FrameAnnotator
+from app.utils.detection_artifact import DetectionArtifact, DetectionArtifactWriter
+from app.utils.analysis_jobs import AnalysisJobQueue, lower_priority
+
+# 检测行字段：帧序号、跟踪ID、类别、中心点坐标和宽高
+ROW_FRAME, ROW_TRACK, ROW_CLS = 0, 1, 2
+ROW_XYWH = slice(3, 7)
+
+
+class ChunkedVideoAnalyzer:
+    """视频文件分段并行分析"""
+
+    # 文件分析默认是否分段并行
+    ENABLED = os.getenv('ANALYSIS_PARALLEL', 'false').lower() == 'true'
+    # 工作进程数
+    WORKERS = int(os.getenv('ANALYSIS_WORKERS', str(min(4, os.cpu_count() or 1))))
+    # 分段时长(秒)
+    CHUNK_SECONDS = float(os.getenv('ANALYSIS_CHUNK_SECONDS', '120'))
+    # 相邻分段重叠时长(秒)
+    OVERLAP_SECONDS = float(os.getenv('ANALYSIS_CHUNK_OVERLAP_SECONDS', '2'))
+    # 拼接IoU阈值
+    STITCH_IOU = float(os.getenv('ANALYSIS_STITCH_IOU', '0.5'))
+    # 拼接所需的最少重叠帧票数(重叠帧较少时取一半)
+    STITCH_MIN_VOTES = 3
+    # 进度上报间隔(秒)
+    PROGRESS_INTERVAL = 0.5
+    # 进程启动方式
+    START_METHOD = os.getenv('DETECTION_WORKER_START_METHOD', 'spawn')
+
+    def __init__(self, yolo, workers=None, chunk_seconds=None, overlap_seconds=None):
+        """
+        Args:
+            yolo: YOLOIntegration(提供模型路径、后端、跟踪配置和目标类别)
+            workers: 工作进程数
+            chunk_seconds: 分段时长(秒)
+            overlap_seconds: 重叠时长(秒)
+        """
+        self.yolo = yolo
+        self.workers = max(1, int(workers or self.WORKERS))
+        self.chunk_seconds = float(chunk_seconds or self.CHUNK_SECONDS)
+        self.overlap_seconds = float(self.OVERLAP_SECONDS if overlap_seconds is None else overlap_seconds)
+        if self.chunk_seconds <= 0 or self.overlap_seconds < 0:
+            raise ValueError(f"Invalid chunk config: {self.chunk_seconds}s / {self.overlap_seconds}s")
+
+    @staticmethod
+    def plan_chunks(total_frames, fps, chunk_seconds, overlap_seconds):
+        """
+        划分分段
+        Args:
+            total_frames: 总帧数
+            fps: 帧率
+        Returns:
+            list: [(start, end, begin)]，[start, end)为归属该段的帧，[begin, end)为实际分析的帧
+                  ([begin, start)为与前一段重叠的预热帧)；
+                  最后一段end为None表示读到文件末尾(容器声明的帧数可能不精确)
+        """
+        chunk = max(1, int(round(chunk_seconds * fps)))
+        overlap = max(0, int(round(overlap_seconds * fps)))
+        count = max(1, math.ceil(total_frames / chunk))
+        chunks = []
+        for index in range(count):
+            start = index * chunk
+            end = None if index == count - 1 else start + chunk
+            chunks.append((start, end, max(0, start - overlap)))
+        return chunks
+
+    def analyze(self, source, save_dir='outputs', save_video=True, progress=None):
+        """
+        分段并行分析视频文件
+        Args:
+            progress: 进度回调 progress(已处理帧数, 总帧数)，抛出异常时通知工作进程停止
+        Returns:
+            dict: 与process_source一致的汇总结果，另含chunks(分段数)
+        """
+        probe = FrameSource(source).open()
+        total_frames, fps = probe.frame_count, probe.nominal_fps or 25.0
+        probe.release()
+        if probe.kind != 'file' or not total_frames:
+            raise ValueError(f"Chunked analysis requires a video file: {source}")
+
+        chunks = self.plan_chunks(total_frames, fps, self.chunk_seconds, self.overlap_seconds)
+        config = {
+            'model_path': self.yolo.model_path,
+            'backend': self.yolo.backend,
+            'tracking_config': self.yolo.tracking_config,
+            'device': self.yolo.device,
+            'classes': list(self.yolo.TARGET_CLASSES.keys()),
+            'threads': max(1, (os.cpu_count() or 1) // min(self.workers, len(chunks))),
+            'nice': AnalysisJobQueue.NICE
+        }
+
+        filename = os.path.basename(source)
+        name, ext = os.path.splitext(filename)
+        output_path = os.path.join(save_dir, f"{name}_analyzed{ext}")
+        summary = {
+            "source": source,
+            "output_path": output_path if save_video else None,
+            "detections_path": DetectionArtifact.path_for(save_dir, source),
+            "total_frames": 0,
+            "total_objects": 0,
+            "chunks": len(chunks)
+        }
+
+        # 各分段的检测行写入临时文件，拼接时逐段读取，内存占用与视频长度无关
+        context = multiprocessing.get_context(self.START_METHOD)
+        frames_done = context.Value('q', 0)
+        cancel = context.Event()
+
+        def report():
+            if progress is not None:
+                # 重叠帧被分析两次，已处理帧数不超过总帧数
+                progress(min(frames_done.value, total_frames), total_frames)
+
+        with tempfile.TemporaryDirectory(prefix='.chunks-', dir=save_dir) as chunk_dir:
+            tasks = [(source, begin, end, os.path.join(chunk_dir, f"{index}.npy"))
+                     for index, (_, end, begin) in enumerate(chunks)]
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(chunks)), mp_context=context,
+                                     initializer=_chunk_worker_init,
+                                     initargs=(config, frames_done, cancel)) as pool:
+                futures = [pool.submit(_analyze_chunk, task) for task in tasks]
+                try:
+                    pending = futures
+                    while pending:
+                        _, pending = wait(pending, timeout=self.PROGRESS_INTERVAL)
+                        report()
+                except BaseException:
+                    # 取消或出错：通知工作进程停止，丢弃未开始的分段
+                    cancel.set()
+                    for future in futures:
+                        future.cancel()
+                    raise
+                outputs = [future.result() for future in futures]
+
+            renderer = _AnnotatedVideoWriter(source, output_path, fps, self._annotator()) if save_video else None
+            try:
+                with DetectionArtifactWriter(summary["detections_path"]) as artifact:
+                    for rows, frames in self.stitch_tracks(chunks, outputs, self.STITCH_IOU, self.STITCH_MIN_VOTES):
+                        report()
+                        summary["total_frames"] += frames
+                        for frame, group in _split_frames(rows):
+                            artifact.write(frame, self._frame_detections(group))
+                            if renderer is not None:
+                                renderer.write(frame, group)
+                    summary["total_objects"] = artifact.objects
+            finally:
+                if renderer is not None:
+                    renderer.close()
+        return summary
+
+    def _annotator(self):
+        return FrameAnnotator(self.yolo.TARGET_CLASSES, self.yolo.special_vehicles)
+
+    def _frame_detections(self, group):
+        """单帧检测行转换为process_source的检测结果格式"""
+        names = self.yolo.TARGET_CLASSES
+        return [
+            {"track_id": int(track_id), "class": names[int(cls_id)], "position": position}
+            for track_id, cls_id, position in zip(group[:, ROW_TRACK].tolist(), group[:, ROW_CLS].tolist(),
+                                                  group[:, ROW_XYWH].tolist())
+        ]
+
+    @staticmethod
+    def stitch_tracks(chunks, outputs, iou_threshold=0.5, min_votes=3):
+        """
+        逐段拼接轨迹(生成器，只保留前一段的检测行)
+        Args:
+            chunks: plan_chunks的结果
+            outputs: 各分段的(检测行或.npy文件路径, 读取帧数)
+        Yields:
+            tuple: (该段归属帧内按帧序号排序、使用全局跟踪ID的检测行, 该段归属帧数)
+        """
+        next_id = 1
+        previous = None
+        previous_map = {}
+
+        for (start, end, begin), (rows, frames_read) in zip(chunks, outputs):
+            if isinstance(rows, str):
+                rows = np.load(rows)
+            rows = np.asarray(rows, dtype=np.float64).reshape(-1, 7)
+            matches = {}
+            if previous is not None:
+                matches = ChunkedVideoAnalyzer._match_overlap(previous, rows, begin, start, iou_threshold,
+                                                              min_votes)
+
+            # 预热帧归属前一段，只有在归属帧内出现的轨迹分配全局ID
+            owned = rows[:, ROW_FRAME] >= start
+            if end is not None:
+                owned &= rows[:, ROW_FRAME] < end
+            mapped = rows[owned]
+
+            # 按首次出现顺序分配全局ID，与前一段匹配的轨迹沿用其ID
+            local_map = {}
+            for local_id in dict.fromkeys(mapped[:, ROW_TRACK].astype(np.int64).tolist()):
+                if local_id in matches and matches[local_id] in previous_map:
+                    local_map[local_id] = previous_map[matches[local_id]]
+                else:
+                    local_map[local_id] = next_id
+                    next_id += 1
+            if len(mapped):
+                mapped = mapped.copy()
+                mapped[:, ROW_TRACK] = [local_map[int(t)] for t in mapped[:, ROW_TRACK]]
+
+            frames = max(0, frames_read - (start - begin))
+            yield (mapped[np.argsort(mapped[:, ROW_FRAME], kind='stable')],
+                   frames if end is None else min(frames, end - start))
+            previous, previous_map = rows, local_map
+
+    @staticmethod
+    def _match_overlap(previous, current, begin, start, iou_threshold, min_votes):
+        """
+        在重叠帧[begin, start)中匹配前后两段的轨迹
+        Returns:
+            dict: {当前段局部ID: 前一段局部ID}
+        """
+        overlap_previous = previous[(previous[:, ROW_FRAME] >= begin) & (previous[:, ROW_FRAME] < start)]
+        if not len(overlap_previous) or not len(current):
+            return {}
+        overlap_current = current[current[:, ROW_FRAME] < start]
+
+        votes = {}
+        for frame in np.unique(overlap_previous[:, ROW_FRAME]):
+            a = overlap_previous[overlap_previous[:, ROW_FRAME] == frame]
+            b = overlap_current[overlap_current[:, ROW_FRAME] == frame]
+            if not len(b):
+                continue
+            iou = _box_iou(a[:, ROW_XYWH], b[:, ROW_XYWH])
+            iou[a[:, ROW_CLS][:, None] != b[:, ROW_CLS][None, :]] = 0
+            for i, j in zip(*np.nonzero(iou >= iou_threshold)):
+                key = (int(b[j, ROW_TRACK]), int(a[i, ROW_TRACK]))
+                votes[key] = votes.get(key, 0) + 1
+
+        # 重叠帧较少时降低票数要求
+        frames = len(np.unique(overlap_previous[:, ROW_FRAME]))
+        required = max(1, min(min_votes, frames // 2))
+        matches, used = {}, set()
+        for (current_id, previous_id), count in sorted(votes.items(), key=lambda item: -item[1]):
+            if count < required:
+                break
+            if current_id in matches or previous_id in used:
+                continue
+            matches[current_id] = previous_id
+            used.add(previous_id)
+        return matches
+
+
+
+class _AnnotatedVideoWriter:
+    """按帧序号顺序写入标注视频(与拼接同步顺序解码一次)"""
+
+    def __init__(self, source, output_path, fps, annotator):
+        self.output_path = output_path
+        self.fps = fps
+        self.annotator = annotator
+        self._reader = FrameSource(source).open()
+        self._writer = None
+        self._index = 0
+
+    def _next(self):
+        frame = self._reader.read()
+        if frame is not None and self._writer is None:
+            height, width = frame.shape[:2]
+            self._writer = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*'mp4v'),  # type: ignore
+                                           self.fps, (width, height))
+        return frame
+
+    def write(self, frame_index, group):
+        """写入frame_index之前的原始帧，再写入frame_index的标注帧"""
+        while self._index <= frame_index:
+            frame = self._next()
+            if frame is None:
+                return
+            if self._index == frame_index:
+                xywh = group[:, ROW_XYWH]
+                xyxy = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+                self.annotator.draw(frame, FrameDetections(xyxy, np.ones(len(group)), group[:, ROW_CLS],
+                                                           group[:, ROW_TRACK], xywh))
+            self._writer.write(frame)
+            self._index += 1
+
+    def close(self):
+        """写入剩余帧并释放资源"""
+        try:
+            while True:
+                frame = self._next()
+                if frame is None:
+                    break
+                self._writer.write(frame)
+                self._index += 1
+        finally:
+            self._reader.release()
+            if self._writer is not None:
+                self._writer.release()
+
+
+def _split_frames(rows):
+    """按帧序号分组(rows已按帧序号排序)"""
+    if not len(rows):
+        return
+    frames = rows[:, ROW_FRAME].astype(np.int64)
+    boundaries = np.flatnonzero(np.diff(frames)) + 1
+    for group in np.split(rows, boundaries):
+        yield int(group[0, ROW_FRAME]), group
+
+
+def _box_iou(xywh_a, xywh_b):
+    """两组中心点格式检测框的IoU矩阵"""
+    a1, a2 = xywh_a[:, :2] - xywh_a[:, 2:] / 2, xywh_a[:, :2] + xywh_a[:, 2:] / 2
+    b1, b2 = xywh_b[:, :2] - xywh_b[:, 2:] / 2, xywh_b[:, :2] + xywh_b[:, 2:] / 2
+    top_left = np.maximum(a1[:, None], b1[None])
+    bottom_right = np.minimum(a2[:, None], b2[None])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = xywh_a[:, 2] * xywh_a[:, 3]
+    area_b = xywh_b[:, 2] * xywh_b[:, 3]
+    return inter / np.maximum(area_a[:, None] + area_b[None] - inter, 1e-9)
+
+
+# 工作进程内的模型和配置(进程启动时初始化一次)
+_worker_state = {}
+
+
+def _chunk_worker_init(config, frames_done=None, cancel=None):
+    """
+    工作进程初始化：限制线程数、降低优先级并加载模型
+    Args:
+        config: 模型和跟踪配置
+        frames_done: 共享的已处理帧数计数
+        cancel: 共享的取消标记
+    """
+    import torch
+    from app.utils.yolo_integration import YOLOIntegration
+
+    # 多个进程并行时每个进程只使用部分CPU核
+    torch.set_num_threads(config['threads'])
+    cv2.setNumThreads(config['threads'])
+    # 让出CPU给实时摄像头
+    lower_priority(config.get('nice'))
+
+    model = YOLOIntegration.load_model(config['model_path'], config['device'], config['backend'])
+    _worker_state.update(config, model=model, frames_done=frames_done, cancel=cancel)
+
+
+def _analyze_chunk(task):
+    """
+    分析一个分段
+    Args:
+        task: (source, start, stop, output_path)，分析[start, stop)，stop为None表示读到文件末尾
+    Returns:
+        tuple: (检测行文件路径 .npy [frame, track_id, cls, cx, cy, w, h], 读取帧数)
+    """
+    source, start, stop, output_path = task
+    model = _worker_state['model']
+    source = FrameSource(source).open()
+    rows = []
+    frames_read = 0
+    try:
+        if start:
+            source.seek(start)
+        # 每个分段使用新的跟踪器状态
+        for tracker in getattr(model.predictor, 'trackers', None) or []:
+            tracker.reset()
+        frames_done, cancel = _worker_state.get('frames_done'), _worker_state.get('cancel')
+        index = start
+        while stop is None or index < stop:
+            if cancel is not None and cancel.is_set():
+                break
+            frame = source.read()
+            if frame is None:
+                break
+            result = model.track(frame, persist=True, tracker=_worker_state['tracking_config'],
+                                 classes=_worker_state['classes'], verbose=False)[0]
+            detections = FrameDetections.of(result)
+            tracked = detections.track_ids >= 0
+            if tracked.any():
+                count = int(tracked.sum())
+                rows.append(np.column_stack([
+                    np.full(count, index), detections.track_ids[tracked], detections.cls[tracked],
+                    detections.xywh[tracked]
+                ]))
+            index += 1
+            frames_read += 1
+            if frames_done is not None:
+                with frames_done.get_lock():
+                    frames_done.value += 1
+    finally:
+        source.release()
+    np.save(output_path, np.concatenate(rows) if rows else np.zeros((0, 7)))
+    return output_path, frames_read
@@ -0,0 +1,200 @@
+"""
+CPU核心预算 (CoreBudget)
+
+主要功能：
+1. 核心分配：
+   - 进程可用的CPU核心(或DETECTION_CPU_BUDGET个核心)构成全局预算
+   - 检测工作单元按摄像头数分配核心：线程模式每个摄像头一个单元，进程模式每个工作进程分组一个单元
+   - 各单元的推理线程数之和等于预算，摄像头数超过核心数时每个单元至少1个线程
+   - 每个单元对应一段连续核心，可选绑定CPU亲和性
+
+2. 动态调整：
+   - 摄像头启动或停止时重新分配，分配版本号递增
+   - 推理线程处理下一帧前比较版本号，变化后重新设置torch线程数和亲和性
+   - 进程模式下Web进程按分组分配核心并经管道下发，工作进程在分到的核心内再分配给各摄像头
+
+3. 状态：
+   - 摄像头的分配结果以cpu字段出现在/detection/status中，工作进程的分配在worker.cpu中
+
+工作流程：
+   DetectionService.start_detection -> core_budget.acquire(camera_id)
+   -> 摄像头线程/批量推理引擎线程：core_budget.sync(camera_id, ...)
+   -> 处理结束：core_budget.release(camera_id)
+
+配置项：
+- DETECTION_CPU_BUDGET: 检测可用的核心数，默认0即进程可用的全部核心
+- DETECTION_CPU_PINNING: 是否将推理线程绑定到分配的核心，默认false
+
+关联模块：
+- [`DetectionService`](app/services/detection_service.py): 摄像头启停时申请和归还核心
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 摄像头线程同步分配
+- [`BatchInferenceEngine`](app/utils/inference_engine.py): 引擎线程使用其所有摄像头的分配之和
+- [`WorkerSupervisor`](app/utils/detection_workers.py): 工作进程分组的分配下发
+
+注意事项：
+1. torch(OpenMP)线程数按调用线程生效，每个推理线程各自设置；不设置时每个推理线程都会使用全部核心
+2. 亲和性按线程设置(Linux)，之后由该线程创建的线程继承；不支持的平台只设置线程数
+3. 摄像头数超过核心数时部分核心由多个单元共享
+"""
+
+import os
+import threading
+
+
+def _available_cores():
+    """进程可用的CPU核心编号"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+class CoreBudget:
+    """按摄像头分配推理线程数和CPU核心"""
+
+    # 检测可用的核心数(0为全部)
+    BUDGET = int(os.getenv('DETECTION_CPU_BUDGET', '0'))
+    # 是否绑定CPU亲和性
+    PINNING = os.getenv('DETECTION_CPU_PINNING', 'false').lower() == 'true'
+
+    def __init__(self, budget=None, pinning=None):
+        self.pinning = self.PINNING if pinning is None else bool(pinning)
+        self.cores = []
+        # 单元 -> 摄像头列表(按启动顺序)，摄像头 -> 单元
+        self._units = {}
+        self._members = {}
+        self._allocations = {}
+        self._version = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.configure(budget=budget)
+
+    def configure(self, cores=None, budget=None):
+        """
+        设置预算核心并重新分配
+        Args:
+            cores: 核心编号列表(工作进程使用Web进程分配的核心)，为空时取进程可用核心
+            budget: 核心数上限，为空时使用DETECTION_CPU_BUDGET
+        """
+        if not cores:
+            cores = _available_cores()
+            budget = self.BUDGET if budget is None else int(budget)
+            if budget > 0:
+                cores = cores[:budget]
+        with self._lock:
+            self.cores = sorted(cores)
+            self._rebalance()
+
+    def acquire(self, camera_id, unit=None):
+        """
+        登记摄像头并重新分配
+        Args:
+            camera_id: 摄像头ID
+            unit: 所属单元(进程模式为工作进程分组)，默认摄像头单独一个单元
+        """
+        unit = camera_id if unit is None else unit
+        with self._lock:
+            if camera_id in self._members:
+                return
+            self._members[camera_id] = unit
+            self._units.setdefault(unit, []).append(camera_id)
+            self._rebalance()
+
+    def release(self, camera_id):
+        """摄像头停止后归还核心并重新分配"""
+        with self._lock:
+            unit = self._members.pop(camera_id, None)
+            if unit is None:
+                return
+            self._units[unit].remove(camera_id)
+            if not self._units[unit]:
+                del self._units[unit]
+            self._rebalance()
+
+    def allocation(self, camera_id):
+        """
+        获取摄像头所属单元的分配
+        Returns:
+            dict: {"threads": 推理线程数, "cores": 核心编号, "pinned": 是否绑定, "cameras": 单元内摄像头数}；
+                  未登记时返回None
+        """
+        with self._lock:
+            unit = self._members.get(camera_id)
+            return self._unit_allocation(unit) if unit is not None else None
+
+    def unit_allocation(self, unit):
+        """获取单元的分配，单元不存在时返回None"""
+        with self._lock:
+            return self._unit_allocation(unit)
+
+    def sync(self, *camera_ids):
+        """
+        在推理线程中调用：分配变化后按摄像头分配之和重新设置当前线程
+        版本号未变化时只做一次比较
+        """
+        local = self._local
+        if getattr(local, 'version', None) == self._version and local.cameras == camera_ids:
+            return
+        with self._lock:
+            local.version = self._version
+            local.cameras = camera_ids
+            units = {self._members[camera_id] for camera_id in camera_ids if camera_id in self._members}
+            allocations = [self._allocations[unit] for unit in units]
+        if not allocations:
+            return
+        cores = sorted({core for allocation in allocations for core in allocation['cores']})
+        self.apply(sum(allocation['threads'] for allocation in allocations), cores)
+
+    def apply(self, threads, cores):
+        """设置当前线程的torch线程数，启用绑定时设置亲和性"""
+        import torch
+
+        torch.set_num_threads(max(1, threads))
+        if self.pinning and cores and hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, cores)
+            except OSError as e:
+                print(f"Failed to set CPU affinity {cores}: {str(e)}")
+
+    def stats(self):
+        """获取预算和各单元的分配"""
+        with self._lock:
+            return {
+                'cores': list(self.cores),
+                'pinning': self.pinning,
+                'units': {str(unit): self._unit_allocation(unit) for unit in self._units}
+            }
+
+    def _unit_allocation(self, unit):
+        allocation = self._allocations.get(unit)
+        if allocation is None:
+            return None
+        return {**allocation, 'cores': list(allocation['cores']), 'pinned': self.pinning,
+                'cameras': len(self._units[unit])}
+
+    def _rebalance(self):
+        """按各单元的摄像头数分配线程数，依次分配连续核心(调用方持有锁)"""
+        self._version += 1
+        self._allocations = {}
+        if not self._units:
+            return
+        size = len(self.cores)
+        total = sum(len(cameras) for cameras in self._units.values())
+        shares = [len(cameras) * size / total for cameras in self._units.values()]
+        threads = [max(1, int(share)) for share in shares]
+        # 取整后剩余的核心按小数部分从大到小补齐
+        spare = size - sum(threads)
+        order = sorted(range(len(shares)), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+        for i in order[:max(0, spare)]:
+            threads[i] += 1
+
+        offset = 0
+        for unit, count in zip(self._units, threads):
+            # 超出预算时从头循环，核心被共享
+            cores = sorted({self.cores[(offset + i) % size] for i in range(count)})
+            self._allocations[unit] = {'threads': count, 'cores': cores}
+            offset += count
+
+
+# 进程级共享实例(工作进程中按Web进程下发的核心重新配置)
+core_budget = CoreBudget()
@@ -0,0 +1,186 @@
+"""
+文件分析检测结果文件 (DetectionArtifact)
+
+主要功能：
+1. 增量写入：
+   - 文件分析逐帧写入NDJSON文件，每行一帧：{"frame": 帧序号, "detections": [...]}
+   - 同时写入行偏移索引(.idx，每行一个int64)，分页读取时直接定位
+   - 结果文件和索引均为缓冲写入，每ANALYSIS_FLUSH_FRAMES帧(及分页读取、关闭时)先刷新结果文件再写入并刷新这些行的索引，
+     异步分析任务运行中分页读取时索引中的行都已完整写入
+   - 内存占用与视频长度无关，接口只返回汇总和结果文件路径
+   - 文件名为<输入文件名>_<时间>_<随机后缀>_detections.ndjson，每次分析写入新文件，
+     同名输入或重复分析不会覆盖之前结果中detections_path指向的文件
+
+2. 分页读取：
+   - 按行偏移索引定位到offset行，只读取limit行
+   - 完整结果可通过/detection/results/<path>直接下载
+
+工作流程：
+   with DetectionArtifactWriter(path) as artifact:
+       artifact.write(frame_index, frame_detections)
+   -> DetectionArtifact.read_page(path, offset, limit)
+
+配置项：
+- ANALYSIS_PAGE_LIMIT: 默认每页帧数，默认100
+- ANALYSIS_MAX_PAGE_LIMIT: 每页帧数上限，默认1000
+- ANALYSIS_FLUSH_FRAMES: 每写入多少帧刷新一次结果文件和索引，默认100
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): process_source
+- [`ChunkedVideoAnalyzer`](app/utils/chunked_analysis.py): 分段并行分析
+- [`ImageBatchAnalyzer`](app/utils/image_batch.py): 图片集批量分析
+- [`DetectionService`](app/services/detection_service.py): 分页查询
+
+注意事项：
+1. 视频只写入有跟踪目标的帧，帧序号从0开始；图片集每张成功解码的图片一行，附带image路径
+2. 分页读取只接受带索引文件的.ndjson结果文件
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+import numpy as np
+
+
+class DetectionArtifactWriter:
+    """逐帧写入检测结果文件和行偏移索引"""
+
+    # 每写入多少帧刷新一次结果文件和索引
+    FLUSH_FRAMES = int(os.getenv('ANALYSIS_FLUSH_FRAMES', '100'))
+
+    # 写入中的结果文件：路径 -> writer，分页读取前刷新
+    _writers = {}
+    _writers_lock = threading.Lock()
+
+    def __init__(self, path, flush_frames=None):
+        self.path = path
+        self.frames = 0
+        self.objects = 0
+        self.flush_frames = max(1, int(flush_frames or self.FLUSH_FRAMES))
+        # 只创建新文件，已存在的结果文件不会被改写
+        self._file = open(path, 'xb')
+        # 索引项在结果文件刷新后才写入，索引文件本身不需要缓冲
+        self._index = open(DetectionArtifact.index_path(path), 'xb', buffering=0)
+        self._offset = 0
+        self._offsets = []
+        self._lock = threading.Lock()
+        with self._writers_lock:
+            self._writers[os.path.realpath(path)] = self
+
+    def write(self, frame, detections, **fields):
+        """
+        写入一帧
+        Args:
+            frame: 帧序号
+            detections: [{"track_id", "class", "position"}]
+            fields: 附加字段(如图片集分析的image)
+        """
+        line = json.dumps({"frame": int(frame), **fields, "detections": detections}, separators=(',', ':'))
+        data = line.encode('utf-8') + b'\n'
+        with self._lock:
+            self._file.write(data)
+            self._offsets.append(self._offset)
+            self._offset += len(data)
+            self.frames += 1
+            self.objects += len(detections)
+            if len(self._offsets) >= self.flush_frames:
+                self._flush()
+
+    def flush(self):
+        """刷新已写入的行及其索引"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        # 行完整落盘后才写入索引，read_page只读取索引中的行
+        if not self._offsets:
+            return
+        self._file.flush()
+        self._index.write(np.asarray(self._offsets, dtype=np.int64).tobytes())
+        self._offsets.clear()
+
+    @classmethod
+    def flush_path(cls, path):
+        """刷新正在写入该结果文件的writer(分页读取前调用)"""
+        with cls._writers_lock:
+            writer = cls._writers.get(os.path.realpath(path))
+        if writer is not None:
+            writer.flush()
+
+    def close(self):
+        with self._writers_lock:
+            if self._writers.get(os.path.realpath(self.path)) is self:
+                del self._writers[os.path.realpath(self.path)]
+        with self._lock:
+            self._flush()
+            self._file.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class DetectionArtifact:
+    """检测结果文件的路径和分页读取"""
+
+    SUFFIX = '_detections.ndjson'
+    # 默认每页帧数
+    PAGE_LIMIT = int(os.getenv('ANALYSIS_PAGE_LIMIT', '100'))
+    # 每页帧数上限
+    MAX_PAGE_LIMIT = int(os.getenv('ANALYSIS_MAX_PAGE_LIMIT', '1000'))
+
+    @staticmethod
+    def path_for(save_dir, source):
+        """输入文件对应的新结果文件路径(每次调用唯一)"""
+        name, _ = os.path.splitext(os.path.basename(os.path.normpath(str(source))))
+        stamp = time.strftime('%Y%m%d%H%M%S')
+        return os.path.join(save_dir, f"{name}_{stamp}_{uuid.uuid4().hex[:8]}{DetectionArtifact.SUFFIX}")
+
+    @staticmethod
+    def index_path(path):
+        return f"{path}.idx"
+
+    @staticmethod
+    def read_page(path, offset=0, limit=None):
+        """
+        分页读取检测结果
+        Args:
+            path: 结果文件路径
+            offset: 起始行(有检测结果的帧)
+            limit: 读取行数
+        Returns:
+            dict: {"path", "offset", "limit", "total", "next_offset", "frames"}
+        """
+        if not path.endswith('.ndjson') or not os.path.exists(DetectionArtifact.index_path(path)):
+            raise FileNotFoundError(f"Detection artifact not found: {path}")
+        # 分析任务仍在写入时先刷新已写入的帧
+        DetectionArtifactWriter.flush_path(path)
+        offset = max(0, int(offset))
+        limit = DetectionArtifact.PAGE_LIMIT if limit is None else int(limit)
+        limit = max(1, min(limit, DetectionArtifact.MAX_PAGE_LIMIT))
+
+        index_path = DetectionArtifact.index_path(path)
+        total = os.path.getsize(index_path) // 8
+        frames = []
+        if offset < total:
+            # 从索引中读取起始行的字节偏移
+            start = np.fromfile(index_path, dtype=np.int64, count=1, offset=offset * 8)[0]
+            with open(path, 'rb') as file:
+                file.seek(int(start))
+                for _ in range(min(limit, total - offset)):
+                    frames.append(json.loads(file.readline()))
+
+        next_offset = offset + len(frames)
+        return {
+            "path": path,
+            "offset": offset,
+            "limit": limit,
+            "total": total,
+            "next_offset": next_offset if next_offset < total else None,
+            "frames": frames
+        }
@@ -0,0 +1,392 @@
+"""
+检测工作进程管理 (WorkerSupervisor)
+
+主要功能：
+1. 进程隔离：
+   - 摄像头(或一组摄像头)在独立的工作进程中解码、推理、标注和编码
+   - 后处理、画面标注、JPEG编码、数据库写入不再与Web进程争用GIL
+   - 单路视频流崩溃或内存泄漏只影响所在工作进程
+   - 同一分组(worker_group)的摄像头共享一个进程及其批量推理引擎
+
+2. 进程间通信(Pipe)：
+   - Web进程 -> 工作进程：resources(核心分配)、viewers(摄像头有无实时画面观看者)、start(启动摄像头)、shutdown(退出)
+   - 工作进程 -> Web进程：
+       reply  - 启动结果
+       event  - 实时画面(已编码JPEG)、违规提醒、特殊车辆提醒、流状态
+       status - 各摄像头状态及流水线统计快照
+   - 画面在工作进程内压缩为JPEG后传输，不传原始帧
+   - 摄像头无人观看时工作进程不渲染、不编码实时画面，观看者加入/离开时由Web进程下发viewers
+
+3. 生命周期：
+   - 分组内第一个摄像头启动时创建进程
+   - 分组内所有摄像头处理结束后进程退出
+   - 进程异常退出时其摄像头从活跃列表移除并记录退出码
+
+4. 核心分配：
+   - Web进程的核心预算以分组为单元分配核心，分组内摄像头增减或其他分组启停时重新下发
+   - 工作进程按分到的核心重新配置进程内的核心预算，再分配给进程内各摄像头
+
+工作流程：
+   DetectionService.start_detection(data, worker_mode='process')
+   -> worker_supervisor.start_camera(data)
+   -> 工作进程：DetectionService.start_detection(data, 线程模式)
+   -> 事件经Pipe返回 -> Web进程WebSocket推送
+
+配置项：
+- DETECTION_WORKER_MODE: 检测运行方式 thread/process，默认thread
+- DETECTION_WORKER_START_METHOD: 进程启动方式，默认spawn
+- DETECTION_WORKER_START_TIMEOUT: 等待工作进程启动摄像头的秒数，默认120
+- DETECTION_WORKER_STATUS_INTERVAL: 状态快照上报间隔(秒)，默认1
+
+关联模块：
+- [`DetectionService`](app/services/detection_service.py): 检测服务
+- [`websocket_utils`](app/utils/websocket_utils.py): 前端推送、实时画面观看者
+- [`CoreBudget`](app/utils/cpu_budget.py): 核心预算
+
+注意事项：
+1. spawn方式会在工作进程中重新导入启动脚本(run.py)，工作进程不使用其中创建的应用，只初始化数据库连接
+2. 工作进程使用独立的数据库连接，需使用支持多进程访问的数据库
+3. 模型在每个工作进程中单独加载，进程数不宜超过CPU核数
+"""
+
+import os
+import threading
+import multiprocessing
+from app.utils.websocket_utils import add_video_viewer_listener, set_video_viewers
+
+
+class DetectionWorker:
+    """Web进程中的工作进程句柄"""
+
+    def __init__(self, group, context, database_uri=None, on_event=None, on_finished=None,
+                 status_interval=1.0):
+        self.group = group
+        self.cameras = set()
+        self.snapshot = {}
+        self.resources = None
+        self.exitcode = None
+        self._on_event = on_event
+        self._on_finished = on_finished
+        self._replies = {}
+        self._lock = threading.Lock()
+
+        self._conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, group, database_uri, status_interval),
+            daemon=True,
+            name=f"detection-worker-{group}"
+        )
+        self.process.start()
+        child_conn.close()
+
+        self._listener = threading.Thread(target=self._listen, daemon=True,
+                                          name=f"detection-worker-{group}-listener")
+        self._listener.start()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    @property
+    def alive(self):
+        return self.process.is_alive()
+
+    @property
+    def idle(self):
+        """没有运行中或启动中的摄像头"""
+        with self._lock:
+            return not self.cameras and not self._replies
+
+    def reserve(self, camera_id):
+        """登记待启动的摄像头，避免进程在启动前被回收"""
+        with self._lock:
+            self._replies[camera_id] = {'event': threading.Event(), 'result': None}
+
+    def start_camera(self, data, timeout=None):
+        """
+        在工作进程中启动摄像头，等待启动结果
+        Returns:
+            dict: 工作进程中start_detection的返回值
+        """
+        camera_id = data['camera_id']
+        with self._lock:
+            reply = self._replies.get(camera_id)
+            if reply is None:
+                reply = self._replies[camera_id] = {'event': threading.Event(), 'result': None}
+        self._send('start', data)
+        if not reply['event'].wait(timeout):
+            with self._lock:
+                self._replies.pop(camera_id, None)
+            raise TimeoutError(f"Detection worker {self.group} did not start camera {camera_id}")
+        result = reply['result']
+        if result is None:
+            raise RuntimeError(f"Detection worker {self.group} exited (code {self.exitcode})")
+        return result
+
+    def set_resources(self, allocation):
+        """下发核心分配(与上次相同时不发送)"""
+        if allocation is None or allocation == self.resources:
+            return
+        try:
+            self._send('resources', allocation)
+            self.resources = allocation
+        except (OSError, EOFError, ValueError):
+            pass
+
+    def set_viewers(self, camera_id, watching):
+        """下发摄像头有无实时画面观看者"""
+        try:
+            self._send('viewers', camera_id, bool(watching))
+        except (OSError, EOFError, ValueError):
+            pass
+
+    def shutdown(self, timeout=5):
+        """通知工作进程退出，超时后强制结束"""
+        try:
+            self._send('shutdown')
+        except (OSError, EOFError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+
+    def camera_status(self, camera_id):
+        """获取工作进程上报的摄像头状态"""
+        return self.snapshot.get(camera_id)
+
+    def info(self):
+        return {'group': self.group, 'pid': self.pid, 'alive': self.alive, 'cameras': sorted(self.cameras),
+                'cpu': self.resources}
+
+    def _send(self, *message):
+        with self._lock:
+            self._conn.send(message)
+
+    def _listen(self):
+        """接收工作进程消息，进程退出(管道关闭)后清理"""
+        try:
+            while True:
+                message = self._conn.recv()
+                kind = message[0]
+                if kind == 'reply':
+                    self._handle_reply(message[1], message[2])
+                elif kind == 'event':
+                    if self._on_event:
+                        self._on_event(message[1], message[2])
+                elif kind == 'status':
+                    self._handle_status(message[1])
+        except (EOFError, OSError):
+            pass
+        finally:
+            self.process.join(timeout=5)
+            self.exitcode = self.process.exitcode
+            with self._lock:
+                pending = list(self._replies.values())
+                self._replies.clear()
+                finished = list(self.cameras)
+                self.cameras.clear()
+            for reply in pending:
+                reply['event'].set()
+            for camera_id in finished:
+                self._finish(camera_id)
+
+    def _handle_reply(self, camera_id, result):
+        with self._lock:
+            reply = self._replies.pop(camera_id, None)
+            if result.get('success'):
+                self.cameras.add(camera_id)
+        if reply is not None:
+            reply['result'] = result
+            reply['event'].set()
+
+    def _handle_status(self, snapshot):
+        """更新状态快照，快照中已不存在的摄像头视为处理结束"""
+        self.snapshot = snapshot
+        with self._lock:
+            finished = [camera_id for camera_id in self.cameras if camera_id not in snapshot]
+            self.cameras.difference_update(finished)
+        for camera_id in finished:
+            self._finish(camera_id)
+
+    def _finish(self, camera_id):
+        if self._on_finished:
+            self._on_finished(self, camera_id)
+
+
+class WorkerSupervisor:
+    """工作进程管理器：按分组创建、复用和回收工作进程"""
+
+    # 检测运行方式：thread - Web进程内线程，process - 独立工作进程
+    WORKER_MODES = ('thread', 'process')
+    MODE = os.getenv('DETECTION_WORKER_MODE', 'thread')
+    # 进程启动方式(spawn可避免fork继承推理线程和CUDA状态)
+    START_METHOD = os.getenv('DETECTION_WORKER_START_METHOD', 'spawn')
+    # 等待工作进程启动摄像头的秒数(含进程启动和模块导入)
+    START_TIMEOUT = float(os.getenv('DETECTION_WORKER_START_TIMEOUT', '120'))
+    # 状态快照上报间隔(秒)
+    STATUS_INTERVAL = float(os.getenv('DETECTION_WORKER_STATUS_INTERVAL', '1'))
+
+    def __init__(self):
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def group_of(data):
+        """摄像头所属分组，worker_group为空时每个摄像头单独一个进程"""
+        return str(data.get('worker_group') or f"camera-{data['camera_id']}")
+
+    def start_camera(self, data, database_uri=None, on_event=None, on_finished=None, resources=None,
+                     viewers=None):
+        """
+        在摄像头所属分组的工作进程中启动检测
+        Args:
+            data: start_detection参数，worker_group为空时每个摄像头单独一个进程
+            database_uri: 工作进程使用的数据库连接
+            on_event: 事件回调 (kind, args)
+            on_finished: 摄像头处理结束回调 (worker, camera_id)
+            resources: 分组的核心分配 (group) -> allocation，在启动摄像头之前下发
+            viewers: 摄像头有无观看者 (camera_id) -> bool，在启动摄像头之前下发
+        Returns:
+            tuple: (DetectionWorker, 启动结果)
+        """
+        group = self.group_of(data)
+        with self._lock:
+            worker = self._workers.get(group)
+            if worker is None or not worker.alive:
+                worker = DetectionWorker(
+                    group,
+                    multiprocessing.get_context(self.START_METHOD),
+                    database_uri=database_uri,
+                    on_event=on_event,
+                    on_finished=lambda w, camera_id: self._camera_finished(w, camera_id, on_finished),
+                    status_interval=self.STATUS_INTERVAL
+                )
+                self._workers[group] = worker
+            worker.reserve(data['camera_id'])
+        if resources is not None:
+            worker.set_resources(resources(group))
+        if viewers is not None:
+            worker.set_viewers(data['camera_id'], viewers(data['camera_id']))
+        try:
+            result = worker.start_camera(data, timeout=self.START_TIMEOUT)
+        except Exception:
+            self._release_if_idle(worker)
+            raise
+        if not result.get('success'):
+            self._release_if_idle(worker)
+        return worker, result
+
+    def update_resources(self, resources):
+        """
+        向所有工作进程下发最新的核心分配
+        Args:
+            resources: (group) -> allocation
+        """
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.set_resources(resources(worker.group))
+
+    def update_viewers(self, camera_id, watching):
+        """观看者加入/离开时向所有工作进程下发(摄像头不在其中的进程只记录状态)"""
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.set_viewers(camera_id, watching)
+
+    def stats(self):
+        """获取所有工作进程信息"""
+        with self._lock:
+            return [worker.info() for worker in self._workers.values()]
+
+    def shutdown(self):
+        """结束所有工作进程"""
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for worker in workers:
+            worker.shutdown()
+
+    def _camera_finished(self, worker, camera_id, callback):
+        if callback:
+            callback(worker, camera_id)
+        self._release_if_idle(worker)
+
+    def _release_if_idle(self, worker):
+        """分组内没有运行中的摄像头时回收工作进程"""
+        with self._lock:
+            if not worker.idle or self._workers.get(worker.group) is not worker:
+                return
+            del self._workers[worker.group]
+        threading.Thread(target=worker.shutdown, daemon=True).start()
+
+
+def _worker_main(conn, group, database_uri, status_interval):
+    """工作进程入口：在进程内以线程模式运行检测，事件经管道发送回Web进程"""
+    from flask import Flask
+    from app import db
+    from app.config.config import Config
+    from app.services.detection_service import DetectionService
+    from app.utils.cpu_budget import core_budget
+
+    app = Flask(f"detection-worker-{group}")
+    app.config.from_object(Config)
+    if database_uri:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    db.init_app(app)
+
+    send_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def send(*message):
+        with send_lock:
+            conn.send(message)
+
+    def report_status():
+        """状态快照在发送锁内生成，保证与启动结果的先后顺序一致"""
+        while not stopped.wait(status_interval):
+            try:
+                with send_lock:
+                    conn.send(('status', DetectionService.get_processing_status()))
+            except (OSError, EOFError, ValueError):
+                break
+
+    # 推送事件改为经管道发送，由Web进程通过WebSocket推送
+    DetectionService.event_sink = lambda kind, args: send('event', kind, args)
+
+    with app.app_context():
+        threading.Thread(target=report_status, daemon=True, name='worker-status').start()
+        try:
+            while True:
+                command = conn.recv()
+                if command[0] == 'shutdown':
+                    break
+                if command[0] == 'resources':
+                    # 进程内的核心预算改为分到的核心，主线程先行绑定，之后启动的摄像头线程继承
+                    allocation = command[1]
+                    core_budget.configure(cores=allocation['cores'])
+                    core_budget.apply(allocation['threads'], allocation['cores'])
+                    continue
+                if command[0] == 'viewers':
+                    set_video_viewers(command[1], command[2])
+                    continue
+                if command[0] == 'start':
+                    data = dict(command[1], worker_mode='thread')
+                    try:
+                        result = DetectionService.start_detection(data)
+                    except Exception as e:
+                        result = {'success': False, 'message': str(e)}
+                    send('reply', data['camera_id'], result)
+        except (EOFError, OSError):
+            pass
+        finally:
+            stopped.set()
+            conn.close()
+
+
+# Web进程共享实例
+worker_supervisor = WorkerSupervisor()
+# Web进程中的观看者变化同步给工作进程
+add_video_viewer_listener(worker_supervisor.update_viewers)
@@ -0,0 +1,135 @@
+"""
+单帧检测结果 (FrameDetections)
+
+主要功能：
+1. 列式存储：
+   - 每帧一份，xyxy / xywh / conf / cls / track_ids 均为连续numpy数组
+   - 由Boxes.data一次性拷贝到CPU构建，不再由各消费者分别调用.cpu().tolist()
+   - 构建结果缓存在检测结果(Results)上，同一帧的所有消费者共享
+
+2. 向量化查询：
+   - class_mask: 按类别筛选
+   - centers: 中心点坐标，可按缩放比例换算回原始画面
+   - 违规检测、特殊车辆检测、画面标注、文件分析均基于同一份数组
+
+工作流程：
+   detections = FrameDetections.of(result)
+   -> mask = detections.class_mask(VEHICLE_CLASSES)
+   -> detections.centers(scale)[mask]
+
+关联模块：
+- [`ViolationDetector`](app/utils/violation_utils.py): 禁停区域判断
+- [`DetectionService`](app/services/detection_service.py): 特殊车辆检测
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 画面标注、文件分析
+
+注意事项：
+1. 未跟踪的检测框track_id为-1
+2. Boxes.data为[x1, y1, x2, y2, (track_id), conf, cls]，有跟踪ID时为7列
+3. 不提供Boxes.data的结果对象按xywh/id/cls属性逐项读取(兼容旧调用方)，此时conf为nan
+"""
+
+import numpy as np
+import torch
+
+
+class FrameDetections:
+    """单帧检测结果的列式表示"""
+
+    __slots__ = ('xyxy', 'xywh', 'conf', 'cls', 'track_ids')
+
+    # 缓存在检测结果上的属性名
+    CACHE_ATTR = '_frame_detections'
+    # 未跟踪的检测框ID
+    NO_TRACK = -1
+
+    def __init__(self, xyxy, conf, cls, track_ids=None, xywh=None):
+        """
+        Args:
+            xyxy: (N, 4) 左上/右下角坐标
+            conf: (N,) 置信度
+            cls: (N,) 类别ID
+            track_ids: (N,) 跟踪ID，None表示未跟踪
+            xywh: (N, 4) 中心点坐标和宽高，None时由xyxy计算
+        """
+        self.xyxy = np.ascontiguousarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.ascontiguousarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.ascontiguousarray(cls, dtype=np.int64).reshape(-1)
+        if track_ids is None:
+            track_ids = np.full(len(self.xyxy), self.NO_TRACK)
+        self.track_ids = np.ascontiguousarray(track_ids, dtype=np.int64).reshape(-1)
+        if xywh is None:
+            xywh = np.empty_like(self.xyxy)
+            xywh[:, 0] = (self.xyxy[:, 0] + self.xyxy[:, 2]) / 2
+            xywh[:, 1] = (self.xyxy[:, 1] + self.xyxy[:, 3]) / 2
+            xywh[:, 2] = self.xyxy[:, 2] - self.xyxy[:, 0]
+            xywh[:, 3] = self.xyxy[:, 3] - self.xyxy[:, 1]
+        self.xywh = np.ascontiguousarray(xywh, dtype=np.float32).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.cls)
+
+    @staticmethod
+    def empty():
+        return FrameDetections(np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+
+    @staticmethod
+    def of(result):
+        """
+        获取检测结果对应的FrameDetections(每个结果只构建一次)
+        Args:
+            result: Ultralytics Results(或提供boxes属性的对象)
+        Returns:
+            FrameDetections
+        """
+        cached = getattr(result, '__dict__', {}).get(FrameDetections.CACHE_ATTR)
+        if cached is not None:
+            return cached
+        detections = FrameDetections.from_boxes(result.boxes)
+        try:
+            setattr(result, FrameDetections.CACHE_ATTR, detections)
+        except AttributeError:
+            pass
+        return detections
+
+    @staticmethod
+    def from_boxes(boxes):
+        """由Boxes构建(一次CPU拷贝)"""
+        if boxes is None:
+            return FrameDetections.empty()
+        data = getattr(boxes, 'data', None)
+        if isinstance(data, torch.Tensor):
+            data = data.detach().cpu().numpy()
+        if not isinstance(data, np.ndarray):
+            return FrameDetections._from_attributes(boxes)
+        if data.ndim != 2 or not len(data):
+            return FrameDetections.empty()
+        track_ids = data[:, 4] if data.shape[1] == 7 else None
+        return FrameDetections(data[:, :4], data[:, -2], data[:, -1], track_ids)
+
+    @staticmethod
+    def _from_attributes(boxes):
+        """按xywh/id/cls属性逐项读取"""
+        def scalar(value):
+            return value.item() if hasattr(value, 'item') else value
+
+        xywh = np.array([[float(scalar(box[i])) for i in range(4)] for box in boxes.xywh.cpu()],
+                        dtype=np.float32).reshape(-1, 4)
+        cls = boxes.cls.cpu().tolist()
+        track_ids = boxes.id.int().cpu().tolist() if boxes.id is not None else None
+        xyxy = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+        return FrameDetections(xyxy, np.full(len(xywh), np.nan), cls, track_ids, xywh)
+
+    def class_mask(self, classes):
+        """属于指定类别的检测框"""
+        return np.isin(self.cls, list(classes))
+
+    def centers(self, scale=1.0):
+        """
+        中心点坐标
+        Args:
+            scale: 检测帧相对原始画面的缩放比例，坐标除以scale换算回原始画面
+        Returns:
+            numpy.ndarray: (N, 2)
+        """
+        centers = self.xywh[:, :2]
+        return centers / scale if scale != 1 else centers
@@ -0,0 +1,443 @@
+"""
+共享内存帧环形缓冲区 (FrameRingBuffer)
+
+主要功能：
+1. 共享内存帧槽：
+   - 每个摄像头一块共享内存，预分配固定数量的帧槽
+   - 采集进程解码后直接写入帧槽，不经过pickle队列
+   - 推理、标注、编码读取帧槽的numpy视图，不复制
+   - 现有的emit_video_frame、cv2.VideoWriter等消费者直接使用视图
+
+2. 序号校验：
+   - 每个帧槽记录写入序号，写入过程中序号为-1
+   - 读取方按序号取帧并校验，帧槽已被覆盖时返回None(FrameRef.valid()为False)
+
+3. 帧槽占用(pin)：
+   - 读取方持有帧视图期间帧槽被占用，写入方跳过被占用的帧槽
+   - 视图(及其派生的裁剪视图、Results)释放后自动解除占用
+   - 所有帧槽都被占用时新帧被丢弃(下游积压形成的背压)
+
+4. 采集进程(FrameCaptureProcess)：
+   - 在独立进程中通过FrameSource解码视频流(解码线程数、降分辨率解码与线程模式一致)并写入环形缓冲区
+   - 解码统计(实际输入帧率、解码错误)和断线重连统计经共享数组返回推理进程
+   - 断线后在采集进程内按退避重连，环形缓冲区和推理进程不受影响
+   - 推理进程通过FrameRingReader按latest策略取最新帧
+
+内存布局：
+   [slots, slot_bytes, height, width, channels]       几何信息
+   [latest_seq, latest_slot, closed, written, dropped] 控制字段
+   seqs[slots] / pins[slots] / shapes[slots, 3] / stamps[slots]
+   帧数据(按64字节对齐)
+
+工作流程：
+   ring = FrameRingBuffer.create(shape)
+   -> FrameCaptureProcess(stream_url, ring.name).start()
+   -> 采集进程：ring.write(frame)
+   -> 推理进程：FrameRingReader(ring).get() -> numpy视图 -> 推理 -> 流水线各阶段
+   -> 视图释放后帧槽可再次写入
+
+配置项：
+- FRAME_RING_SLOTS: 每个摄像头的帧槽数量，默认8
+- FRAME_RING_POLL_MS: 读取方等待新帧的轮询间隔(毫秒)，默认2
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 采集进程模式(capture_process)
+- [`StreamPipeline`](app/utils/pipeline.py): 帧视图随检测结果进入各阶段
+
+注意事项：
+1. 单写入方：每个环形缓冲区只能有一个采集进程写入；占用计数只由一个读取进程修改
+2. 帧槽数量决定下游最多可积压的帧数，内存占用为 帧槽数 × 单帧大小
+   (1080p约6MB/帧)
+3. 创建方负责释放共享内存(unlink)，其他进程只关闭映射
+"""
+
+import os
+import threading
+import time
+import weakref
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class FrameRingBuffer:
+    """单写入方的共享内存帧环形缓冲区"""
+
+    # 每个摄像头的帧槽数量
+    SLOTS = int(os.getenv('FRAME_RING_SLOTS', '8'))
+    # 帧数据对齐字节数
+    ALIGN = 64
+
+    # 控制字段下标
+    _LATEST_SEQ, _LATEST_SLOT, _CLOSED, _WRITTEN, _DROPPED = range(5)
+    # 帧槽写入中
+    WRITING = -1
+
+    def __init__(self, shm, owner):
+        self._shm = shm
+        self.owner = owner
+        self.name = shm.name
+
+        geometry = np.ndarray((5,), dtype=np.int64, buffer=shm.buf)
+        self.slots, self.slot_bytes = int(geometry[0]), int(geometry[1])
+        self.shape = tuple(int(v) for v in geometry[2:5])
+        self._views = self._map(shm.buf, self.slots)
+        self.control, self.seqs, self.pins, self.shapes, self.stamps, self._data_offset = self._views
+        self._cursor = -1
+
+    @staticmethod
+    def _layout(slots):
+        """计算各字段偏移量"""
+        offsets = {}
+        offset = 5 * 8
+        for name, size in (('control', 5 * 8), ('seqs', slots * 8), ('pins', slots * 4),
+                           ('shapes', slots * 3 * 4), ('stamps', slots * 8)):
+            offsets[name] = offset
+            offset += size
+        align = FrameRingBuffer.ALIGN
+        offsets['data'] = (offset + align - 1) // align * align
+        return offsets
+
+    @staticmethod
+    def _map(buf, slots):
+        offsets = FrameRingBuffer._layout(slots)
+        return (
+            np.ndarray((5,), dtype=np.int64, buffer=buf, offset=offsets['control']),
+            np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=offsets['seqs']),
+            np.ndarray((slots,), dtype=np.int32, buffer=buf, offset=offsets['pins']),
+            np.ndarray((slots, 3), dtype=np.int32, buffer=buf, offset=offsets['shapes']),
+            np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=offsets['stamps']),
+            offsets['data']
+        )
+
+    @staticmethod
+    def create(shape, slots=None, name=None):
+        """
+        创建环形缓冲区
+        Args:
+            shape: 帧尺寸(height, width, channels)，决定帧槽容量
+            slots: 帧槽数量(至少3个：写入中、最新帧、读取方占用)
+            name: 共享内存名称，默认自动生成
+        Returns:
+            FrameRingBuffer: 创建方实例(负责unlink)
+        """
+        slots = max(3, int(slots or FrameRingBuffer.SLOTS))
+        height, width = shape[:2]
+        channels = shape[2] if len(shape) > 2 else 1
+        slot_bytes = height * width * channels
+        align = FrameRingBuffer.ALIGN
+        slot_bytes = (slot_bytes + align - 1) // align * align
+
+        size = FrameRingBuffer._layout(slots)['data'] + slots * slot_bytes
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        np.ndarray((5,), dtype=np.int64, buffer=shm.buf)[:] = (slots, slot_bytes, height, width, channels)
+        ring = FrameRingBuffer(shm, owner=True)
+        ring.control[:] = (-1, -1, 0, 0, 0)
+        ring.seqs[:] = FrameRingBuffer.WRITING
+        ring.pins[:] = 0
+        return ring
+
+    @staticmethod
+    def attach(name):
+        """连接已存在的环形缓冲区"""
+        return FrameRingBuffer(shared_memory.SharedMemory(name=name), owner=False)
+
+    def write(self, frame, timestamp=None):
+        """
+        写入一帧(仅写入方调用)
+        Args:
+            frame: uint8图像，字节数不超过帧槽容量
+        Returns:
+            int: 帧序号；所有帧槽被占用时丢弃并返回None
+        """
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame {frame.shape} exceeds ring slot size {self.shape}")
+
+        latest_slot = int(self.control[self._LATEST_SLOT])
+        for step in range(1, self.slots + 1):
+            slot = (self._cursor + step) % self.slots
+            # 最新帧所在的帧槽和被占用的帧槽不能覆盖
+            if slot == latest_slot or self.pins[slot]:
+                continue
+            previous = self.seqs[slot]
+            self.seqs[slot] = self.WRITING
+            if self.pins[slot]:
+                # 读取方在标记写入前占用了该帧槽，恢复原序号
+                self.seqs[slot] = previous
+                continue
+
+            offset = self._data_offset + slot * self.slot_bytes
+            target = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf, offset=offset)
+            np.copyto(target, frame)
+            self.shapes[slot] = frame.shape if frame.ndim == 3 else (*frame.shape, 1)
+            self.stamps[slot] = time.time() if timestamp is None else timestamp
+
+            seq = int(self.control[self._LATEST_SEQ]) + 1
+            self.seqs[slot] = seq
+            self.control[self._LATEST_SLOT] = slot
+            self.control[self._LATEST_SEQ] = seq
+            self.control[self._WRITTEN] += 1
+            self._cursor = slot
+            return seq
+
+        self.control[self._DROPPED] += 1
+        return None
+
+    @property
+    def latest_seq(self):
+        return int(self.control[self._LATEST_SEQ])
+
+    @property
+    def closed(self):
+        return bool(self.control[self._CLOSED])
+
+    def mark_closed(self):
+        """写入方标记流结束"""
+        self.control[self._CLOSED] = 1
+
+    def slot_view(self, slot):
+        """帧槽的numpy视图(不复制)"""
+        height, width, channels = (int(v) for v in self.shapes[slot])
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        offset = self._data_offset + slot * self.slot_bytes
+        return np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf, offset=offset)
+
+    def stats(self):
+        return {
+            'slots': self.slots,
+            'written': int(self.control[self._WRITTEN]),
+            'dropped': int(self.control[self._DROPPED]),
+            'pinned': int(np.count_nonzero(self.pins))
+        }
+
+    def close(self):
+        """关闭映射，创建方同时释放共享内存"""
+        self._views = self.control = self.seqs = self.pins = self.shapes = self.stamps = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # 仍有视图引用共享内存，映射随进程退出释放
+            pass
+        if self.owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class FrameRef:
+    """环形缓冲区中一帧的引用"""
+
+    def __init__(self, ring, seq, slot, array):
+        self.ring = ring
+        self.seq = seq
+        self.slot = slot
+        self.array = array
+        self.timestamp = float(ring.stamps[slot])
+
+    def valid(self):
+        """帧槽是否仍是该帧(未被覆盖)"""
+        return self.ring.seqs is not None and int(self.ring.seqs[self.slot]) == self.seq
+
+    def copy(self):
+        """复制为独立数组"""
+        return self.array.copy()
+
+
+class FrameRingReader:
+    """
+    读取方：按latest策略获取最新帧
+    提供与StageQueue一致的get/close/stats接口，可直接替换采集队列
+    """
+
+    # 等待新帧的轮询间隔(秒)
+    POLL_INTERVAL = float(os.getenv('FRAME_RING_POLL_MS', '2')) / 1000.0
+
+    def __init__(self, ring, name='capture'):
+        self.ring = ring
+        self.name = name
+        self.policy = 'latest'
+        self._last_seq = -1
+        self._closed = False
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.enqueued = 0
+        self.skipped = 0
+
+    def read(self, seq=None):
+        """
+        按序号读取一帧并占用帧槽
+        Args:
+            seq: 帧序号，默认最新帧
+        Returns:
+            FrameRef: 帧槽已被覆盖或尚无帧时返回None
+        """
+        ring = self.ring
+        seq = ring.latest_seq if seq is None else seq
+        if seq < 0:
+            return None
+        slot = int(ring.control[ring._LATEST_SLOT]) if seq == ring.latest_seq else self._find_slot(seq)
+        if slot is None or slot < 0:
+            return None
+
+        with self._lock:
+            ring.pins[slot] += 1
+        if int(ring.seqs[slot]) != seq:
+            # 占用前帧槽已被覆盖或正在写入
+            self._unpin(slot)
+            return None
+
+        array = ring.slot_view(slot)
+        # 视图及其派生视图全部释放后解除占用
+        weakref.finalize(array, self._unpin, slot)
+        return FrameRef(ring, seq, slot, array)
+
+    def get(self, timeout=None):
+        """
+        等待并返回比上一次更新的帧(numpy视图)
+        Returns:
+            写入方结束且没有新帧时返回StageQueue.CLOSED，超时返回None
+        """
+        from app.utils.pipeline import StageQueue
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._closed:
+                return StageQueue.CLOSED
+            seq = self.ring.latest_seq
+            if seq > self._last_seq:
+                frame = self.read(seq)
+                if frame is not None:
+                    self.skipped += max(0, seq - self._last_seq - 1)
+                    self._last_seq = seq
+                    self.enqueued += 1
+                    return frame.array
+                continue
+            if self.ring.closed:
+                return StageQueue.CLOSED
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.POLL_INTERVAL)
+
+    def close(self, discard=False):
+        self._closed = True
+
+    def stats(self):
+        """与StageQueue.stats()格式一致，dropped包含读取方跳过和写入方丢弃的帧"""
+        ring_stats = self.ring.stats() if self.ring.control is not None else {'dropped': 0, 'pinned': 0}
+        return {
+            'depth': int(self.ring.latest_seq > self._last_seq) if self.ring.control is not None else 0,
+            'capacity': self.ring.slots,
+            'policy': self.policy,
+            'enqueued': self.enqueued,
+            'dropped': self.skipped + ring_stats['dropped'],
+            'blocked_seconds': 0.0,
+            'pinned': ring_stats['pinned']
+        }
+
+    def _find_slot(self, seq):
+        matches = np.flatnonzero(self.ring.seqs == seq) if self.ring.seqs is not None else []
+        return int(matches[0]) if len(matches) else None
+
+    def _unpin(self, slot):
+        with self._lock:
+            if self.ring.pins is not None and self.ring.pins[slot] > 0:
+                self.ring.pins[slot] -= 1
+
+
+class FrameCaptureProcess:
+    """在独立进程中解码视频流并写入环形缓冲区"""
+
+    # 进程启动方式
+    START_METHOD = os.getenv('DETECTION_WORKER_START_METHOD', 'spawn')
+    # 共享解码统计字段(采集进程写入)
+    STAT_FIELDS = ('frames', 'errors', 'input_fps', 'decode_ms')
+    # 共享重连统计字段(down_since为0表示已连接，time.monotonic跨进程可比)
+    RECONNECT_FIELDS = ('disconnects', 'reconnects', 'attempts', 'downtime', 'down_since')
+
+    def __init__(self, stream_url, ring_name, name=None, max_size=None, decode_threads=None):
+        context = multiprocessing.get_context(self.START_METHOD)
+        self._stop = context.Event()
+        self._stats = context.Array('d', len(self.STAT_FIELDS), lock=False)
+        self._reconnect = context.Array('d', len(self.RECONNECT_FIELDS), lock=False)
+        from app.utils.frame_source import FrameSource, StreamReconnector
+        self.reconnect_enabled = (StreamReconnector.ENABLED
+                                  and str(stream_url).lower().startswith(FrameSource.STREAM_PREFIXES))
+        self.process = context.Process(
+            target=_capture_main,
+            args=(stream_url, ring_name, self._stop, max_size, decode_threads, self._stats, self._reconnect),
+            daemon=True,
+            name=name or 'frame-capture'
+        )
+
+    def start(self):
+        self.process.start()
+        return self
+
+    def stop(self, timeout=5):
+        """通知采集进程退出，超时后强制结束"""
+        self._stop.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+
+    def source_stats(self):
+        """采集进程上报的解码统计(见FrameSource.stats)"""
+        values = dict(zip(self.STAT_FIELDS, self._stats[:]))
+        stats = {
+            'frames': int(values['frames']),
+            'errors': int(values['errors']),
+            'input_fps': values['input_fps'] or None,
+            'decode_ms': values['decode_ms'] or None
+        }
+        if self.reconnect_enabled:
+            from app.utils.frame_source import StreamReconnector
+            reconnect = dict(zip(self.RECONNECT_FIELDS, self._reconnect[:]))
+            stats['reconnect'] = StreamReconnector.describe(
+                reconnect['disconnects'], reconnect['reconnects'], reconnect['attempts'],
+                reconnect['downtime'], reconnect['down_since'] or None)
+        return stats
+
+    @property
+    def exitcode(self):
+        return self.process.exitcode
+
+
+def _capture_main(stream_url, ring_name, stop_event, max_size=None, decode_threads=None, stats=None,
+                  reconnect_stats=None):
+    """采集进程入口：读取视频帧写入环形缓冲区，流结束或收到停止信号时退出(断线时在进程内重连)"""
+    import cv2
+    from app.utils.frame_source import FrameSource
+
+    def publish_reconnect(reconnector):
+        if reconnect_stats is not None:
+            reconnect_stats[:] = [reconnector.disconnects, reconnector.reconnects, reconnector.attempts,
+                                  reconnector.downtime, reconnector.down_since or 0]
+
+    ring = FrameRingBuffer.attach(ring_name)
+    source = None
+    height, width = ring.shape[:2]
+    try:
+        source = FrameSource(stream_url, max_size=max_size, decode_threads=decode_threads,
+                             stop_event=stop_event, reconnect_listener=publish_reconnect).open()
+        while not stop_event.is_set():
+            frame = source.read()
+            if frame is None:
+                break
+            if frame.nbytes > ring.slot_bytes:
+                # 分辨率变化时缩放到帧槽尺寸
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            ring.write(frame)
+            if stats is not None:
+                current = source.stats()
+                stats[:] = [current['frames'], current['errors'],
+                            current['input_fps'] or 0, current['decode_ms'] or 0]
+    except ConnectionError as e:
+        print(f"Capture process error: {str(e)}")
+    finally:
+        ring.mark_closed()
+        if source is not None:
+            source.release()
+        ring.close()
@@ -0,0 +1,439 @@
+"""
+视频帧源 (FrameSource)
+
+主要功能：
+1. 统一解码入口：
+   - 实时流：rtsp:// rtmp:// http(s)://
+   - 视频文件：mp4/avi等
+   - 图片目录：按文件名排序逐张读取(用于回放、测试)
+   - 单张图片
+
+2. 解码控制：
+   - 视频：通过OpenCV FFmpeg后端设置解码线程数(CAP_PROP_N_THREADS)和缓冲帧数
+   - 图片目录：解码线程池并行读取，保持文件顺序
+   - 降分辨率解码：帧的长边缩小到max_size(通常取推理尺寸)，
+     JPEG图片直接按1/2、1/4、1/8解码(IMREAD_REDUCED_*)，视频帧解码后立即缩放
+   - 下游的运动检测、ROI、画面标注、编码、共享内存均使用缩小后的帧
+
+3. 统计：
+   - 实际输入帧率(按解码完成时间滑动平均)与标称帧率
+   - 平均解码耗时、解码错误数
+
+4. 断线重连(StreamReconnector)：
+   - 实时流连续解码失败达到上限后不结束，释放连接并按指数退避重新打开
+   - 重连期间read()阻塞，下游的模型、跟踪器、录像分段和违规缓存保持不变
+   - 统计重连次数、尝试次数、累计和当前停机时间
+
+工作流程：
+   source = FrameSource(url, max_size=640).open()
+   -> frame = source.read()  (None表示结束)
+   -> source.stats()
+   -> source.release()
+
+配置项：
+- FRAME_DECODE_THREADS: 解码线程数，0表示使用OpenCV默认值
+- FRAME_BUFFER_SIZE: 实时流缓冲帧数，默认4
+- FRAME_DECODE_ERROR_LIMIT: 连续解码错误上限，超过后视为断线(未启用重连时视为流结束)，默认30
+- STREAM_RECONNECT: 实时流断线后是否自动重连，默认true
+- STREAM_RECONNECT_INITIAL_DELAY: 首次重连前等待的秒数，默认1
+- STREAM_RECONNECT_MAX_DELAY: 重连间隔上限(秒)，每次失败后间隔加倍，默认30
+- STREAM_RECONNECT_MAX_ATTEMPTS: 单次断线的最大重连次数，0表示不限，默认0
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): batched模式采集
+- [`FrameRingBuffer`](app/utils/frame_ring.py): 采集进程模式
+
+注意事项：
+1. 降分辨率后检测框坐标为缩小后的坐标，禁停区域和ROI按scale换算
+2. 文件读到末尾视为正常结束，实时流读取失败计为解码错误
+3. 重连后输出尺寸保持不变(分辨率变化的帧缩放到原尺寸)，共享内存帧槽、ROI和录像无需重建
+4. 图片目录中尺寸不同的图片保持宽高比缩放到输出尺寸内，右侧和下方补黑边(不拉伸)，
+   frame_scale为最近一帧相对其原始图片的缩放比例(检测框坐标除以该值即原图坐标)
+"""
+
+import glob
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+
+class StreamReconnector:
+    """实时流断线重连：指数退避，统计重连和停机时间"""
+
+    # 是否自动重连
+    ENABLED = os.getenv('STREAM_RECONNECT', 'true').lower() == 'true'
+    # 首次重连前等待的秒数
+    INITIAL_DELAY = float(os.getenv('STREAM_RECONNECT_INITIAL_DELAY', '1'))
+    # 重连间隔上限(秒)
+    MAX_DELAY = float(os.getenv('STREAM_RECONNECT_MAX_DELAY', '30'))
+    # 单次断线的最大重连次数(0为不限)
+    MAX_ATTEMPTS = int(os.getenv('STREAM_RECONNECT_MAX_ATTEMPTS', '0'))
+
+    def __init__(self, stop_event=None, initial_delay=None, max_delay=None, max_attempts=None, listener=None):
+        """
+        Args:
+            stop_event: 停止事件(threading.Event或multiprocessing.Event)，设置后立即放弃重连
+            listener: 状态变化回调 (reconnector)，采集进程用于同步共享统计
+        """
+        self.stop_event = stop_event or threading.Event()
+        self.initial_delay = self.INITIAL_DELAY if initial_delay is None else float(initial_delay)
+        self.max_delay = self.MAX_DELAY if max_delay is None else float(max_delay)
+        self.max_attempts = self.MAX_ATTEMPTS if max_attempts is None else int(max_attempts)
+        self.listener = listener
+
+        # 统计信息
+        self.disconnects = 0
+        self.reconnects = 0
+        self.attempts = 0
+        self.downtime = 0.0
+        self.last_error = None
+        self.down_since = None  # 本次断线开始时间(time.monotonic)，已连接时为None
+
+    def reconnect(self, connect, disconnect=None):
+        """
+        断线后调用：按退避间隔重试connect()直到成功
+        Args:
+            connect: 重新建立连接的函数，失败时抛出异常
+            disconnect: 释放连接的函数，connect()阻塞期间收到停止时释放刚建立的连接
+        Returns:
+            bool: 是否重连成功；停止或超过最大次数返回False
+        """
+        self.disconnects += 1
+        self.down_since = time.monotonic()
+        self._notify()
+        delay = self.initial_delay
+        attempt = 0
+        try:
+            while not self.max_attempts or attempt < self.max_attempts:
+                if self.stop_event.wait(delay):
+                    return False
+                attempt += 1
+                self.attempts += 1
+                try:
+                    connect()
+                except Exception as e:
+                    self.last_error = str(e)
+                    delay = min(max(delay, 0.1) * 2, self.max_delay)
+                    self._notify()
+                    continue
+                # 打开视频流可能阻塞较久，期间收到停止时不保留新连接
+                if self.stop_event.is_set():
+                    if disconnect is not None:
+                        disconnect()
+                    return False
+                self.reconnects += 1
+                return True
+            return False
+        finally:
+            self.downtime += time.monotonic() - self.down_since
+            self.down_since = None
+            self._notify()
+
+    def _notify(self):
+        if self.listener is not None:
+            self.listener(self)
+
+    def stop(self):
+        """中断等待中的重连"""
+        self.stop_event.set()
+
+    def stats(self):
+        """获取重连统计"""
+        return self.describe(self.disconnects, self.reconnects, self.attempts, self.downtime,
+                             self.down_since, self.last_error)
+
+    @staticmethod
+    def describe(disconnects, reconnects, attempts, downtime, down_since=None, last_error=None):
+        """
+        生成重连统计(采集进程模式由共享统计字段还原)
+        Returns:
+            dict: state(connected/reconnecting)、断线次数、重连成功次数、尝试次数、
+                  累计停机秒数(含本次)、本次停机秒数、最近一次失败原因
+        """
+        current = time.monotonic() - down_since if down_since is not None else 0.0
+        return {
+            'state': 'reconnecting' if down_since is not None else 'connected',
+            'disconnects': int(disconnects),
+            'reconnects': int(reconnects),
+            'attempts': int(attempts),
+            'downtime_seconds': round(downtime + current, 3),
+            'current_downtime_seconds': round(current, 3),
+            'last_error': last_error
+        }
+
+
+class FrameSource:
+    """单个输入源的解码器"""
+
+    # 解码线程数(0表示OpenCV默认)
+    DECODE_THREADS = int(os.getenv('FRAME_DECODE_THREADS', '0'))
+    # 实时流缓冲帧数
+    BUFFER_SIZE = int(os.getenv('FRAME_BUFFER_SIZE', '4'))
+    # 连续解码错误上限
+    ERROR_LIMIT = int(os.getenv('FRAME_DECODE_ERROR_LIMIT', '30'))
+
+    STREAM_PREFIXES = ('rtsp://', 'rtmp://', 'http://', 'https://')
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+    # JPEG降分辨率解码标志(缩小倍数: 标志)
+    REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                     (2, cv2.IMREAD_REDUCED_COLOR_2))
+    # 输入帧率滑动窗口(帧)
+    FPS_WINDOW = 30
+
+    def __init__(self, source, max_size=None, decode_threads=None, buffer_size=None, reconnect=None,
+                 stop_event=None, reconnect_listener=None):
+        """
+        Args:
+            source: 视频流URL、视频文件、图片目录或图片文件
+            max_size: 帧长边上限，None表示保持原始分辨率
+            decode_threads: 解码线程数
+            buffer_size: 实时流缓冲帧数
+            reconnect: 实时流断线后是否自动重连，默认STREAM_RECONNECT(非实时流不重连)
+            stop_event: 停止事件，设置后中断重连等待
+            reconnect_listener: 重连状态变化回调(见StreamReconnector)
+        """
+        self.source = str(source)
+        self.max_size = int(max_size) if max_size else None
+        self.decode_threads = self.DECODE_THREADS if decode_threads is None else int(decode_threads)
+        self.buffer_size = buffer_size or self.BUFFER_SIZE
+        self.kind = self._detect_kind(self.source)
+        if reconnect is None:
+            reconnect = StreamReconnector.ENABLED
+        self.reconnector = (StreamReconnector(stop_event, listener=reconnect_listener)
+                            if reconnect and self.kind == 'stream' else None)
+
+        self.source_size = None  # 原始(宽, 高)
+        self.size = None         # 输出(宽, 高)
+        self.nominal_fps = None
+        self._cap = None
+        self._images = None
+        self._pool = None
+        self._pending = deque()
+        self._reduce_flag = cv2.IMREAD_COLOR
+        self._reduce_factor = 1
+        # 最近一帧的解码缩小倍数(图片目录)
+        self._frame_factor = 1
+        # 最近一帧相对其原始画面的缩放比例
+        self.frame_scale = 1.0
+
+        # 统计信息
+        self.frames = 0
+        self.errors = 0
+        self._consecutive_errors = 0
+        self._decode_seconds = 0.0
+        self._stamps = deque(maxlen=self.FPS_WINDOW)
+
+    @staticmethod
+    def _detect_kind(source):
+        if source.lower().startswith(FrameSource.STREAM_PREFIXES):
+            return 'stream'
+        if os.path.isdir(source) or any(ch in source for ch in '*?['):
+            return 'images'
+        if source.lower().endswith(FrameSource.IMAGE_EXTENSIONS):
+            return 'images'
+        return 'file'
+
+    def open(self):
+        """
+        打开输入源
+        Returns:
+            FrameSource: self
+        """
+        if self.kind == 'images':
+            self._open_images()
+        else:
+            self._open_video()
+        return self
+
+    def _open_video(self):
+        params = []
+        if self.decode_threads > 0:
+            params += [cv2.CAP_PROP_N_THREADS, self.decode_threads]
+        cap = cv2.VideoCapture(self.source, cv2.CAP_FFMPEG, params) if params else cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            raise ConnectionError(f"Failed to open stream: {self.source}")
+        if self.kind == 'stream':
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+        self._cap = cap
+        self.nominal_fps = cap.get(cv2.CAP_PROP_FPS) or self.nominal_fps
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        # 重连时保持原输出尺寸
+        if width and height and self.source_size is None:
+            self._set_source_size(width, height)
+
+    def _open_images(self):
+        if os.path.isdir(self.source):
+            files = [os.path.join(self.source, f) for f in os.listdir(self.source)]
+        else:
+            files = glob.glob(self.source)
+        self._images = deque(sorted(f for f in files if f.lower().endswith(self.IMAGE_EXTENSIONS)))
+        if not self._images:
+            raise FileNotFoundError(f"No images found: {self.source}")
+        self._pool = ThreadPoolExecutor(max_workers=max(1, self.decode_threads or 1),
+                                        thread_name_prefix='frame-decode')
+
+    def _set_source_size(self, width, height):
+        self.source_size = (width, height)
+        scale = self.scale
+        self.size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if self.kind == 'images':
+            # 选择不小于目标尺寸的最大JPEG缩小倍数，剩余部分再缩放
+            for factor, flag in self.REDUCED_FLAGS:
+                if max(width, height) / factor >= max(self.size):
+                    self._reduce_flag = flag
+                    self._reduce_factor = factor
+                    break
+
+    @property
+    def frame_count(self):
+        """视频文件总帧数(容器声明值，可能不精确)；其他输入源返回None"""
+        if self.kind != 'file' or self._cap is None:
+            return None
+        return int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+
+    def seek(self, index):
+        """
+        定位到视频文件的第index帧(分段分析使用)
+        Returns:
+            bool: 是否定位成功
+        """
+        if self.kind != 'file' or self._cap is None:
+            raise ValueError(f"Seeking is only supported for video files: {self.source}")
+        return bool(self._cap.set(cv2.CAP_PROP_POS_FRAMES, index))
+
+    @property
+    def scale(self):
+        """输出帧相对原始帧的缩放比例"""
+        if not self.max_size or self.source_size is None:
+            return 1.0
+        return min(1.0, self.max_size / max(self.source_size))
+
+    def read(self):
+        """
+        读取下一帧
+        Returns:
+            numpy.ndarray: BGR图像；输入结束返回None
+        """
+        while True:
+            start = time.monotonic()
+            frame = self._read_image() if self.kind == 'images' else self._read_video()
+            if frame is False:
+                return None
+            if frame is None:
+                # 解码失败：实时流连续失败过多视为结束，图片跳过
+                self.errors += 1
+                self._consecutive_errors += 1
+                if self.kind != 'images' and self._consecutive_errors >= self.ERROR_LIMIT:
+                    if not self._reconnect():
+                        return None
+                continue
+
+            if self.source_size is None:
+                self._set_source_size(frame.shape[1], frame.shape[0])
+            if self.kind == 'images':
+                frame = self._fit_image(frame)
+            else:
+                self.frame_scale = self.scale
+                if self.size != (frame.shape[1], frame.shape[0]):
+                    frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+
+            now = time.monotonic()
+            self._decode_seconds += now - start
+            self._stamps.append(now)
+            self._consecutive_errors = 0
+            self.frames += 1
+            return frame
+
+    def _fit_image(self, frame):
+        """图片保持宽高比缩放到输出尺寸内，右侧和下方补黑边，记录相对原始图片的缩放比例"""
+        height, width = frame.shape[:2]
+        ratio = min(self.size[0] / width, self.size[1] / height)
+        self.frame_scale = ratio / self._frame_factor
+        if self.size == (width, height):
+            return frame
+        fitted = (min(self.size[0], max(1, round(width * ratio))), min(self.size[1], max(1, round(height * ratio))))
+        frame = cv2.resize(frame, fitted, interpolation=cv2.INTER_AREA)
+        if fitted == self.size:
+            return frame
+        canvas = np.zeros((self.size[1], self.size[0], 3), dtype=frame.dtype)
+        canvas[:fitted[1], :fitted[0]] = frame
+        return canvas
+
+    def _reconnect(self):
+        """实时流断线：释放连接后按退避重新打开，返回是否重连成功"""
+        if self.reconnector is None:
+            return False
+        self._consecutive_errors = 0
+        self._release_capture()
+        print(f"Stream lost, reconnecting: {self.source}")
+        return self.reconnector.reconnect(self._open_video, self._release_capture)
+
+    def _release_capture(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def interrupt(self):
+        """中断等待中的重连(停止采集时调用)"""
+        if self.reconnector is not None:
+            self.reconnector.stop()
+
+    def _read_video(self):
+        """返回帧；读取失败返回None；文件结束返回False"""
+        ret, frame = self._cap.read()
+        if ret:
+            return frame
+        if self.kind == 'file':
+            total = self._cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            position = self._cap.get(cv2.CAP_PROP_POS_FRAMES)
+            if not total or position >= total:
+                return False
+        return None
+
+    def _read_image(self):
+        """并行解码后续图片，按文件顺序返回"""
+        if self.source_size is None and self._images and not self._pending:
+            # 首张图片完整解码以确定原始尺寸和降分辨率倍数
+            path = self._images.popleft()
+            self._frame_factor = 1
+            return cv2.imread(path)
+
+        while self._images and len(self._pending) < max(1, self.decode_threads or 1) * 2:
+            self._pending.append(self._pool.submit(cv2.imread, self._images.popleft(), self._reduce_flag))
+        if not self._pending:
+            return False
+        self._frame_factor = self._reduce_factor
+        return self._pending.popleft().result()
+
+    def stats(self):
+        """获取解码统计信息"""
+        stamps = list(self._stamps)
+        input_fps = (len(stamps) - 1) / (stamps[-1] - stamps[0]) if len(stamps) > 1 and stamps[-1] > stamps[0] else None
+        return {
+            'kind': self.kind,
+            'frames': self.frames,
+            'errors': self.errors,
+            'input_fps': round(input_fps, 2) if input_fps else None,
+            'nominal_fps': round(self.nominal_fps, 2) if self.nominal_fps else None,
+            'decode_ms': round(self._decode_seconds / self.frames * 1000, 2) if self.frames else None,
+            'decode_threads': self.decode_threads,
+            'source_size': self.source_size,
+            'size': self.size,
+            'scale': round(self.scale, 4),
+            'reconnect': self.reconnector.stats() if self.reconnector is not None else None
+        }
+
+    def release(self):
+        """释放解码资源(由读取帧的线程调用，不与read()并发)"""
+        self._release_capture()
+        if self._pool is not None:
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+            self._pool.shutdown(wait=False)
+            self._pool = None
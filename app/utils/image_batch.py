@@ -0,0 +1,198 @@
+"""
+图片集批量分析 (ImageBatchAnalyzer)
+
+主要功能：
+1. 输入：
+   - 图片目录(按文件名排序)、通配符路径(如/data/*.jpg)或图片路径列表
+   - 一次请求分析整个图片集，模型只获取一次
+
+2. 批量推理：
+   - 按batch_size将图片组成批次，一次前向推理处理一个批次
+   - 解码线程池并行解码图片，当前批次推理时预先解码后续batch_size+解码线程数张图片
+   - 图片尺寸可以不同，由模型预处理统一缩放
+   - 使用摄像头推理配置(InferenceProfile)和TARGET_CLASSES类别过滤
+
+3. 结果：
+   - 所有图片的检测结果写入一个检测结果文件(DetectionArtifact)，每张图片一行，附带image路径
+   - 汇总格式与YOLOIntegration.process_source一致，total_frames为成功分析的图片数
+   - 检测结果文件名每次分析唯一(见DetectionArtifact.path_for)，并发任务和重复分析互不覆盖
+   - 可选输出标注图片到与检测结果文件同名的_analyzed目录，文件名带图片序号前缀，不同目录的同名图片不会互相覆盖
+
+工作流程：
+   images = ImageBatchAnalyzer.list_images(source)
+   -> ImageBatchAnalyzer(yolo, batch_size=16).analyze(images, name, save_dir)
+   -> 解码线程池(后续图片) / model.predict(当前批次)
+   -> 检测结果文件 / 标注图片 / 汇总
+
+配置项：
+- ANALYSIS_IMAGE_BATCH_SIZE: 批次大小，默认0即自动(GPU为16，CPU为CPU核数与8的较小值)
+- ANALYSIS_IMAGE_DECODE_THREADS: 解码线程数，默认min(4, CPU核数)
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): process_images
+- [`DetectionArtifact`](app/utils/detection_artifact.py): 检测结果文件
+- [`FrameAnnotator`](app/utils/annotation.py): 标注图片
+
+注意事项：
+1. 图片之间没有时序关系，只做检测不做跟踪，track_id为null
+2. 无法解码的图片不写入结果文件，计入failed_images
+"""
+
+import glob
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from app.utils.detections import FrameDetections
+from app.utils.annotation import FrameAnnotator
+from app.utils.detection_artifact import DetectionArtifact, DetectionArtifactWriter
+
+
+class ImageBatchAnalyzer:
+    """图片集批量分析"""
+
+    # 批次大小(0表示自动：GPU为16，CPU为CPU核数与8的较小值)
+    BATCH_SIZE = int(os.getenv('ANALYSIS_IMAGE_BATCH_SIZE', '0'))
+    GPU_BATCH_SIZE = 16
+    # 批次内的图片由推理线程并行计算，单核上合批没有收益
+    CPU_BATCH_SIZE = min(8, os.cpu_count() or 1)
+    # 解码线程数
+    DECODE_THREADS = int(os.getenv('ANALYSIS_IMAGE_DECODE_THREADS', str(min(4, os.cpu_count() or 1))))
+
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+    def __init__(self, yolo, batch_size=None, decode_threads=None):
+        """
+        Args:
+            yolo: YOLOIntegration(提供模型、推理配置和目标类别)
+            batch_size: 批次大小
+            decode_threads: 解码线程数
+        """
+        self.yolo = yolo
+        batch_size = int(batch_size or self.BATCH_SIZE)
+        if not batch_size:
+            batch_size = self.GPU_BATCH_SIZE if str(yolo.device).startswith('cuda') else self.CPU_BATCH_SIZE
+        self.batch_size = max(1, batch_size)
+        self.decode_threads = max(1, int(decode_threads or self.DECODE_THREADS))
+
+    @staticmethod
+    def is_image_set(source):
+        """输入源是否为图片集(目录、通配符路径或路径列表)"""
+        if isinstance(source, (list, tuple)):
+            return True
+        source = str(source)
+        return os.path.isdir(source) or any(ch in source for ch in '*?[')
+
+    @staticmethod
+    def list_images(source):
+        """
+        获取图片集中的图片路径
+        Args:
+            source: 图片目录、通配符路径或图片路径列表
+        Returns:
+            list: 图片路径(目录和通配符按文件名排序，列表保持原顺序)
+        """
+        if isinstance(source, (list, tuple)):
+            images = [str(path) for path in source]
+            unsupported = [path for path in images if not path.lower().endswith(ImageBatchAnalyzer.IMAGE_EXTENSIONS)]
+            if unsupported:
+                raise ValueError(f"Unsupported image files: {unsupported[:5]}")
+            missing = [path for path in images if not os.path.isfile(path)]
+            if missing:
+                raise FileNotFoundError(f"Image files not found: {missing[:5]}")
+        else:
+            if os.path.isdir(source):
+                files = [os.path.join(source, name) for name in os.listdir(source)]
+            else:
+                files = glob.glob(source)
+            images = sorted(path for path in files if path.lower().endswith(ImageBatchAnalyzer.IMAGE_EXTENSIONS))
+        if not images:
+            raise FileNotFoundError(f"No images found: {source}")
+        return images
+
+    def analyze(self, images, name, save_dir='outputs', save_images=False, progress=None):
+        """
+        批量分析图片集
+        Args:
+            images: 图片路径列表
+            name: 结果文件名前缀
+            save_dir: 输出目录
+            save_images: 是否输出标注图片
+            progress: 进度回调 progress(已处理图片数, 总图片数)
+        Returns:
+            dict: 与process_source一致的汇总结果，另含failed_images
+        """
+        detections_path = DetectionArtifact.path_for(save_dir, name)
+        # 标注图片目录与检测结果文件同名(每次分析唯一)
+        output_dir = detections_path[:-len(DetectionArtifact.SUFFIX)] + '_analyzed'
+        if save_images:
+            os.makedirs(output_dir, exist_ok=True)
+        summary = {
+            "source": name,
+            "output_path": output_dir if save_images else None,
+            "detections_path": detections_path,
+            "total_frames": 0,
+            "total_objects": 0,
+            "failed_images": 0
+        }
+        target_classes = self.yolo.TARGET_CLASSES
+        options = {'classes': list(target_classes.keys()), **self.yolo.profile.predict_options()}
+        annotator = FrameAnnotator(target_classes, self.yolo.special_vehicles) if save_images else None
+        batches = [range(start, min(start + self.batch_size, len(images)))
+                   for start in range(0, len(images), self.batch_size)]
+
+        handle = self.yolo.acquire_model()
+        pool = ThreadPoolExecutor(max_workers=self.decode_threads, thread_name_prefix='image-decode')
+        try:
+            with DetectionArtifactWriter(summary["detections_path"]) as artifact:
+                decoder = _PrefetchDecoder(pool, images, self.batch_size + self.decode_threads)
+                for batch in batches:
+                    frames = [decoder.next() for _ in batch]
+
+                    decoded = [(index, frame) for index, frame in zip(batch, frames) if frame is not None]
+                    summary["failed_images"] += len(frames) - len(decoded)
+                    if decoded:
+                        results = handle.model.predict([frame for _, frame in decoded], device=self.yolo.device,
+                                                       verbose=False, **options)
+                        for (index, frame), result in zip(decoded, results):
+                            detections = FrameDetections.of(result)
+                            mask = detections.class_mask(target_classes)
+                            artifact.write(index, [
+                                {"track_id": None, "class": target_classes[cls_id], "position": position}
+                                for cls_id, position in zip(detections.cls[mask].tolist(),
+                                                            detections.xywh[mask].tolist())
+                            ], image=images[index])
+                            if annotator is not None:
+                                # 序号前缀区分不同目录中的同名图片
+                                filename = f"{index:06d}_{os.path.basename(images[index])}"
+                                cv2.imwrite(os.path.join(output_dir, filename), annotator.draw(frame, detections))
+                    summary["total_frames"] += len(decoded)
+                    if progress is not None:
+                        progress(batch[-1] + 1, len(images))
+                summary["total_objects"] = artifact.objects
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            handle.release()
+        return summary
+
+
+class _PrefetchDecoder:
+    """按顺序返回解码结果，始终保持lookahead张图片在解码中(推理当前批次时解码后续图片)"""
+
+    def __init__(self, pool, images, lookahead):
+        self._pool = pool
+        self._images = images
+        self._lookahead = lookahead
+        self._futures = deque()
+        self._next = 0
+        self._fill()
+
+    def _fill(self):
+        while self._next < len(self._images) and len(self._futures) < self._lookahead:
+            self._futures.append(self._pool.submit(cv2.imread, self._images[self._next]))
+            self._next += 1
+
+    def next(self):
+        frame = self._futures.popleft().result()
+        self._fill()
+        return frame
@@ -0,0 +1,464 @@
+"""
+跨摄像头批量推理引擎 (BatchInferenceEngine)
+
+主要功能：
+1. 批量推理：
+   - 收集所有活跃摄像头的最新帧
+   - 合并为一个批次执行一次前向推理
+   - 可配置批次大小和最大等待时间
+   - 支持ROI裁剪推理和摄像头独立推理参数，批次内按推理参数分组
+   - 可选两级级联：跟踪器更新前由更大的模型复检低置信度目标和禁停区域(见ModelCascade)
+
+2. 独立跟踪：
+   - 每个摄像头拥有独立的跟踪器(BoT-SORT/ByteTrack/IoU)
+   - 批量检测结果按摄像头拆分后分别更新跟踪器
+   - 跟踪ID在摄像头之间互不影响
+   - 非关键帧由摄像头线程调用CameraTracker.propagate外推，不进入引擎
+
+3. 引擎管理：
+   - 相同模型、设备、检测类别的摄像头共享同一个引擎
+   - 最后一个摄像头关闭通道后停止引擎并归还模型句柄
+
+工作流程：
+1. 摄像头线程：
+   channel = inference_engines.open_channel(yolo, camera_id)
+   -> 解码帧 -> channel.infer(frame)
+   -> 等待引擎返回带跟踪ID的结果
+
+2. 引擎线程：
+   等待第一帧 -> 在MAX_WAIT_MS内继续收集帧(最多BATCH_SIZE帧)
+   -> 按所有摄像头的核心分配之和设置推理线程数
+   -> model.predict(frames)
+   -> 无需复检的摄像头跟踪器更新并唤醒
+   -> 合并执行所有摄像头的第二级复检 -> 跟踪器更新
+   -> 唤醒对应摄像头线程
+
+配置项：
+- INFERENCE_BATCH_SIZE: 最大批次大小，默认8
+- INFERENCE_MAX_WAIT_MS: 凑批最大等待时间(毫秒)，默认10
+
+性能说明：
+- CPU环境下批量推理能显著提高总吞吐量
+- 所有摄像头的帧均已到达时立即推理，不额外等待
+- 摄像头线程提交后阻塞等待结果，每个摄像头同一时刻最多一个待处理帧
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 提供模型和解码循环
+- [`ModelRegistry`](app/utils/model_registry.py): 模型共享
+- [`IoUTracker`](app/utils/iou_tracker.py): 轻量IoU跟踪器
+- [`CoreBudget`](app/utils/cpu_budget.py): 推理线程数和CPU亲和性
+- [`ModelCascade`](app/utils/cascade.py): 两级检测级联
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.utils.roi import InferenceROI
+from app.utils.iou_tracker import IoUTracker
+from app.utils.cascade import ModelCascade
+from app.utils.metrics import metrics
+from app.utils.cpu_budget import core_budget
+
+
+class CameraTracker:
+    """单个摄像头的跟踪器状态"""
+
+    def __init__(self, tracking_config, frame_rate=30):
+        import yaml
+        from ultralytics.utils import IterableSimpleNamespace  # type: ignore
+        from ultralytics.utils.checks import check_yaml  # type: ignore
+        from ultralytics.trackers.track import TRACKER_MAP  # type: ignore
+
+        with open(check_yaml(tracking_config), encoding='utf-8') as f:
+            cfg = IterableSimpleNamespace(**yaml.safe_load(f))
+        trackers = {**TRACKER_MAP, 'iou': IoUTracker}
+        if cfg.tracker_type not in trackers:
+            raise ValueError(f"Unsupported tracker type: {cfg.tracker_type}")
+        self.tracker = trackers[cfg.tracker_type](args=cfg, frame_rate=frame_rate)
+        self.names = None
+
+    def update(self, result):
+        """
+        使用检测结果更新跟踪器
+        Args:
+            result: 单帧检测结果(Results)
+        Returns:
+            Results: 仅包含已跟踪目标的结果(boxes带id)
+        """
+        import torch
+
+        self.names = result.names
+        det = result.boxes.cpu().numpy()
+        tracks = self.tracker.update(det, result.orig_img)
+        if len(tracks) == 0:
+            return result[:0]
+
+        idx = tracks[:, -1].astype(int)
+        tracked = result[idx]
+        tracked.update(boxes=torch.as_tensor(tracks[:, :-1]))
+        return tracked
+
+    def propagate(self, frame):
+        """
+        不执行检测，用跟踪器的运动模型将目标外推到当前帧(非关键帧使用)
+        Args:
+            frame: 当前帧BGR图像
+        Returns:
+            Results: 外推后的跟踪结果；尚未处理过关键帧时返回None
+        """
+        import numpy as np
+        import torch
+        from ultralytics.engine.results import Results  # type: ignore
+
+        if self.names is None:
+            return None
+
+        tracker = self.tracker
+        if isinstance(tracker, IoUTracker):
+            boxes = tracker.propagate()
+        else:
+            # 与update一致：帧号递增，已跟踪和丢失目标一起做卡尔曼预测
+            tracker.frame_id += 1
+            tracker.multi_predict(tracker.tracked_stracks + tracker.lost_stracks)
+
+            tracks = [track.result for track in tracker.tracked_stracks if track.is_activated]
+            boxes = np.asarray(tracks, dtype=np.float32)[:, :-1] if tracks else np.zeros((0, 7), dtype=np.float32)
+        return Results(frame, path='', names=self.names, boxes=torch.as_tensor(boxes))
+
+
+class _InferenceRequest:
+    """待推理的单帧请求"""
+
+    def __init__(self, channel, frame, box=None, options=None):
+        self.channel = channel
+        self.frame = frame
+        self.box = box
+        self.options = options or {}
+        # 送入检测器的图像(ROI裁剪视图或整帧)
+        self.input = InferenceROI.crop(frame, box) if box is not None else frame
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # 本帧分摊的模型推理耗时(秒)
+        self.model_time = None
+
+
+class CameraChannel:
+    """摄像头与推理引擎之间的通道"""
+
+    def __init__(self, engine, camera_id, tracker, cascade=None):
+        self.engine = engine
+        self.camera_id = camera_id
+        self.tracker = tracker
+        self.cascade = cascade
+        self.frames = 0
+        # 最近一帧分摊的模型推理耗时(秒)，不含凑批等待、级联和跟踪
+        self.model_time = None
+        self.closed = False
+
+    def infer(self, frame, timeout=None, box=None, options=None):
+        """
+        提交一帧并等待结果
+        Args:
+            frame: BGR图像(numpy数组)
+            timeout: 最长等待秒数
+            box: 推理区域(x1, y1, x2, y2)，None表示整帧
+            options: 推理参数(imgsz/conf/iou/max_det/classes)，未指定的使用引擎默认值
+        Returns:
+            Results: 带跟踪ID的检测结果(整帧坐标)；通道关闭时返回None
+        """
+        if self.closed:
+            raise RuntimeError(f"Inference channel for camera {self.camera_id} is closed")
+        request = self.engine.submit(self, frame, box, options)
+        if not request.done.wait(timeout):
+            raise TimeoutError(f"Inference timeout for camera {self.camera_id}")
+        if request.error is not None:
+            raise request.error
+        self.frames += 1
+        self.model_time = request.model_time
+        return request.result
+
+    def close(self):
+        """关闭通道"""
+        if not self.closed:
+            self.closed = True
+            self.engine.close_channel(self)
+
+
+class BatchInferenceEngine:
+    # 最大批次大小
+    BATCH_SIZE = int(os.getenv('INFERENCE_BATCH_SIZE', '8'))
+    # 凑批最大等待时间(毫秒)
+    MAX_WAIT_MS = float(os.getenv('INFERENCE_MAX_WAIT_MS', '10'))
+
+    def __init__(self, model_handle, device='cpu', classes=None, batch_size=None, max_wait_ms=None,
+                 on_stop=None):
+        self.model_handle = model_handle
+        self.device = device
+        self.classes = classes
+        self.batch_size = max(1, batch_size or self.BATCH_SIZE)
+        self.max_wait = (self.MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self._on_stop = on_stop
+
+        self._pending = OrderedDict()  # camera_id -> _InferenceRequest
+        self._channels = {}
+        self._cond = threading.Condition()
+        self._running = True
+
+        # 统计信息
+        self.batches = 0
+        self.frames = 0
+
+        self._thread = threading.Thread(target=self._run, daemon=True, name='batch-inference')
+        self._thread.start()
+
+    def attach(self, camera_id, tracker, cascade=None):
+        """
+        为摄像头创建通道
+        Args:
+            cascade: 摄像头的两级级联(ModelCascade)，None表示不启用
+        Returns:
+            CameraChannel: 引擎已停止时返回None
+        """
+        with self._cond:
+            if not self._running:
+                return None
+            channel = CameraChannel(self, camera_id, tracker, cascade)
+            self._channels[camera_id] = channel
+            return channel
+
+    def close_channel(self, channel):
+        """关闭通道，最后一个通道关闭时停止引擎"""
+        with self._cond:
+            if self._channels.get(channel.camera_id) is channel:
+                del self._channels[channel.camera_id]
+            request = self._pending.get(channel.camera_id)
+            if request is not None and request.channel is channel:
+                del self._pending[channel.camera_id]
+                request.done.set()
+            idle = not self._channels
+            if idle:
+                self._running = False
+                self._cond.notify_all()
+        if idle:
+            self._thread.join(timeout=5)
+            self.model_handle.release()
+            if self._on_stop:
+                self._on_stop(self)
+
+    def submit(self, channel, frame, box=None, options=None):
+        """提交帧(摄像头线程等待结果后才提交下一帧，每个摄像头最多一个待处理帧)"""
+        request = _InferenceRequest(channel, frame, box, options)
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Inference engine stopped")
+            self._pending[channel.camera_id] = request
+            self._cond.notify_all()
+        return request
+
+    def stats(self):
+        """获取引擎统计信息"""
+        with self._cond:
+            return {
+                'cameras': len(self._channels),
+                'batch_size': self.batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'batches': self.batches,
+                'frames': self.frames,
+                'avg_batch': round(self.frames / self.batches, 2) if self.batches else 0
+            }
+
+    def _collect_batch(self):
+        """收集一批请求：所有摄像头已就绪、达到批次大小或超时即返回"""
+        with self._cond:
+            while self._running and not self._pending:
+                self._cond.wait()
+            if not self._running:
+                return []
+
+            deadline = time.monotonic() + self.max_wait
+            while (self._running and len(self._pending) < self.batch_size
+                   and len(self._pending) < len(self._channels)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                _, request = self._pending.popitem(last=False)
+                batch.append(request)
+            return batch
+
+    def _run(self):
+        """引擎主循环"""
+        while self._running:
+            batch = self._collect_batch()
+            if batch:
+                # 引擎线程代所有摄像头推理，使用它们的核心分配之和
+                with self._cond:
+                    cameras = tuple(self._channels)
+                core_budget.sync(*cameras)
+                self._process_batch(batch)
+
+    def _process_batch(self, batch):
+        """按推理参数分组执行批量推理(同一次前向推理的参数必须一致)，再合并执行各摄像头的第二级复检"""
+        groups = OrderedDict()
+        for request in batch:
+            key = tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                               for name, value in request.options.items()))
+            groups.setdefault(key, []).append(request)
+        refining = []
+        for requests in groups.values():
+            refining.extend(self._predict_group(requests, requests[0].options))
+        if refining:
+            self._refine(refining)
+
+    def _predict_group(self, batch, options=None):
+        """
+        执行一次批量推理并分发结果
+        Returns:
+            list: 需要第二级复检的(请求, CascadeRun, 已用级联耗时)，其余请求已完成
+        """
+        try:
+            options = {'classes': self.classes, **(options or {})}
+            started = time.perf_counter()
+            results = self.model_handle.model.predict(
+                [request.input for request in batch],
+                device=self.device,
+                verbose=False,
+                **options
+            )
+            elapsed = time.perf_counter() - started
+            # 统计与其他引擎状态一样在锁内更新，stats()在Web线程中读取
+            with self._cond:
+                self.batches += 1
+                self.frames += len(batch)
+        except Exception as e:
+            for request in batch:
+                request.error = e
+                request.done.set()
+            return []
+
+        refining = []
+        for request, result in zip(batch, results):
+            camera_id = request.channel.camera_id
+            # 批次推理时间按帧数均摊，其他摄像头的帧和级联不计入本帧
+            request.model_time = elapsed / len(batch)
+            try:
+                # 同一批次的摄像头都等待了整批推理
+                metrics.observe(camera_id, 'inference', elapsed)
+                # ROI结果先映射回整帧坐标，跟踪器始终工作在整帧坐标系
+                if request.box is not None:
+                    result = InferenceROI.to_full_frame(result, request.frame, request.box)
+                cascade = request.channel.cascade
+                if cascade is not None:
+                    started = time.perf_counter()
+                    run = cascade.plan(result, request.frame, options, request.input.shape)
+                    if run is not None:
+                        refining.append((request, run, time.perf_counter() - started))
+                        continue
+                    metrics.observe(camera_id, 'cascade', time.perf_counter() - started)
+            except Exception as e:
+                request.error = e
+                request.done.set()
+                continue
+            self._finish(request, result)
+        return refining
+
+    def _refine(self, refining):
+        """同一周期内所有摄像头的第二级复检按模型和推理参数合并推理"""
+        groups = OrderedDict()
+        for item in refining:
+            groups.setdefault(item[1].key, []).append(item)
+        for items in groups.values():
+            try:
+                started = time.perf_counter()
+                results = ModelCascade.predict([run for _, run, _ in items])
+                elapsed = time.perf_counter() - started
+            except Exception as e:
+                for request, _, _ in items:
+                    request.error = e
+                    request.done.set()
+                continue
+
+            for (request, run, planned), crop_results in zip(items, results):
+                try:
+                    started = time.perf_counter()
+                    result = run.cascade.apply(run, crop_results)
+                    # 与inference阶段一致，同组摄像头各记录一次合并推理耗时
+                    metrics.observe(request.channel.camera_id, 'cascade',
+                                    planned + elapsed + time.perf_counter() - started)
+                except Exception as e:
+                    request.error = e
+                    request.done.set()
+                    continue
+                self._finish(request, result)
+
+    def _finish(self, request, result):
+        """更新摄像头跟踪器并唤醒摄像头线程"""
+        try:
+            started = time.perf_counter()
+            request.result = request.channel.tracker.update(result)
+            metrics.observe(request.channel.camera_id, 'tracking', time.perf_counter() - started)
+        except Exception as e:
+            request.error = e
+        finally:
+            request.done.set()
+
+
+class InferenceEngineManager:
+    """
+    推理引擎管理器
+    按(模型文件, 设备, 后端, 检测类别)共享引擎
+    """
+
+    def __init__(self):
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def open_channel(self, yolo, camera_id, frame_rate=30, cascade=None):
+        """
+        为摄像头打开推理通道
+        Args:
+            yolo: YOLOIntegration实例
+            camera_id: 摄像头ID
+            frame_rate: 视频帧率(用于跟踪器丢失判定)
+            cascade: 两级级联(ModelCascade)，由通道所在引擎线程调用
+        Returns:
+            CameraChannel: 推理通道
+        """
+        classes = tuple(sorted(yolo.TARGET_CLASSES.keys()))
+        key = (yolo.model_path, yolo.device, yolo.backend, classes)
+        tracker = CameraTracker(yolo.tracking_config, frame_rate=frame_rate)
+        with self._lock:
+            engine = self._engines.get(key)
+            channel = engine.attach(camera_id, tracker, cascade) if engine is not None else None
+            if channel is None:
+                # 引擎不存在或已停止，创建新引擎
+                engine = BatchInferenceEngine(
+                    yolo.acquire_model(),
+                    device=yolo.device,
+                    classes=list(classes),
+                    on_stop=lambda e, k=key: self._remove(k, e)
+                )
+                self._engines[key] = engine
+                channel = engine.attach(camera_id, tracker, cascade)
+            return channel
+
+    def stats(self):
+        """获取所有引擎的统计信息"""
+        with self._lock:
+            engines = list(self._engines.items())
+        return [{'model_path': key[0], 'device': key[1], 'backend': key[2], **engine.stats()}
+                for key, engine in engines]
+
+    def _remove(self, key, engine):
+        with self._lock:
+            if self._engines.get(key) is engine:
+                del self._engines[key]
+
+
+# 进程级共享实例
+inference_engines = InferenceEngineManager()
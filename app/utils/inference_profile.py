@@ -0,0 +1,232 @@
+"""
+摄像头推理配置 (InferenceProfile / AdaptiveImgsz)
+
+主要功能：
+1. 推理配置(InferenceProfile)：
+   - 每个摄像头独立的推理尺寸、置信度阈值、NMS IoU阈值、最大检测数、检测类别子集
+   - 低优先级的全景摄像头可使用小尺寸、高阈值，出入口摄像头保持全尺寸
+   - 配置保存在Camera.inference_profile(JSON)
+
+2. 自适应推理尺寸(AdaptiveImgsz)：
+   - 设置latency_budget_ms后启用
+   - 统计每帧推理耗时(指数滑动平均)，取引擎测得的批次推理时间按批内帧数均摊，不含凑批等待和其他摄像头的级联
+   - 持续超出预算时按尺寸阶梯降低推理尺寸
+   - 阶梯中降级后的尺寸取自共享尺寸表(SIZES)，降级的摄像头落在相同尺寸上，引擎仍可合批推理
+   - 负载下降后，预测更大尺寸的延迟(与尺寸平方成正比)仍在预算内时逐级恢复
+
+配置格式：
+   {
+     "imgsz": 640,               # 推理尺寸
+     "conf": 0.35,               # 置信度阈值
+     "iou": 0.6,                 # NMS IoU阈值
+     "max_det": 100,             # 最大检测数
+     "classes": ["car", "bus"],  # 检测类别子集(类别名或类别ID)
+     "latency_budget_ms": 80,    # 每帧推理耗时预算，为空表示不自适应
+     "min_imgsz": 320            # 自适应时的最小推理尺寸
+   }
+
+配置项：
+- PROFILE_DOWN_PATIENCE: 连续超出预算多少帧后降低尺寸，默认10
+- PROFILE_UP_PATIENCE: 连续满足恢复条件多少帧后提高尺寸，默认50
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 应用推理配置
+- [`BatchInferenceEngine`](app/utils/inference_engine.py): 按推理参数分组批量推理
+- [`Camera`](app/models/camera.py): 配置存储
+
+注意事项：
+1. 未设置的字段使用模型默认值
+2. 推理尺寸会对齐到32的倍数
+"""
+
+import math
+import os
+
+
+class InferenceProfile:
+    """单个摄像头的推理参数"""
+
+    # 推理尺寸对齐步长
+    STRIDE = 32
+    # 支持的配置字段
+    FIELDS = ('imgsz', 'conf', 'iou', 'max_det', 'classes', 'latency_budget_ms', 'min_imgsz')
+
+    def __init__(self, imgsz=640, conf=None, iou=None, max_det=None, classes=None,
+                 latency_budget_ms=None, min_imgsz=320):
+        self.imgsz = self._align(imgsz)
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.classes = classes
+        self.latency_budget_ms = latency_budget_ms
+        self.min_imgsz = min(self._align(min_imgsz), self.imgsz)
+
+        if conf is not None and not 0 < conf < 1:
+            raise ValueError(f"Invalid conf: {conf}")
+        if iou is not None and not 0 < iou < 1:
+            raise ValueError(f"Invalid iou: {iou}")
+        if max_det is not None and max_det < 1:
+            raise ValueError(f"Invalid max_det: {max_det}")
+        if latency_budget_ms is not None and latency_budget_ms <= 0:
+            raise ValueError(f"Invalid latency budget: {latency_budget_ms}")
+
+    @staticmethod
+    def from_config(config, default_imgsz=640, target_classes=None):
+        """
+        根据摄像头配置创建推理参数
+        Args:
+            config: 配置字典(可为空)
+            default_imgsz: 未配置imgsz时的推理尺寸
+            target_classes: 可检测类别 {cls_id: name}，用于校验和解析类别名
+        Returns:
+            InferenceProfile
+        """
+        config = dict(config or {})
+        unknown = set(config) - set(InferenceProfile.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown inference profile fields: {sorted(unknown)}")
+
+        classes = config.get('classes')
+        if classes is not None:
+            classes = InferenceProfile._resolve_classes(classes, target_classes)
+
+        return InferenceProfile(
+            imgsz=int(config.get('imgsz') or default_imgsz),
+            conf=config.get('conf'),
+            iou=config.get('iou'),
+            max_det=config.get('max_det'),
+            classes=classes,
+            latency_budget_ms=config.get('latency_budget_ms'),
+            min_imgsz=int(config.get('min_imgsz') or 320)
+        )
+
+    @staticmethod
+    def _resolve_classes(classes, target_classes):
+        """将类别名/ID解析为排序后的类别ID列表"""
+        target_classes = target_classes or {}
+        by_name = {name: cls_id for cls_id, name in target_classes.items()}
+        resolved = set()
+        for item in classes:
+            cls_id = by_name.get(item, item)
+            if not isinstance(cls_id, int) or (target_classes and cls_id not in target_classes):
+                raise ValueError(f"Invalid class in inference profile: {item}")
+            resolved.add(cls_id)
+        if not resolved:
+            raise ValueError("Inference profile classes must not be empty")
+        return sorted(resolved)
+
+    @staticmethod
+    def _align(imgsz):
+        stride = InferenceProfile.STRIDE
+        return max(stride, int(math.ceil(int(imgsz) / stride) * stride))
+
+    def predict_options(self, imgsz=None):
+        """
+        生成传给model.predict的参数(只包含已配置的字段)
+        Args:
+            imgsz: 实际推理尺寸(自适应或ROI缩放后)，默认配置值
+        """
+        options = {'imgsz': imgsz or self.imgsz}
+        for name in ('conf', 'iou', 'max_det', 'classes'):
+            value = getattr(self, name)
+            if value is not None:
+                options[name] = value
+        return options
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class AdaptiveImgsz:
+    """按处理延迟自动调整推理尺寸"""
+
+    # 尺寸阶梯(相对配置尺寸的比例)
+    LADDER_RATIOS = (1.0, 0.8, 0.65, 0.5)
+    # 共享尺寸表：降级尺寸对齐到其中最接近的尺寸，不同摄像头的阶梯使用相同尺寸
+    SIZES = (1280, 1024, 832, 640, 512, 416, 320, 256, 192, 160)
+    # 延迟滑动平均系数
+    EMA_ALPHA = 0.2
+    # 连续超出预算多少帧后降低尺寸
+    DOWN_PATIENCE = int(os.getenv('PROFILE_DOWN_PATIENCE', '10'))
+    # 连续满足恢复条件多少帧后提高尺寸
+    UP_PATIENCE = int(os.getenv('PROFILE_UP_PATIENCE', '50'))
+    # 恢复条件：预测延迟低于预算的比例
+    UP_MARGIN = 0.85
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.budget = profile.latency_budget_ms / 1000.0 if profile.latency_budget_ms else None
+        # 第一级为配置尺寸，其余各级取共享尺寸表中最接近的尺寸
+        sizes = [size for size in self.SIZES if profile.min_imgsz <= size < profile.imgsz]
+        ladder = [profile.imgsz]
+        for ratio in self.LADDER_RATIOS[1:]:
+            if not sizes:
+                break
+            size = min(sizes, key=lambda value: abs(value - profile.imgsz * ratio))
+            if size < ladder[-1]:
+                ladder.append(size)
+        self.ladder = ladder
+        self.level = 0
+        self.latency = None
+        self._over = 0
+        self._under = 0
+
+        # 统计信息
+        self.downgrades = 0
+        self.upgrades = 0
+
+    @property
+    def imgsz(self):
+        return self.ladder[self.level]
+
+    def record(self, seconds):
+        """
+        记录一帧的推理耗时并按需调整尺寸
+        Returns:
+            bool: 推理尺寸是否改变
+        """
+        self.latency = seconds if self.latency is None else (
+            self.EMA_ALPHA * seconds + (1 - self.EMA_ALPHA) * self.latency)
+        if self.budget is None:
+            return False
+
+        if self.latency > self.budget:
+            self._over += 1
+            self._under = 0
+            if self._over >= self.DOWN_PATIENCE and self.level < len(self.ladder) - 1:
+                self._change(self.level + 1)
+                self.downgrades += 1
+                return True
+            return False
+
+        self._over = 0
+        if self.level > 0:
+            # 计算量与尺寸平方成正比，预测提高一级后的延迟
+            predicted = self.latency * (self.ladder[self.level - 1] / self.imgsz) ** 2
+            if predicted < self.budget * self.UP_MARGIN:
+                self._under += 1
+                if self._under >= self.UP_PATIENCE:
+                    self._change(self.level - 1)
+                    self.upgrades += 1
+                    return True
+            else:
+                self._under = 0
+        return False
+
+    def _change(self, level):
+        """切换尺寸，按尺寸平方比例修正滑动平均，避免立即反向调整"""
+        self.latency *= (self.ladder[level] / self.imgsz) ** 2
+        self.level = level
+        self._over = 0
+        self._under = 0
+
+    def stats(self):
+        """获取自适应状态"""
+        return {
+            'imgsz': self.imgsz,
+            'ladder': self.ladder,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'budget_ms': self.profile.latency_budget_ms,
+            'downgrades': self.downgrades,
+            'upgrades': self.upgrades
+        }
@@ -0,0 +1,280 @@
+"""
+轻量IoU跟踪器 (IoUTracker)
+
+主要功能：
+1. SORT风格跟踪：
+   - 每个目标一个匀速卡尔曼滤波器，状态为[cx, cy, 面积, 宽高比, vx, vy, v面积]
+   - 预测、更新对所有目标批量计算(numpy矩阵运算)，不逐目标循环
+   - 检测框与预测框的IoU矩阵一次计算，按IoU从高到低贪心匹配，只匹配同类别目标
+   - 不依赖lap/scipy的线性分配，也不计算外观特征
+
+2. 与Ultralytics跟踪器兼容：
+   - update(det)接收Boxes(xyxy/conf/cls)，返回[x1, y1, x2, y2, track_id, score, cls, 检测索引]
+   - 跟踪ID从1开始递增且不复用，与BYTETracker/BOTSORT一致，CameraTracker、违规检测、特殊车辆记录无需区分
+   - propagate()供非关键帧外推，返回[x1, y1, x2, y2, track_id, score, cls]
+
+3. 生命周期：
+   - 未匹配的检测(置信度不低于new_track_thresh)创建新目标
+   - 累计匹配min_hits帧后输出(跟踪开始的前min_hits帧内立即输出)，之后漏检一帧不需要重新确认
+   - 连续track_buffer帧(按帧率换算)未匹配的目标删除
+
+配置项(跟踪配置文件 app/assets/configs/iou.yaml)：
+- track_high_thresh: 参与匹配的最低检测置信度，默认0.25
+- new_track_thresh: 创建新目标的最低检测置信度，默认0.25
+- match_thresh: 匹配所需的最小IoU，默认0.3
+- track_buffer: 目标丢失后保留的帧数(30fps下)，默认30
+- min_hits: 输出前需要累计匹配的帧数，默认2
+
+工作流程：
+   tracker = IoUTracker(args=cfg, frame_rate=25)
+   -> tracks = tracker.update(result.boxes.cpu().numpy())
+   -> boxes = tracker.propagate()   # 非关键帧
+
+关联模块：
+- [`CameraTracker`](app/utils/inference_engine.py): 按tracker_type创建跟踪器
+- [`YOLOIntegration`](app/utils/yolo_integration.py): tracker_type='iou'
+- scripts/benchmark_trackers.py: 与BoT-SORT/ByteTrack的单帧耗时对比
+
+注意事项：
+1. 只在batched实时检测中可用；Ultralytics的model.track(stream推理模式、文件分析)只支持botsort/bytetrack
+2. 输出框为检测框本身(非滤波后的框)，外推帧输出卡尔曼预测框
+3. 没有外观特征，目标交叉遮挡时比BoT-SORT更容易交换ID
+"""
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    计算两组xyxy框的IoU矩阵
+    Returns:
+        numpy.ndarray: (len(boxes_a), len(boxes_b))
+    """
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+def greedy_match(scores, threshold):
+    """
+    按分数从高到低贪心匹配
+    Args:
+        scores: (行数, 列数)匹配分数
+        threshold: 最低分数
+    Returns:
+        tuple: (行索引数组, 列索引数组)
+    """
+    rows, cols = np.nonzero(scores >= threshold)
+    if len(rows) == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    order = np.argsort(-scores[rows, cols], kind='stable')
+    used_rows, used_cols = set(), set()
+    matched_rows, matched_cols = [], []
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matched_rows.append(row)
+        matched_cols.append(col)
+    return np.asarray(matched_rows, dtype=int), np.asarray(matched_cols, dtype=int)
+
+
+class _KalmanBank:
+    """一组目标的匀速卡尔曼滤波器(状态和协方差按目标堆叠，批量预测和更新)"""
+
+    # 状态转移：位置和面积加上速度
+    F = np.eye(7)
+    F[0, 4] = F[1, 5] = F[2, 6] = 1.0
+    # 观测：[cx, cy, 面积, 宽高比]
+    H = np.eye(4, 7)
+    # 过程噪声和观测噪声(与SORT一致)
+    Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001])
+    R = np.diag([1.0, 1.0, 10.0, 10.0])
+    # 初始协方差：速度未知，方差较大
+    P0 = np.diag([10.0, 10.0, 10.0, 10.0, 10000.0, 10000.0, 10000.0])
+
+    def __init__(self):
+        self.x = np.zeros((0, 7))
+        self.P = np.zeros((0, 7, 7))
+
+    @staticmethod
+    def to_measurement(boxes):
+        """xyxy -> [cx, cy, 面积, 宽高比]"""
+        width = boxes[:, 2] - boxes[:, 0]
+        height = np.maximum(boxes[:, 3] - boxes[:, 1], 1e-6)
+        return np.stack([boxes[:, 0] + width / 2, boxes[:, 1] + height / 2, width * height, width / height], axis=1)
+
+    def boxes(self):
+        """当前状态的xyxy框"""
+        cx, cy, area, ratio = self.x[:, 0], self.x[:, 1], np.maximum(self.x[:, 2], 1e-6), self.x[:, 3]
+        width = np.sqrt(area * np.maximum(ratio, 1e-6))
+        height = area / np.maximum(width, 1e-6)
+        return np.stack([cx - width / 2, cy - height / 2, cx + width / 2, cy + height / 2], axis=1)
+
+    def add(self, boxes):
+        x = np.zeros((len(boxes), 7))
+        x[:, :4] = self.to_measurement(boxes)
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, np.broadcast_to(self.P0, (len(boxes), 7, 7))])
+
+    def keep(self, mask):
+        self.x = self.x[mask]
+        self.P = self.P[mask]
+
+    def predict(self):
+        # 面积不能预测为负
+        shrinking = self.x[:, 2] + self.x[:, 6] <= 0
+        self.x[shrinking, 6] = 0.0
+        self.x = self.x @ self.F.T
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+    def update(self, index, boxes):
+        """用观测框更新index指定的目标"""
+        if len(index) == 0:
+            return
+        x, P = self.x[index], self.P[index]
+        residual = self.to_measurement(boxes) - x @ self.H.T
+        S = self.H @ P @ self.H.T + self.R
+        K = P @ self.H.T @ np.linalg.inv(S)
+        self.x[index] = x + (K @ residual[..., None])[..., 0]
+        self.P[index] = (np.eye(7) - K @ self.H) @ P
+
+
+class IoUTracker:
+    """SORT风格的IoU跟踪器(接口与Ultralytics的BYTETracker一致)"""
+
+    DEFAULTS = {
+        'track_high_thresh': 0.25,
+        'new_track_thresh': 0.25,
+        'match_thresh': 0.3,
+        'track_buffer': 30,
+        'min_hits': 2
+    }
+
+    def __init__(self, args=None, frame_rate=30):
+        """
+        Args:
+            args: 跟踪配置(IterableSimpleNamespace或dict)，缺省项使用DEFAULTS
+            frame_rate: 视频帧率(换算目标丢失后保留的帧数)
+        """
+        config = dict(self.DEFAULTS)
+        if args is not None:
+            items = args.items() if isinstance(args, dict) else vars(args).items()
+            config.update({key: value for key, value in items if key in self.DEFAULTS})
+        self.track_high_thresh = float(config['track_high_thresh'])
+        self.new_track_thresh = float(config['new_track_thresh'])
+        self.match_thresh = float(config['match_thresh'])
+        self.min_hits = int(config['min_hits'])
+        self.max_time_lost = max(1, int(frame_rate / 30.0 * int(config['track_buffer'])))
+        self.reset()
+
+    def reset(self):
+        """清空所有目标，ID重新从1开始"""
+        self.frame_id = 0
+        self._next_id = 1
+        self._kalman = _KalmanBank()
+        self._ids = np.zeros(0, dtype=int)
+        self._cls = np.zeros(0)
+        self._score = np.zeros(0)
+        self._hits = np.zeros(0, dtype=int)
+        self._lost = np.zeros(0, dtype=int)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def update(self, results, img=None, feats=None):
+        """
+        用一帧检测结果更新跟踪器
+        Args:
+            results: Boxes(需要xyxy/conf/cls)
+            img: 未使用(接口兼容)
+            feats: 未使用(接口兼容)
+        Returns:
+            numpy.ndarray: (N, 8) [x1, y1, x2, y2, track_id, score, cls, 检测索引]
+        """
+        self.frame_id += 1
+        boxes = np.asarray(results.xyxy, dtype=np.float64).reshape(-1, 4)
+        scores = np.asarray(results.conf, dtype=np.float64).reshape(-1)
+        classes = np.asarray(results.cls, dtype=np.float64).reshape(-1)
+        candidates = np.flatnonzero(scores >= self.track_high_thresh)
+
+        # 所有目标外推到当前帧，与检测框按IoU匹配(只匹配同类别)
+        self._kalman.predict()
+        self._lost += 1
+        iou = iou_matrix(boxes[candidates], self._kalman.boxes())
+        iou[classes[candidates][:, None] != self._cls[None, :]] = 0.0
+        det_rows, track_rows = greedy_match(iou, self.match_thresh)
+        matched = candidates[det_rows]
+
+        self._kalman.update(track_rows, boxes[matched])
+        self._score[track_rows] = scores[matched]
+        self._hits[track_rows] += 1
+        self._lost[track_rows] = 0
+
+        # 未匹配的高置信度检测创建新目标
+        unmatched = np.setdiff1d(candidates, matched)
+        unmatched = unmatched[scores[unmatched] >= self.new_track_thresh]
+        new_rows = np.arange(len(self._ids), len(self._ids) + len(unmatched))
+        if len(unmatched):
+            self._kalman.add(boxes[unmatched])
+            self._ids = np.concatenate([self._ids, np.arange(self._next_id, self._next_id + len(unmatched))])
+            self._next_id += len(unmatched)
+            self._cls = np.concatenate([self._cls, classes[unmatched]])
+            self._score = np.concatenate([self._score, scores[unmatched]])
+            self._hits = np.concatenate([self._hits, np.ones(len(unmatched), dtype=int)])
+            self._lost = np.concatenate([self._lost, np.zeros(len(unmatched), dtype=int)])
+
+        # 输出本帧匹配且已确认的目标(跟踪开始的前min_hits帧内立即输出)
+        det_index = np.concatenate([matched, unmatched])
+        rows = np.concatenate([track_rows, new_rows]).astype(int)
+        confirmed = self._confirmed()[rows]
+        det_index, rows = det_index[confirmed], rows[confirmed]
+        output = np.concatenate([
+            boxes[det_index],
+            self._ids[rows, None],
+            scores[det_index, None],
+            classes[det_index, None],
+            det_index[:, None]
+        ], axis=1).astype(np.float32)
+
+        # 删除丢失过久的目标
+        alive = self._lost <= self.max_time_lost
+        if not alive.all():
+            self._drop(alive)
+        return output
+
+    def propagate(self):
+        """
+        不执行检测，将已确认的目标外推一帧(非关键帧使用)
+        Returns:
+            numpy.ndarray: (N, 7) [x1, y1, x2, y2, track_id, score, cls]
+        """
+        # 外推帧不计入丢失，只输出上一次更新时匹配到的已确认目标
+        active = (self._lost == 0) & self._confirmed()
+        self.frame_id += 1
+        self._kalman.predict()
+        return np.concatenate([
+            self._kalman.boxes()[active],
+            self._ids[active, None],
+            self._score[active, None],
+            self._cls[active, None]
+        ], axis=1).astype(np.float32)
+
+    def _confirmed(self):
+        return (self._hits >= self.min_hits) | (self.frame_id <= self.min_hits)
+
+    def _drop(self, keep):
+        self._kalman.keep(keep)
+        self._ids = self._ids[keep]
+        self._cls = self._cls[keep]
+        self._score = self._score[keep]
+        self._hits = self._hits[keep]
+        self._lost = self._lost[keep]
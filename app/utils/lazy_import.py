@@ -0,0 +1,79 @@
+"""
+延迟导入 (LazyImport)
+
+主要功能：
+1. 重依赖按需加载：
+   - cv2、torch、ultralytics、pandas、plotly、shapely在首次使用检测、分析或图表功能时才导入
+   - 只提供REST查询或执行数据库迁移的进程不再加载这些依赖，启动更快、内存更少
+
+2. 代理对象：
+   - LazyImport('pandas') 代理模块，LazyImport('app.utils.yolo_integration', 'YOLOIntegration') 代理模块属性
+   - 首次访问属性或调用时导入并缓存目标对象，之后直接转发
+   - 模块级名称保持不变，调用方代码和unittest.mock.patch无需修改
+
+工作流程：
+   cv2 = LazyImport('cv2')
+   -> cv2.imencode(...)  # 首次访问时导入cv2
+
+关联模块：
+- [`DetectionService`](app/services/detection_service.py): 检测/分析相关依赖
+- [`StatisticsService`](app/services/statistics_service.py): pandas/plotly
+- [`websocket_utils`](app/utils/websocket_utils.py): 画面编码
+- scripts/benchmark_startup.py: 启动耗时基准
+
+注意事项：
+1. 代理对象不能用于isinstance、except子句或作为基类，这些场景需要在函数内导入
+2. 导入失败的异常在首次使用时抛出，而不是启动时
+"""
+
+import importlib
+import threading
+
+
+class LazyImport:
+    """模块或模块属性的延迟导入代理"""
+
+    __slots__ = ('_module', '_attribute', '_target', '_lock')
+
+    def __init__(self, module, attribute=None):
+        """
+        Args:
+            module: 模块名
+            attribute: 模块属性名，None表示代理模块本身
+        """
+        object.__setattr__(self, '_module', module)
+        object.__setattr__(self, '_attribute', attribute)
+        object.__setattr__(self, '_target', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _resolve(self):
+        target = self._target
+        if target is None:
+            with self._lock:
+                if self._target is None:
+                    module = importlib.import_module(self._module)
+                    object.__setattr__(self, '_target',
+                                       module if self._attribute is None else getattr(module, self._attribute))
+                target = self._target
+        return target
+
+    @property
+    def loaded(self):
+        """目标是否已导入"""
+        return self._target is not None
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        name = self._module if self._attribute is None else f"{self._module}.{self._attribute}"
+        return f"<LazyImport {name} ({'loaded' if self.loaded else 'not loaded'})>"
@@ -0,0 +1,252 @@
+"""
+流水线阶段耗时与Prometheus指标 (PipelineMetrics)
+
+主要功能：
+1. 阶段耗时直方图：
+   - 每个摄像头、每个阶段一个固定分桶的直方图(LatencyHistogram)
+   - 阶段：decode(解码)、inference(批量推理)、cascade(第二级复检)、tracking(跟踪/外推)、violations(违规检测)、
+     annotate(标注渲染)、encode(实时画面JPEG编码)、record(VideoWriter写入)、db_commit(数据库提交)
+   - 记录一次只做二分查找和三次累加，开销在微秒以下，可在生产环境常开
+
+2. 计数器：
+   - 数据库写入次数(按表)，速率由Prometheus计算
+
+3. 导出：
+   - 直方图和计数器作为流水线统计项(metrics)出现在/detection/status中，
+     进程模式下随工作进程的状态快照传回Web进程
+   - /metrics按Prometheus文本格式导出阶段耗时、队列深度、丢帧、断线重连、两级级联、活跃摄像头、数据库写入和分析任务
+
+工作流程：
+   histogram = metrics.histogram(camera_id, 'decode')
+   -> started = time.perf_counter(); ...; histogram.observe(time.perf_counter() - started)
+   -> pipeline.register_stats('metrics', lambda: metrics.snapshot(camera_id))
+   -> render_metrics(DetectionService.get_processing_status(), analysis_jobs.stats())
+
+配置项：
+- METRICS_ENABLED: 是否记录阶段耗时，默认true
+
+关联模块：
+- [`DetectionService`](app/services/detection_service.py): 事件、编码、录制阶段，/metrics内容
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 解码、跟踪外推
+- [`BatchInferenceEngine`](app/utils/inference_engine.py): 推理、第二级复检、跟踪
+- [`FrameAnnotator`](app/utils/annotation.py): 标注渲染
+- [`ViolationService`](app/services/violation_service.py): 违规记录提交
+
+注意事项：
+1. 摄像头停止后其直方图被清除，重新启动后从零开始(Prometheus按计数器重置处理)
+2. inference为整批推理耗时，同一批次的每个摄像头各记录一次
+3. stream推理模式由Ultralytics内部解码和推理，只记录下游阶段
+"""
+
+import os
+import threading
+from bisect import bisect_left
+
+
+class LatencyHistogram:
+    """固定分桶的耗时直方图(秒)"""
+
+    # 分桶上限(秒)，最后一个桶为+Inf
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    __slots__ = ('counts', 'sum', 'count', '_lock')
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect_left(self.BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        """{"buckets": 各桶计数(非累积，最后一个为+Inf), "sum": 总耗时, "count": 次数}"""
+        with self._lock:
+            return {'buckets': list(self.counts), 'sum': round(self.sum, 6), 'count': self.count}
+
+
+class _NullHistogram:
+    """未启用时的空直方图"""
+
+    __slots__ = ()
+
+    def observe(self, seconds):
+        pass
+
+
+class PipelineMetrics:
+    """按摄像头组织的阶段耗时直方图和计数器"""
+
+    # 是否记录阶段耗时
+    ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+    NULL_HISTOGRAM = _NullHistogram()
+
+    def __init__(self, enabled=None):
+        self.enabled = self.ENABLED if enabled is None else bool(enabled)
+        # {camera_id: {"stages": {阶段: LatencyHistogram}, "counters": {名称: 次数}}}
+        self._cameras = {}
+        self._lock = threading.Lock()
+
+    def _camera(self, camera_id):
+        camera = self._cameras.get(camera_id)
+        if camera is None:
+            with self._lock:
+                camera = self._cameras.setdefault(camera_id, {'stages': {}, 'counters': {}})
+        return camera
+
+    def histogram(self, camera_id, stage):
+        """
+        获取摄像头某阶段的直方图(循环外获取一次，循环内直接observe)
+        未启用或camera_id为None时返回空直方图
+        """
+        if not self.enabled or camera_id is None:
+            return self.NULL_HISTOGRAM
+        stages = self._camera(camera_id)['stages']
+        histogram = stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = stages.setdefault(stage, LatencyHistogram())
+        return histogram
+
+    def observe(self, camera_id, stage, seconds):
+        self.histogram(camera_id, stage).observe(seconds)
+
+    def count(self, camera_id, name, amount=1):
+        """累加计数器(如db_writes.violations)"""
+        if not self.enabled or camera_id is None:
+            return
+        counters = self._camera(camera_id)['counters']
+        with self._lock:
+            counters[name] = counters.get(name, 0) + amount
+
+    def snapshot(self, camera_id):
+        """
+        获取摄像头的直方图和计数器快照
+        Returns:
+            dict: {"stages": {阶段: 直方图快照}, "counters": {名称: 次数}}
+        """
+        camera = self._cameras.get(camera_id)
+        if camera is None:
+            return {'stages': {}, 'counters': {}}
+        with self._lock:
+            stages = list(camera['stages'].items())
+            counters = dict(camera['counters'])
+        return {'stages': {stage: histogram.snapshot() for stage, histogram in stages},
+                'counters': counters}
+
+    def remove(self, camera_id):
+        """摄像头停止后清除其指标"""
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+def render_metrics(status, jobs=None, prefix='vehicle_detection'):
+    """
+    生成Prometheus文本格式的指标
+    Args:
+        status: DetectionService.get_processing_status()的结果
+        jobs: 分析任务队列统计(AnalysisJobQueue.stats())
+        prefix: 指标名前缀
+    Returns:
+        str: text/plain; version=0.0.4
+    """
+    families = {}
+
+    def add(name, kind, help_text, labels, value):
+        family = families.setdefault(f"{prefix}_{name}", (kind, help_text, []))
+        family[2].append((labels, value))
+
+    states = {}
+    for camera_id, camera in status.items():
+        states[camera.get('status')] = states.get(camera.get('status'), 0) + 1
+        pipeline = camera.get('pipeline') or {}
+        camera_label = str(camera_id)
+
+        if 'frames' in pipeline:
+            add('frames_total', 'counter', 'Frames published to the pipeline stages',
+                {'camera': camera_label}, pipeline['frames'])
+        for queue_name, queue in (pipeline.get('queues') or {}).items():
+            labels = {'camera': camera_label, 'queue': queue_name}
+            add('queue_depth', 'gauge', 'Items waiting in the stage queue', labels, queue.get('depth', 0))
+            add('queue_enqueued_total', 'counter', 'Items put into the stage queue',
+                labels, queue.get('enqueued', 0))
+            add('queue_dropped_total', 'counter', 'Frames dropped by the stage queue',
+                labels, queue.get('dropped', 0))
+            add('queue_blocked_seconds_total', 'counter', 'Time producers spent blocked on the stage queue',
+                labels, float(queue.get('blocked_seconds', 0.0)))
+
+        metrics = pipeline.get('metrics') or {}
+        for stage, histogram in (metrics.get('stages') or {}).items():
+            add('stage_seconds', 'histogram', 'Per-frame processing time of each pipeline stage',
+                {'camera': camera_label, 'stage': stage}, histogram)
+        reconnect = (pipeline.get('source') or {}).get('reconnect')
+        if reconnect:
+            labels = {'camera': camera_label}
+            add('stream_disconnects_total', 'counter', 'Stream disconnects detected', labels,
+                reconnect.get('disconnects', 0))
+            add('stream_reconnects_total', 'counter', 'Successful warm stream reconnects', labels,
+                reconnect.get('reconnects', 0))
+            add('stream_reconnect_attempts_total', 'counter', 'Stream reconnect attempts', labels,
+                reconnect.get('attempts', 0))
+            add('stream_downtime_seconds_total', 'counter', 'Time spent without a stream connection', labels,
+                float(reconnect.get('downtime_seconds', 0.0)))
+        cascade = pipeline.get('cascade')
+        if cascade:
+            labels = {'camera': camera_label}
+            add('cascade_frames_total', 'counter', 'Frames checked by the first cascade stage', labels,
+                cascade.get('frames', 0))
+            add('cascade_runs_total', 'counter', 'Second cascade stage runs', labels, cascade.get('runs', 0))
+            for reason, crops in (cascade.get('crops') or {}).items():
+                add('cascade_crops_total', 'counter', 'Regions re-checked by the second cascade stage',
+                    {'camera': camera_label, 'reason': reason}, crops)
+        for counter, value in (metrics.get('counters') or {}).items():
+            if counter.startswith('db_writes.'):
+                add('db_writes_total', 'counter', 'Database commits by table',
+                    {'camera': camera_label, 'table': counter.split('.', 1)[1]}, value)
+
+    add('active_cameras', 'gauge', 'Cameras with an active detection pipeline', {}, len(status))
+    for state, total in states.items():
+        add('cameras', 'gauge', 'Cameras by processing status', {'status': state}, total)
+    if jobs is not None:
+        for state in ('queued', 'running'):
+            add('analysis_jobs', 'gauge', 'File analysis jobs by state', {'state': state}, jobs.get(state, 0))
+
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if kind != 'histogram':
+                lines.append(f"{name}{_labels(**labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(LatencyHistogram.BUCKETS + ('+Inf',), value['buckets']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(**labels)} {_number(float(value['sum']))}")
+            lines.append(f"{name}_count{_labels(**labels)} {_number(value['count'])}")
+    return '\n'.join(lines) + '\n'
+
+
+# 进程级共享实例(工作进程中各自一份，经状态快照传回)
+metrics = PipelineMetrics()
@@ -0,0 +1,120 @@
+"""
+模型导出与缓存工具 (ModelExporter)
+
+主要功能：
+1. ONNX导出：
+   - 将PyTorch(.pt)模型导出为ONNX格式，供ONNX Runtime在CPU上推理
+   - 导出为动态输入(dynamic)，支持批量推理和不同分辨率
+   - 每个模型只导出一次，后续启动直接复用
+
+2. 导出缓存：
+   - 缓存目录：app/assets/model_cache (与app/assets/models同级)
+   - 缓存文件名：<模型名>_<模型哈希>_<输入尺寸>.onnx
+   - 模型文件内容变化后哈希改变，自动重新导出
+
+工作流程：
+1. 查询缓存：
+   ModelExporter.export_onnx(model_path)
+   -> 计算模型文件哈希
+   -> 缓存文件存在：直接返回路径
+   -> 不存在：在临时目录中导出 -> 原子移动到缓存目录 -> 返回路径
+
+配置项：
+- MODEL_CACHE_DIR: 导出缓存目录，默认app/assets/model_cache
+- ONNX_EXPORT_IMGSZ: 导出输入尺寸，默认640
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): onnx后端加载导出模型
+- [`ModelRegistry`](app/utils/model_registry.py): 同一模型只会被加载(导出)一次
+
+注意事项：
+1. 导出需要安装onnx，推理需要安装onnxruntime
+2. 导出在临时目录中进行，不会覆盖模型目录中的同名文件
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from ultralytics import YOLO  # type: ignore
+
+
+class ModelExporter:
+    # 导出缓存目录
+    CACHE_DIR = os.getenv(
+        'MODEL_CACHE_DIR',
+        os.path.abspath(os.path.join(os.path.dirname(__file__), '../assets/model_cache'))
+    )
+    # 导出输入尺寸
+    EXPORT_IMGSZ = int(os.getenv('ONNX_EXPORT_IMGSZ', '640'))
+    # 哈希长度
+    HASH_LENGTH = 16
+
+    # 进程内导出锁(同一时刻只导出一个模型)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def model_hash(model_path):
+        """计算模型文件内容哈希"""
+        digest = hashlib.sha256()
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()[:ModelExporter.HASH_LENGTH]
+
+    @staticmethod
+    def cache_path(model_path, imgsz=None, suffix='.onnx', cache_dir=None):
+        """
+        获取导出文件的缓存路径
+        Args:
+            model_path: 源模型文件路径
+            imgsz: 导出输入尺寸
+            suffix: 缓存文件后缀(如.onnx/.int8.onnx)
+            cache_dir: 缓存目录，默认CACHE_DIR
+        Returns:
+            str: 缓存文件路径
+        """
+        imgsz = imgsz or ModelExporter.EXPORT_IMGSZ
+        name = os.path.splitext(os.path.basename(model_path))[0]
+        filename = f"{name}_{ModelExporter.model_hash(model_path)}_{imgsz}{suffix}"
+        return os.path.join(cache_dir or ModelExporter.CACHE_DIR, filename)
+
+    @staticmethod
+    def export_onnx(model_path, imgsz=None, cache_dir=None):
+        """
+        导出ONNX模型(已缓存时直接返回)
+        Args:
+            model_path: PyTorch模型文件路径
+            imgsz: 导出输入尺寸
+            cache_dir: 缓存目录
+        Returns:
+            str: ONNX模型文件路径
+        """
+        imgsz = imgsz or ModelExporter.EXPORT_IMGSZ
+        cache_dir = cache_dir or ModelExporter.CACHE_DIR
+        target = ModelExporter.cache_path(model_path, imgsz, '.onnx', cache_dir)
+        if os.path.exists(target):
+            return target
+
+        with ModelExporter._lock:
+            if os.path.exists(target):
+                return target
+
+            os.makedirs(cache_dir, exist_ok=True)
+            work_dir = tempfile.mkdtemp(prefix='export_', dir=cache_dir)
+            try:
+                # 在临时目录中导出，避免写入模型目录
+                source = os.path.join(work_dir, os.path.basename(model_path))
+                shutil.copyfile(model_path, source)
+                print(f"Exporting {model_path} to ONNX (imgsz={imgsz})...")
+                exported = YOLO(source).export(format='onnx', imgsz=imgsz, dynamic=True, verbose=False)
+                if not exported or not os.path.exists(exported):
+                    raise Exception(f"ONNX export produced no file for {model_path}")
+                os.replace(exported, target)
+            except Exception as e:
+                raise Exception(f"ONNX export failed: {str(e)}")
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        return target
@@ -0,0 +1,278 @@
+"""
+YOLO模型注册表 (ModelRegistry)
+
+主要功能：
+1. 模型共享：
+   - 以(模型文件, 设备, 推理后端)为键，进程内每个模型只加载一次
+   - 向检测线程发放模型句柄(ModelHandle)
+   - 每个句柄持有独立的推理器(predictor)，共享同一份权重
+
+2. 模型预热：
+   - 首次加载后执行一次空白帧推理
+   - 完成算子融合、内存分配等一次性开销，避免首帧延迟
+
+3. 内存管理：
+   - 统计每个模型的常驻内存
+   - 超出内存预算时按LRU顺序淘汰空闲模型
+   - 正在被使用的模型(引用计数>0)不会被淘汰
+
+工作流程：
+1. 获取句柄：
+   handle = model_registry.acquire(model_path, device, backend, loader)
+   -> 命中缓存：引用计数+1
+   -> 未命中：调用loader加载 -> 预热 -> 登记
+
+2. 使用模型：
+   handle.model.track(...) / handle.model.predict(...)
+
+3. 释放句柄：
+   handle.release()
+   -> 引用计数-1
+   -> 检查内存预算，淘汰空闲模型
+
+配置项：
+- MODEL_REGISTRY_MAX_MEMORY_MB: 模型常驻内存预算(MB)，默认2048
+- MODEL_REGISTRY_WARMUP: 是否在加载后预热(true/false)，默认true
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 通过注册表获取模型
+- [`DetectionService`](app/services/detection_service.py): 查询注册表状态
+
+注意事项：
+1. 句柄必须释放，推荐使用with语句
+2. 不同线程不能共用同一个句柄(跟踪器状态保存在predictor中)
+"""
+
+import copy
+import os
+import threading
+import time
+
+
+class ModelHandle:
+    """
+    模型句柄
+    持有注册表中某个模型的独立视图，释放后不可再使用
+    """
+
+    def __init__(self, registry, key, model):
+        self._registry = registry
+        self.key = key
+        self._model = model
+        self._released = False
+
+    @property
+    def model(self):
+        if self._released:
+            raise RuntimeError(f"Model handle already released: {self.key}")
+        return self._model
+
+    def release(self):
+        """释放句柄，重复调用无副作用"""
+        if self._released:
+            return
+        self._released = True
+        self._model = None
+        self._registry.release(self.key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class _RegistryEntry:
+    """注册表条目：保存已加载的主模型及其使用情况"""
+
+    def __init__(self, key):
+        self.key = key
+        self.model = None
+        self.ref_count = 0
+        self.memory_bytes = 0
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.last_used = time.time()
+        self.loaded = threading.Event()
+        self.error = None
+
+
+class ModelRegistry:
+    # 内存预算(MB)
+    MAX_MEMORY_MB = int(os.getenv('MODEL_REGISTRY_MAX_MEMORY_MB', '2048'))
+    # 加载后是否预热
+    WARMUP = os.getenv('MODEL_REGISTRY_WARMUP', 'true').lower() == 'true'
+    # 预热输入尺寸
+    WARMUP_IMGSZ = 640
+
+    def __init__(self, max_memory_mb=None):
+        self.max_memory_mb = max_memory_mb if max_memory_mb is not None else self.MAX_MEMORY_MB
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, model_path, device='cpu', backend='pytorch', loader=None, warmup=None):
+        """
+        获取模型句柄
+        Args:
+            model_path: 模型文件绝对路径
+            device: 推理设备(cpu/cuda)
+            backend: 推理后端
+            loader: 加载函数 loader(model_path, device) -> model
+            warmup: 是否预热，默认使用WARMUP配置
+        Returns:
+            ModelHandle: 模型句柄
+        """
+        key = (model_path, device, backend)
+        with self._lock:
+            entry = self._entries.get(key)
+            is_owner = entry is None
+            if is_owner:
+                entry = _RegistryEntry(key)
+                self._entries[key] = entry
+            entry.ref_count += 1
+            entry.last_used = time.time()
+
+        if is_owner:
+            self._load_entry(entry, loader, warmup)
+        else:
+            entry.loaded.wait()
+
+        if entry.error is not None:
+            self._discard_failed(entry)
+            raise entry.error
+
+        return ModelHandle(self, key, self._worker_view(entry.model))
+
+    def release(self, key):
+        """归还模型句柄，并按内存预算淘汰空闲模型"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.ref_count = max(0, entry.ref_count - 1)
+            entry.last_used = time.time()
+        self.evict_idle()
+
+    def evict_idle(self):
+        """
+        按LRU顺序淘汰空闲模型，直到常驻内存不超过预算
+        Returns:
+            list: 被淘汰的模型键
+        """
+        budget = self.max_memory_mb * 1024 * 1024
+        evicted = []
+        with self._lock:
+            total = sum(e.memory_bytes for e in self._entries.values())
+            idle = sorted(
+                (e for e in self._entries.values() if e.ref_count == 0 and e.loaded.is_set()),
+                key=lambda e: e.last_used
+            )
+            for entry in idle:
+                if total <= budget:
+                    break
+                del self._entries[entry.key]
+                total -= entry.memory_bytes
+                evicted.append(entry.key)
+        return evicted
+
+    def clear(self):
+        """清空所有空闲模型"""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.ref_count == 0]:
+                del self._entries[key]
+
+    def stats(self):
+        """获取注册表状态"""
+        with self._lock:
+            models = [{
+                'model_path': entry.key[0],
+                'device': entry.key[1],
+                'backend': entry.key[2],
+                'ref_count': entry.ref_count,
+                'memory_mb': round(entry.memory_bytes / (1024 * 1024), 2),
+                'load_seconds': round(entry.load_seconds, 3),
+                'warmup_seconds': round(entry.warmup_seconds, 3),
+                'last_used': entry.last_used
+            } for entry in self._entries.values() if entry.loaded.is_set() and entry.error is None]
+        return {
+            'max_memory_mb': self.max_memory_mb,
+            'used_memory_mb': round(sum(m['memory_mb'] for m in models), 2),
+            'models': models
+        }
+
+    def _load_entry(self, entry, loader, warmup):
+        """加载并预热模型，结果写入条目"""
+        try:
+            if loader is None:
+                raise ValueError("Model loader is required for first acquire")
+            start = time.time()
+            model = loader(entry.key[0], entry.key[1])
+            entry.load_seconds = time.time() - start
+
+            if self.WARMUP if warmup is None else warmup:
+                start = time.time()
+                self._warmup(model, entry.key[1])
+                entry.warmup_seconds = time.time() - start
+
+            entry.model = model
+            entry.memory_bytes = self._estimate_memory(model, entry.key[0])
+        except Exception as e:
+            entry.error = e
+        finally:
+            entry.loaded.set()
+
+        if entry.error is None:
+            self.evict_idle()
+
+    def _discard_failed(self, entry):
+        """移除加载失败的条目，下次获取时重新加载"""
+        with self._lock:
+            entry.ref_count = max(0, entry.ref_count - 1)
+            if self._entries.get(entry.key) is entry and entry.ref_count == 0:
+                del self._entries[entry.key]
+
+    def _warmup(self, model, device):
+        """使用空白帧执行一次推理"""
+        import numpy as np
+        frame = np.zeros((self.WARMUP_IMGSZ, self.WARMUP_IMGSZ, 3), dtype=np.uint8)
+        model.predict(frame, device=device, imgsz=self.WARMUP_IMGSZ, verbose=False)
+
+    @staticmethod
+    def _estimate_memory(model, model_path):
+        """估算模型常驻内存：优先统计参数和缓冲区，否则使用文件大小"""
+        try:
+            module = getattr(model, 'model', None)
+            if isinstance(module, str) and os.path.isfile(module):
+                # 导出格式(如ONNX)的模型只保存文件路径
+                return os.path.getsize(module)
+            if module is not None and hasattr(module, 'parameters'):
+                total = sum(p.numel() * p.element_size() for p in module.parameters())
+                total += sum(b.numel() * b.element_size() for b in module.buffers())
+                if total > 0:
+                    return int(total)
+        except Exception:
+            pass
+        try:
+            return os.path.getsize(model_path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _worker_view(model):
+        """
+        创建共享权重的模型视图
+        每个视图有独立的predictor/回调/参数覆盖，跟踪器状态互不干扰
+        """
+        view = copy.copy(model)
+        view.predictor = None
+        callbacks = getattr(model, 'callbacks', None)
+        if isinstance(callbacks, dict):
+            view.callbacks = {event: list(funcs) for event, funcs in callbacks.items()}
+        overrides = getattr(model, 'overrides', None)
+        if isinstance(overrides, dict):
+            view.overrides = dict(overrides)
+        return view
+
+
+# 进程级共享实例
+model_registry = ModelRegistry()
@@ -0,0 +1,194 @@
+"""
+运动检测、关键帧调度与运动门控 (MotionDetector / KeyframeScheduler / MotionGate)
+
+主要功能：
+1. 运动检测(MotionDetector)：
+   - 将帧缩小并转为灰度，与上一帧做差分
+   - 运动分数 = 变化像素占比(0~1)
+   - 计算量与原始分辨率无关，开销远小于一次检测
+
+2. 关键帧调度(KeyframeScheduler)：
+   - 每隔interval帧执行一次完整检测(关键帧)
+   - 运动分数超过阈值时提前触发关键帧(车辆进入、场景突变)
+   - 非关键帧由跟踪器的运动模型(卡尔曼滤波)外推目标位置
+
+3. 运动门控(MotionGate)：
+   - 与上一次处理的帧比较，画面无变化时跳过检测，直接复用上一帧结果
+   - 与参考帧(而非相邻帧)比较，缓慢移动的车辆累积变化后仍会触发检测
+   - 连续跳过帧数达到上限时强制检测一次，避免长时间不更新
+
+工作流程：
+   gate.should_detect(frame)
+   -> False：复用上一帧结果(静止画面)
+   -> True：scheduler.is_keyframe(frame)
+            -> True：YOLO检测 + 跟踪器更新
+            -> False：跟踪器外推(CameraTracker.propagate)
+
+配置项：
+- MOTION_WIDTH: 运动检测缩放宽度，默认160
+- MOTION_PIXEL_THRESHOLD: 像素灰度变化阈值，默认25
+- MOTION_GATE_MAX_SKIP: 运动门控最多连续跳过帧数，默认250
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 逐帧调度检测
+- [`CameraTracker`](app/utils/inference_engine.py): 非关键帧的跟踪外推
+
+注意事项：
+1. KeyframeScheduler每帧都需要调用，保证差分基准为相邻帧
+2. interval=1时不做运动检测，与逐帧检测完全一致
+3. 门控阈值为变化像素占比，越小越灵敏；夜间噪点较多时可适当调大
+"""
+
+import os
+import cv2
+
+
+class MotionDetector:
+    """基于缩小灰度帧差分的运动检测"""
+
+    # 运动检测缩放宽度
+    WIDTH = int(os.getenv('MOTION_WIDTH', '160'))
+    # 像素灰度变化阈值
+    PIXEL_THRESHOLD = int(os.getenv('MOTION_PIXEL_THRESHOLD', '25'))
+
+    def __init__(self, width=None, pixel_threshold=None):
+        self.width = width or self.WIDTH
+        self.pixel_threshold = pixel_threshold if pixel_threshold is not None else self.PIXEL_THRESHOLD
+        self._previous = None
+
+    def prepare(self, frame):
+        """缩小并转为模糊灰度图"""
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, int(height * self.width / width)))
+        gray = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def difference(self, gray, reference):
+        """计算两幅预处理灰度图之间的变化像素占比"""
+        if reference is None or reference.shape != gray.shape:
+            return 1.0
+        diff = cv2.absdiff(gray, reference)
+        return cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1]) / diff.size
+
+    def score(self, frame):
+        """
+        计算与上一帧相比的运动分数
+        Args:
+            frame: BGR图像
+        Returns:
+            float: 变化像素占比，第一帧返回1.0
+        """
+        gray = self.prepare(frame)
+        previous, self._previous = self._previous, gray
+        return self.difference(gray, previous)
+
+    def reset(self):
+        """清除差分基准"""
+        self._previous = None
+
+
+class KeyframeScheduler:
+    """关键帧调度：固定间隔 + 运动触发"""
+
+    def __init__(self, interval=1, motion_threshold=None):
+        """
+        Args:
+            interval: 关键帧间隔(帧)，1表示逐帧检测
+            motion_threshold: 触发关键帧的运动分数，None或0表示不按运动触发
+        """
+        self.interval = max(1, int(interval or 1))
+        self.motion_threshold = motion_threshold or None
+        self.motion = MotionDetector() if self.interval > 1 and self.motion_threshold else None
+        self._since_keyframe = None
+
+        # 统计信息
+        self.keyframes = 0
+        self.propagated = 0
+        self.motion_triggered = 0
+
+    def is_keyframe(self, frame):
+        """判断当前帧是否需要完整检测"""
+        if self.interval == 1:
+            self.keyframes += 1
+            return True
+
+        score = self.motion.score(frame) if self.motion is not None else 0.0
+        due = self._since_keyframe is None or self._since_keyframe + 1 >= self.interval
+        triggered = not due and self.motion_threshold is not None and score >= self.motion_threshold
+        if not (due or triggered):
+            self._since_keyframe += 1
+            self.propagated += 1
+            return False
+
+        if triggered:
+            self.motion_triggered += 1
+        self._since_keyframe = 0
+        self.keyframes += 1
+        return True
+
+    def force_keyframe(self):
+        """下一帧强制执行完整检测"""
+        self._since_keyframe = None
+
+    def stats(self):
+        """获取调度统计信息"""
+        total = self.keyframes + self.propagated
+        return {
+            'interval': self.interval,
+            'motion_threshold': self.motion_threshold,
+            'keyframes': self.keyframes,
+            'propagated': self.propagated,
+            'motion_triggered': self.motion_triggered,
+            'detect_ratio': round(self.keyframes / total, 3) if total else 1.0
+        }
+
+
+class MotionGate:
+    """运动门控：画面静止时跳过检测"""
+
+    # 最多连续跳过帧数
+    MAX_SKIP = int(os.getenv('MOTION_GATE_MAX_SKIP', '250'))
+
+    def __init__(self, threshold, max_skip=None):
+        """
+        Args:
+            threshold: 门控阈值(变化像素占比)，低于该值视为静止
+            max_skip: 最多连续跳过帧数
+        """
+        self.threshold = float(threshold)
+        self.max_skip = max_skip if max_skip is not None else self.MAX_SKIP
+        self.motion = MotionDetector()
+        self._reference = None
+        self._skip_run = 0
+
+        # 统计信息
+        self.frames = 0
+        self.skipped = 0
+
+    def should_detect(self, frame):
+        """
+        判断当前帧是否需要检测
+        Returns:
+            bool: False表示画面静止，可复用上一帧结果
+        """
+        self.frames += 1
+        gray = self.motion.prepare(frame)
+        if (self._reference is not None and self._skip_run < self.max_skip
+                and self.motion.difference(gray, self._reference) < self.threshold):
+            self._skip_run += 1
+            self.skipped += 1
+            return False
+
+        # 需要检测的帧作为新的比较基准
+        self._reference = gray
+        self._skip_run = 0
+        return True
+
+    def stats(self):
+        """获取门控统计信息"""
+        return {
+            'threshold': self.threshold,
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'skip_ratio': round(self.skipped / self.frames, 3) if self.frames else 0.0
+        }
@@ -0,0 +1,228 @@
+"""
+视频流处理流水线 (StreamPipeline)
+
+主要功能：
+1. 有界队列(StageQueue)：
+   - 各处理阶段之间通过有界队列连接
+   - 支持两种满队列策略：
+     latest - 丢弃最旧的元素，保留最新帧(适用于推理、实时推送)
+     block  - 阻塞生产者，保证不丢帧(适用于录像、数据库写入)
+   - 统计队列深度、丢弃数量、阻塞时间
+
+2. 阶段线程(StreamPipeline)：
+   - 每个阶段一个独立线程，互不阻塞
+   - 单个阶段处理异常不会影响其他阶段
+   - 关闭时等待不丢帧的阶段处理完剩余数据
+
+典型流水线：
+   采集(capture) --latest--> 推理/跟踪
+                               |--latest--> 实时推送(live)
+                               |--block---> 违规/特殊车辆/数据库(events)
+                               |--block---> 视频录制(record)
+
+关联模块：
+- [`DetectionService`](app/services/detection_service.py): 组装检测流水线
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 采集队列
+
+注意事项：
+1. block策略的队列满时会对上游形成背压，容量需按内存预算设置
+2. 各阶段处理函数需自行保证线程安全
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class StageQueue:
+    """带丢帧策略的有界队列"""
+
+    POLICIES = ('latest', 'block')
+
+    # 队列关闭后get()返回的标记
+    CLOSED = object()
+
+    def __init__(self, name, maxsize, policy='block'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Invalid drop policy: {policy}")
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # 统计信息
+        self.enqueued = 0
+        self.dropped = 0
+        self.blocked_seconds = 0.0
+
+    def put(self, item, timeout=None):
+        """
+        放入元素
+        Returns:
+            bool: 是否放入成功(队列关闭或阻塞超时返回False)
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                if self.policy == 'latest':
+                    self._items.popleft()
+                    self.dropped += 1
+                else:
+                    start = time.monotonic()
+                    deadline = None if timeout is None else start + timeout
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    self.blocked_seconds += time.monotonic() - start
+                    if self._closed or len(self._items) >= self.maxsize:
+                        return False
+            self._items.append(item)
+            self.enqueued += 1
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """
+        取出元素
+        Returns:
+            队列关闭且为空时返回StageQueue.CLOSED，超时返回None
+        """
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._items:
+                if self._closed:
+                    return self.CLOSED
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self, discard=False):
+        """关闭队列，discard=True时丢弃剩余元素"""
+        with self._cond:
+            self._closed = True
+            if discard:
+                self.dropped += len(self._items)
+                self._items.clear()
+            self._cond.notify_all()
+
+    @property
+    def depth(self):
+        return len(self._items)
+
+    def stats(self):
+        """获取队列统计信息"""
+        with self._cond:
+            return {
+                'depth': len(self._items),
+                'capacity': self.maxsize,
+                'policy': self.policy,
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'blocked_seconds': round(self.blocked_seconds, 3)
+            }
+
+
+class StreamPipeline:
+    """单个摄像头的多阶段处理流水线"""
+
+    def __init__(self, camera_id, wrap=None):
+        """
+        Args:
+            camera_id: 摄像头ID
+            wrap: 可选，包装阶段线程函数(如绑定应用上下文)
+        """
+        self.camera_id = camera_id
+        self._wrap = wrap
+        self.frames = 0
+        self._queues = {}
+        self._stages = []  # (queue, handler, thread)
+        self._errors = {}
+        self._extra_stats = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, handler, maxsize, policy='block'):
+        """
+        添加处理阶段
+        Args:
+            name: 阶段名称
+            handler: 处理函数 handler(item)
+            maxsize: 输入队列容量
+            policy: 满队列策略(latest/block)
+        """
+        queue = StageQueue(name, maxsize, policy)
+        thread = threading.Thread(
+            target=self._wrap(self._run_stage) if self._wrap else self._run_stage,
+            args=(queue, handler),
+            daemon=True,
+            name=f"camera-{self.camera_id}-{name}"
+        )
+        self._queues[name] = queue
+        self._stages.append((queue, handler, thread))
+        return queue
+
+    def register_queue(self, queue):
+        """登记由外部线程消费的队列(仅用于统计)"""
+        with self._lock:
+            self._queues[queue.name] = queue
+
+    def register_stats(self, name, provider):
+        """登记附加统计项，provider()的返回值以name为键出现在stats()中"""
+        with self._lock:
+            self._extra_stats[name] = provider
+
+    def start(self):
+        """启动所有阶段线程"""
+        for _, _, thread in self._stages:
+            thread.start()
+
+    def publish(self, item):
+        """将一帧结果分发给所有阶段"""
+        self.frames += 1
+        for queue, _, _ in self._stages:
+            queue.put(item)
+
+    def close(self, timeout=None):
+        """
+        关闭流水线
+        latest队列直接丢弃剩余帧，block队列等待处理完毕
+        """
+        for queue, _, _ in self._stages:
+            queue.close(discard=queue.policy == 'latest')
+        for _, _, thread in self._stages:
+            if thread.is_alive():
+                thread.join(timeout)
+
+    def stats(self):
+        """获取各队列深度和丢帧统计"""
+        with self._lock:
+            queues = {name: queue.stats() for name, queue in self._queues.items()}
+            errors = dict(self._errors)
+            extra = dict(self._extra_stats)
+        return {
+            'frames': self.frames,
+            'queues': queues,
+            'errors': errors,
+            **{name: provider() for name, provider in extra.items()}
+        }
+
+    def _run_stage(self, queue, handler):
+        """阶段线程主循环"""
+        while True:
+            item = queue.get()
+            if item is StageQueue.CLOSED:
+                break
+            try:
+                handler(item)
+            except Exception as e:
+                with self._lock:
+                    self._errors[queue.name] = self._errors.get(queue.name, 0) + 1
+                print(f"Pipeline stage {queue.name} error (camera {self.camera_id}): {str(e)}")
@@ -0,0 +1,391 @@
+"""
+INT8量化推理工具 (ModelQuantizer)
+
+主要功能：
+1. 校准数据采样：
+   - 从DetectionService按小时保存的录像(save_dir/camera_<id>_*.mp4)中均匀抽帧
+   - 校准帧与评估帧错开采样，评估不使用参与校准的帧
+
+2. 静态量化：
+   - 基于ONNX导出模型(见ModelExporter)执行ONNX Runtime静态量化(QDQ格式)
+   - 权重INT8(按通道)，激活UINT8
+   - 检测头(Detect)的卷积分支(cv2/cv3)参与量化，只有解码部分保持FP32，避免坐标精度损失：
+     DFL分布积分(dfl/)和检测头模块直属的Concat/Split/Sigmoid/Mul/Add等框解码、锚点生成节点
+   - 量化模型与ONNX模型缓存在同一目录：<模型名>_<模型哈希>_<输入尺寸>.int8.onnx
+
+3. 精度/速度报告：
+   - 按摄像头分别评估，便于逐个摄像头决定是否启用INT8
+   - 按类别统计FP32与INT8检测结果的一致性(同类别IoU匹配)
+   - 统计FP32与INT8的单帧推理帧率及加速比
+
+工作流程：
+1. 生成量化模型和报告：
+   POST /detection/quantize
+   -> DetectionService.quantize_model()
+   -> ModelQuantizer.build_report()
+   -> 抽取校准帧 -> 导出ONNX -> 静态量化
+   -> 抽取评估帧 -> FP32/INT8分别推理 -> 对比
+   -> 报告保存为<量化模型>.report.json
+
+2. 启用量化模型：
+   摄像头inference_backend设为onnx-int8
+   -> YOLOIntegration加载缓存的量化模型
+
+配置项：
+- QUANT_CALIBRATION_FRAMES: 校准帧数，默认200
+- QUANT_EVAL_FRAMES: 每个摄像头的评估帧数，默认100
+- QUANT_IOU_THRESHOLD: 一致性匹配IoU阈值，默认0.5
+
+关联模块：
+- [`ModelExporter`](app/utils/model_export.py): ONNX导出和缓存路径
+- [`YOLOIntegration`](app/utils/yolo_integration.py): onnx-int8后端
+- [`DetectionService`](app/services/detection_service.py): 录像目录和接口
+
+注意事项：
+1. 需要安装onnx和onnxruntime
+2. 校准帧应覆盖白天/夜间等典型场景，录像越多样量化效果越好
+"""
+
+import glob
+import json
+import os
+import re
+import shutil
+import time
+import cv2
+import numpy as np
+from ultralytics import YOLO  # type: ignore
+from app.utils.model_export import ModelExporter
+
+
+class _FrameCalibrationReader:
+    """ONNX Runtime校准数据读取器：逐帧提供预处理后的输入"""
+
+    def __init__(self, input_name, frames, imgsz):
+        self.input_name = input_name
+        self.frames = frames
+        self.imgsz = imgsz
+        self._index = 0
+
+    def get_next(self):
+        if self._index >= len(self.frames):
+            return None
+        frame = self.frames[self._index]
+        self._index += 1
+        return {self.input_name: ModelQuantizer.preprocess(frame, self.imgsz)}
+
+    def rewind(self):
+        self._index = 0
+
+
+class ModelQuantizer:
+    # 校准帧数
+    CALIBRATION_FRAMES = int(os.getenv('QUANT_CALIBRATION_FRAMES', '200'))
+    # 每个摄像头的评估帧数
+    EVAL_FRAMES = int(os.getenv('QUANT_EVAL_FRAMES', '100'))
+    # 一致性匹配IoU阈值
+    IOU_THRESHOLD = float(os.getenv('QUANT_IOU_THRESHOLD', '0.5'))
+    # 量化模型缓存后缀
+    SUFFIX = '.int8.onnx'
+
+    @staticmethod
+    def recording_files(save_dir, camera_id=None):
+        """获取摄像头录像文件列表"""
+        pattern = f"camera_{camera_id}_*.mp4" if camera_id is not None else "camera_*_*.mp4"
+        return sorted(glob.glob(os.path.join(save_dir, pattern)))
+
+    @staticmethod
+    def recorded_cameras(save_dir):
+        """获取录像目录中出现的摄像头ID"""
+        cameras = set()
+        for path in ModelQuantizer.recording_files(save_dir):
+            match = re.match(r'camera_(\d+)_', os.path.basename(path))
+            if match:
+                cameras.add(int(match.group(1)))
+        return sorted(cameras)
+
+    @staticmethod
+    def sample_frames(save_dir, camera_id=None, count=None, offset=0.0):
+        """
+        从录像中均匀抽帧
+        Args:
+            save_dir: 录像目录
+            camera_id: 摄像头ID，None表示所有摄像头
+            count: 抽帧数量
+            offset: 采样偏移(0~1个采样间隔)，用于错开校准帧和评估帧
+        Returns:
+            list: BGR图像列表
+        """
+        count = count or ModelQuantizer.CALIBRATION_FRAMES
+        sources = []
+        for path in ModelQuantizer.recording_files(save_dir, camera_id):
+            cap = cv2.VideoCapture(path)
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            cap.release()
+            if total > 0:
+                sources.append((path, total))
+
+        total_frames = sum(total for _, total in sources)
+        if total_frames == 0:
+            return []
+
+        # 在所有录像拼接后的帧序列上均匀取点
+        step = total_frames / min(count, total_frames)
+        positions = [int((i + offset) * step) for i in range(min(count, total_frames))]
+
+        frames = []
+        start = 0
+        for path, total in sources:
+            indices = [p - start for p in positions if start <= p < start + total]
+            start += total
+            if not indices:
+                continue
+            cap = cv2.VideoCapture(path)
+            try:
+                for index in indices:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+                    ret, frame = cap.read()
+                    if ret:
+                        frames.append(frame)
+            finally:
+                cap.release()
+        return frames
+
+    @staticmethod
+    def preprocess(frame, imgsz):
+        """与推理时一致的预处理：letterbox -> RGB -> CHW -> 归一化"""
+        from ultralytics.data.augment import LetterBox  # type: ignore
+
+        image = LetterBox((imgsz, imgsz), auto=False)(image=frame)
+        image = image[..., ::-1].transpose(2, 0, 1)
+        return np.ascontiguousarray(image, dtype=np.float32)[None] / 255.0
+
+    @staticmethod
+    def int8_path(model_path, imgsz=None, cache_dir=None):
+        """获取量化模型缓存路径(文件可能尚未生成)"""
+        return ModelExporter.cache_path(model_path, imgsz, ModelQuantizer.SUFFIX, cache_dir)
+
+    @staticmethod
+    def quantize(model_path, frames, imgsz=None, cache_dir=None):
+        """
+        使用校准帧生成INT8量化模型
+        Args:
+            model_path: PyTorch模型文件路径
+            frames: 校准帧列表
+            imgsz: 输入尺寸
+            cache_dir: 缓存目录
+        Returns:
+            str: 量化模型路径
+        """
+        import onnx  # type: ignore
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static  # type: ignore
+
+        if not frames:
+            raise ValueError("No calibration frames available")
+
+        imgsz = imgsz or ModelExporter.EXPORT_IMGSZ
+        fp32_path = ModelExporter.export_onnx(model_path, imgsz, cache_dir)
+        target = ModelQuantizer.int8_path(model_path, imgsz, cache_dir)
+
+        fp32_model = onnx.load(fp32_path)
+        input_name = fp32_model.graph.input[0].name
+        temp_path = target + '.tmp'
+        try:
+            quantize_static(
+                fp32_path,
+                temp_path,
+                _FrameCalibrationReader(input_name, frames, imgsz),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+                nodes_to_exclude=ModelQuantizer._head_nodes(fp32_model)
+            )
+
+            # 保留Ultralytics元数据(类别名、步长、输入尺寸)
+            int8_model = onnx.load(temp_path)
+            del int8_model.metadata_props[:]
+            int8_model.metadata_props.extend(fp32_model.metadata_props)
+            onnx.save(int8_model, temp_path)
+            os.replace(temp_path, target)
+        except Exception as e:
+            raise Exception(f"INT8 quantization failed: {str(e)}")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            # 量化过程中生成的中间文件
+            shutil.rmtree(temp_path + '.data', ignore_errors=True)
+
+        return target
+
+    @staticmethod
+    def _head_nodes(model):
+        """
+        获取检测头(最后一个模块)解码部分的节点名称
+        卷积分支位于子模块下(如/model.22/cv2.0/...)，不排除；DFL(/model.22/dfl/...)和检测头直属节点
+        (如/model.22/Concat、/model.22/Sigmoid)为解码部分
+        """
+        index = -1
+        for node in model.graph.node:
+            match = re.match(r'/model\.(\d+)/', node.name)
+            if match:
+                index = max(index, int(match.group(1)))
+        prefix = f"/model.{index}/"
+        nodes = []
+        for node in model.graph.node:
+            if not node.name.startswith(prefix):
+                continue
+            path = node.name[len(prefix):]
+            if '/' not in path or path.startswith('dfl/'):
+                nodes.append(node.name)
+        return nodes
+
+    @staticmethod
+    def match_detections(reference, candidate, iou_threshold=None):
+        """
+        同类别按IoU贪心匹配检测框
+        Args:
+            reference: 基准检测 ndarray[N, 5] (x1, y1, x2, y2, cls)
+            candidate: 待比较检测 ndarray[M, 5]
+            iou_threshold: 匹配阈值
+        Returns:
+            dict: {cls: 匹配数量}
+        """
+        iou_threshold = ModelQuantizer.IOU_THRESHOLD if iou_threshold is None else iou_threshold
+        matched = {}
+        for cls_id in np.unique(reference[:, 4]) if len(reference) else []:
+            ref = reference[reference[:, 4] == cls_id, :4]
+            cand = candidate[candidate[:, 4] == cls_id, :4] if len(candidate) else np.zeros((0, 4))
+            if not len(cand):
+                continue
+
+            # IoU矩阵
+            lt = np.maximum(ref[:, None, :2], cand[None, :, :2])
+            rb = np.minimum(ref[:, None, 2:], cand[None, :, 2:])
+            inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+            area_ref = np.prod(ref[:, 2:] - ref[:, :2], axis=1)
+            area_cand = np.prod(cand[:, 2:] - cand[:, :2], axis=1)
+            iou = inter / (area_ref[:, None] + area_cand[None, :] - inter + 1e-9)
+
+            count = 0
+            while iou.size and iou.max() >= iou_threshold:
+                i, j = np.unravel_index(np.argmax(iou), iou.shape)
+                iou[i, :] = -1
+                iou[:, j] = -1
+                count += 1
+            matched[int(cls_id)] = count
+        return matched
+
+    @staticmethod
+    def compare(fp32_model, int8_model, frames, classes):
+        """
+        对比FP32与INT8模型
+        Args:
+            fp32_model: FP32模型
+            int8_model: INT8模型
+            frames: 评估帧列表
+            classes: 目标类别 {cls_id: name}
+        Returns:
+            dict: 帧率、加速比和按类别的一致性
+        """
+        class_ids = list(classes.keys())
+
+        def run(model):
+            # 预热一次，排除首帧初始化开销
+            model.predict(frames[0], classes=class_ids, verbose=False)
+            outputs = []
+            start = time.perf_counter()
+            for frame in frames:
+                result = model.predict(frame, classes=class_ids, verbose=False)[0]
+                boxes = result.boxes
+                outputs.append(np.concatenate([
+                    boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy()[:, None]
+                ], axis=1) if len(boxes) else np.zeros((0, 5)))
+            return outputs, time.perf_counter() - start
+
+        fp32_outputs, fp32_seconds = run(fp32_model)
+        int8_outputs, int8_seconds = run(int8_model)
+
+        stats = {cls_id: {'fp32': 0, 'int8': 0, 'matched': 0} for cls_id in class_ids}
+        for reference, candidate in zip(fp32_outputs, int8_outputs):
+            for cls_id, count in ModelQuantizer.match_detections(reference, candidate).items():
+                stats[cls_id]['matched'] += count
+            for cls_id in class_ids:
+                stats[cls_id]['fp32'] += int(np.sum(reference[:, 4] == cls_id))
+                stats[cls_id]['int8'] += int(np.sum(candidate[:, 4] == cls_id))
+
+        per_class = {}
+        for cls_id, item in stats.items():
+            total = item['fp32'] + item['int8']
+            per_class[classes[cls_id]] = {
+                **item,
+                # F1形式的一致性：两者均未检出时视为完全一致
+                'agreement': round(2 * item['matched'] / total, 4) if total else 1.0
+            }
+
+        fp32_fps = len(frames) / fp32_seconds if fp32_seconds else 0.0
+        int8_fps = len(frames) / int8_seconds if int8_seconds else 0.0
+        return {
+            'frames': len(frames),
+            'fp32_fps': round(fp32_fps, 2),
+            'int8_fps': round(int8_fps, 2),
+            'speedup': round(int8_fps / fp32_fps, 3) if fp32_fps else None,
+            'classes': per_class
+        }
+
+    @staticmethod
+    def build_report(model_path, save_dir, classes, camera_ids=None, calibration_frames=None,
+                     eval_frames=None, imgsz=None, cache_dir=None):
+        """
+        生成量化模型并输出按摄像头的精度/速度报告
+        Args:
+            model_path: PyTorch模型文件路径
+            save_dir: 录像目录
+            classes: 目标类别 {cls_id: name}
+            camera_ids: 参与校准和评估的摄像头，默认录像目录中的所有摄像头
+            calibration_frames: 校准帧数
+            eval_frames: 每个摄像头的评估帧数
+            imgsz: 输入尺寸
+            cache_dir: 缓存目录
+        Returns:
+            dict: 报告内容
+        """
+        imgsz = imgsz or ModelExporter.EXPORT_IMGSZ
+        calibration_frames = calibration_frames or ModelQuantizer.CALIBRATION_FRAMES
+        eval_frames = eval_frames or ModelQuantizer.EVAL_FRAMES
+        camera_ids = camera_ids or ModelQuantizer.recorded_cameras(save_dir)
+        if not camera_ids:
+            raise ValueError(f"No camera recordings found in {save_dir}")
+
+        # 校准帧在各摄像头间平均分配
+        per_camera = max(1, calibration_frames // len(camera_ids))
+        frames = []
+        for camera_id in camera_ids:
+            frames.extend(ModelQuantizer.sample_frames(save_dir, camera_id, per_camera))
+
+        int8_path = ModelQuantizer.quantize(model_path, frames, imgsz, cache_dir)
+        fp32_path = ModelExporter.export_onnx(model_path, imgsz, cache_dir)
+        fp32_model = YOLO(fp32_path, task='detect')
+        int8_model = YOLO(int8_path, task='detect')
+
+        cameras = {}
+        for camera_id in camera_ids:
+            # 错开半个采样间隔，评估帧不与校准帧重合
+            samples = ModelQuantizer.sample_frames(save_dir, camera_id, eval_frames, offset=0.5)
+            if samples:
+                cameras[str(camera_id)] = ModelQuantizer.compare(fp32_model, int8_model, samples, classes)
+
+        report = {
+            'model_path': model_path,
+            'fp32_path': fp32_path,
+            'int8_path': int8_path,
+            'imgsz': imgsz,
+            'calibration_frames': len(frames),
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'cameras': cameras
+        }
+        report_path = os.path.splitext(int8_path)[0] + '.report.json'
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        report['report_path'] = report_path
+        return report
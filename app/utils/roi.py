@@ -0,0 +1,153 @@
+"""
+推理感兴趣区域 (InferenceROI)
+
+主要功能：
+1. 区域配置：
+   - 显式指定：[x1, y1, x2, y2] (原始画面像素坐标)
+   - 自动推导："auto"，取所有禁停区域的外接矩形并向外扩展margin像素
+   - 未配置或无法推导时使用整帧
+
+2. 裁剪推理：
+   - 只将ROI区域送入检测器(numpy切片，不复制图像)
+   - 按ROI占整帧的比例缩小推理尺寸，目标在模型输入中的像素尺度不变，
+     计算量随ROI面积下降
+   - 检测框映射回整帧坐标后再进入跟踪器，
+     跟踪、违规检测(ViolationDetector)、画面标注均使用整帧坐标
+
+工作流程：
+   roi = InferenceROI.resolve(camera.inference_roi, camera.restricted_areas)
+   -> box = roi.box_for(frame.shape)
+   -> 引擎推理 frame[y1:y2, x1:x2]
+   -> InferenceROI.to_full_frame(result, frame, box)
+
+配置项：
+- DETECTION_ROI_MARGIN: 自动推导时的外扩像素，默认64
+
+关联模块：
+- [`YOLOIntegration`](app/utils/yolo_integration.py): 逐帧计算ROI
+- [`BatchInferenceEngine`](app/utils/inference_engine.py): 裁剪推理和坐标映射
+- [`Camera`](app/models/camera.py): inference_roi / restricted_areas配置
+
+注意事项：
+1. ROI外的车辆不会被检测，自动模式的margin需覆盖驶入禁停区域前的轨迹
+2. 画面分辨率变化时ROI按新尺寸重新裁剪
+3. 降分辨率解码(FrameSource)时ROI通过scaled()换算到缩小后的帧坐标
+"""
+
+import math
+import os
+
+
+class InferenceROI:
+    # 自动推导时的外扩像素
+    MARGIN = int(os.getenv('DETECTION_ROI_MARGIN', '64'))
+    # 推理尺寸对齐步长(模型最大下采样倍数)
+    STRIDE = 32
+
+    def __init__(self, box):
+        """
+        Args:
+            box: (x1, y1, x2, y2) 原始画面像素坐标
+        """
+        x1, y1, x2, y2 = (int(round(v)) for v in box)
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f"Invalid inference ROI: {box}")
+        self.box = (x1, y1, x2, y2)
+        self._clipped = {}
+
+    @staticmethod
+    def resolve(config, restricted_areas=None, margin=None):
+        """
+        根据摄像头配置创建ROI
+        Args:
+            config: None / [x1, y1, x2, y2] / "auto"
+            restricted_areas: 禁停区域列表(auto模式使用)
+            margin: 外扩像素
+        Returns:
+            InferenceROI: 未配置或无法推导时返回None
+        """
+        if not config:
+            return None
+        if config == 'auto':
+            points = [point for area in restricted_areas or [] for point in area.get('points', [])]
+            if not points:
+                return None
+            margin = InferenceROI.MARGIN if margin is None else margin
+            xs = [p[0] for p in points]
+            ys = [p[1] for p in points]
+            return InferenceROI((min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin))
+        if isinstance(config, (list, tuple)) and len(config) == 4:
+            return InferenceROI(config)
+        raise ValueError(f"Invalid inference ROI config: {config}")
+
+    def scaled(self, scale):
+        """
+        按帧缩放比例换算ROI(降分辨率解码时使用)
+        Returns:
+            InferenceROI: scale为1时返回自身
+        """
+        if scale == 1:
+            return self
+        x1, y1, x2, y2 = self.box
+        return InferenceROI((math.floor(x1 * scale), math.floor(y1 * scale),
+                             math.ceil(x2 * scale), math.ceil(y2 * scale)))
+
+    def box_for(self, shape):
+        """
+        获取裁剪到画面范围内的ROI
+        Args:
+            shape: 帧尺寸(height, width, ...)
+        Returns:
+            tuple: (x1, y1, x2, y2)；ROI覆盖整帧或在画面外时返回None
+        """
+        height, width = shape[:2]
+        key = (height, width)
+        if key not in self._clipped:
+            x1, y1, x2, y2 = self.box
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(width, x2), min(height, y2)
+            if x2 <= x1 or y2 <= y1 or (x1, y1, x2, y2) == (0, 0, width, height):
+                self._clipped[key] = None
+            else:
+                self._clipped[key] = (x1, y1, x2, y2)
+        return self._clipped[key]
+
+    @staticmethod
+    def imgsz_for(box, shape, base_imgsz):
+        """
+        按ROI占整帧的比例计算推理尺寸，保持目标像素尺度不变
+        Args:
+            box: (x1, y1, x2, y2)
+            shape: 整帧尺寸
+            base_imgsz: 整帧推理尺寸
+        Returns:
+            int: 对齐到STRIDE的推理尺寸
+        """
+        height, width = shape[:2]
+        scale = max(box[2] - box[0], box[3] - box[1]) / max(width, height)
+        stride = InferenceROI.STRIDE
+        return int(min(base_imgsz, max(stride, math.ceil(base_imgsz * scale / stride) * stride)))
+
+    @staticmethod
+    def crop(frame, box):
+        """裁剪ROI区域(视图，不复制)"""
+        x1, y1, x2, y2 = box
+        return frame[y1:y2, x1:x2]
+
+    @staticmethod
+    def to_full_frame(result, frame, box):
+        """
+        将ROI内的检测结果映射回整帧坐标
+        Args:
+            result: ROI图像上的检测结果(Results)
+            frame: 整帧图像
+            box: (x1, y1, x2, y2)
+        Returns:
+            Results: 整帧图像及整帧坐标的检测结果
+        """
+        from ultralytics.engine.results import Results  # type: ignore
+
+        data = result.boxes.data.clone()
+        data[:, [0, 2]] += box[0]
+        data[:, [1, 3]] += box[1]
+        return Results(frame, path=result.path, names=result.names, boxes=data)
@@ -64,13 +64,22 @@
 优化建议：
 1. 可添加车辆停留时间判断
 2. 可扩展支持更多违规类型
-3. 可优化空间查询性能
+
+性能说明：
+- 检测框读取自每帧共享的FrameDetections，不再单独转换张量
+- 禁停区域多边形预处理后缓存，所有目标中心点一次性判断(shapely.contains_xy)
 """
+import numpy as np
+import shapely
 from shapely.geometry import Point, Polygon
+from app.utils.detections import FrameDetections
 
 class ViolationDetector:
     # 需要检查的车辆类别
     VEHICLE_CLASSES = {2: 'car', 5: 'bus', 7: 'truck'}
+    # 已构建的禁停区域多边形(按顶点缓存)
+    _polygons = {}
+    _POLYGON_CACHE_SIZE = 256
     
     @staticmethod
     def is_point_in_polygon(point, polygon_points):
@@ -80,38 +89,58 @@ class ViolationDetector:
         return polygon.contains(point)
 
     @staticmethod
-    def check_vehicle_violation(detection_result, restricted_areas):
+    def _polygon(points):
+        """获取预处理(prepare)后的多边形，区域配置不变时复用"""
+        key = tuple(tuple(point) for point in points)
+        polygon = ViolationDetector._polygons.get(key)
+        if polygon is None:
+            if len(ViolationDetector._polygons) >= ViolationDetector._POLYGON_CACHE_SIZE:
+                ViolationDetector._polygons.clear()
+            polygon = Polygon(points)
+            shapely.prepare(polygon)
+            ViolationDetector._polygons[key] = polygon
+        return polygon
+
+    @staticmethod
+    def check_vehicle_violation(detection_result, restricted_areas, scale=1.0):
         """
         检查车辆是否在禁停区域内
         Args:
             detection_result: YOLO检测结果
-            restricted_areas: 禁停区域列表
+            restricted_areas: 禁停区域列表(原始画面坐标)
+            scale: 检测帧相对原始画面的缩放比例(降分辨率解码时小于1)
         Returns:
             violations: 违规信息列表
         """
         if not restricted_areas or detection_result.boxes is None:
             return []
-            
-        violations = []
-        boxes = detection_result.boxes.xywh.cpu()  # 获取中心点坐标和宽高
-        track_ids = detection_result.boxes.id.int().cpu().tolist()
-        cls_ids = detection_result.boxes.cls.cpu().tolist()
         
-        # 遍历所有检测到的目标
-        for box, track_id, cls_id in zip(boxes, track_ids, cls_ids):
-            # 仅检查车辆类别
-            if int(cls_id) in ViolationDetector.VEHICLE_CLASSES:
-                x, y = box[0].item(), box[1].item()  # 获取中心点坐标
-                
-                # 检查每个禁停区域
-                for area in restricted_areas:
-                    if ViolationDetector.is_point_in_polygon([x, y], area['points']):
-                        violations.append({
-                            'track_id': track_id,
-                            'vehicle_type': ViolationDetector.VEHICLE_CLASSES[int(cls_id)],
-                            'location': {'x': int(x), 'y': int(y)},
-                            'area_id': area['id']
-                        })
-                        break  # 一个目标只记录一次违规
-                        
+        # 仅检查已跟踪的车辆类别(未跟踪的目标无法去重)
+        detections = FrameDetections.of(detection_result)
+        mask = detections.class_mask(ViolationDetector.VEHICLE_CLASSES) & (detections.track_ids >= 0)
+        if not mask.any():
+            return []
+        centers = detections.centers(scale)[mask]  # 中心点坐标(换算回原始画面)
+        track_ids = detections.track_ids[mask]
+        cls_ids = detections.cls[mask]
+        
+        # 每个目标记录第一个命中的禁停区域(一个目标只记录一次违规)
+        area_index = np.full(len(centers), -1)
+        for index, area in enumerate(restricted_areas):
+            pending = area_index < 0
+            if not pending.any():
+                break
+            polygon = ViolationDetector._polygon(area['points'])
+            inside = shapely.contains_xy(polygon, centers[pending, 0], centers[pending, 1])
+            area_index[np.flatnonzero(pending)[inside]] = index
+        
+        violations = []
+        for i in np.flatnonzero(area_index >= 0):
+            x, y = float(centers[i, 0]), float(centers[i, 1])
+            violations.append({
+                'track_id': int(track_ids[i]),
+                'vehicle_type': ViolationDetector.VEHICLE_CLASSES[int(cls_ids[i])],
+                'location': {'x': int(x), 'y': int(y)},
+                'area_id': restricted_areas[area_index[i]]['id']
+            })
         return violations
@@ -92,6 +92,7 @@ WebSocket通信工具模块 (websocket_utils.py)
    - 使用房间机制(按摄像头ID分组)
    - 避免全局广播
    - 及时清理断开的连接
+   - 记录各摄像头的观看者，无人观看时不渲染、不编码实时画面
 
 异常处理：
 - WebSocket连接异常处理
@@ -102,12 +103,69 @@ WebSocket通信工具模块 (websocket_utils.py)
 
 from flask_socketio import SocketIO
 from typing import ClassVar
-import cv2
 import base64
+import threading
 import time
+from app.utils.lazy_import import LazyImport
+
+# 画面编码时导入
+cv2 = LazyImport('cv2')
 
 socketio = SocketIO()
 
+# 实时画面观看者：连接sid -> 已加入的摄像头ID
+_video_viewers = {}
+# 由其他进程同步的有观看者的摄像头ID(工作进程中由Web进程下发)
+_remote_video_viewers = set()
+_video_viewers_lock = threading.Lock()
+# 摄像头有无观看者变化时的回调 callback(camera_id, watching)
+_video_viewer_listeners = []
+
+def _watched_cameras():
+    return set().union(*_video_viewers.values())
+
+def track_video_viewer(sid, camera_id=None, joined=True):
+    """
+    记录观看者加入/离开摄像头房间，摄像头有无观看者变化时通知回调
+    Args:
+        sid: 客户端连接ID
+        camera_id: 摄像头ID，None表示连接断开(离开所有房间)
+        joined: 加入或离开
+    """
+    with _video_viewers_lock:
+        before = _watched_cameras()
+        if camera_id is None:
+            _video_viewers.pop(sid, None)
+        elif joined:
+            _video_viewers.setdefault(sid, set()).add(str(camera_id))
+        else:
+            _video_viewers.get(sid, set()).discard(str(camera_id))
+        after = _watched_cameras()
+        listeners = list(_video_viewer_listeners)
+    for changed in sorted(before ^ after):
+        for listener in listeners:
+            listener(changed, changed in after)
+
+def add_video_viewer_listener(callback):
+    """注册观看者变化回调 callback(camera_id, watching)"""
+    with _video_viewers_lock:
+        _video_viewer_listeners.append(callback)
+
+def set_video_viewers(camera_id, watching):
+    """设置由其他进程同步的观看状态(工作进程中没有WebSocket连接)"""
+    with _video_viewers_lock:
+        if watching:
+            _remote_video_viewers.add(str(camera_id))
+        else:
+            _remote_video_viewers.discard(str(camera_id))
+
+def has_video_viewers(camera_id):
+    """摄像头房间是否有观看者"""
+    camera_id = str(camera_id)
+    with _video_viewers_lock:
+        return camera_id in _remote_video_viewers or any(
+            camera_id in cameras for cameras in _video_viewers.values())
+
 class VideoStreamConfig:
     # 视频流配置
     MAX_WIDTH: ClassVar[int] = 1280  # 最大宽度
@@ -174,22 +232,29 @@ def emit_detection_stats(stats_data):
     except Exception as e:
         print(f"Error sending detection stats: {str(e)}")
 
-def emit_video_frame(camera_id, frame_data):
-    """发送视频帧到前端"""
-    try:
-        # 调整分辨率
-        h, w = frame_data.shape[:2]
-        if w > VideoStreamConfig.MAX_WIDTH or h > VideoStreamConfig.MAX_HEIGHT:
-            ratio = min(VideoStreamConfig.MAX_WIDTH/w, VideoStreamConfig.MAX_HEIGHT/h)
-            new_size = (int(w*ratio), int(h*ratio))
-            frame_data = cv2.resize(frame_data, new_size, interpolation=cv2.INTER_AREA)
-            
-        # JPEG压缩
-        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), VideoStreamConfig.JPEG_QUALITY]
-        _, buffer = cv2.imencode('.jpg', frame_data, encode_param)
+def encode_video_frame(frame_data):
+    """
+    缩放并压缩视频帧
+    Returns:
+        bytes: JPEG数据
+    """
+    # 调整分辨率
+    h, w = frame_data.shape[:2]
+    if w > VideoStreamConfig.MAX_WIDTH or h > VideoStreamConfig.MAX_HEIGHT:
+        ratio = min(VideoStreamConfig.MAX_WIDTH/w, VideoStreamConfig.MAX_HEIGHT/h)
+        new_size = (int(w*ratio), int(h*ratio))
+        frame_data = cv2.resize(frame_data, new_size, interpolation=cv2.INTER_AREA)
         
+    # JPEG压缩
+    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), VideoStreamConfig.JPEG_QUALITY]
+    _, buffer = cv2.imencode('.jpg', frame_data, encode_param)
+    return buffer.tobytes()
+
+def emit_encoded_frame(camera_id, jpeg_data):
+    """发送已压缩的视频帧到前端(检测工作进程编码后经IPC传回)"""
+    try:
         # 转换为base64字符串
-        frame_base64 = base64.b64encode(buffer.tobytes()).decode('utf-8')
+        frame_base64 = base64.b64encode(jpeg_data).decode('utf-8')
         
         # 发送到对应摄像头的房间
         room = f'camera_{camera_id}'
@@ -202,6 +267,13 @@ def emit_video_frame(camera_id, frame_data):
     except Exception as e:
         print(f"Error sending video frame: {str(e)}")
 
+def emit_video_frame(camera_id, frame_data):
+    """发送视频帧到前端"""
+    try:
+        emit_encoded_frame(camera_id, encode_video_frame(frame_data))
+    except Exception as e:
+        print(f"Error sending video frame: {str(e)}")
+
 def emit_error(namespace, error_data):
     """发送错误事件"""
     try:
@@ -70,9 +70,24 @@ SPECIAL_VEHICLES = {
 性能优化：
 1. GPU加速：
    - 模型运行在CUDA设备
-   - 批处理优化
+   - 批处理优化：多路摄像头的帧合并为一个批次推理(见BatchInferenceEngine)
+   - 无GPU时可选ONNX Runtime后端(backend='onnx')，导出模型按哈希缓存(见ModelExporter)
+   - 可选INT8量化后端(backend='onnx-int8')，使用录像校准(见ModelQuantizer)
+   - 关键帧检测：每N帧(或画面运动较大时)检测一次，其余帧由跟踪器外推，
+     违规检测、特殊车辆提醒和画面标注仍逐帧获得检测框
+   - 运动门控：画面静止(如夜间停车场)时跳过检测，复用上一帧结果
+   - ROI裁剪：只对感兴趣区域推理并按比例缩小推理尺寸，结果映射回整帧坐标
+   - 推理配置：每个摄像头独立的推理尺寸/阈值/类别，超出延迟预算时自动降低推理尺寸
+     (见InferenceProfile)
+   - 采集进程：可选在独立进程中解码，帧经共享内存环形缓冲区传递，推理和输出阶段直接使用视图
+     (见FrameRingBuffer)
+   - 解码层：可配置解码线程数，按推理尺寸降分辨率解码，统计实际输入帧率和解码错误
+     (见FrameSource)
+   - 两级级联：nano模型逐帧检测，更大的模型按频率限制只复检低置信度目标和禁停区域
+     (见ModelCascade)
 
 2. 内存管理：
+   - 通过模型注册表共享已加载模型，避免重复加载
    - 及时释放资源
    - 避免内存泄漏
 
@@ -91,6 +106,16 @@ SPECIAL_VEHICLES = {
 - [`DetectionService`](app/services/detection_service.py): 检测服务
 - [`ViolationService`](app/services/violation_service.py): 违规检测
 - [`websocket_utils`](app/utils/websocket_utils.py): WebSocket通信
+- [`ModelRegistry`](app/utils/model_registry.py): 模型注册表
+- [`ModelExporter`](app/utils/model_export.py): ONNX导出缓存
+- [`ModelQuantizer`](app/utils/quantization.py): INT8量化
+- [`InferenceProfile`](app/utils/inference_profile.py): 摄像头推理配置
+- [`FrameRingBuffer`](app/utils/frame_ring.py): 共享内存帧缓冲
+- [`FrameSource`](app/utils/frame_source.py): 视频流/文件/图片目录解码
+- [`ChunkedVideoAnalyzer`](app/utils/chunked_analysis.py): 长视频分段并行分析
+- [`ImageBatchAnalyzer`](app/utils/image_batch.py): 图片集批量分析
+- [`CoreBudget`](app/utils/cpu_budget.py): 摄像头推理线程数分配
+- [`ModelCascade`](app/utils/cascade.py): 两级检测级联
 
 使用示例：
 1. 初始化：
@@ -106,12 +131,32 @@ SPECIAL_VEHICLES = {
    )
 """
 
+import itertools
 import os
 import threading
+import time
 import cv2
 import torch
 from ultralytics import YOLO  # type: ignore
 from app.services.violation_service import ViolationService
+from app.utils.model_registry import model_registry
+from app.utils.model_export import ModelExporter
+from app.utils.quantization import ModelQuantizer
+from app.utils.inference_engine import inference_engines
+from app.utils.pipeline import StageQueue
+from app.utils.motion import KeyframeScheduler, MotionGate
+from app.utils.roi import InferenceROI
+from app.utils.inference_profile import InferenceProfile, AdaptiveImgsz
+from app.utils.frame_ring import FrameRingBuffer, FrameRingReader, FrameCaptureProcess
+from app.utils.frame_source import FrameSource, StreamReconnector
+from app.utils.metrics import metrics
+from app.utils.cpu_budget import core_budget
+from app.utils.cascade import ModelCascade
+from app.utils.detections import FrameDetections
+from app.utils.annotation import FrameAnnotator
+from app.utils.chunked_analysis import ChunkedVideoAnalyzer
+from app.utils.detection_artifact import DetectionArtifact, DetectionArtifactWriter
+from app.utils.image_batch import ImageBatchAnalyzer
 
 """
 YOLO 和跟踪算法集成工具
@@ -127,8 +172,36 @@ class YOLOIntegration:
     TRACKER_OPTIONS = {
         'botsort': 'botsort.yaml',
         'bytetrack': 'bytetrack.yaml',
+        # 轻量IoU跟踪器(仅batched实时检测)
+        'iou': os.path.abspath(os.path.join(os.path.dirname(__file__), '../assets/configs/iou.yaml')),
         'custom': None  # 用于自定义配置
     }
+
+    # 实时流推理模式：
+    # batched - 自行解码，多摄像头共享批量推理引擎
+    # stream  - 由Ultralytics逐路加载视频流并推理
+    INFERENCE_MODES = ('batched', 'stream')
+    INFERENCE_MODE = os.getenv('DETECTION_INFERENCE_MODE', 'stream')
+
+    # 推理后端：
+    # pytorch - 直接加载.pt模型
+    # onnx    - 导出为ONNX并使用ONNX Runtime推理(适用于无GPU的边缘设备)
+    # onnx-int8 - 使用校准后的INT8量化模型(需先通过POST /detection/quantize生成)
+    BACKENDS = ('pytorch', 'onnx', 'onnx-int8')
+    BACKEND = os.getenv('DETECTION_BACKEND', 'pytorch')
+
+    # 关键帧间隔：每隔N帧执行一次检测，其余帧由跟踪器外推(1表示逐帧检测，仅batched模式)
+    KEYFRAME_INTERVAL = int(os.getenv('DETECTION_KEYFRAME_INTERVAL', '1'))
+    # 运动分数超过该值时提前执行检测(变化像素占比，0表示不按运动触发)
+    KEYFRAME_MOTION_THRESHOLD = float(os.getenv('DETECTION_KEYFRAME_MOTION_THRESHOLD', '0.1'))
+    # 运动门控阈值：与上次检测帧相比变化像素占比低于该值时跳过检测，复用上一帧结果(0表示关闭，仅batched模式)
+    MOTION_GATE_THRESHOLD = float(os.getenv('DETECTION_MOTION_GATE_THRESHOLD', '0'))
+    # 在独立进程中解码视频流，帧经共享内存传递(仅batched模式)
+    CAPTURE_PROCESS = os.getenv('DETECTION_CAPTURE_PROCESS', 'false').lower() == 'true'
+    # 降分辨率解码：帧长边上限(0表示原始分辨率，auto表示推理尺寸，仅batched模式)
+    DECODE_MAX_SIZE = os.getenv('DETECTION_DECODE_MAX_SIZE', '0')
+    # 默认整帧推理尺寸(可由摄像头推理配置覆盖，ROI推理时按比例缩小)
+    IMGSZ = int(os.getenv('DETECTION_IMGSZ', '640'))
     
     # 需要检测的类别
     TARGET_CLASSES = {
@@ -150,10 +223,25 @@ class YOLOIntegration:
         初始化YOLO模型和跟踪配置
         Args:
             model_path: 模型文件名称
-            tracker_type: 跟踪器类型 (botsort/bytetrack/custom)
+            tracker_type: 跟踪器类型 (botsort/bytetrack/iou/custom，iou仅batched实时检测)
             tracking_config: 自定义跟踪配置文件路径
+            inference_mode: 实时流推理模式 (batched/stream)
+            backend: 推理后端 (pytorch/onnx/onnx-int8)
+            keyframe_interval: 关键帧间隔
+            keyframe_motion_threshold: 触发关键帧的运动分数
+            motion_gate_threshold: 运动门控阈值(静止画面跳过检测)
+            roi: 推理区域 [x1, y1, x2, y2] 或 "auto"(由禁停区域推导)
+            restricted_areas: 禁停区域(roi为auto时使用)
+            profile: 推理配置 {imgsz, conf, iou, max_det, classes, latency_budget_ms, min_imgsz}
+            capture_process: 是否在独立进程中解码视频流
+            decode_max_size: 降分辨率解码的帧长边上限，"auto"表示推理尺寸
+            decode_threads: 解码线程数(0表示OpenCV默认)
+            cascade: 两级级联 {model_path, conf_threshold, interval, areas, imgsz, conf, max_crops, padding}
     """
-    def __init__(self, model_path, tracker_type='botsort', tracking_config=None, special_vehicles=None):
+    def __init__(self, model_path, tracker_type='botsort', tracking_config=None, special_vehicles=None,
+                 inference_mode=None, backend=None, keyframe_interval=None, keyframe_motion_threshold=None,
+                 motion_gate_threshold=None, roi=None, restricted_areas=None, profile=None,
+                 capture_process=None, decode_max_size=None, decode_threads=None, cascade=None):
         self.base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../assets'))
         self.model_dir = os.path.join(self.base_path, 'models')
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
@@ -177,44 +265,371 @@ class YOLOIntegration:
         # 允许自定义特殊车辆
         self.special_vehicles = special_vehicles if special_vehicles else self.SPECIAL_VEHICLES
 
+        # 推理后端
+        self.backend = backend or self.BACKEND
+        if self.backend not in self.BACKENDS:
+            raise ValueError(f"Invalid backend: {self.backend}")
+
+        # 实时流推理模式
+        self.inference_mode = inference_mode or self.INFERENCE_MODE
+        if self.inference_mode not in self.INFERENCE_MODES:
+            raise ValueError(f"Invalid inference mode: {self.inference_mode}")
+        if self.tracker_type == 'iou' and self.inference_mode != 'batched':
+            raise ValueError("IoU tracker requires batched inference mode")
+
+        # 关键帧调度
+        self.keyframe_interval = int(keyframe_interval or self.KEYFRAME_INTERVAL)
+        self.keyframe_motion_threshold = (self.KEYFRAME_MOTION_THRESHOLD if keyframe_motion_threshold is None
+                                          else float(keyframe_motion_threshold))
+        if self.keyframe_interval < 1:
+            raise ValueError(f"Invalid keyframe interval: {self.keyframe_interval}")
+        if self.keyframe_interval > 1 and self.inference_mode != 'batched':
+            raise ValueError("Keyframe detection requires batched inference mode")
+
+        # 运动门控
+        self.motion_gate_threshold = float(self.MOTION_GATE_THRESHOLD if motion_gate_threshold is None
+                                           else motion_gate_threshold)
+        if self.motion_gate_threshold < 0:
+            raise ValueError(f"Invalid motion gate threshold: {self.motion_gate_threshold}")
+        if self.motion_gate_threshold > 0 and self.inference_mode != 'batched':
+            raise ValueError("Motion gate requires batched inference mode")
+
+        # 推理区域
+        self.roi = InferenceROI.resolve(roi, restricted_areas)
+        if self.roi is not None and self.inference_mode != 'batched':
+            raise ValueError("Inference ROI requires batched inference mode")
+
+        # 推理配置
+        self.profile = InferenceProfile.from_config(profile, default_imgsz=self.IMGSZ,
+                                                    target_classes=self.TARGET_CLASSES)
+        if self.profile.latency_budget_ms and self.inference_mode != 'batched':
+            raise ValueError("Adaptive image size requires batched inference mode")
+
+        # 采集方式
+        self.capture_process = self.CAPTURE_PROCESS if capture_process is None else bool(capture_process)
+        if self.capture_process and self.inference_mode != 'batched':
+            raise ValueError("Capture process requires batched inference mode")
+
+        # 解码配置
+        self.decode_max_size = self._resolve_decode_max_size(
+            self.DECODE_MAX_SIZE if decode_max_size is None else decode_max_size)
+        if self.decode_max_size and self.inference_mode != 'batched':
+            raise ValueError("Reduced-resolution decoding requires batched inference mode")
+        self.decode_threads = decode_threads
+        # 检测帧相对原始画面的缩放比例(打开视频流后确定)
+        self.frame_scale = 1.0
+
+        # 两级级联：第二级模型同样位于模型目录
+        self.cascade = ModelCascade.from_config(cascade, restricted_areas)
+        if self.cascade is not None:
+            if self.inference_mode != 'batched':
+                raise ValueError("Model cascade requires batched inference mode")
+            self.cascade.model_path = os.path.join(self.model_dir, self.cascade.model_path)
+            if not os.path.exists(self.cascade.model_path):
+                raise FileNotFoundError(f"Cascade model not found: {self.cascade.model_path}")
+
+    def _resolve_decode_max_size(self, value):
+        """解析降分辨率解码配置：0/None关闭，auto取推理尺寸"""
+        if value in (None, '', 0, '0'):
+            return None
+        if str(value).lower() == 'auto':
+            return self.profile.imgsz
+        try:
+            size = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid decode max size: {value}")
+        if size < InferenceROI.STRIDE:
+            raise ValueError(f"Invalid decode max size: {value}")
+        return size
+
+    def _load_model(self, model_path, device):
+        """加载模型(由模型注册表在首次获取时调用)"""
+        return YOLOIntegration.load_model(model_path, device, self.backend)
+
+    @staticmethod
+    def load_model(model_path, device, backend='pytorch'):
+        """按推理后端加载模型(分段分析的工作进程不经过模型注册表，直接调用)"""
+        if backend == 'onnx':
+            # 使用缓存的导出模型，首次使用时导出；ONNX Runtime按device选择执行器
+            return YOLO(ModelExporter.export_onnx(model_path), task='detect')
+        if backend == 'onnx-int8':
+            # 量化依赖录像校准，不在加载时自动生成
+            int8_path = ModelQuantizer.int8_path(model_path)
+            if not os.path.exists(int8_path):
+                raise FileNotFoundError(f"INT8 model not calibrated: {int8_path}")
+            return YOLO(int8_path, task='detect')
+
+        model = YOLO(model_path)
+        model.to(device)  # 优先使用GPU，不可用时自动回退CPU
+        return model
+
+    def acquire_model(self):
+        """
+        从模型注册表获取共享模型句柄
+        Returns:
+            ModelHandle: 使用完毕后需调用release()
+        """
+        return model_registry.acquire(
+            self.model_path,
+            device=self.device,
+            backend=self.backend,
+            loader=self._load_model
+        )
+
+    def acquire_cascade_model(self):
+        """从模型注册表获取第二级模型句柄(与第一级使用相同的设备和后端)"""
+        return model_registry.acquire(
+            self.cascade.model_path,
+            device=self.device,
+            backend=self.backend,
+            loader=self._load_model
+        )
+
     """
         在独立线程中运行YOLO跟踪器
         Args:
             camera_id: 摄像头ID
             stream_url: 视频流URL
+            check_violations: 是否在推理线程内检查违规(流水线模式下由事件阶段检查)
+            pipeline: 所属处理流水线(用于登记采集队列统计)
         Returns:
             generator: 生成检测结果的生成器
     """
-    def run_tracker_in_thread(self, camera_id, stream_url):
+    def run_tracker_in_thread(self, camera_id, stream_url, check_violations=True, pipeline=None):
         try:
-            # 初始化模型
-            model = YOLO(self.model_path)
-            model.to(self.device)  # 优先使用GPU，不可用时自动回退CPU
-            
             # 初始化违规检测服务
-            violation_service = ViolationService()
+            violation_service = ViolationService() if check_violations else None
             
-            # 启动跟踪，只处理目标类别
-            results_gen = model.track(
-                source=stream_url,
-                stream=True,
-                tracker=self.tracking_config,
-                classes=list(self.TARGET_CLASSES.keys())  # 只检测指定类别
-            )
-            
-            for results in results_gen:
-                if results and len(results):
-                    result = results[0]  # 获取当前帧的结果
-                    
-                    # 检查违规情况
-                    violations = violation_service.check_violations(camera_id, result)
-                    
-                    yield result, violations
+            for result in self._iter_tracked_frames(camera_id, stream_url, pipeline):
+                # 检查违规情况
+                violations = (violation_service.check_violations(camera_id, result, self.frame_scale)
+                              if violation_service else [])
+                
+                yield result, violations
                     
         except Exception as e:
             print(f"Error processing camera {camera_id}: {str(e)}")
             raise
 
+    def _iter_tracked_frames(self, camera_id, stream_url, pipeline=None):
+        """按推理模式逐帧生成带跟踪ID的检测结果"""
+        if self.inference_mode == 'stream':
+            yield from self._iter_stream_results(stream_url, camera_id, pipeline)
+        else:
+            yield from self._iter_batched_results(camera_id, stream_url, pipeline)
+
+    def _iter_stream_results(self, stream_url, camera_id=None, pipeline=None):
+        """
+        由Ultralytics加载视频流，逐路推理和跟踪(推理在当前线程，按摄像头的核心分配设置线程数)
+        实时流断开后保持模型句柄，按退避重新打开，跟踪器状态保留(persist)
+        """
+        reconnector = None
+        if StreamReconnector.ENABLED and str(stream_url).lower().startswith(FrameSource.STREAM_PREFIXES):
+            reconnector = StreamReconnector()
+            if pipeline is not None:
+                pipeline.register_stats('source', lambda: {'kind': 'stream', 'reconnect': reconnector.stats()})
+        
+        # 从注册表获取模型(已加载的模型直接复用)
+        with self.acquire_model() as handle:
+            # 启动跟踪，只处理目标类别(推理配置可指定类别子集)
+            options = {'classes': list(self.TARGET_CLASSES.keys()), **self.profile.predict_options()}
+            stream = {'results': handle.model.track(
+                source=stream_url,
+                stream=True,
+                tracker=self.tracking_config,
+                **options
+            )}
+            
+            def reconnect():
+                # 重新打开视频流并处理第一帧，失败时抛出异常
+                results_gen = handle.model.track(
+                    source=stream_url,
+                    stream=True,
+                    tracker=self.tracking_config,
+                    persist=True,
+                    **options
+                )
+                first = next(results_gen)
+                stream['results'] = itertools.chain([first], results_gen)
+            
+            connected = False
+            while True:
+                try:
+                    for results in stream['results']:
+                        connected = True
+                        # 核心分配变化后下一帧生效
+                        core_budget.sync(camera_id)
+                        if results and len(results):
+                            yield results[0]  # 获取当前帧的结果
+                except ConnectionError as e:
+                    # 首次打开失败直接报错，运行中断线则重连
+                    if reconnector is None or not connected:
+                        raise
+                    print(f"Stream lost on camera {camera_id}: {str(e)}")
+                if reconnector is None or not reconnector.reconnect(reconnect):
+                    break
+
+    def _iter_batched_results(self, camera_id, stream_url, pipeline=None):
+        """自行解码视频流，通过共享引擎与其他摄像头合并推理"""
+        source = FrameSource(stream_url, max_size=self.decode_max_size,
+                             decode_threads=self.decode_threads).open()
+        
+        # 关键帧调度：非关键帧不检测，由跟踪器外推
+        scheduler = KeyframeScheduler(self.keyframe_interval, self.keyframe_motion_threshold)
+        if pipeline is not None:
+            pipeline.register_stats('keyframes', scheduler.stats)
+        
+        # 运动门控：静止画面不检测，复用上一帧结果
+        gate = MotionGate(self.motion_gate_threshold) if self.motion_gate_threshold > 0 else None
+        if gate is not None and pipeline is not None:
+            pipeline.register_stats('motion_gate', gate.stats)
+        
+        # 推理尺寸：超出延迟预算时自动降低，负载下降后恢复
+        adaptive = AdaptiveImgsz(self.profile)
+        if pipeline is not None:
+            pipeline.register_stats('profile', adaptive.stats)
+        
+        tracking = metrics.histogram(camera_id, 'tracking')
+        # 以下资源在try中获取，finally只释放已获取的部分
+        cascade = None
+        channel = None
+        stop_capture = None
+        last_result = None
+        gated = False
+        try:
+            # 两级级联：第二级在引擎线程中、跟踪器更新前运行
+            if self.cascade is not None:
+                cascade = self.cascade.open(self.acquire_cascade_model(), self.device)
+                if pipeline is not None:
+                    pipeline.register_stats('cascade', cascade.stats)
+            
+            frame_rate = int(source.nominal_fps or 30)
+            channel = inference_engines.open_channel(self, camera_id, frame_rate=frame_rate, cascade=cascade)
+            
+            # 采集持续读取，推理只取最新帧，避免流缓冲堆积
+            frames, stop_capture, source_stats = self._start_capture(source, camera_id, stream_url)
+            if pipeline is not None:
+                pipeline.register_queue(frames)
+                pipeline.register_stats('source', source_stats)
+            
+            # 降分辨率解码后ROI换算到缩小后的帧坐标
+            self.frame_scale = source.scale
+            roi = self.roi.scaled(self.frame_scale) if self.roi is not None else None
+            if cascade is not None:
+                cascade.scale = self.frame_scale
+            
+            while True:
+                frame = frames.get()
+                if frame is StageQueue.CLOSED:
+                    break
+                
+                # ROI之外(天空、建筑)的变化不触发检测
+                box = roi.box_for(frame.shape) if roi is not None else None
+                view = InferenceROI.crop(frame, box) if box is not None else frame
+                
+                if gate is not None and not gate.should_detect(view):
+                    result = self._reuse_result(last_result, frame)
+                    gated = True
+                else:
+                    if gated:
+                        # 画面重新变化，立即检测而不是外推
+                        scheduler.force_keyframe()
+                        gated = False
+                    if scheduler.is_keyframe(view):
+                        imgsz = adaptive.imgsz
+                        if box is not None:
+                            imgsz = InferenceROI.imgsz_for(box, frame.shape, imgsz)
+                        result = channel.infer(frame, box=box, options=self.profile.predict_options(imgsz))
+                        # 只统计引擎测得的本帧推理耗时，凑批等待和其他摄像头的负载不影响本摄像头的尺寸
+                        if channel.model_time is not None:
+                            adaptive.record(channel.model_time)
+                    else:
+                        started = time.perf_counter()
+                        result = channel.tracker.propagate(frame)
+                        tracking.observe(time.perf_counter() - started)
+                    last_result = result
+                if result is not None and len(result):
+                    yield result
+        finally:
+            if channel is not None:
+                channel.close()
+            if cascade is not None:
+                cascade.close()
+            # 采集启动后视频流由采集线程(或已在_start_capture中)释放
+            if stop_capture is not None:
+                stop_capture()
+            else:
+                source.release()
+
+    def _start_capture(self, source, camera_id, stream_url):
+        """
+        启动采集
+        - 线程模式：采集线程读取source，经StageQueue传递最新帧
+        - 进程模式：采集进程解码写入共享内存环形缓冲区，推理线程读取帧视图
+        Returns:
+            tuple: (帧队列，get()返回帧或StageQueue.CLOSED; 停止采集的函数; 解码统计函数)
+        """
+        if not self.capture_process:
+            frames = StageQueue('capture', maxsize=1, policy='latest')
+            capture_thread = threading.Thread(
+                target=self._capture_frames,
+                args=(source, frames, camera_id),
+                daemon=True,
+                name=f"camera-{camera_id}-capture"
+            )
+            capture_thread.start()
+
+            def stop():
+                frames.close(discard=True)
+                # 采集线程可能正在等待重连；视频流由采集线程退出时释放，
+                # 超时后不在此处释放，避免与阻塞中的read()/重新打开并发
+                source.interrupt()
+                capture_thread.join(timeout=5)
+            return frames, stop, source.stats
+
+        # 按首帧(降分辨率后)尺寸分配帧槽，采集进程以相同配置重新打开视频流
+        first = source.read()
+        base_stats = source.stats()
+        source.release()
+        if first is None:
+            raise ConnectionError(f"Failed to read stream: {stream_url}")
+        ring = FrameRingBuffer.create(first.shape)
+        ring.write(first)
+        process = FrameCaptureProcess(stream_url, ring.name, name=f"camera-{camera_id}-capture",
+                                      max_size=self.decode_max_size,
+                                      decode_threads=self.decode_threads).start()
+        frames = FrameRingReader(ring)
+
+        def stop():
+            frames.close()
+            process.stop()
+            # 仍被流水线引用的帧视图在释放前保持映射
+            ring.close()
+        return frames, stop, lambda: {**base_stats, **process.source_stats()}
+
+    @staticmethod
+    def _reuse_result(result, frame):
+        """将上一帧的检测结果套用到当前帧(静止画面)"""
+        if result is None:
+            return None
+        from ultralytics.engine.results import Results  # type: ignore
+        return Results(frame, path=result.path, names=result.names, boxes=result.boxes.data)
+
+    @staticmethod
+    def _capture_frames(source, frames, camera_id=None):
+        """采集线程：读取视频帧放入队列，流结束或队列关闭时退出并释放视频流"""
+        decode = metrics.histogram(camera_id, 'decode')
+        try:
+            while True:
+                started = time.perf_counter()
+                frame = source.read()
+                decode.observe(time.perf_counter() - started)
+                if frame is None or not frames.put(frame):
+                    break
+        finally:
+            frames.close()
+            source.release()
+
 
 
 
@@ -249,23 +664,34 @@ class YOLOIntegration:
 
 
 
-    """处理输入源(图片/视频)并保存结果"""
-    def process_source(self, source, save_dir='outputs'):
+    """
+        处理输入源(图片/视频)并保存结果
+        Args:
+            source: 图片/视频文件路径
+            save_dir: 输出目录
+            progress: 进度回调 progress(已处理帧数, 总帧数)，抛出异常时中止分析
+    """
+    def process_source(self, source, save_dir='outputs', progress=None):
+        handle = None
         try:
+            # 文件分析由Ultralytics跟踪，只支持botsort/bytetrack
+            if self.tracker_type == 'iou':
+                raise ValueError("IoU tracker is not supported for file analysis")
             os.makedirs(save_dir, exist_ok=True)
             
-            # 初始化模型
-            model = YOLO(self.model_path)
-            model.to(self.device)
+            # 从注册表获取模型
+            handle = self.acquire_model()
+            model = handle.model
             
             # 添加文件名处理
             filename = os.path.basename(source)
             name, ext = os.path.splitext(filename)
             output_path = os.path.join(save_dir, f"{name}_analyzed{ext}")
             
-            # 运行推理
+            # 运行推理(stream模式逐帧返回，不在内存中保留所有帧的结果)
             results = model.track(
                 source=source,
+                stream=True,
                 save=True,  # 保存带标注的结果
                 project=save_dir,
                 name=os.path.basename(output_path),
@@ -273,77 +699,126 @@ class YOLOIntegration:
                 classes=list(self.TARGET_CLASSES.keys())  # 只检测指定类别
             )
             
-            # 汇总检测结果
+            # 汇总检测结果，逐帧明细写入结果文件
             summary = {
                 "source": source,
                 "output_path": output_path,
-                "detections": [],
+                "detections_path": DetectionArtifact.path_for(save_dir, source),
                 "total_frames": 0,
                 "total_objects": 0
             }
             
             # 处理每一帧的结果
-            for r in results:
-                if r.boxes is not None and r.boxes.id is not None:
-                    frame_detections = []
-                    boxes_xywh = r.boxes.xywh
-                    boxes_id = r.boxes.id
-                    boxes_cls = r.boxes.cls
-                    
-                    # 处理 tensor 或 numpy array
-                    if hasattr(boxes_xywh, 'cpu'):
-                        boxes_xywh = boxes_xywh.cpu()  # type: ignore
-                    if hasattr(boxes_id, 'cpu'):
-                        boxes_id = boxes_id.int().cpu()  # type: ignore
-                    if hasattr(boxes_cls, 'cpu'):
-                        boxes_cls = boxes_cls.cpu()  # type: ignore
-                    
-                    for box, track_id, cls_id in zip(boxes_xywh, boxes_id, boxes_cls):
-                        if int(cls_id) in self.TARGET_CLASSES:
-                            detection = {
-                                "track_id": int(track_id),
-                                "class": self.TARGET_CLASSES[int(cls_id)],
-                                "position": box.tolist()
-                            }
-                            frame_detections.append(detection)
-                    
-                    summary["detections"].append(frame_detections)
-                    summary["total_objects"] += len(frame_detections)
-                summary["total_frames"] += 1
+            target_classes = list(self.TARGET_CLASSES.keys())
+            total_frames = self._count_frames(source) if progress is not None else None
+            if progress is not None:
+                progress(0, total_frames)
+            with DetectionArtifactWriter(summary["detections_path"]) as artifact:
+                self._write_detections(results, artifact, summary, target_classes, progress, total_frames)
             
             return summary
             
         except Exception as e:
             raise Exception(f"Source processing failed: {str(e)}")
+        finally:
+            if handle is not None:
+                handle.release()
+
+    @staticmethod
+    def _count_frames(source):
+        """视频文件的总帧数(用于进度)，其他输入源返回None"""
+        probe = FrameSource(source)
+        if probe.kind != 'file':
+            return None
+        try:
+            return probe.open().frame_count
+        finally:
+            probe.release()
+
+    def _write_detections(self, results, artifact, summary, target_classes, progress=None, total_frames=None):
+        """逐帧写入有跟踪目标的检测结果"""
+        for r in results:
+            if r.boxes is not None and r.boxes.id is not None:
+                detections = FrameDetections.of(r)
+                mask = detections.class_mask(target_classes)
+                frame_detections = [
+                    {
+                        "track_id": track_id,
+                        "class": self.TARGET_CLASSES[cls_id],
+                        "position": position
+                    }
+                    for track_id, cls_id, position in zip(
+                        detections.track_ids[mask].tolist(),
+                        detections.cls[mask].tolist(),
+                        detections.xywh[mask].tolist()
+                    )
+                ]
+                
+                artifact.write(summary["total_frames"], frame_detections)
+                summary["total_objects"] += len(frame_detections)
+            summary["total_frames"] += 1
+            if progress is not None:
+                progress(summary["total_frames"], total_frames)
 
 
 
 
+    """
+        分段并行分析视频文件(长视频)
+        Args:
+            source: 视频文件路径
+            save_dir: 输出目录
+            workers: 工作进程数
+            chunk_seconds: 分段时长(秒)
+            overlap_seconds: 相邻分段重叠时长(秒)
+            save_video: 是否输出标注视频
+            progress: 进度回调 progress(已处理帧数, 总帧数)，抛出异常时中止分析
+        Returns:
+            dict: 与process_source一致的汇总结果
+    """
+    def process_source_parallel(self, source, save_dir='outputs', workers=None, chunk_seconds=None,
+                                overlap_seconds=None, save_video=True, progress=None):
+        try:
+            if self.tracker_type == 'iou':
+                raise ValueError("IoU tracker is not supported for file analysis")
+            os.makedirs(save_dir, exist_ok=True)
+            analyzer = ChunkedVideoAnalyzer(self, workers=workers, chunk_seconds=chunk_seconds,
+                                            overlap_seconds=overlap_seconds)
+            return analyzer.analyze(source, save_dir, save_video=save_video, progress=progress)
+        except Exception as e:
+            raise Exception(f"Parallel source processing failed: {str(e)}")
+
+    """
+        批量分析图片集
+        Args:
+            source: 图片目录、通配符路径或图片路径列表
+            save_dir: 输出目录
+            batch_size: 批次大小
+            decode_threads: 解码线程数
+            save_images: 是否输出标注图片
+            progress: 进度回调 progress(已处理图片数, 总图片数)
+        Returns:
+            dict: 与process_source一致的汇总结果
+    """
+    def process_images(self, source, save_dir='outputs', batch_size=None, decode_threads=None,
+                       save_images=False, progress=None):
+        try:
+            os.makedirs(save_dir, exist_ok=True)
+            images = ImageBatchAnalyzer.list_images(source)
+            # 结果文件名前缀：目录名，通配符和路径列表为images(文件名另带时间和随机后缀，每次分析唯一)
+            name = os.path.basename(os.path.normpath(source)) if isinstance(source, str) and os.path.isdir(source) \
+                else 'images'
+            analyzer = ImageBatchAnalyzer(self, batch_size=batch_size, decode_threads=decode_threads)
+            return analyzer.analyze(images, name, save_dir, save_images=save_images, progress=progress)
+        except Exception as e:
+            raise Exception(f"Image batch processing failed: {str(e)}")
+
     """可视化检测结果"""    
     def visualize_results(self, frame, results):
         if results.boxes is None or len(results.boxes) == 0:
             return frame
-            
-        boxes = results.boxes.xywh.cpu()
-        track_ids = results.boxes.id.int().cpu().tolist()
-        cls_ids = results.boxes.cls.cpu().tolist()
         
-        for box, track_id, cls_id in zip(boxes, track_ids, cls_ids):
-            cls_id = int(cls_id)
-            if cls_id in self.TARGET_CLASSES:
-                x, y, w, h = map(int, box)
-                cls_name = self.TARGET_CLASSES[cls_id]
-                
-                # 使用特殊颜色标记特殊车辆
-                color = self.special_vehicles[cls_id]['color'] if cls_id in self.special_vehicles else (0, 255, 0)
-                
-                # 绘制边界框
-                cv2.rectangle(frame, (x-w//2, y-h//2), (x+w//2, y+h//2), color, 2)
-                
-                # 添加标签
-                label = f'{cls_name} #{track_id} ({x},{y})'
-                cv2.putText(frame, label, (x-w//2, y-h//2-10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-
-        return frame
+        # 使用特殊颜色标记特殊车辆(与实时推送、录制的标注一致)
+        annotator = FrameAnnotator(self.TARGET_CLASSES, self.special_vehicles)
+        return annotator.draw(frame, FrameDetections.of(results))
 
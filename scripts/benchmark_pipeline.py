@@ -0,0 +1,451 @@
+#!/usr/bin/env python
+"""
+Vehicle Detection 端到端流水线基准
+
+功能:
+- 生成合成视频：道路背景上移动的车辆图像，画面顶部编码帧序号(二进制条码)
+- 输入源：
+    stream  本地MJPEG-over-HTTP服务按帧率推流，模拟RTSP摄像头(默认)
+    file    合成的mp4文件，解码不限速，测量解码吞吐(推理只取最新帧，大部分帧被跳过)
+- 使用真实的DetectionService检测流水线(线程模式、共享批量推理引擎、事件/录制阶段、SQLite数据库)
+- 摄像头数量逐级增加，每一级在独立子进程中运行，报告：
+    每路摄像头推理帧率、丢帧数
+    端到端延迟分位数(推流发出该帧 -> 推理结果返回；有检测目标时另报告事件阶段处理完成)
+    进程CPU占用(单核百分比)、峰值RSS
+- 结果保存为JSON(含提交号)，可与之前的结果对比，检查性能回退
+
+使用方法:
+    python scripts/benchmark_pipeline.py [options]
+
+选项:
+    --cameras       摄像头数量序列，默认1,2,4
+    --duration      每级推流时长(秒)，默认20
+    --fps           合成视频帧率，默认15
+    --size          合成视频分辨率，默认640x360
+    --source        输入源类型 stream/file，默认stream
+    --model         模型文件(相对app/assets/models)，默认yolov8n.pt
+    --warmup        每级开始后不计入统计的时长(秒)，默认3
+    --no-record     不录制视频
+    --output        结果JSON路径，默认outputs/benchmarks/pipeline-<提交号>.json
+    --compare       与之前的结果JSON对比
+    --max-regression 对比时帧率下降或p95延迟上升超过该百分比则失败
+
+注意事项:
+1. 模型文件需放在app/assets/models下(如yolov8n.pt)
+2. file模式下帧没有推流时间，只报告吞吐，不报告端到端延迟；文件读完即结束，预热只跳过首帧
+3. 帧率和延迟只统计推理结果(无检测目标的帧不进入事件阶段，event_latency_ms可能为空)
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+# 帧序号条码：画面顶部BAR_BITS个黑白块
+BAR_BITS = 16
+BAR_HEIGHT_RATIO = 0.06
+
+
+# ---------------------------------------------------------------------------
+# 合成视频
+# ---------------------------------------------------------------------------
+
+def encode_index(frame, index):
+    """在画面顶部绘制帧序号条码"""
+    height, width = frame.shape[:2]
+    bar_height = max(8, int(height * BAR_HEIGHT_RATIO))
+    block = width / BAR_BITS
+    for bit in range(BAR_BITS):
+        value = 255 if (index >> bit) & 1 else 0
+        frame[:bar_height, int(bit * block):int((bit + 1) * block)] = value
+
+
+def decode_index(frame):
+    """从画面(可能已缩小)读取帧序号"""
+    height, width = frame.shape[:2]
+    row = max(4, int(height * BAR_HEIGHT_RATIO)) // 2
+    block = width / BAR_BITS
+    index = 0
+    for bit in range(BAR_BITS):
+        if frame[row, int((bit + 0.5) * block)].mean() > 127:
+            index |= 1 << bit
+    return index
+
+
+def make_frames(count, width, height):
+    """
+    生成合成视频帧(JPEG)
+    车辆图像使用ultralytics自带的bus.jpg，不存在时使用矩形
+    """
+    import cv2
+    import numpy as np
+
+    sprite = None
+    try:
+        import ultralytics
+        image = cv2.imread(os.path.join(os.path.dirname(ultralytics.__file__), 'assets', 'bus.jpg'))
+        if image is not None:
+            sprite_height = int(height * 0.6)
+            sprite = cv2.resize(image, (int(image.shape[1] * sprite_height / image.shape[0]), sprite_height))
+    except ImportError:
+        pass
+    if sprite is None:
+        sprite = np.full((int(height * 0.4), int(width * 0.3), 3), (40, 40, 200), dtype=np.uint8)
+
+    background = np.full((height, width, 3), 90, dtype=np.uint8)
+    background[int(height * 0.7):] = 60
+    top = int(height * 0.25)
+    travel = width + sprite.shape[1]
+    frames = []
+    for index in range(count):
+        frame = background.copy()
+        # 车辆从左向右循环移动
+        x = int(index * 4) % travel - sprite.shape[1]
+        left, right = max(0, x), min(width, x + sprite.shape[1])
+        if right > left:
+            frame[top:top + sprite.shape[0], left:right] = sprite[:, left - x:right - x]
+        encode_index(frame, index)
+        ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        frames.append(buf.tobytes())
+    return frames
+
+
+def write_video(path, frames, fps):
+    """将合成帧写为mp4文件"""
+    import cv2
+    import numpy as np
+
+    first = cv2.imdecode(np.frombuffer(frames[0], np.uint8), cv2.IMREAD_COLOR)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (first.shape[1], first.shape[0]))
+    for data in frames:
+        writer.write(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR))
+    writer.release()
+
+
+class MjpegServer:
+    """本地MJPEG推流服务：/cam<N>.mjpg 按帧率推送合成帧，记录每帧发出时间"""
+
+    def __init__(self, frames, fps):
+        self.frames = frames
+        self.fps = fps
+        # {摄像头ID: {帧序号: 发出时间}}
+        self.emitted = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                camera_id = int(self.path.strip('/').split('.')[0][3:])
+                times = server.emitted.setdefault(camera_id, {})
+                self.send_response(200)
+                self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+                self.end_headers()
+                start = time.monotonic()
+                for index, data in enumerate(server.frames):
+                    # 按帧率定时发送，不因客户端读取慢而累积
+                    delay = start + index / server.fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    try:
+                        self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                                         + str(len(data)).encode() + b'\r\n\r\n' + data + b'\r\n')
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+                    times[index] = time.monotonic()
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def url(self, camera_id):
+        return f"http://127.0.0.1:{self._httpd.server_port}/cam{camera_id}.mjpg"
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+# ---------------------------------------------------------------------------
+# 单级测量(子进程)
+# ---------------------------------------------------------------------------
+
+def rss_mb():
+    """当前进程RSS(MB)"""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def pick(p):
+        return round(values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] * 1000, 1)
+    return {'p50': pick(50), 'p90': pick(90), 'p95': pick(95), 'p99': pick(99),
+            'mean': round(statistics.fmean(values) * 1000, 1), 'count': len(values)}
+
+
+def run_level(args, cameras):
+    """运行一级测量：cameras路摄像头同时检测"""
+    from app import create_app, db
+    from app.config.config import Config
+    from app.config.scheduler_config import scheduler
+    from app.models.camera import Camera
+    from app.services.detection_service import DetectionService
+    from app.utils.inference_engine import CameraChannel, inference_engines
+
+    work_dir = tempfile.mkdtemp(prefix='pipeline-bench-')
+    width, height = (int(value) for value in args.size.split('x'))
+    frame_count = int(args.duration * args.fps)
+    frames = make_frames(frame_count, width, height)
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+
+    app = create_app(BenchmarkConfig)
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+
+    server = None
+    if args.source == 'stream':
+        server = MjpegServer(frames, args.fps)
+        urls = {camera_id: server.url(camera_id) for camera_id in range(1, cameras + 1)}
+    else:
+        video_path = os.path.join(work_dir, 'synthetic.mp4')
+        write_video(video_path, frames, args.fps)
+        urls = {camera_id: video_path for camera_id in range(1, cameras + 1)}
+
+    # 记录推理结果和事件阶段完成时间：{摄像头ID: [(帧序号, 时间)]}
+    inferred = {camera_id: [] for camera_id in urls}
+    handled = {camera_id: [] for camera_id in urls}
+    original_infer = CameraChannel.infer
+    original_events = DetectionService._handle_frame_events
+
+    def timed_infer(channel, frame, *infer_args, **infer_kwargs):
+        result = original_infer(channel, frame, *infer_args, **infer_kwargs)
+        inferred[channel.camera_id].append((decode_index(frame), time.monotonic()))
+        return result
+
+    def timed_events(camera_id, camera, results, *event_args, **event_kwargs):
+        original_events(camera_id, camera, results, *event_args, **event_kwargs)
+        handled[camera_id].append((decode_index(results.orig_img), time.monotonic()))
+
+    CameraChannel.infer = timed_infer
+    DetectionService._handle_frame_events = staticmethod(timed_events)
+
+    samples = []
+    status = {}
+    engines = []
+    try:
+        with app.app_context():
+            db.create_all()
+            for camera_id in urls:
+                db.session.add(Camera(name=f"bench-{camera_id}", ip_address='127.0.0.1',
+                                      port=0, url=urls[camera_id], restricted_areas=[{
+                                          'id': 1,
+                                          'points': [[0, height // 2], [width // 2, height // 2],
+                                                     [width // 2, height], [0, height]]
+                                      }]))
+            db.session.commit()
+            # 新建的数据库中摄像头ID从1开始依次分配，与推流路径一致
+            assert [camera.id for camera in Camera.query.order_by(Camera.id)] == list(urls)
+
+            cpu_start, wall_start = sum(os.times()[:2]), time.monotonic()
+            for camera_id, url in urls.items():
+                DetectionService.start_detection({
+                    'camera_id': camera_id,
+                    'stream_url': url,
+                    'model_path': args.model,
+                    'tracker_type': 'bytetrack',
+                    'inference_mode': 'batched',
+                    'worker_mode': 'thread',
+                    'record': args.record,
+                    'save_dir': os.path.join(work_dir, 'videos')
+                })
+
+            # 采样CPU/RSS和流水线状态，直到所有摄像头的输入结束
+            deadline = wall_start + args.duration + 120
+            while DetectionService.active_threads and time.monotonic() < deadline:
+                time.sleep(0.5)
+                samples.append(rss_mb())
+                for camera_id, camera_status in DetectionService.get_processing_status().items():
+                    status[camera_id] = camera_status
+                # 引擎在最后一路摄像头结束时关闭，保留最后一次快照
+                engines = inference_engines.stats() or engines
+            cpu_seconds = sum(os.times()[:2]) - cpu_start
+            wall_seconds = time.monotonic() - wall_start
+    finally:
+        CameraChannel.infer = original_infer
+        DetectionService._handle_frame_events = staticmethod(original_events)
+        if server is not None:
+            server.close()
+
+    per_camera = []
+    infer_latency, event_latency = [], []
+    for camera_id in urls:
+        emitted = server.emitted.get(camera_id, {}) if server is not None else {}
+        # 跳过预热阶段(模型加载、引擎启动)；文件解码不限速，只跳过首帧
+        if server is not None:
+            warm = [(index, at) for index, at in inferred[camera_id] if index >= args.warmup * args.fps]
+        else:
+            warm = inferred[camera_id][1:]
+        fps = None
+        if len(warm) > 1 and warm[-1][1] > warm[0][1]:
+            fps = round((len(warm) - 1) / (warm[-1][1] - warm[0][1]), 2)
+        camera_infer = [at - emitted[index] for index, at in warm if index in emitted]
+        camera_events = [at - emitted[index] for index, at in handled[camera_id]
+                         if index >= args.warmup * args.fps and index in emitted]
+        infer_latency += camera_infer
+        event_latency += camera_events
+        pipeline = status.get(camera_id, {}).get('pipeline', {})
+        per_camera.append({
+            'camera_id': camera_id,
+            'fps': fps,
+            'inferred_frames': len(inferred[camera_id]),
+            'event_frames': len(handled[camera_id]),
+            'emitted_frames': len(emitted) if server is not None else frame_count,
+            'latency_ms': percentiles(camera_infer),
+            'source': pipeline.get('source'),
+            'queues': pipeline.get('queues')
+        })
+
+    fps_values = [camera['fps'] for camera in per_camera if camera['fps']]
+    return {
+        'cameras': cameras,
+        'fps_mean': round(statistics.fmean(fps_values), 2) if fps_values else None,
+        'fps_min': min(fps_values) if fps_values else None,
+        'fps_total': round(sum(fps_values), 2) if fps_values else None,
+        'latency_ms': percentiles(infer_latency),
+        'event_latency_ms': percentiles(event_latency),
+        'cpu_percent': round(cpu_seconds / wall_seconds * 100, 1) if wall_seconds else None,
+        'rss_mb_peak': round(max(samples), 1) if samples else round(rss_mb(), 1),
+        'wall_seconds': round(wall_seconds, 2),
+        'engines': engines,
+        'per_camera': per_camera
+    }
+
+
+# ---------------------------------------------------------------------------
+# 汇总与对比
+# ---------------------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current, baseline, max_regression=None):
+    """与之前的结果对比，返回回退说明列表"""
+    regressions = []
+    previous = {level['cameras']: level for level in baseline.get('levels', [])}
+    print(f"\n对比 {baseline.get('commit')} -> {current.get('commit')}")
+    for level in current['levels']:
+        old = previous.get(level['cameras'])
+        if old is None:
+            continue
+        metrics = [('fps_mean', level['fps_mean'], old['fps_mean'], False),
+                   ('latency_p95', (level['latency_ms'] or {}).get('p95'), (old['latency_ms'] or {}).get('p95'), True),
+                   ('cpu_percent', level['cpu_percent'], old['cpu_percent'], True),
+                   ('rss_mb_peak', level['rss_mb_peak'], old['rss_mb_peak'], True)]
+        for name, new_value, old_value, lower_is_better in metrics:
+            if new_value is None or not old_value:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            print(f"  {level['cameras']}路 {name:<12} {old_value:>10} -> {new_value:>10} ({change:+.1f}%)")
+            worse = change if lower_is_better else -change
+            if max_regression is not None and name in ('fps_mean', 'latency_p95') and worse > max_regression:
+                regressions.append(f"{level['cameras']} cameras {name} regressed {worse:.1f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vehicle Detection 端到端流水线基准')
+    parser.add_argument('--cameras', default='1,2,4', help='摄像头数量序列，逗号分隔')
+    parser.add_argument('--duration', type=float, default=20, help='每级推流时长(秒)')
+    parser.add_argument('--fps', type=float, default=15, help='合成视频帧率')
+    parser.add_argument('--size', default='640x360', help='合成视频分辨率')
+    parser.add_argument('--source', choices=('stream', 'file'), default='stream', help='输入源类型')
+    parser.add_argument('--model', default='yolov8n.pt', help='模型文件(相对app/assets/models)')
+    parser.add_argument('--warmup', type=float, default=3, help='不计入统计的预热时长(秒)')
+    parser.add_argument('--no-record', dest='record', action='store_false', help='不录制视频')
+    parser.add_argument('--output', help='结果JSON路径')
+    parser.add_argument('--compare', help='与之前的结果JSON对比')
+    parser.add_argument('--max-regression', type=float, help='允许的帧率下降/p95延迟上升百分比')
+    parser.add_argument('--level', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.level:
+        # 子进程：运行一级测量，结果输出到标准输出最后一行
+        print(json.dumps(run_level(args, args.level)))
+        return
+
+    if not os.path.exists(PROJECT_ROOT / 'app' / 'assets' / 'models' / args.model):
+        sys.exit(f"Model not found: app/assets/models/{args.model}")
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'config': {key: getattr(args, key) for key in ('duration', 'fps', 'size', 'source', 'model',
+                                                        'warmup', 'record')},
+        'levels': []
+    }
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get('PYTHONPATH')]))
+    # 推流结束即测量结束，不重连
+    env['STREAM_RECONNECT'] = 'false'
+
+    print(f"{'摄像头':<8}{'帧率/路':>10}{'最低帧率':>10}{'p50(ms)':>10}{'p95(ms)':>10}"
+          f"{'p99(ms)':>10}{'CPU%':>8}{'RSS(MB)':>10}")
+    for cameras in [int(value) for value in args.cameras.split(',') if value]:
+        command = [sys.executable, __file__, *sys.argv[1:], '--level', str(cameras)]
+        result = subprocess.run(command, cwd=PROJECT_ROOT, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            sys.exit(f"Benchmark level {cameras} failed:\n{result.stderr[-4000:]}")
+        level = json.loads(result.stdout.strip().splitlines()[-1])
+        report['levels'].append(level)
+        latency = level['latency_ms'] or {}
+        print(f"{cameras:<8}{level['fps_mean'] or '-':>10}{level['fps_min'] or '-':>10}"
+              f"{latency.get('p50', '-'):>10}{latency.get('p95', '-'):>10}{latency.get('p99', '-'):>10}"
+              f"{level['cpu_percent']:>8}{level['rss_mb_peak']:>10}")
+
+    output = args.output or str(PROJECT_ROOT / 'outputs' / 'benchmarks' / f"pipeline-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    print(f"\n结果已保存: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(report, json.load(file), args.max_regression)
+        for regression in regressions:
+            print(f"FAIL: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
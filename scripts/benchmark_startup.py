@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Vehicle Detection 启动耗时基准
+
+功能:
+- 在全新子进程中测量冷启动耗时：import app、create_app()、import run
+- 以空解释器(python -c pass)为基线，报告中位数/最小值和峰值内存
+- 检查启动后是否加载了重依赖(cv2/torch/ultralytics/pandas/plotly/shapely)
+- 超过耗时上限或加载了重依赖时以非零状态退出，便于在CI中跟踪回退
+
+使用方法:
+    python scripts/benchmark_startup.py [options]
+
+选项:
+    --runs          每项测量次数，默认5
+    --max-seconds   create_app()耗时中位数上限，超过则失败
+    --allow-heavy   不检查重依赖是否被加载
+    --json          以JSON输出结果
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 启动阶段不应加载的重依赖
+HEAVY_MODULES = ['cv2', 'torch', 'ultralytics', 'pandas', 'plotly', 'shapely']
+
+# 子进程测量脚本：执行目标语句后输出耗时、峰值内存和已加载的重依赖
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [name for name in {heavy!r} if name in sys.modules]
+}}))
+"""
+
+TARGETS = {
+    'baseline': 'pass',
+    'import app': 'import app',
+    'create_app()': 'from app import create_app; create_app()',
+    'import run': 'import run',
+}
+
+
+def measure(statement, env):
+    """在全新解释器中执行一次测量，返回(总耗时, 探测结果)"""
+    code = PROBE.format(statement=statement, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', code], cwd=PROJECT_ROOT, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vehicle Detection 启动耗时基准')
+    parser.add_argument('--runs', type=int, default=5, help='每项测量次数')
+    parser.add_argument('--max-seconds', type=float, help='create_app()耗时中位数上限(秒)')
+    parser.add_argument('--allow-heavy', action='store_true', help='不检查重依赖是否被加载')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get('PYTHONPATH')]))
+    # 未配置数据库时使用内存SQLite，避免依赖外部MySQL
+    env.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+
+    report = {}
+    for name, statement in TARGETS.items():
+        samples = [measure(statement, env) for _ in range(max(1, args.runs))]
+        seconds = [sample['seconds'] for sample in samples]
+        report[name] = {
+            'median_seconds': round(statistics.median(seconds), 4),
+            'min_seconds': round(min(seconds), 4),
+            'maxrss_mb': round(max(sample['maxrss_mb'] for sample in samples), 1),
+            'heavy_modules': sorted({module for sample in samples for module in sample['heavy']})
+        }
+
+    failures = []
+    create_app_time = report['create_app()']['median_seconds']
+    if args.max_seconds is not None and create_app_time > args.max_seconds:
+        failures.append(f"create_app() median {create_app_time:.3f}s exceeds {args.max_seconds:.3f}s")
+    if not args.allow_heavy:
+        for name, result in report.items():
+            if result['heavy_modules']:
+                failures.append(f"{name} loaded heavy modules: {', '.join(result['heavy_modules'])}")
+
+    if args.json:
+        print(json.dumps({'results': report, 'failures': failures}, indent=2, ensure_ascii=False))
+    else:
+        print(f"{'目标':<16}{'中位数(s)':>12}{'最小值(s)':>12}{'峰值内存(MB)':>14}  重依赖")
+        for name, result in report.items():
+            print(f"{name:<16}{result['median_seconds']:>12.3f}{result['min_seconds']:>12.3f}"
+                  f"{result['maxrss_mb']:>14.1f}  {', '.join(result['heavy_modules']) or '-'}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
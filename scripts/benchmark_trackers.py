@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+Vehicle Detection 跟踪器基准
+
+功能:
+- 生成合成检测序列：目标匀速运动，叠加位置噪声、置信度波动和随机漏检
+- 分别用botsort、bytetrack、iou跟踪器(与batched实时检测相同的CameraTracker配置)处理同一序列
+- 报告每帧update耗时(平均/p95，微秒)、ID切换次数和输出目标数，不涉及模型推理
+
+使用方法:
+    python scripts/benchmark_trackers.py [options]
+
+选项:
+    --objects       每帧目标数，逗号分隔，默认5,20,50
+    --frames        每组序列帧数，默认300
+    --miss-rate     单个目标漏检概率，默认0.05
+    --trackers      参与比较的跟踪器，逗号分隔，默认botsort,bytetrack,iou
+    --seed          随机种子，默认0
+    --json          以JSON输出结果
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.utils.inference_engine import CameraTracker  # noqa: E402
+from app.utils.yolo_integration import YOLOIntegration  # noqa: E402
+
+FRAME_SHAPE = (720, 1280)
+VEHICLE_CLASSES = (2, 3, 5, 7)
+
+
+def make_sequence(objects, frames, miss_rate, rng):
+    """
+    生成合成检测序列
+    Returns:
+        list: 每帧(检测数组(n,6) [x1,y1,x2,y2,conf,cls], 对应的真实目标编号(n,))
+    """
+    height, width = FRAME_SHAPE
+    size = rng.uniform(40, 120, size=(objects, 2))
+    position = rng.uniform([0, 0], [width - 120, height - 120], size=(objects, 2))
+    velocity = rng.uniform(-6, 6, size=(objects, 2))
+    classes = rng.choice(VEHICLE_CLASSES, size=objects).astype(np.float32)
+
+    sequence = []
+    for _ in range(frames):
+        position += velocity
+        # 碰到画面边缘反弹，目标始终在画面内
+        for axis, limit in ((0, width), (1, height)):
+            out = (position[:, axis] < 0) | (position[:, axis] + size[:, axis] > limit)
+            velocity[out, axis] *= -1
+            position[:, axis] = np.clip(position[:, axis], 0, limit - size[:, axis])
+
+        visible = np.flatnonzero(rng.random(objects) >= miss_rate)
+        noise = rng.normal(0, 1.5, size=(len(visible), 4))
+        boxes = np.hstack([position[visible], position[visible] + size[visible]]) + noise
+        conf = rng.uniform(0.4, 0.95, size=(len(visible), 1))
+        detections = np.hstack([boxes, conf, classes[visible, None]]).astype(np.float32)
+        sequence.append((detections, visible))
+    return sequence
+
+
+def run_tracker(name, sequence, image):
+    """用指定跟踪器处理序列，返回耗时和ID统计"""
+    from ultralytics.engine.results import Boxes  # type: ignore
+
+    tracker = CameraTracker(YOLOIntegration.TRACKER_OPTIONS[name]).tracker
+    durations = []
+    assigned = {}
+    switches = 0
+    outputs = 0
+    for detections, truth in sequence:
+        boxes = Boxes(detections, FRAME_SHAPE)
+        started = time.perf_counter()
+        tracks = tracker.update(boxes, image)
+        durations.append(time.perf_counter() - started)
+
+        outputs += len(tracks)
+        for row in tracks:
+            target = int(truth[int(row[-1])])
+            track_id = int(row[4])
+            if assigned.get(target, track_id) != track_id:
+                switches += 1
+            assigned[target] = track_id
+
+    micros = np.asarray(durations) * 1e6
+    return {
+        'mean_us': round(float(micros.mean()), 1),
+        'p95_us': round(float(np.percentile(micros, 95)), 1),
+        'id_switches': switches,
+        'tracks_per_frame': round(outputs / len(sequence), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vehicle Detection 跟踪器基准')
+    parser.add_argument('--objects', default='5,20,50', help='每帧目标数，逗号分隔')
+    parser.add_argument('--frames', type=int, default=300, help='每组序列帧数')
+    parser.add_argument('--miss-rate', type=float, default=0.05, help='单个目标漏检概率')
+    parser.add_argument('--trackers', default='botsort,bytetrack,iou', help='参与比较的跟踪器')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    args = parser.parse_args()
+
+    trackers = [name.strip() for name in args.trackers.split(',') if name.strip()]
+    for name in trackers:
+        if not YOLOIntegration.TRACKER_OPTIONS.get(name):
+            parser.error(f"unknown tracker: {name}")
+
+    # botsort的全局运动补偿需要图像，使用与画面同尺寸的灰度噪声图
+    image = np.random.default_rng(args.seed).integers(0, 255, size=(*FRAME_SHAPE, 3), dtype=np.uint8)
+
+    report = {}
+    for objects in (int(value) for value in args.objects.split(',')):
+        sequence = make_sequence(objects, args.frames, args.miss_rate, np.random.default_rng(args.seed))
+        report[objects] = {name: run_tracker(name, sequence, image) for name in trackers}
+
+    if args.json:
+        print(json.dumps({'frames': args.frames, 'miss_rate': args.miss_rate, 'results': report},
+                         indent=2, ensure_ascii=False))
+        return
+
+    print(f"{'目标数':<8}{'跟踪器':<12}{'平均(us)':>12}{'p95(us)':>12}{'ID切换':>10}{'输出/帧':>10}")
+    for objects, results in report.items():
+        for name, result in results.items():
+            print(f"{objects:<8}{name:<12}{result['mean_us']:>12.1f}{result['p95_us']:>12.1f}"
+                  f"{result['id_switches']:>10}{result['tracks_per_frame']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
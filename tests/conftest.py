@@ -8,6 +8,7 @@
 - 测试客户端
 - 数据库session
 - Mock对象
+- 检测结果(Results)和测试图片工厂
 """
 
 import sys
@@ -196,3 +197,40 @@ def mock_detection_result():
     mock_result.boxes.cls.cpu.return_value.tolist.return_value = [2]  # car
     mock_result.plot.return_value = Mock()
     return mock_result
+
+
+@pytest.fixture
+def make_result():
+    """
+    构建Ultralytics检测结果的工厂
+    make_result(rows, shape=(480, 640), names=None)
+    rows为[x1, y1, x2, y2, conf, cls]或带跟踪ID的[x1, y1, x2, y2, id, conf, cls]
+    """
+    import numpy as np
+    import torch
+    from ultralytics.engine.results import Results
+
+    def factory(rows, shape=(480, 640), names=None):
+        data = np.asarray(rows, dtype=np.float32)
+        if not data.size:
+            data = data.reshape(0, 6)
+        frame = np.zeros((*shape, 3), dtype=np.uint8)
+        names = names or {0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck'}
+        return Results(frame, path='', names=names, boxes=torch.as_tensor(data))
+    return factory
+
+
+@pytest.fixture
+def write_images():
+    """
+    写入测试图片的工厂
+    write_images(directory, count, size=(400, 200))，文件名0000.jpg起，第index张像素值为index*40(对256取模)
+    """
+    import cv2
+    import numpy as np
+
+    def factory(directory, count, size=(400, 200)):
+        for index in range(count):
+            frame = np.full((size[1], size[0], 3), index * 40 % 256, dtype=np.uint8)
+            cv2.imwrite(os.path.join(str(directory), f"{index:04d}.jpg"), frame)
+    return factory
@@ -6,9 +6,12 @@
 - Config类
 - 调度器配置
 - 应用初始化
+- 延迟导入与启动依赖
 """
 
+import json
 import os
+import subprocess
 import sys
 
 # 确保项目路径优先
@@ -122,3 +125,51 @@ class TestTestConfigClass:
         
         assert 'sqlite' in LocalTestConfig.SQLALCHEMY_DATABASE_URI
         assert LocalTestConfig.SQLALCHEMY_TRACK_MODIFICATIONS is False
+
+
+class TestLazyStartup:
+    """延迟导入与启动依赖测试"""
+
+    PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    HEAVY_MODULES = ['cv2', 'torch', 'ultralytics', 'pandas', 'plotly', 'shapely']
+
+    def test_lazy_import_module(self):
+        """测试模块代理在首次访问时导入"""
+        from app.utils.lazy_import import LazyImport
+
+        proxy = LazyImport('json')
+        assert proxy.loaded is False
+        assert proxy.dumps({'a': 1}) == '{"a": 1}'
+        assert proxy.loaded is True
+
+    def test_lazy_import_attribute(self):
+        """测试属性代理可直接调用"""
+        from app.utils.lazy_import import LazyImport
+
+        proxy = LazyImport('collections', 'OrderedDict')
+        assert proxy(a=1) == {'a': 1}
+        assert 'collections.OrderedDict' in repr(proxy)
+
+    def test_lazy_import_missing_module(self):
+        """测试导入失败在首次使用时抛出"""
+        import pytest
+        from app.utils.lazy_import import LazyImport
+
+        proxy = LazyImport('app.utils.no_such_module')
+        with pytest.raises(ImportError):
+            proxy.anything
+
+    def test_create_app_does_not_load_heavy_modules(self):
+        """测试应用启动不加载检测和图表依赖"""
+        code = (
+            "import json, sys\n"
+            "from app import create_app\n"
+            "app = create_app()\n"
+            f"print(json.dumps([name for name in {self.HEAVY_MODULES!r} if name in sys.modules]))\n"
+        )
+        env = dict(os.environ, PYTHONPATH=self.PROJECT_ROOT, DATABASE_URL='sqlite:///:memory:')
+        result = subprocess.run([sys.executable, '-c', code], cwd=self.PROJECT_ROOT, env=env,
+                                capture_output=True, text=True, timeout=120)
+
+        assert result.returncode == 0, result.stderr
+        assert json.loads(result.stdout.strip().splitlines()[-1]) == []
@@ -856,6 +856,7 @@ class TestAnalyzeFile:
         payload = {
             "source": "/path/to/video.mp4",
             "model": "yolov8n.pt",
+            "wait": True,
             "tracker_type": "botsort"
         }
 
@@ -884,7 +885,8 @@ class TestAnalyzeFile:
 
         payload = {
             "source": "/path/to/image.jpg",
-            "model": "yolov8n.pt"
+            "model": "yolov8n.pt",
+            "wait": True
         }
 
         resp = client.post("/detection/analyze", json=payload)
@@ -908,6 +910,7 @@ class TestAnalyzeFile:
         payload = {
             "source": "/path/to/video.mp4",
             "model": "yolov8n.pt",
+            "wait": True,
             "tracker_type": "bytetrack"
         }
 
@@ -1273,7 +1276,8 @@ class TestDetectionExceptionHandling:
         try:
             resp = client.post("/detection/analyze", json={
                 "source": "/nonexistent/file.mp4",
-                "model": "yolov8n.pt"
+                "model": "yolov8n.pt",
+                "wait": True
             })
             
             assert resp.status_code >= 400
@@ -27,6 +27,19 @@ class TestConnectRoutes:
         assert 'message' in data
         assert 'running' in data['message']
 
+    @patch('app.services.detection_service.DetectionService.get_processing_status')
+    def test_metrics_route(self, mock_status, client):
+        """测试Prometheus指标路由"""
+        mock_status.return_value = {1: {'status': 'running', 'pipeline': {'frames': 5, 'queues': {}}}}
+
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        text = response.get_data(as_text=True)
+        assert 'vehicle_detection_frames_total{camera="1"} 5' in text
+        assert 'vehicle_detection_active_cameras 1' in text
+
 
 class TestAuthRoutes:
     """认证路由测试"""
@@ -239,11 +252,116 @@ class TestDetectionRoutes:
         
         response = client.post('/detection/analyze', json={
             'source': '/path/to/video.mp4',
-            'model': 'yolov8n.pt'
+            'model': 'yolov8n.pt',
+            'wait': True
         })
         
         assert response.status_code == 200
     
+    @patch('app.services.detection_service.DetectionService.analyze_file')
+    def test_analyze_file_async_job(self, mock_analyze, client, tmp_path):
+        """测试异步提交分析任务并查询状态和结果"""
+        import time
+
+        source = tmp_path / 'video.mp4'
+        source.write_bytes(b'')
+        mock_analyze.return_value = {'success': True, 'results': {'total_frames': 3}}
+
+        response = client.post('/detection/analyze', json={'source': str(source), 'model': 'yolov8n.pt'})
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+
+        deadline = time.time() + 5
+        while client.get(f'/detection/analyze/jobs/{job_id}').get_json()['status'] != 'completed':
+            assert time.time() < deadline
+            time.sleep(0.01)
+
+        result = client.get(f'/detection/analyze/jobs/{job_id}/result')
+        assert result.status_code == 200
+        assert result.get_json()['results']['total_frames'] == 3
+        assert job_id in [job['job_id'] for job in client.get('/detection/analyze/jobs').get_json()['jobs']]
+
+    def test_analyze_file_async_invalid_source(self, client, tmp_path):
+        """测试异步提交时校验输入文件"""
+        response = client.post('/detection/analyze', json={'source': str(tmp_path / 'missing.mp4'),
+                                                            'model': 'yolov8n.pt'})
+        assert response.status_code == 404
+
+        text = tmp_path / 'notes.txt'
+        text.write_text('x')
+        response = client.post('/detection/analyze', json={'source': str(text), 'model': 'yolov8n.pt'})
+        assert response.status_code == 400
+
+        assert client.get('/detection/analyze/jobs/unknown').status_code == 404
+        assert client.post('/detection/analyze/jobs/unknown/cancel').status_code == 404
+
+    def test_get_analysis_detections_paging(self, client, tmp_path, monkeypatch):
+        """测试分页查询文件分析的检测结果"""
+        from app.services.detection_service import DetectionService
+        from app.utils.detection_artifact import DetectionArtifactWriter
+
+        monkeypatch.setattr(DetectionService, 'ANALYSIS_OUTPUT_DIR', str(tmp_path))
+        path = str(tmp_path / 'video_detections.ndjson')
+        with DetectionArtifactWriter(path) as artifact:
+            for frame in range(3):
+                artifact.write(frame, [{'track_id': 1, 'class': 'car', 'position': [1, 2, 3, 4]}])
+
+        response = client.get('/detection/analyze/detections', query_string={'path': path, 'offset': 1, 'limit': 1})
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['total'] == 3
+        assert data['next_offset'] == 2
+        assert data['frames'][0]['frame'] == 1
+
+    def test_get_analysis_detections_not_found(self, client, tmp_path, monkeypatch):
+        """测试查询不存在的检测结果文件"""
+        from app.services.detection_service import DetectionService
+
+        monkeypatch.setattr(DetectionService, 'ANALYSIS_OUTPUT_DIR', str(tmp_path))
+        response = client.get('/detection/analyze/detections',
+                              query_string={'path': str(tmp_path / 'missing_detections.ndjson')})
+
+        assert response.status_code == 404
+        response = client.get('/detection/analyze/detections', query_string={'job_id': 'unknown'})
+        assert response.status_code == 404
+
+    def test_get_analysis_detections_outside_output_dir(self, client, tmp_path, monkeypatch):
+        """测试分页查询拒绝读取分析输出目录之外的文件"""
+        from app.services.detection_service import DetectionService
+        from app.utils.detection_artifact import DetectionArtifactWriter
+
+        outputs = tmp_path / 'outputs'
+        outputs.mkdir()
+        monkeypatch.setattr(DetectionService, 'ANALYSIS_OUTPUT_DIR', str(outputs))
+        path = str(tmp_path / 'other_detections.ndjson')
+        with DetectionArtifactWriter(path) as artifact:
+            artifact.write(0, [])
+
+        for query in (path, str(outputs / '..' / 'other_detections.ndjson')):
+            response = client.get('/detection/analyze/detections', query_string={'path': query})
+            assert response.status_code == 403
+
+    @patch('app.services.detection_service.analysis_jobs')
+    def test_get_analysis_detections_by_job(self, mock_jobs, client, tmp_path):
+        """测试按任务ID定位检测结果文件，任务未完成返回409"""
+        from app.utils.detection_artifact import DetectionArtifactWriter
+
+        path = str(tmp_path / 'video_detections.ndjson')
+        with DetectionArtifactWriter(path) as artifact:
+            artifact.write(0, [])
+        job = Mock(status='completed', result={'results': {'detections_path': path}})
+        mock_jobs.get.return_value = job
+
+        response = client.get('/detection/analyze/detections', query_string={'job_id': 'abc'})
+        assert response.status_code == 200
+        assert response.get_json()['total'] == 1
+        mock_jobs.get.assert_called_with('abc')
+
+        job.status = 'running'
+        response = client.get('/detection/analyze/detections', query_string={'job_id': 'abc'})
+        assert response.status_code == 409
+
     def test_configure_special_vehicles_success(self, client):
         """测试配置特殊车辆成功"""
         response = client.post('/detection/special-vehicles/config', json={
@@ -529,11 +529,81 @@ class TestDetectionService:
         
         status = DetectionService.get_processing_status()
         
-        assert status[1] == 'running'
-        assert status[2] == 'stopped'
+        assert status[1]['status'] == 'running'
+        assert status[2]['status'] == 'stopped'
         
         DetectionService.active_threads.clear()
     
+    def test_get_processing_status_reconnecting(self, app_context):
+        """测试获取处理状态 - 断线重连中的摄像头及其Prometheus指标"""
+        from app.services.detection_service import DetectionService
+        from app.utils.metrics import render_metrics
+        
+        pipeline = Mock()
+        pipeline.stats.return_value = {'source': {'kind': 'stream', 'reconnect': {
+            'state': 'reconnecting', 'disconnects': 3, 'reconnects': 2, 'attempts': 6,
+            'downtime_seconds': 41.5, 'current_downtime_seconds': 4.0, 'last_error': 'timeout'}}}
+        DetectionService.active_threads = {1: {'thread': Mock(), 'status': 'running', 'pipeline': pipeline}}
+        try:
+            status = DetectionService.get_processing_status()
+        finally:
+            DetectionService.active_threads.clear()
+        
+        assert status[1]['status'] == 'reconnecting'
+        text = render_metrics(status)
+        assert 'vehicle_detection_stream_reconnects_total{camera="1"} 2' in text
+        assert 'vehicle_detection_stream_downtime_seconds_total{camera="1"} 41.5' in text
+        assert 'vehicle_detection_cameras{status="reconnecting"} 1' in text
+    
+    def test_get_processing_status_cascade(self, app_context):
+        """测试获取处理状态 - 两级级联统计及其Prometheus指标"""
+        from app.services.detection_service import DetectionService
+        from app.utils.metrics import render_metrics
+        
+        pipeline = Mock()
+        pipeline.stats.return_value = {'cascade': {
+            'model': 'yolov8m.pt', 'frames': 120, 'runs': 18, 'run_ratio': 0.15,
+            'crops': {'low_conf': 25, 'area': 18}, 'rate_limited': 40, 'replaced': 21, 'added': 23}}
+        DetectionService.active_threads = {1: {'thread': Mock(), 'status': 'running', 'pipeline': pipeline}}
+        try:
+            status = DetectionService.get_processing_status()
+        finally:
+            DetectionService.active_threads.clear()
+        
+        assert status[1]['pipeline']['cascade']['runs'] == 18
+        text = render_metrics(status)
+        assert 'vehicle_detection_cascade_frames_total{camera="1"} 120' in text
+        assert 'vehicle_detection_cascade_runs_total{camera="1"} 18' in text
+        assert 'vehicle_detection_cascade_crops_total{camera="1",reason="area"} 18' in text
+    
+    def test_get_restricted_areas_for_cascade(self, app_context):
+        """测试级联复检禁停区域时读取禁停区域"""
+        from app.services.detection_service import DetectionService
+        
+        areas = [{'name': 'A', 'points': [[0, 0], [10, 0], [10, 10]]}]
+        data = {'camera_id': 1, 'restricted_areas': areas}
+        
+        assert DetectionService._get_restricted_areas(data) is None
+        assert DetectionService._get_restricted_areas({**data, 'cascade': {'model_path': 'yolov8m.pt'}}) == areas
+        assert DetectionService._get_restricted_areas(
+            {**data, 'cascade': {'model_path': 'yolov8m.pt', 'areas': False}}) is None
+    
+    def test_get_processing_status_cpu_allocation(self, app_context):
+        """测试获取处理状态 - 包含摄像头的核心分配"""
+        from app.services.detection_service import DetectionService
+        from app.utils.cpu_budget import core_budget
+        
+        DetectionService.active_threads = {1: {'thread': Mock(), 'status': 'running'}}
+        core_budget.acquire(1)
+        try:
+            status = DetectionService.get_processing_status()
+        finally:
+            core_budget.release(1)
+            DetectionService.active_threads.clear()
+        
+        assert status[1]['cpu']['threads'] == len(core_budget.cores)
+        assert status[1]['cpu']['cameras'] == 1
+    
     def test_get_all_detections(self, db_session):
         """测试获取所有检测记录"""
         from app.services.detection_service import DetectionService
@@ -719,6 +789,120 @@ class TestDetectionService:
         record = Detection.query.filter_by(camera_id=camera.id, video_path=video_path).first()
         assert record is None
 
+    @patch('app.services.detection_service.worker_supervisor')
+    def test_start_detection_process_mode(self, mock_supervisor, app_context):
+        """测试进程模式启动检测 - 由工作进程管理器启动并登记"""
+        from app.services.detection_service import DetectionService
+        
+        DetectionService.active_threads.clear()
+        worker = Mock(group='gate', pid=1234)
+        mock_supervisor.start_camera.return_value = (worker, {'success': True, 'camera_id': 9})
+        
+        result = DetectionService.start_detection({
+            'camera_id': 9,
+            'stream_url': 'rtsp://test',
+            'model_path': 'yolov8n.pt',
+            'save_dir': 'streams/9',
+            'worker_mode': 'process',
+            'worker_group': 'gate'
+        })
+        
+        assert result['success'] is True
+        assert result['worker'] == {'group': 'gate', 'pid': 1234}
+        assert DetectionService.active_threads[9]['worker'] is worker
+        
+        # 摄像头按分组占用核心，启动前下发给工作进程
+        from app.utils.cpu_budget import core_budget
+        resources = mock_supervisor.start_camera.call_args.kwargs['resources']
+        assert resources('gate') == core_budget.unit_allocation('worker:gate')
+        assert core_budget.allocation(9)['cameras'] == 1
+        mock_supervisor.update_resources.assert_called_with(resources)
+        
+        # 工作进程上报摄像头结束后移除并归还核心
+        worker.exitcode = 0
+        DetectionService._on_worker_camera_finished(worker, 9)
+        assert 9 not in DetectionService.active_threads
+        assert core_budget.allocation(9) is None
+    
+    @patch('app.services.detection_service.worker_supervisor')
+    @patch('app.services.detection_service.emit_streaming_result')
+    def test_start_detection_process_mode_failed(self, mock_emit, mock_supervisor, app_context):
+        """测试进程模式启动检测 - 工作进程启动失败"""
+        from app.services.detection_service import DetectionService
+        
+        DetectionService.active_threads.clear()
+        mock_supervisor.start_camera.return_value = (Mock(), {'success': False, 'message': 'bad model'})
+        
+        with pytest.raises(Exception, match='bad model'):
+            DetectionService.start_detection({'camera_id': 9, 'worker_mode': 'process'})
+        
+        assert 9 not in DetectionService.active_threads
+        mock_emit.assert_called_once_with(9, 'stopped')
+    
+    def test_start_detection_invalid_worker_mode(self, app_context):
+        """测试启动检测 - 非法运行方式"""
+        from app.services.detection_service import DetectionService
+        
+        DetectionService.active_threads.clear()
+        
+        with pytest.raises(Exception, match='Invalid worker mode'):
+            DetectionService.start_detection({'camera_id': 9, 'worker_mode': 'fiber'})
+    
+    def test_get_processing_status_process_worker(self, app_context):
+        """测试获取处理状态 - 合并工作进程上报的快照"""
+        from app.services.detection_service import DetectionService
+        
+        worker = Mock()
+        worker.camera_status.return_value = {'status': 'running', 'pipeline': {'frames': 42}}
+        worker.info.return_value = {'group': 'gate', 'pid': 1234, 'alive': True, 'cameras': [3]}
+        DetectionService.active_threads = {3: {'worker': worker, 'status': 'running'}}
+        
+        status = DetectionService.get_processing_status()
+        
+        assert status[3]['pipeline'] == {'frames': 42}
+        assert status[3]['worker']['pid'] == 1234
+        
+        DetectionService.active_threads.clear()
+    
+    @patch('app.services.detection_service.emit_violation_alert')
+    def test_publish_event_to_sink(self, mock_emit, app_context):
+        """测试工作进程中事件发送到管道而不是直接推送"""
+        from app.services.detection_service import DetectionService
+        
+        sink = Mock()
+        DetectionService.event_sink = sink
+        try:
+            DetectionService._publish_event('violation_alert', {'camera_id': 1})
+        finally:
+            DetectionService.event_sink = None
+        
+        sink.assert_called_once_with('violation_alert', ({'camera_id': 1},))
+        mock_emit.assert_not_called()
+        
+        DetectionService._publish_event('violation_alert', {'camera_id': 1})
+        mock_emit.assert_called_once_with({'camera_id': 1})
+    
+    @patch('app.services.detection_service.emit_encoded_frame')
+    @patch('app.services.detection_service.has_video_viewers')
+    def test_emit_live_frame_skips_without_viewers(self, mock_viewers, mock_emit, app_context):
+        """测试实时推送 - 无人观看时不渲染、不编码"""
+        import numpy as np
+        from app.services.detection_service import DetectionService
+        
+        annotated = Mock()
+        annotated.image.return_value = np.zeros((48, 64, 3), dtype=np.uint8)
+        state = {'last_emit': 0.0}
+        
+        mock_viewers.return_value = False
+        DetectionService._emit_live_frame(5, annotated, state)
+        annotated.image.assert_not_called()
+        mock_emit.assert_not_called()
+        
+        mock_viewers.return_value = True
+        DetectionService._emit_live_frame(5, annotated, state)
+        annotated.image.assert_called_once()
+        assert mock_emit.call_args[0][0] == 5
+
 
 class TestViolationService:
     """违规服务测试"""
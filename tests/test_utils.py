@@ -7,10 +7,32 @@
 - WebSocket工具函数
 - VideoStreamConfig: 视频流配置
 - YOLOIntegration: YOLO集成
+- ModelRegistry: 模型注册表
+- BatchInferenceEngine: 批量推理引擎
+- StreamPipeline: 视频流处理流水线
+- ModelExporter: ONNX导出缓存
+- ModelQuantizer: INT8量化
+- KeyframeScheduler: 关键帧调度
+- MotionGate: 运动门控
+- InferenceROI: 推理区域
+- InferenceProfile: 摄像头推理配置
+- WorkerSupervisor: 检测工作进程管理
+- FrameRingBuffer: 共享内存帧环形缓冲区
+- FrameSource: 视频帧解码层与断线重连
+- FrameDetections: 单帧列式检测结果
+- FrameAnnotator: 单次渲染的画面标注
+- ChunkedVideoAnalyzer: 长视频分段并行分析、检测结果文件
+- AnalysisJobQueue: 异步文件分析任务队列
+- ImageBatchAnalyzer: 图片集批量分析
+- PipelineMetrics: 流水线阶段耗时与Prometheus指标
+- IoUTracker: 轻量IoU跟踪器
+- CoreBudget: CPU核心预算
+- ModelCascade: 两级检测级联
 """
 
+import os
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch, MagicMock, call
 
 
 class TestViolationDetector:
@@ -674,4 +696,2453 @@ class TestWebSocketUtilsAdvanced:
         frame = np_local.zeros((480, 640, 3), dtype=np_local.uint8)
         
         # 应该不抛异常（被捕获）
-        emit_video_frame(1, frame)
\ No newline at end of file
+        emit_video_frame(1, frame)
+
+
+class TestModelRegistry:
+    """模型注册表测试"""
+
+    @staticmethod
+    def _loader():
+        loader = Mock(side_effect=lambda path, device: MagicMock(name=f"model:{path}"))
+        return loader
+
+    def test_acquire_loads_once(self, app_context):
+        """测试同一模型只加载一次"""
+        from app.utils.model_registry import ModelRegistry
+
+        registry = ModelRegistry(max_memory_mb=1024)
+        loader = self._loader()
+
+        h1 = registry.acquire('/models/a.pt', 'cpu', loader=loader, warmup=False)
+        h2 = registry.acquire('/models/a.pt', 'cpu', loader=loader, warmup=False)
+
+        assert loader.call_count == 1
+        assert h1.model is not h2.model  # 每个句柄独立视图
+        assert registry.stats()['models'][0]['ref_count'] == 2
+
+    def test_different_device_or_backend_loads_separately(self, app_context):
+        """测试键包含设备和后端"""
+        from app.utils.model_registry import ModelRegistry
+
+        registry = ModelRegistry(max_memory_mb=1024)
+        loader = self._loader()
+
+        registry.acquire('/models/a.pt', 'cpu', 'pytorch', loader=loader, warmup=False)
+        registry.acquire('/models/a.pt', 'cuda', 'pytorch', loader=loader, warmup=False)
+        registry.acquire('/models/a.pt', 'cpu', 'onnx', loader=loader, warmup=False)
+
+        assert loader.call_count == 3
+
+    def test_warmup_runs_predict(self, app_context):
+        """测试加载后预热"""
+        from app.utils.model_registry import ModelRegistry
+
+        registry = ModelRegistry(max_memory_mb=1024)
+        model = MagicMock()
+
+        registry.acquire('/models/a.pt', 'cpu', loader=lambda p, d: model, warmup=True)
+
+        model.predict.assert_called_once()
+
+    def test_released_handle_unusable(self, app_context):
+        """测试句柄释放后不可使用"""
+        from app.utils.model_registry import ModelRegistry
+
+        registry = ModelRegistry(max_memory_mb=1024)
+        with registry.acquire('/models/a.pt', 'cpu', loader=self._loader(), warmup=False) as handle:
+            assert handle.model is not None
+
+        with pytest.raises(RuntimeError):
+            _ = handle.model
+        assert registry.stats()['models'][0]['ref_count'] == 0
+
+    @patch('app.utils.model_registry.ModelRegistry._estimate_memory', return_value=600 * 1024 * 1024)
+    def test_lru_eviction_of_idle_models(self, mock_memory, app_context):
+        """测试超出内存预算时淘汰最久未使用的空闲模型"""
+        from app.utils.model_registry import ModelRegistry
+
+        registry = ModelRegistry(max_memory_mb=1000)
+        loader = self._loader()
+
+        ha = registry.acquire('/models/a.pt', 'cpu', loader=loader, warmup=False)
+        ha.release()
+        hb = registry.acquire('/models/b.pt', 'cpu', loader=loader, warmup=False)
+
+        paths = [m['model_path'] for m in registry.stats()['models']]
+        assert paths == ['/models/b.pt']
+
+        # 使用中的模型不会被淘汰
+        registry.acquire('/models/c.pt', 'cpu', loader=loader, warmup=False)
+        paths = {m['model_path'] for m in registry.stats()['models']}
+        assert paths == {'/models/b.pt', '/models/c.pt'}
+        hb.release()
+        assert {m['model_path'] for m in registry.stats()['models']} == {'/models/c.pt'}
+
+    def test_load_failure_not_cached(self, app_context):
+        """测试加载失败不会被缓存"""
+        from app.utils.model_registry import ModelRegistry
+
+        registry = ModelRegistry(max_memory_mb=1024)
+        failing = Mock(side_effect=FileNotFoundError("missing"))
+
+        with pytest.raises(FileNotFoundError):
+            registry.acquire('/models/a.pt', 'cpu', loader=failing, warmup=False)
+
+        handle = registry.acquire('/models/a.pt', 'cpu', loader=self._loader(), warmup=False)
+        assert handle.model is not None
+
+    @patch('app.utils.yolo_integration.os.path.exists', return_value=True)
+    @patch('app.utils.yolo_integration.model_registry')
+    def test_process_source_releases_handle(self, mock_registry, mock_exists, app_context, tmp_path):
+        """测试文件分析结束后归还模型句柄"""
+        from app.utils.yolo_integration import YOLOIntegration
+
+        handle = MagicMock()
+        handle.model.track.return_value = []
+        mock_registry.acquire.return_value = handle
+
+        yolo = YOLOIntegration('model.pt')
+        summary = yolo.process_source('video.mp4', str(tmp_path))
+
+        assert summary['total_frames'] == 0
+        handle.release.assert_called_once()
+
+
+class TestBatchInferenceEngine:
+    """跨摄像头批量推理引擎测试"""
+
+    @staticmethod
+    def _handle(batches):
+        """模拟模型句柄：记录每次批量推理的帧"""
+        handle = MagicMock()
+
+        def predict(frames, **kwargs):
+            batches.append(list(frames))
+            return [f"result:{frame}" for frame in frames]
+
+        handle.model.predict.side_effect = predict
+        return handle
+
+    @staticmethod
+    def _tracker():
+        tracker = Mock()
+        tracker.update.side_effect = lambda result: result
+        return tracker
+
+    def test_frames_from_cameras_batched_together(self, app_context):
+        """测试多个摄像头的帧合并为一个批次"""
+        import threading
+        from app.utils.inference_engine import BatchInferenceEngine
+
+        batches = []
+        engine = BatchInferenceEngine(self._handle(batches), batch_size=4, max_wait_ms=500)
+        channels = [engine.attach(camera_id, self._tracker()) for camera_id in (1, 2, 3)]
+
+        results = {}
+        threads = [
+            threading.Thread(target=lambda c=c: results.update({c.camera_id: c.infer(f"frame{c.camera_id}")}))
+            for c in channels
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+
+        assert results == {1: 'result:frame1', 2: 'result:frame2', 3: 'result:frame3'}
+        assert len(batches) == 1
+        assert sorted(batches[0]) == ['frame1', 'frame2', 'frame3']
+        for c in channels:
+            c.close()
+
+    def test_each_camera_uses_own_tracker(self, app_context):
+        """测试结果由对应摄像头的跟踪器处理"""
+        from app.utils.inference_engine import BatchInferenceEngine
+
+        engine = BatchInferenceEngine(self._handle([]), batch_size=2, max_wait_ms=0)
+        tracker1, tracker2 = self._tracker(), self._tracker()
+        c1 = engine.attach(1, tracker1)
+        c2 = engine.attach(2, tracker2)
+
+        c1.infer('a', timeout=5)
+        c2.infer('b', timeout=5)
+
+        tracker1.update.assert_called_once_with('result:a')
+        tracker2.update.assert_called_once_with('result:b')
+        c1.close()
+        c2.close()
+
+    def test_last_channel_close_releases_model(self, app_context):
+        """测试最后一个通道关闭后停止引擎并归还模型"""
+        from app.utils.inference_engine import BatchInferenceEngine
+
+        handle = self._handle([])
+        stopped = Mock()
+        engine = BatchInferenceEngine(handle, max_wait_ms=0, on_stop=stopped)
+        c1 = engine.attach(1, self._tracker())
+        c2 = engine.attach(2, self._tracker())
+
+        c1.close()
+        handle.release.assert_not_called()
+        c2.close()
+
+        handle.release.assert_called_once()
+        stopped.assert_called_once_with(engine)
+        assert engine.attach(3, self._tracker()) is None
+        with pytest.raises(RuntimeError):
+            c2.infer('x')
+
+    def test_inference_error_propagates(self, app_context):
+        """测试推理异常传递给摄像头线程"""
+        from app.utils.inference_engine import BatchInferenceEngine
+
+        handle = MagicMock()
+        handle.model.predict.side_effect = RuntimeError("out of memory")
+        engine = BatchInferenceEngine(handle, max_wait_ms=0)
+        channel = engine.attach(1, self._tracker())
+
+        with pytest.raises(RuntimeError, match="out of memory"):
+            channel.infer('frame', timeout=5)
+        channel.close()
+
+    @patch('app.utils.yolo_integration.os.path.exists', return_value=True)
+    def test_invalid_inference_mode(self, mock_exists, app_context):
+        """测试无效推理模式"""
+        from app.utils.yolo_integration import YOLOIntegration
+
+        with pytest.raises(ValueError):
+            YOLOIntegration('model.pt', inference_mode='invalid')
+        assert YOLOIntegration('model.pt', inference_mode='stream').inference_mode == 'stream'
+
+
+class TestStreamPipeline:
+    """视频流处理流水线测试"""
+
+    def test_latest_policy_drops_oldest(self):
+        """测试latest策略丢弃最旧元素"""
+        from app.utils.pipeline import StageQueue
+
+        queue = StageQueue('live', 2, 'latest')
+        for i in range(5):
+            assert queue.put(i) is True
+
+        assert queue.get(timeout=0) == 3
+        assert queue.get(timeout=0) == 4
+        assert queue.get(timeout=0) is None
+        stats = queue.stats()
+        assert stats['enqueued'] == 5
+        assert stats['dropped'] == 3
+
+    def test_block_policy_timeout(self):
+        """测试block策略队列满时阻塞直至超时"""
+        from app.utils.pipeline import StageQueue
+
+        queue = StageQueue('record', 1, 'block')
+        assert queue.put('a') is True
+        assert queue.put('b', timeout=0.05) is False
+        assert queue.stats()['dropped'] == 0
+        assert queue.stats()['blocked_seconds'] > 0
+
+    def test_closed_queue(self):
+        """测试关闭后的队列"""
+        from app.utils.pipeline import StageQueue
+
+        queue = StageQueue('events', 4, 'block')
+        queue.put('a')
+        queue.close()
+
+        assert queue.put('b') is False
+        assert queue.get() == 'a'
+        assert queue.get() is StageQueue.CLOSED
+
+        with pytest.raises(ValueError):
+            StageQueue('x', 1, 'invalid')
+
+    def test_pipeline_drains_block_stages(self):
+        """测试关闭流水线时block阶段处理完剩余数据"""
+        from app.utils.pipeline import StreamPipeline
+
+        handled = []
+        pipeline = StreamPipeline(1)
+        pipeline.add_stage('record', handled.append, 16, 'block')
+        pipeline.start()
+        for i in range(10):
+            pipeline.publish(i)
+        pipeline.close(timeout=5)
+
+        assert handled == list(range(10))
+        stats = pipeline.stats()
+        assert stats['frames'] == 10
+        assert stats['queues']['record']['enqueued'] == 10
+
+    def test_stage_error_isolated(self):
+        """测试单个阶段异常不影响其他阶段"""
+        from app.utils.pipeline import StreamPipeline
+
+        handled = []
+
+        def failing(item):
+            raise RuntimeError("boom")
+
+        pipeline = StreamPipeline(1)
+        pipeline.add_stage('live', failing, 4, 'block')
+        pipeline.add_stage('events', handled.append, 4, 'block')
+        pipeline.start()
+        pipeline.publish('frame')
+        pipeline.close(timeout=5)
+
+        assert handled == ['frame']
+        assert pipeline.stats()['errors'] == {'live': 1}
+
+
+class TestModelExporter:
+    """ONNX导出缓存测试"""
+
+    @staticmethod
+    def _model_file(tmp_path, content=b'weights'):
+        path = tmp_path / 'yolov8n.pt'
+        path.write_bytes(content)
+        return str(path)
+
+    def test_cache_path_keyed_by_hash_and_imgsz(self, tmp_path):
+        """测试缓存文件名包含模型哈希和输入尺寸"""
+        from app.utils.model_export import ModelExporter
+
+        model_path = self._model_file(tmp_path)
+        path = ModelExporter.cache_path(model_path, 640, cache_dir=str(tmp_path))
+
+        assert os.path.basename(path).startswith('yolov8n_')
+        assert path.endswith('_640.onnx')
+        assert path != ModelExporter.cache_path(model_path, 320, cache_dir=str(tmp_path))
+
+        self._model_file(tmp_path, b'retrained')
+        assert path != ModelExporter.cache_path(model_path, 640, cache_dir=str(tmp_path))
+
+    @patch('app.utils.model_export.YOLO')
+    def test_export_once_and_reuse(self, mock_yolo, tmp_path):
+        """测试首次导出后复用缓存文件"""
+        from app.utils.model_export import ModelExporter
+
+        model_path = self._model_file(tmp_path)
+        cache_dir = str(tmp_path / 'cache')
+
+        def fake_export(**kwargs):
+            source = mock_yolo.call_args[0][0]
+            exported = os.path.splitext(source)[0] + '.onnx'
+            with open(exported, 'wb') as f:
+                f.write(b'onnx')
+            return exported
+
+        mock_yolo.return_value.export.side_effect = fake_export
+
+        first = ModelExporter.export_onnx(model_path, 640, cache_dir=cache_dir)
+        second = ModelExporter.export_onnx(model_path, 640, cache_dir=cache_dir)
+
+        assert first == second
+        assert os.path.exists(first)
+        assert mock_yolo.return_value.export.call_count == 1
+        assert mock_yolo.return_value.export.call_args.kwargs['dynamic'] is True
+        # 导出在临时目录中完成，不写入模型目录，也不残留临时文件
+        assert not os.path.exists(str(tmp_path / 'yolov8n.onnx'))
+        assert os.listdir(cache_dir) == [os.path.basename(first)]
+
+    @patch('app.utils.model_export.YOLO')
+    def test_export_failure(self, mock_yolo, tmp_path):
+        """测试导出失败"""
+        from app.utils.model_export import ModelExporter
+
+        mock_yolo.return_value.export.side_effect = RuntimeError("onnx not installed")
+        cache_dir = str(tmp_path / 'cache')
+
+        with pytest.raises(Exception, match="ONNX export failed"):
+            ModelExporter.export_onnx(self._model_file(tmp_path), 640, cache_dir=cache_dir)
+        assert os.listdir(cache_dir) == []
+
+    @patch('app.utils.yolo_integration.ModelExporter.export_onnx', return_value='/cache/yolov8n.onnx')
+    @patch('app.utils.yolo_integration.YOLO')
+    @patch('app.utils.yolo_integration.os.path.exists', return_value=True)
+    def test_onnx_backend_loads_exported_model(self, mock_exists, mock_yolo, mock_export):
+        """测试onnx后端加载导出模型"""
+        from app.utils.yolo_integration import YOLOIntegration
+
+        yolo = YOLOIntegration('yolov8n.pt', backend='onnx')
+        yolo._load_model(yolo.model_path, 'cpu')
+
+        mock_export.assert_called_once_with(yolo.model_path)
+        mock_yolo.assert_called_once_with('/cache/yolov8n.onnx', task='detect')
+        mock_yolo.return_value.to.assert_not_called()
+
+        with pytest.raises(ValueError):
+            YOLOIntegration('yolov8n.pt', backend='tensorrt')
+
+
+class TestModelQuantizer:
+    """INT8量化工具测试"""
+
+    @staticmethod
+    def _write_video(path, frames):
+        import cv2
+        import numpy as np
+        out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 10, (64, 48))
+        for i in range(frames):
+            out.write(np.full((48, 64, 3), i, dtype=np.uint8))
+        out.release()
+
+    def test_sample_frames_from_recordings(self, tmp_path):
+        """测试按摄像头从录像中均匀抽帧"""
+        from app.utils.quantization import ModelQuantizer
+
+        self._write_video(tmp_path / 'camera_1_20240315_14.mp4', 20)
+        self._write_video(tmp_path / 'camera_1_20240315_15.mp4', 20)
+        self._write_video(tmp_path / 'camera_2_20240315_14.mp4', 10)
+
+        assert ModelQuantizer.recorded_cameras(str(tmp_path)) == [1, 2]
+        frames = ModelQuantizer.sample_frames(str(tmp_path), camera_id=1, count=8)
+        assert len(frames) == 8
+        assert frames[0].shape == (48, 64, 3)
+        assert ModelQuantizer.sample_frames(str(tmp_path), camera_id=3, count=8) == []
+
+    def test_head_nodes_exclude_only_decode(self):
+        """测试只有检测头的DFL和框解码节点保持FP32，卷积分支参与量化"""
+        from app.utils.quantization import ModelQuantizer
+
+        names = ['/model.0/conv/Conv', '/model.21/cv1/conv/Conv',
+                 '/model.22/cv2.0/cv2.0.0/conv/Conv', '/model.22/cv3.2/cv3.2.2/Conv',
+                 '/model.22/dfl/conv/Conv', '/model.22/dfl/Softmax',
+                 '/model.22/Concat', '/model.22/Split', '/model.22/Sigmoid', '/model.22/Mul_2', '/model.22/Add_1']
+        model = Mock()
+        model.graph.node = [Mock(name=name) for name in names]
+        for node, name in zip(model.graph.node, names):
+            node.name = name
+
+        assert ModelQuantizer._head_nodes(model) == names[4:]
+
+    def test_match_detections_per_class(self):
+        """测试同类别IoU匹配"""
+        import numpy as np
+        from app.utils.quantization import ModelQuantizer
+
+        reference = np.array([
+            [0, 0, 10, 10, 2],
+            [20, 20, 30, 30, 2],
+            [0, 0, 10, 10, 5]
+        ], dtype=float)
+        candidate = np.array([
+            [1, 1, 10, 10, 2],     # 与第一个car匹配
+            [50, 50, 60, 60, 2],   # 位置不一致
+            [0, 0, 10, 10, 7]      # 类别不一致
+        ], dtype=float)
+
+        matched = ModelQuantizer.match_detections(reference, candidate, 0.5)
+        assert matched == {2: 1}
+
+    def test_compare_report(self):
+        """测试FP32/INT8对比报告"""
+        import numpy as np
+        import torch
+        from app.utils.quantization import ModelQuantizer
+
+        def model_with(boxes):
+            result = MagicMock()
+            result.boxes.xyxy = torch.tensor([b[:4] for b in boxes], dtype=torch.float32).reshape(-1, 4)
+            result.boxes.cls = torch.tensor([b[4] for b in boxes], dtype=torch.float32)
+            result.boxes.__len__.return_value = len(boxes)
+            model = Mock()
+            model.predict.return_value = [result]
+            return model
+
+        fp32 = model_with([[0, 0, 10, 10, 2], [20, 20, 40, 40, 5]])
+        int8 = model_with([[0, 0, 10, 10, 2]])
+        frames = [np.zeros((48, 64, 3), dtype=np.uint8)] * 3
+
+        report = ModelQuantizer.compare(fp32, int8, frames, {2: 'car', 5: 'bus', 7: 'truck'})
+
+        assert report['frames'] == 3
+        assert report['classes']['car'] == {'fp32': 3, 'int8': 3, 'matched': 3, 'agreement': 1.0}
+        assert report['classes']['bus']['agreement'] == 0.0
+        assert report['classes']['truck']['agreement'] == 1.0
+        assert fp32.predict.call_args.kwargs['classes'] == [2, 5, 7]
+
+    @patch('app.utils.yolo_integration.YOLO')
+    @patch('app.utils.yolo_integration.ModelQuantizer.int8_path', return_value='/cache/missing.int8.onnx')
+    def test_int8_backend_requires_calibration(self, mock_path, mock_yolo):
+        """测试未校准时onnx-int8后端加载失败"""
+        from app.utils.yolo_integration import YOLOIntegration
+
+        with patch('app.utils.yolo_integration.os.path.exists', return_value=True):
+            yolo = YOLOIntegration('yolov8n.pt', backend='onnx-int8')
+        with pytest.raises(FileNotFoundError, match="not calibrated"):
+            yolo._load_model(yolo.model_path, 'cpu')
+        mock_yolo.assert_not_called()
+
+
+class TestKeyframeScheduler:
+    """关键帧检测测试"""
+
+    @staticmethod
+    def _frame(value=0):
+        import numpy as np
+        return np.full((120, 160, 3), value, dtype=np.uint8)
+
+    def test_fixed_interval(self):
+        """测试按固定间隔执行检测"""
+        from app.utils.motion import KeyframeScheduler
+
+        scheduler = KeyframeScheduler(interval=3)
+        decisions = [scheduler.is_keyframe(self._frame()) for _ in range(7)]
+
+        assert decisions == [True, False, False, True, False, False, True]
+        stats = scheduler.stats()
+        assert stats['keyframes'] == 3
+        assert stats['propagated'] == 4
+
+    def test_every_frame_when_interval_one(self):
+        """测试间隔为1时逐帧检测且不做运动检测"""
+        from app.utils.motion import KeyframeScheduler
+
+        scheduler = KeyframeScheduler(interval=1, motion_threshold=0.1)
+        assert all(scheduler.is_keyframe(self._frame()) for _ in range(5))
+        assert scheduler.motion is None
+
+    def test_motion_triggers_keyframe(self):
+        """测试画面变化较大时提前检测"""
+        from app.utils.motion import KeyframeScheduler
+
+        scheduler = KeyframeScheduler(interval=10, motion_threshold=0.1)
+        assert scheduler.is_keyframe(self._frame(0)) is True
+        assert scheduler.is_keyframe(self._frame(0)) is False
+        assert scheduler.is_keyframe(self._frame(255)) is True
+        assert scheduler.stats()['motion_triggered'] == 1
+
+    def test_tracker_propagates_between_keyframes(self):
+        """测试非关键帧由跟踪器外推，保持跟踪ID"""
+        import numpy as np
+        import torch
+        from ultralytics.engine.results import Results
+        from app.utils.inference_engine import CameraTracker
+
+        tracker = CameraTracker('bytetrack.yaml')
+        frame = self._frame()
+        assert tracker.propagate(frame) is None
+
+        tracked = None
+        for step in range(5):
+            x = 10 + step * 10
+            result = Results(frame, path='', names={2: 'car'},
+                             boxes=torch.tensor([[x, 20, x + 30, 50, 0.9, 2]], dtype=torch.float32))
+            tracked = tracker.update(result)
+
+        propagated = tracker.propagate(frame)
+
+        assert propagated.boxes.id.int().tolist() == tracked.boxes.id.int().tolist()
+        assert int(propagated.boxes.cls[0]) == 2
+        # 目标持续向右移动，外推位置应继续向右
+        assert float(propagated.boxes.xyxy[0, 0]) > float(tracked.boxes.xyxy[0, 0])
+
+    @patch('app.utils.yolo_integration.os.path.exists', return_value=True)
+    def test_keyframe_requires_batched_mode(self, mock_exists):
+        """测试关键帧模式仅支持batched推理"""
+        from app.utils.yolo_integration import YOLOIntegration
+
+        with pytest.raises(ValueError):
+            YOLOIntegration('yolov8n.pt', inference_mode='stream', keyframe_interval=3)
+        assert YOLOIntegration('yolov8n.pt', inference_mode='batched', keyframe_interval=3).keyframe_interval == 3
+
+
+class TestMotionGate:
+    """运动门控测试"""
+
+    @staticmethod
+    def _frame(x=None):
+        import numpy as np
+        frame = np.full((120, 160, 3), 60, dtype=np.uint8)
+        if x is not None:
+            frame[40:80, x:x + 30] = 255
+        return frame
+
+    def test_static_scene_skipped(self):
+        """测试静止画面跳过检测"""
+        from app.utils.motion import MotionGate
+
+        gate = MotionGate(threshold=0.01)
+        decisions = [gate.should_detect(self._frame(10)) for _ in range(5)]
+
+        assert decisions == [True, False, False, False, False]
+        assert gate.stats() == {'threshold': 0.01, 'frames': 5, 'skipped': 4, 'skip_ratio': 0.8}
+
+    def test_accumulated_motion_detected(self):
+        """测试缓慢移动累积超过阈值后恢复检测"""
+        from app.utils.motion import MotionGate
+
+        gate = MotionGate(threshold=0.05)
+        assert gate.should_detect(self._frame(10)) is True
+        # 与参考帧而非相邻帧比较，移动距离逐渐累积
+        decisions = [gate.should_detect(self._frame(10 + step)) for step in range(1, 20)]
+        assert False in decisions
+        assert True in decisions
+
+    def test_max_skip_forces_detection(self):
+        """测试连续跳过达到上限时强制检测"""
+        from app.utils.motion import MotionGate
+
+        gate = MotionGate(threshold=0.01, max_skip=2)
+        decisions = [gate.should_detect(self._frame()) for _ in range(7)]
+        assert decisions == [True, False, False, True, False, False, True]
+
+    def test_reuse_result_on_current_frame(self):
+        """测试复用上一帧结果时使用当前帧图像"""
+        import torch
+        from ultralytics.engine.results import Results
+        from app.utils.yolo_integration import YOLOIntegration
+
+        previous = Results(self._frame(10), path='cam', names={2: 'car'},
+                           boxes=torch.tensor([[10, 40, 40, 80, 1, 0.9, 2]], dtype=torch.float32))
+        current = self._frame(12)
+
+        reused = YOLOIntegration._reuse_result(previous, current)
+
+        assert reused.orig_img is current
+        assert reused.boxes.id.int().tolist() == [1]
+        assert YOLOIntegration._reuse_result(None, current) is None
+
+
+class TestInferenceROI:
+    """推理区域测试"""
+
+    def test_resolve_auto_from_restricted_areas(self):
+        """测试由禁停区域外接矩形推导ROI"""
+        from app.utils.roi import InferenceROI
+
+        areas = [
+            {'id': 1, 'points': [[100, 200], [300, 200], [300, 400]]},
+            {'id': 2, 'points': [[500, 250], [600, 300]]}
+        ]
+        roi = InferenceROI.resolve('auto', areas, margin=50)
+
+        assert roi.box == (50, 150, 650, 450)
+        assert InferenceROI.resolve('auto', []) is None
+        assert InferenceROI.resolve(None, areas) is None
+        assert InferenceROI.resolve([10, 20, 110, 120]).box == (10, 20, 110, 120)
+        with pytest.raises(ValueError):
+            InferenceROI.resolve([10, 20, 5, 120])
+        with pytest.raises(ValueError):
+            InferenceROI.resolve('sky')
+
+    def test_box_clipped_to_frame(self):
+        """测试ROI裁剪到画面范围"""
+        from app.utils.roi import InferenceROI
+
+        roi = InferenceROI((-20, 100, 700, 300))
+        assert roi.box_for((480, 640, 3)) == (0, 100, 640, 300)
+        # 覆盖整帧时不裁剪
+        assert InferenceROI((-10, -10, 700, 500)).box_for((480, 640, 3)) is None
+
+    def test_imgsz_scaled_with_roi(self):
+        """测试推理尺寸按ROI比例缩小并按步长对齐"""
+        from app.utils.roi import InferenceROI
+
+        assert InferenceROI.imgsz_for((0, 0, 960, 540), (1080, 1920, 3), 640) == 320
+        assert InferenceROI.imgsz_for((0, 0, 1000, 540), (1080, 1920, 3), 640) == 352
+        assert InferenceROI.imgsz_for((0, 0, 10, 10), (1080, 1920, 3), 640) == 32
+
+    def test_engine_maps_roi_results_to_full_frame(self, app_context):
+        """测试引擎裁剪推理后将检测框映射回整帧坐标"""
+        import numpy as np
+        import torch
+        from ultralytics.engine.results import Results
+        from app.utils.inference_engine import BatchInferenceEngine
+
+        calls = []
+
+        def predict(frames, **kwargs):
+            calls.append(([f.shape for f in frames], kwargs.get('imgsz')))
+            return [Results(f, path='', names={2: 'car'},
+                            boxes=torch.tensor([[10, 20, 30, 40, 0.9, 2]], dtype=torch.float32)) for f in frames]
+
+        handle = MagicMock()
+        handle.model.predict.side_effect = predict
+        tracker = Mock()
+        tracker.update.side_effect = lambda result: result
+        engine = BatchInferenceEngine(handle, max_wait_ms=0)
+        channel = engine.attach(1, tracker)
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+
+        result = channel.infer(frame, timeout=5, box=(100, 200, 420, 440), options={'imgsz': 320})
+
+        assert calls == [([(240, 320, 3)], 320)]
+        assert result.orig_img is frame
+        assert result.boxes.xyxy[0].tolist() == [110, 220, 130, 240]
+        channel.close()
+
+
+class TestInferenceProfile:
+    """摄像头推理配置测试"""
+
+    TARGET_CLASSES = {0: 'person', 2: 'car', 5: 'bus', 7: 'truck'}
+
+    def test_from_config_resolves_class_names(self):
+        """测试类别名解析为类别ID并只输出已配置的推理参数"""
+        from app.utils.inference_profile import InferenceProfile
+
+        profile = InferenceProfile.from_config(
+            {'imgsz': 400, 'conf': 0.4, 'classes': ['bus', 2]},
+            target_classes=self.TARGET_CLASSES
+        )
+
+        assert profile.imgsz == 416
+        assert profile.predict_options() == {'imgsz': 416, 'conf': 0.4, 'classes': [2, 5]}
+        assert profile.predict_options(320)['imgsz'] == 320
+
+    def test_from_config_defaults(self):
+        """测试未配置时使用默认推理尺寸"""
+        from app.utils.inference_profile import InferenceProfile
+
+        profile = InferenceProfile.from_config(None, default_imgsz=640)
+
+        assert profile.predict_options() == {'imgsz': 640}
+        assert profile.latency_budget_ms is None
+
+    @pytest.mark.parametrize('config', [
+        {'classes': ['airplane']},
+        {'classes': []},
+        {'conf': 1.5},
+        {'latency_budget_ms': 0},
+        {'unknown': 1}
+    ])
+    def test_from_config_invalid(self, config):
+        """测试非法配置"""
+        from app.utils.inference_profile import InferenceProfile
+
+        with pytest.raises(ValueError):
+            InferenceProfile.from_config(config, target_classes=self.TARGET_CLASSES)
+
+    def test_adaptive_steps_down_when_over_budget(self):
+        """测试持续超出延迟预算时逐级降低推理尺寸"""
+        from app.utils.inference_profile import InferenceProfile, AdaptiveImgsz
+
+        adaptive = AdaptiveImgsz(InferenceProfile(imgsz=640, latency_budget_ms=50, min_imgsz=320))
+
+        assert adaptive.ladder == [640, 512, 416, 320]
+        for _ in range(AdaptiveImgsz.DOWN_PATIENCE):
+            adaptive.record(0.1)
+
+        assert adaptive.imgsz == 512
+        assert adaptive.stats()['downgrades'] == 1
+
+    def test_adaptive_steps_up_when_load_drops(self):
+        """测试负载下降且预测延迟在预算内时恢复推理尺寸"""
+        from app.utils.inference_profile import InferenceProfile, AdaptiveImgsz
+
+        adaptive = AdaptiveImgsz(InferenceProfile(imgsz=640, latency_budget_ms=50))
+        adaptive.level = 1
+        adaptive.latency = 0.045
+
+        # 预测640尺寸延迟约70ms，超出预算，不恢复
+        for _ in range(AdaptiveImgsz.UP_PATIENCE):
+            adaptive.record(0.045)
+        assert adaptive.imgsz == 512
+
+        for _ in range(AdaptiveImgsz.UP_PATIENCE + 20):
+            adaptive.record(0.01)
+        assert adaptive.imgsz == 640
+        assert adaptive.upgrades == 1
+
+    def test_adaptive_disabled_without_budget(self):
+        """测试未设置延迟预算时不调整推理尺寸"""
+        from app.utils.inference_profile import InferenceProfile, AdaptiveImgsz
+
+        adaptive = AdaptiveImgsz(InferenceProfile(imgsz=320))
+        for _ in range(100):
+            assert adaptive.record(1.0) is False
+
+        assert adaptive.imgsz == 320
+        assert adaptive.stats()['latency_ms'] == 1000.0
+
+    def test_adaptive_ladder_uses_shared_sizes(self):
+        """测试不同配置尺寸的阶梯降级到共享尺寸表，降级后的摄像头可合批推理"""
+        from app.utils.inference_profile import InferenceProfile, AdaptiveImgsz
+
+        assert AdaptiveImgsz(InferenceProfile(imgsz=800, latency_budget_ms=50)).ladder == [800, 640, 512, 416]
+        assert AdaptiveImgsz(InferenceProfile(imgsz=960, latency_budget_ms=50)).ladder == [960, 832, 640, 512]
+        assert AdaptiveImgsz(InferenceProfile(imgsz=320, latency_budget_ms=50, min_imgsz=320)).ladder == [320]
+
+    def test_engine_groups_requests_by_options(self, app_context):
+        """测试引擎按推理参数分组，同一批次内参数不同的摄像头分别推理"""
+        import threading
+        from app.utils.inference_engine import BatchInferenceEngine, CameraChannel, _InferenceRequest
+
+        handle = MagicMock()
+        handle.model.predict.side_effect = lambda frames, **kwargs: [Mock() for _ in frames]
+        engine = BatchInferenceEngine.__new__(BatchInferenceEngine)
+        engine.model_handle = handle
+        engine.device = 'cpu'
+        engine.classes = [0, 2, 5, 7]
+        engine.batches = engine.frames = 0
+        engine._cond = threading.Condition()
+
+        tracker = Mock()
+        channel = CameraChannel(engine, 1, tracker)
+        batch = [
+            _InferenceRequest(channel, 'a', options={'imgsz': 640}),
+            _InferenceRequest(channel, 'b', options={'imgsz': 320, 'conf': 0.5, 'classes': [2]}),
+            _InferenceRequest(channel, 'c', options={'imgsz': 640})
+        ]
+        engine._process_batch(batch)
+
+        calls = handle.model.predict.call_args_list
+        assert [call.args[0] for call in calls] == [['a', 'c'], ['b']]
+        assert calls[0].kwargs['classes'] == [0, 2, 5, 7]
+        assert calls[1].kwargs['classes'] == [2]
+        assert calls[1].kwargs['conf'] == 0.5
+        assert all(request.done.is_set() and request.error is None for request in batch)
+        assert (engine.batches, engine.frames) == (2, 3)
+        # 每帧记录所在分组的推理耗时均摊值
+        assert batch[0].model_time == batch[2].model_time
+        assert all(request.model_time is not None for request in batch)
+
+
+class TestWorkerSupervisor:
+    """检测工作进程管理测试"""
+
+    class _FakeConnection:
+        """父进程端管道：recv阻塞直到关闭"""
+
+        def __init__(self):
+            import queue
+            self.messages = queue.Queue()
+            self.sent = []
+
+        def send(self, message):
+            self.sent.append(message)
+
+        def recv(self):
+            message = self.messages.get()
+            if message is None:
+                raise EOFError
+            return message
+
+    def _make_worker(self, on_event=None, on_finished=None):
+        from app.utils.detection_workers import DetectionWorker
+
+        conn = self._FakeConnection()
+        context = Mock()
+        context.Pipe.return_value = (conn, Mock())
+        context.Process.return_value.exitcode = -9
+        worker = DetectionWorker('gate', context, on_event=on_event, on_finished=on_finished)
+        return worker, conn
+
+    def test_start_camera_waits_for_reply(self):
+        """测试启动摄像头等待工作进程回复"""
+        import threading
+
+        worker, conn = self._make_worker()
+        threading.Timer(0.05, lambda: conn.messages.put(('reply', 1, {'success': True}))).start()
+
+        result = worker.start_camera({'camera_id': 1}, timeout=5)
+
+        assert result == {'success': True}
+        assert conn.sent == [('start', {'camera_id': 1})]
+        assert worker.cameras == {1}
+        conn.messages.put(None)
+
+    def test_resources_sent_before_start(self):
+        """测试核心分配先于启动命令下发，分配未变化时不重复发送"""
+        import threading
+
+        worker, conn = self._make_worker()
+        allocation = {'threads': 2, 'cores': [0, 1]}
+        worker.set_resources(allocation)
+        worker.set_resources(dict(allocation))
+        threading.Timer(0.05, lambda: conn.messages.put(('reply', 1, {'success': True}))).start()
+        worker.start_camera({'camera_id': 1}, timeout=5)
+
+        assert conn.sent == [('resources', allocation), ('start', {'camera_id': 1})]
+        assert worker.info()['cpu'] == allocation
+        conn.messages.put(None)
+
+    def test_supervisor_forwards_viewers(self):
+        """测试启动前下发观看状态，观看者变化时同步给所有工作进程"""
+        from app.utils.detection_workers import WorkerSupervisor
+
+        supervisor = WorkerSupervisor()
+        worker = Mock(group='gate', alive=True, idle=False)
+        worker.start_camera.return_value = {'success': True}
+
+        with patch('app.utils.detection_workers.DetectionWorker', return_value=worker):
+            supervisor.start_camera({'camera_id': 1, 'worker_group': 'gate'}, viewers=lambda camera_id: False)
+        supervisor.update_viewers('1', True)
+
+        assert worker.set_viewers.call_args_list == [call(1, False), call('1', True)]
+
+    def test_events_and_finished_cameras(self):
+        """测试事件转发，状态快照中消失的摄像头视为结束"""
+        import threading
+
+        events = []
+        finished = threading.Event()
+        worker, conn = self._make_worker(
+            on_event=lambda kind, args: events.append((kind, args)),
+            on_finished=lambda w, camera_id: finished.set()
+        )
+        worker.cameras.update({1, 2})
+
+        conn.messages.put(('event', 'violation_alert', ({'camera_id': 1},)))
+        conn.messages.put(('status', {2: {'status': 'running'}}))
+
+        assert finished.wait(5)
+        assert events == [('violation_alert', ({'camera_id': 1},))]
+        assert worker.cameras == {2}
+        assert worker.camera_status(2) == {'status': 'running'}
+        conn.messages.put(None)
+
+    def test_worker_exit_finishes_all_cameras(self):
+        """测试工作进程退出时所有摄像头结束，等待中的启动请求失败"""
+        finished = []
+        worker, conn = self._make_worker(on_finished=lambda w, camera_id: finished.append(camera_id))
+        worker.cameras.update({1, 2})
+        worker.reserve(3)
+
+        conn.messages.put(None)
+        with pytest.raises(RuntimeError, match='exited'):
+            worker.start_camera({'camera_id': 3}, timeout=5)
+
+        worker._listener.join(5)
+        assert sorted(finished) == [1, 2]
+        assert worker.exitcode == -9
+        assert worker.idle
+
+    def test_supervisor_groups_cameras(self):
+        """测试同一分组的摄像头共享工作进程"""
+        from app.utils.detection_workers import WorkerSupervisor
+
+        supervisor = WorkerSupervisor()
+        worker = Mock(group='gate', alive=True, idle=False)
+        worker.start_camera.return_value = {'success': True}
+
+        with patch('app.utils.detection_workers.DetectionWorker', return_value=worker) as mock_worker:
+            supervisor.start_camera({'camera_id': 1, 'worker_group': 'gate'})
+            supervisor.start_camera({'camera_id': 2, 'worker_group': 'gate'})
+            supervisor.start_camera({'camera_id': 3})
+
+        assert mock_worker.call_count == 2
+        assert [call.args[0] for call in mock_worker.call_args_list] == ['gate', 'camera-3']
+
+
+class TestFrameRingBuffer:
+    """共享内存帧环形缓冲区测试"""
+
+    @pytest.fixture
+    def ring(self):
+        from app.utils.frame_ring import FrameRingBuffer
+
+        ring = FrameRingBuffer.create((4, 6, 3), slots=3)
+        yield ring
+        ring.close()
+
+    @staticmethod
+    def _frame(value):
+        import numpy as np
+        return np.full((4, 6, 3), value, dtype=np.uint8)
+
+    def test_write_and_read_view(self, ring):
+        """测试写入后读取共享内存视图(不复制)"""
+        import numpy as np
+        from app.utils.frame_ring import FrameRingBuffer, FrameRingReader
+
+        writer = FrameRingBuffer.attach(ring.name)
+        assert writer.write(self._frame(7)) == 0
+        reader = FrameRingReader(ring)
+
+        frame = reader.read()
+        assert frame.seq == 0
+        assert frame.array.shape == (4, 6, 3)
+        assert int(frame.array[0, 0, 0]) == 7
+        # 与写入方共享同一块内存
+        writer.slot_view(frame.slot)[0, 0, 0] = 9
+        assert int(frame.array[0, 0, 0]) == 9
+        assert np.shares_memory(frame.array, ring.slot_view(frame.slot))
+        del frame
+        writer.close()
+
+    def test_overwritten_slot_detected(self, ring):
+        """测试帧槽被覆盖后按旧序号读取失败"""
+        from app.utils.frame_ring import FrameRingReader
+
+        for value in range(4):
+            ring.write(self._frame(value))
+        reader = FrameRingReader(ring)
+
+        assert reader.read(0) is None
+        assert int(reader.read(3).array[0, 0, 0]) == 3
+
+    def test_pinned_slot_not_overwritten(self, ring):
+        """测试读取方持有的帧不会被覆盖，释放后恢复写入"""
+        import gc
+        from app.utils.frame_ring import FrameRingReader
+
+        reader = FrameRingReader(ring)
+        ring.write(self._frame(1))
+        held = reader.read()
+        for value in range(2, 8):
+            ring.write(self._frame(value))
+
+        assert held.valid()
+        assert int(held.array[0, 0, 0]) == 1
+        assert ring.stats()['pinned'] == 1
+
+        # 视图释放后解除占用
+        slot = held.slot
+        del held
+        gc.collect()
+        assert ring.pins[slot] == 0
+
+    def test_all_slots_pinned_drops_frame(self, ring):
+        """测试所有可写帧槽被占用时丢弃新帧"""
+        from app.utils.frame_ring import FrameRingReader
+
+        reader = FrameRingReader(ring)
+        held = []
+        for value in range(3):
+            ring.write(self._frame(value))
+            held.append(reader.read())
+
+        assert ring.write(self._frame(9)) is None
+        assert ring.stats()['dropped'] == 1
+        assert [int(f.array[0, 0, 0]) for f in held] == [0, 1, 2]
+
+    def test_reader_get_latest_and_closed(self, ring):
+        """测试读取方只取最新帧，写入方结束后返回CLOSED"""
+        from app.utils.frame_ring import FrameRingReader
+        from app.utils.pipeline import StageQueue
+
+        reader = FrameRingReader(ring)
+        assert reader.get(timeout=0.01) is None
+
+        for value in range(3):
+            ring.write(self._frame(value))
+        frame = reader.get(timeout=1)
+        assert int(frame[0, 0, 0]) == 2
+
+        ring.mark_closed()
+        assert reader.get(timeout=1) is StageQueue.CLOSED
+        stats = reader.stats()
+        assert stats['enqueued'] == 1
+        assert stats['dropped'] == 2
+        assert stats['policy'] == 'latest'
+
+    def test_frame_larger_than_slot(self, ring):
+        """测试超出帧槽容量的帧"""
+        import numpy as np
+
+        with pytest.raises(ValueError):
+            ring.write(np.zeros((8, 8, 3), dtype=np.uint8))
+
+
+class TestFrameSource:
+    """视频帧解码层测试"""
+
+    def test_image_folder_reduced_decode_in_order(self, tmp_path, write_images):
+        """测试图片目录并行解码、保持顺序并按max_size降分辨率"""
+        from app.utils.frame_source import FrameSource
+
+        write_images(tmp_path, 5)
+        (tmp_path / '0002_broken.jpg').write_bytes(b'not an image')
+
+        source = FrameSource(str(tmp_path), max_size=100, decode_threads=2).open()
+        frames = []
+        while True:
+            frame = source.read()
+            if frame is None:
+                break
+            frames.append(frame)
+        stats = source.stats()
+        source.release()
+
+        assert source.kind == 'images'
+        assert [f.shape for f in frames] == [(50, 100, 3)] * 5
+        assert [round(float(f.mean()) / 40) for f in frames] == [0, 1, 2, 3, 4]
+        assert stats['frames'] == 5
+        assert stats['errors'] == 1
+        assert stats['source_size'] == (400, 200)
+        assert stats['scale'] == 0.25
+        assert stats['decode_ms'] is not None
+
+    def test_image_folder_mixed_sizes_letterboxed(self, tmp_path, write_images):
+        """测试图片目录中尺寸不同的图片保持宽高比缩放并补边，记录每帧缩放比例"""
+        import cv2
+        import numpy as np
+        from app.utils.frame_source import FrameSource
+
+        write_images(tmp_path, 1)
+        cv2.imwrite(str(tmp_path / '0001.jpg'), np.full((100, 100, 3), 200, dtype=np.uint8))
+
+        source = FrameSource(str(tmp_path), decode_threads=1).open()
+        first = source.read()
+        assert source.frame_scale == 1.0
+        second = source.read()
+        source.release()
+
+        assert first.shape == second.shape == (200, 400, 3)
+        assert source.frame_scale == 2.0
+        assert abs(float(second[:, :200].mean()) - 200) < 5
+        assert second[:, 200:].max() == 0
+
+    def test_video_file_scaled_and_ends(self, tmp_path):
+        """测试视频文件解码后缩放，读到末尾正常结束"""
+        import cv2
+        import numpy as np
+        from app.utils.frame_source import FrameSource
+
+        path = str(tmp_path / 'clip.avi')
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (320, 240))
+        for index in range(6):
+            writer.write(np.full((240, 320, 3), index * 30, dtype=np.uint8))
+        writer.release()
+
+        source = FrameSource(path, max_size=160, decode_threads=1).open()
+        frames = []
+        while True:
+            frame = source.read()
+            if frame is None:
+                break
+            frames.append(frame)
+        stats = source.stats()
+        source.release()
+
+        assert source.kind == 'file'
+        assert len(frames) == 6
+        assert frames[0].shape == (120, 160, 3)
+        assert stats['nominal_fps'] == 10
+        assert stats['errors'] == 0
+        assert stats['input_fps'] is not None
+
+    def test_full_resolution_without_max_size(self, tmp_path, write_images):
+        """测试未配置max_size时保持原始分辨率"""
+        from app.utils.frame_source import FrameSource
+
+        write_images(tmp_path, 1, size=(64, 48))
+        source = FrameSource(str(tmp_path)).open()
+
+        assert source.read().shape == (48, 64, 3)
+        assert source.scale == 1.0
+        assert source.read() is None
+        source.release()
+
+    def test_open_errors(self, tmp_path):
+        """测试输入源无法打开"""
+        from app.utils.frame_source import FrameSource
+
+        with pytest.raises(FileNotFoundError):
+            FrameSource(str(tmp_path)).open()
+        with pytest.raises(ConnectionError):
+            FrameSource(str(tmp_path / 'missing.mp4')).open()
+        assert FrameSource('rtsp://camera/stream').kind == 'stream'
+
+    class _FakeCapture:
+        """模拟视频流连接：依次返回帧，之后读取失败；opened为False时表示打开失败"""
+
+        def __init__(self, frames=0, opened=True):
+            import numpy as np
+            self.frames = [np.full((48, 64, 3), index, dtype=np.uint8) for index in range(frames)]
+            self.opened = opened
+
+        def isOpened(self):
+            return self.opened
+
+        def read(self):
+            return (True, self.frames.pop(0)) if self.frames else (False, None)
+
+        def get(self, prop):
+            return 0
+
+        def set(self, prop, value):
+            return True
+
+        def release(self):
+            pass
+
+    def test_stream_reconnects_after_drop(self):
+        """测试实时流断线后按退避重连，输出尺寸不变，统计重连和停机时间"""
+        from app.utils.frame_source import FrameSource
+
+        captures = [self._FakeCapture(2), self._FakeCapture(opened=False), self._FakeCapture(3)]
+        with patch('app.utils.frame_source.cv2.VideoCapture', side_effect=captures), \
+                patch.object(FrameSource, 'ERROR_LIMIT', 3):
+            source = FrameSource('rtsp://camera/stream', max_size=32, reconnect=True).open()
+            source.reconnector.initial_delay = 0
+            frames = [source.read() for _ in range(5)]
+            stats = source.stats()
+
+        assert [int(frame[0, 0, 0]) for frame in frames] == [0, 1, 0, 1, 2]
+        assert {frame.shape for frame in frames} == {(24, 32, 3)}
+        assert stats['errors'] == 3
+        reconnect = stats['reconnect']
+        assert reconnect['state'] == 'connected'
+        assert (reconnect['disconnects'], reconnect['reconnects'], reconnect['attempts']) == (1, 1, 2)
+        assert 'Failed to open' in reconnect['last_error']
+        assert reconnect['current_downtime_seconds'] == 0.0
+
+    def test_stream_reconnect_gives_up(self):
+        """测试超过最大重连次数或停止采集后流结束，未启用重连时断线即结束"""
+        from app.utils.frame_source import FrameSource
+
+        with patch('app.utils.frame_source.cv2.VideoCapture',
+                   side_effect=[self._FakeCapture(1)] + [self._FakeCapture(opened=False)] * 2), \
+                patch.object(FrameSource, 'ERROR_LIMIT', 2):
+            source = FrameSource('rtsp://camera/stream', reconnect=True).open()
+            source.reconnector.initial_delay = 0
+            source.reconnector.max_attempts = 2
+            assert source.read() is not None
+            assert source.read() is None
+        assert source.stats()['reconnect']['attempts'] == 2
+
+        with patch('app.utils.frame_source.cv2.VideoCapture', return_value=self._FakeCapture(1)), \
+                patch.object(FrameSource, 'ERROR_LIMIT', 2):
+            source = FrameSource('rtsp://camera/stream', reconnect=True).open()
+            source.interrupt()
+            source.read()
+            assert source.read() is None
+            assert source.stats()['reconnect']['attempts'] == 0
+
+            source = FrameSource('rtsp://camera/stream', reconnect=False).open()
+            assert source.reconnector is None
+            assert source.stats()['reconnect'] is None
+        assert FrameSource('clip.mp4', reconnect=True).reconnector is None
+
+    def test_stop_during_reconnect_releases_new_connection(self):
+        """测试重新打开视频流期间收到停止时释放新连接并结束，不计为重连成功"""
+        from app.utils.frame_source import FrameSource
+
+        first, reopened = self._FakeCapture(1), self._FakeCapture(5)
+        reopened.release = Mock()
+
+        def open_capture(*args):
+            if open_capture.calls:
+                # 阻塞的打开过程中停止采集
+                source.interrupt()
+            open_capture.calls += 1
+            return first if open_capture.calls == 1 else reopened
+        open_capture.calls = 0
+
+        with patch('app.utils.frame_source.cv2.VideoCapture', side_effect=open_capture), \
+                patch.object(FrameSource, 'ERROR_LIMIT', 2):
+            source = FrameSource('rtsp://camera/stream', reconnect=True).open()
+            source.reconnector.initial_delay = 0
+            assert source.read() is not None
+            assert source.read() is None
+
+        reopened.release.assert_called_once()
+        assert source._cap is None
+        reconnect = source.stats()['reconnect']
+        assert (reconnect['attempts'], reconnect['reconnects']) == (1, 0)
+
+    def test_capture_thread_releases_source(self):
+        """测试采集线程退出时自行释放视频流"""
+        from app.utils.pipeline import StageQueue
+        from app.utils.yolo_integration import YOLOIntegration
+
+        source = Mock()
+        source.read.side_effect = ['frame', None]
+        frames = StageQueue('capture', maxsize=1, policy='latest')
+
+        YOLOIntegration._capture_frames(source, frames)
+
+        source.release.assert_called_once()
+        assert frames.get() == 'frame'
+
+    def test_reconnect_backoff(self):
+        """测试重连间隔按指数增长并受上限约束"""
+        from app.utils.frame_source import StreamReconnector
+
+        stop_event = Mock()
+        stop_event.wait.return_value = False
+        states = []
+        reconnector = StreamReconnector(stop_event, initial_delay=1, max_delay=4, max_attempts=5,
+                                        listener=lambda r: states.append(r.stats()['state']))
+
+        assert reconnector.reconnect(Mock(side_effect=ConnectionError('down'))) is False
+        assert [call.args[0] for call in stop_event.wait.call_args_list] == [1, 2, 4, 4, 4]
+        assert states[0] == 'reconnecting' and states[-1] == 'connected'
+        assert reconnector.stats()['last_error'] == 'down'
+
+    def test_capture_process_reconnect_stats(self):
+        """测试采集进程模式经共享数组还原重连统计"""
+        from app.utils.frame_ring import FrameCaptureProcess
+
+        process = FrameCaptureProcess('rtsp://camera/stream', 'ring')
+        process._reconnect[:] = [2, 1, 5, 3.5, 0]
+        reconnect = process.source_stats()['reconnect']
+
+        assert reconnect['state'] == 'connected'
+        assert (reconnect['disconnects'], reconnect['reconnects'], reconnect['attempts']) == (2, 1, 5)
+        assert reconnect['downtime_seconds'] == 3.5
+        assert 'reconnect' not in FrameCaptureProcess('clip.mp4', 'ring').source_stats()
+
+    @patch('app.utils.yolo_integration.os.path.exists', return_value=True)
+    def test_stream_mode_reconnect_keeps_model(self, mock_exists):
+        """测试stream推理模式断线后复用模型句柄重新打开，跟踪器状态保留"""
+        from app.utils.frame_source import StreamReconnector
+        from app.utils.yolo_integration import YOLOIntegration
+
+        def stream(*items):
+            for item in items:
+                if isinstance(item, Exception):
+                    raise item
+                yield [item]
+
+        yolo = YOLOIntegration('yolov8n.pt', inference_mode='stream')
+        handle = MagicMock()
+        handle.__enter__.return_value = handle
+        handle.model.track.side_effect = [stream('a', 'b'), stream('c'), stream(ConnectionError('down'))]
+        pipeline = Mock()
+        with patch.object(yolo, 'acquire_model', return_value=handle), \
+                patch.object(StreamReconnector, 'INITIAL_DELAY', 0), \
+                patch.object(StreamReconnector, 'MAX_ATTEMPTS', 1):
+            results = list(yolo._iter_stream_results('rtsp://camera/stream', 1, pipeline))
+
+        assert results == ['a', 'b', 'c']
+        assert [call.kwargs.get('persist') for call in handle.model.track.call_args_list] == [None, True, True]
+        name, provider = pipeline.register_stats.call_args.args
+        assert name == 'source'
+        assert provider()['reconnect']['reconnects'] == 1
+
+    def test_scaled_roi_and_violation_coordinates(self, app_context):
+        """测试降分辨率后ROI换算到缩小帧，违规位置换算回原始画面"""
+        import numpy as np
+        from app.utils.roi import InferenceROI
+        from app.utils.violation_utils import ViolationDetector
+
+        assert InferenceROI((100, 200, 301, 400)).scaled(0.5).box == (50, 100, 151, 200)
+
+        result = Mock()
+        result.boxes.xywh.cpu.return_value = np.array([[60.0, 60.0, 10.0, 10.0]])
+        result.boxes.id.int.return_value.cpu.return_value.tolist.return_value = [7]
+        result.boxes.cls.cpu.return_value.tolist.return_value = [2]
+        areas = [{'id': 1, 'points': [[100, 100], [200, 100], [200, 200], [100, 200]]}]
+
+        assert ViolationDetector.check_vehicle_violation(result, areas) == []
+        violations = ViolationDetector.check_vehicle_violation(result, areas, scale=0.5)
+        assert violations[0]['location'] == {'x': 120, 'y': 120}
+
+    @patch('app.utils.yolo_integration.os.path.exists')
+    def test_decode_max_size_config(self, mock_exists, app_context):
+        """测试降分辨率解码配置解析"""
+        from app.utils.yolo_integration import YOLOIntegration
+
+        mock_exists.return_value = True
+
+        yolo = YOLOIntegration('yolov8n.pt', inference_mode='batched', decode_max_size='auto', profile={'imgsz': 480})
+        assert yolo.decode_max_size == 480
+        assert YOLOIntegration('yolov8n.pt', inference_mode='batched', decode_max_size=0).decode_max_size is None
+        with pytest.raises(ValueError):
+            YOLOIntegration('yolov8n.pt', decode_max_size='large')
+        with pytest.raises(ValueError):
+            YOLOIntegration('yolov8n.pt', decode_max_size=640, inference_mode='stream')
+
+
+class TestFrameDetections:
+    """单帧列式检测结果测试"""
+
+    def test_built_once_from_tracked_boxes(self, make_result):
+        """测试由跟踪结果一次构建并缓存在结果上"""
+        from app.utils.detections import FrameDetections
+
+        result = make_result([[10, 20, 30, 60, 4, 0.9, 2], [100, 100, 200, 140, 5, 0.5, 0]])
+        detections = FrameDetections.of(result)
+
+        assert FrameDetections.of(result) is detections
+        assert len(detections) == 2
+        assert detections.xywh.tolist() == [[20, 40, 20, 40], [150, 120, 100, 40]]
+        assert detections.track_ids.tolist() == [4, 5]
+        assert detections.cls.tolist() == [2, 0]
+        assert detections.class_mask({2: 'car'}).tolist() == [True, False]
+        assert detections.centers(0.5).tolist() == [[40, 80], [300, 240]]
+        assert detections.xywh.flags['C_CONTIGUOUS']
+
+    def test_untracked_and_empty(self, make_result):
+        """测试未跟踪结果和空结果"""
+        import numpy as np
+        from app.utils.detections import FrameDetections
+
+        detections = FrameDetections.of(make_result([[10, 20, 30, 60, 0.9, 2]]))
+        assert detections.track_ids.tolist() == [FrameDetections.NO_TRACK]
+        assert np.isclose(detections.conf[0], 0.9)
+
+        assert len(FrameDetections.of(make_result(np.zeros((0, 6))))) == 0
+        result = Mock()
+        result.boxes = None
+        assert len(FrameDetections.of(result)) == 0
+
+    def test_attribute_fallback(self):
+        """测试不提供Boxes.data的结果按属性读取"""
+        from app.utils.detections import FrameDetections
+
+        result = Mock()
+        result.boxes.xywh.cpu.return_value = [[100, 200, 50, 50]]
+        result.boxes.cls.cpu.return_value.tolist.return_value = [5]
+        result.boxes.id.int.return_value.cpu.return_value.tolist.return_value = [3]
+
+        detections = FrameDetections.of(result)
+        assert detections.xyxy.tolist() == [[75, 175, 125, 225]]
+        assert detections.track_ids.tolist() == [3]
+        assert detections.cls.tolist() == [5]
+
+    def test_violation_first_matching_area_in_box_order(self, app_context, make_result):
+        """测试向量化违规检测：按检测框顺序输出，每个目标只记录第一个命中区域"""
+        from app.utils.violation_utils import ViolationDetector
+
+        result = make_result([
+            [140, 140, 160, 160, 1, 0.9, 2],   # 区域1和区域2重叠处
+            [540, 140, 560, 160, 2, 0.9, 7],   # 区域外
+            [240, 240, 260, 260, 3, 0.9, 5],   # 区域2
+            [140, 140, 160, 160, 4, 0.9, 0],   # 行人
+            [120, 120, 130, 130, 9, 0.9, 2]    # 仅区域1
+        ])
+        areas = [
+            {'id': 10, 'points': [[100, 100], [200, 100], [200, 200], [100, 200]]},
+            {'id': 20, 'points': [[120, 120], [300, 120], [300, 300], [120, 300]]}
+        ]
+
+        violations = ViolationDetector.check_vehicle_violation(result, areas)
+
+        assert [(v['track_id'], v['area_id']) for v in violations] == [(1, 10), (3, 20), (9, 10)]
+        assert violations[1] == {'track_id': 3, 'vehicle_type': 'bus', 'location': {'x': 250, 'y': 250},
+                                 'area_id': 20}
+
+
+class TestFrameAnnotator:
+    """单次渲染的画面标注测试"""
+
+    FRAME = (120, 160)
+
+    def test_render_once_shared(self, make_result):
+        """测试同一帧只渲染一次，原始帧不被修改"""
+        from app.utils.annotation import FrameAnnotator, AnnotatedFrame
+
+        annotator = FrameAnnotator({2: 'car', 5: 'bus'}, {5: {'name': 'bus', 'color': (0, 0, 255)}})
+        result = make_result([[20, 20, 60, 60, 1, 0.9, 5]], self.FRAME)
+        annotated = AnnotatedFrame(result, annotator)
+
+        image = annotated.image()
+        assert annotated.image() is image
+        assert annotator.rendered == 1
+        assert not result.orig_img.any()
+        # 特殊车辆使用配置颜色
+        assert image[20, 40].tolist() == [0, 0, 255]
+
+    def test_buffer_reused_after_release(self, make_result):
+        """测试标注画面释放后输出缓冲区被复用"""
+        from app.utils.annotation import FrameAnnotator, AnnotatedFrame
+
+        annotator = FrameAnnotator({2: 'car'})
+        for _ in range(3):
+            annotated = AnnotatedFrame(make_result([[20, 20, 60, 60, 1, 0.9, 2]], self.FRAME), annotator)
+            annotated.image()
+            del annotated
+
+        assert annotator.stats() == {'rendered': 3, 'allocated': 1, 'reused': 2, 'free': 1}
+
+    def test_no_annotation_uses_original_frame(self, make_result):
+        """测试关闭标注时直接使用原始帧"""
+        from app.utils.annotation import AnnotatedFrame
+
+        result = make_result([[20, 20, 60, 60, 1, 0.9, 2]], self.FRAME)
+        assert AnnotatedFrame(result).image() is result.orig_img
+
+    def test_video_viewer_tracking(self):
+        """测试实时画面观看者记录"""
+        from app.utils.websocket_utils import track_video_viewer, has_video_viewers
+
+        track_video_viewer('sid-1', 7)
+        track_video_viewer('sid-2', '7')
+        assert has_video_viewers(7)
+
+        track_video_viewer('sid-1', 7, joined=False)
+        assert has_video_viewers('7')
+        track_video_viewer('sid-2')
+        assert not has_video_viewers(7)
+
+    def test_video_viewer_changes_notify_listeners(self):
+        """测试摄像头有无观看者变化时通知回调，工作进程使用同步的观看状态"""
+        from app.utils import websocket_utils
+        from app.utils.websocket_utils import (track_video_viewer, has_video_viewers, set_video_viewers,
+                                               add_video_viewer_listener)
+
+        changes = []
+        add_video_viewer_listener(lambda camera_id, watching: changes.append((camera_id, watching)))
+        try:
+            track_video_viewer('sid-1', 8)
+            track_video_viewer('sid-2', 8)
+            track_video_viewer('sid-1')
+            track_video_viewer('sid-2', 8, joined=False)
+        finally:
+            websocket_utils._video_viewer_listeners.pop()
+        assert changes == [('8', True), ('8', False)]
+
+        set_video_viewers(9, True)
+        assert has_video_viewers('9')
+        set_video_viewers(9, False)
+        assert not has_video_viewers(9)
+
+
+class TestChunkedVideoAnalyzer:
+    """长视频分段并行分析测试"""
+
+    @staticmethod
+    def _track(frames, track_id, x, cls_id=2):
+        """生成一条静止轨迹的检测行 [frame, track_id, cls, x, y, w, h]"""
+        return [[frame, track_id, cls_id, x, 100, 40, 40] for frame in frames]
+
+    @staticmethod
+    def _stitch(chunks, outputs):
+        """拼接所有分段，返回(检测行, 总帧数)"""
+        import numpy as np
+        from app.utils.chunked_analysis import ChunkedVideoAnalyzer
+
+        parts = list(ChunkedVideoAnalyzer.stitch_tracks(chunks, outputs))
+        return np.concatenate([rows for rows, _ in parts]), sum(frames for _, frames in parts)
+
+    def test_plan_chunks(self):
+        """测试按时长划分分段，最后一段读到文件末尾"""
+        from app.utils.chunked_analysis import ChunkedVideoAnalyzer
+
+        chunks = ChunkedVideoAnalyzer.plan_chunks(250, 10, chunk_seconds=10, overlap_seconds=1)
+
+        # 除第一段外从起点前的重叠帧开始分析
+        assert chunks == [(0, 100, 0), (100, 200, 90), (200, None, 190)]
+        assert ChunkedVideoAnalyzer.plan_chunks(50, 10, 10, 1) == [(0, None, 0)]
+
+    def test_stitch_tracks_across_overlap(self, tmp_path):
+        """测试重叠帧内的轨迹拼接为同一全局ID，重叠帧只计入前一段"""
+        import numpy as np
+
+        chunks = [(0, 10, 0), (10, None, 6)]
+        # 第一段：车辆A(局部ID 5)贯穿边界，车辆B(局部ID 6)在边界前离开
+        first = np.array(self._track(range(0, 10), 5, 100) + self._track(range(0, 5), 6, 300), dtype=float)
+        # 第二段(从第6帧预热)：车辆A为局部ID 1，新车辆C为局部ID 2
+        second = np.array(self._track(range(6, 20), 1, 100) + self._track(range(15, 20), 2, 500), dtype=float)
+        # 工作进程输出的检测行文件
+        np.save(str(tmp_path / '1.npy'), second)
+
+        rows, total_frames = self._stitch(chunks, [(first, 10), (str(tmp_path / '1.npy'), 14)])
+
+        assert total_frames == 20
+        assert list(rows[:, 0]) == sorted(rows[:, 0])
+        ids = {x: set(rows[rows[:, 3] == x][:, 1].astype(int).tolist()) for x in (100, 300, 500)}
+        assert ids == {100: {1}, 300: {2}, 500: {3}}
+        # 车辆A每帧只出现一次
+        assert len(rows[rows[:, 3] == 100]) == 20
+
+    def test_stitch_tracks_different_class_not_joined(self):
+        """测试重叠帧内类别不同的轨迹不拼接"""
+        import numpy as np
+
+        chunks = [(0, 10, 0), (10, None, 6)]
+        first = np.array(self._track(range(0, 10), 1, 100, cls_id=2), dtype=float)
+        second = np.array(self._track(range(6, 20), 1, 100, cls_id=7), dtype=float)
+
+        rows, _ = self._stitch(chunks, [(first, 10), (second, 14)])
+
+        assert set(rows[rows[:, 2] == 2][:, 1].tolist()) == {1}
+        assert set(rows[rows[:, 2] == 7][:, 1].tolist()) == {2}
+
+    def test_stitch_overlap_owned_by_previous_chunk(self):
+        """测试重叠帧使用前一段(跟踪器已稳定)的结果，后一段冷启动的预热结果不计入"""
+        import numpy as np
+
+        chunks = [(0, 10, 0), (10, 20, 6), (20, None, 16)]
+        # 用宽度区分来源：第一段40，第二段41，第三段42
+        first = np.array([[frame, 3, 2, 100, 100, 40, 40] for frame in range(0, 10)], dtype=float)
+        second = np.array([[frame, 1, 2, 100, 100, 41, 40] for frame in range(6, 20)]
+                          # 冷启动时的误检，只出现在预热帧中
+                          + [[frame, 2, 7, 400, 100, 30, 30] for frame in range(6, 8)], dtype=float)
+        third = np.array([[frame, 4, 2, 100, 100, 42, 40] for frame in range(16, 25)], dtype=float)
+
+        rows, total_frames = self._stitch(chunks, [(first, 10), (second, 14), (third, 9)])
+
+        assert total_frames == 25
+        assert rows[:, 0].tolist() == list(range(25))
+        widths = dict(zip(rows[:, 0].astype(int).tolist(), rows[:, 5].tolist()))
+        assert {widths[frame] for frame in range(0, 10)} == {40}
+        assert {widths[frame] for frame in range(10, 20)} == {41}
+        assert {widths[frame] for frame in range(20, 25)} == {42}
+        # 三段拼接为同一轨迹，预热帧中的误检不计入也不占用全局ID
+        assert set(rows[:, 1].tolist()) == {1}
+        assert 7 not in rows[:, 2]
+
+    def test_box_iou(self):
+        """测试中心点格式检测框的IoU"""
+        import numpy as np
+        from app.utils.chunked_analysis import _box_iou
+
+        iou = _box_iou(np.array([[50, 50, 20, 20]]), np.array([[50, 50, 20, 20], [60, 50, 20, 20], [200, 200, 10, 10]]))
+
+        assert np.allclose(iou, [[1.0, 1 / 3, 0.0]])
+
+    def test_frame_source_seek(self, tmp_path):
+        """测试视频文件定位到指定帧，图片目录不支持定位"""
+        import cv2
+        import numpy as np
+        from app.utils.frame_source import FrameSource
+
+        path = str(tmp_path / 'clip.avi')
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+        for index in range(10):
+            writer.write(np.full((48, 64, 3), index * 20, dtype=np.uint8))
+        writer.release()
+
+        source = FrameSource(path).open()
+        assert source.frame_count == 10
+        assert source.seek(6)
+        assert round(float(source.read().mean()) / 20) == 6
+        source.release()
+
+        cv2.imwrite(str(tmp_path / '0001.jpg'), np.zeros((8, 8, 3), dtype=np.uint8))
+        images = FrameSource(str(tmp_path)).open()
+        with pytest.raises(ValueError):
+            images.seek(0)
+        images.release()
+
+    def test_detection_artifact_paging(self, tmp_path):
+        """测试检测结果文件逐帧写入和按索引分页读取"""
+        from app.utils.detection_artifact import DetectionArtifact, DetectionArtifactWriter
+
+        path = DetectionArtifact.path_for(str(tmp_path), '/videos/gate.mp4')
+        with DetectionArtifactWriter(path) as artifact:
+            for frame in range(0, 10, 2):
+                artifact.write(frame, [{"track_id": frame, "class": "car", "position": [1.0, 2.0, 3.0, 4.0]}] * 2)
+
+        assert os.path.basename(path).startswith('gate_') and path.endswith(DetectionArtifact.SUFFIX)
+        assert (artifact.frames, artifact.objects) == (5, 10)
+
+        page = DetectionArtifact.read_page(path, offset=1, limit=3)
+        assert [f['frame'] for f in page['frames']] == [2, 4, 6]
+        assert (page['total'], page['next_offset']) == (5, 4)
+        assert page['frames'][0]['detections'][0]['track_id'] == 2
+
+        last = DetectionArtifact.read_page(path, offset=4)
+        assert [f['frame'] for f in last['frames']] == [8]
+        assert last['next_offset'] is None
+        assert DetectionArtifact.read_page(path, offset=9)['frames'] == []
+
+        with pytest.raises(FileNotFoundError):
+            DetectionArtifact.read_page(str(tmp_path / 'other.json'))
+
+    def test_detection_artifact_paths_unique(self, tmp_path):
+        """测试同名输入和重复分析使用不同的结果文件，已有结果文件不会被改写"""
+        from app.utils.detection_artifact import DetectionArtifact, DetectionArtifactWriter
+
+        paths = {DetectionArtifact.path_for(str(tmp_path), source)
+                 for source in ('/a/cam1.mp4', '/b/cam1.mp4', '/a/cam1.mp4')}
+        assert len(paths) == 3
+
+        path = paths.pop()
+        with DetectionArtifactWriter(path) as artifact:
+            artifact.write(0, [])
+        with pytest.raises(FileExistsError):
+            DetectionArtifactWriter(path)
+        assert DetectionArtifact.read_page(path)['total'] == 1
+
+    def test_detection_artifact_read_while_writing(self, tmp_path):
+        """测试写入过程中分页读取只返回已完整写入的行(异步分析任务运行中)"""
+        from app.utils.detection_artifact import DetectionArtifact, DetectionArtifactWriter
+
+        path = DetectionArtifact.path_for(str(tmp_path), 'gate.mp4')
+        with DetectionArtifactWriter(path) as artifact:
+            assert DetectionArtifact.read_page(path)['total'] == 0
+            for frame in range(3):
+                artifact.write(frame, [{"track_id": 1, "class": "car", "position": [1.0, 2.0, 3.0, 4.0]}])
+                page = DetectionArtifact.read_page(path)
+                assert page['total'] == frame + 1
+                assert [f['frame'] for f in page['frames']] == list(range(frame + 1))
+
+
+    def test_detection_artifact_flushes_in_batches(self, tmp_path):
+        """测试结果文件和索引按批刷新，索引只在结果文件刷新后写入"""
+        from app.utils.detection_artifact import DetectionArtifact, DetectionArtifactWriter
+
+        path = DetectionArtifact.path_for(str(tmp_path), 'gate.mp4')
+        index_path = DetectionArtifact.index_path(path)
+        with DetectionArtifactWriter(path, flush_frames=3) as artifact:
+            for frame in range(2):
+                artifact.write(frame, [])
+            assert os.path.getsize(index_path) == 0
+            artifact.write(2, [])
+            assert os.path.getsize(index_path) == 3 * 8
+            artifact.write(3, [])
+            assert os.path.getsize(index_path) == 3 * 8
+        assert DetectionArtifact.read_page(path)['total'] == 4
+
+
+class TestAnalysisJobQueue:
+    """异步文件分析任务队列测试"""
+
+    @staticmethod
+    def _wait(job, statuses=('completed', 'failed', 'cancelled'), timeout=5):
+        import time
+
+        deadline = time.time() + timeout
+        while job.status not in statuses and time.time() < deadline:
+            time.sleep(0.01)
+        return job.status
+
+    def test_job_progress_and_result(self):
+        """测试任务执行、进度上报和结果"""
+        from app.utils.analysis_jobs import AnalysisJobQueue
+
+        def runner(data, progress):
+            for frame in range(1, 11):
+                progress(frame, 10)
+            return {'source': data['source'], 'total_frames': 10}
+
+        queue = AnalysisJobQueue(max_workers=1, nice=0)
+        job = queue.submit(runner, {'source': 'a.mp4'})
+
+        assert self._wait(job) == 'completed'
+        info = queue.get(job.id).to_dict(include_result=True)
+        assert info['progress']['frames_done'] == 10
+        assert info['progress']['percent'] == 100.0
+        assert info['progress']['fps'] is not None
+        assert info['result'] == {'source': 'a.mp4', 'total_frames': 10}
+
+    def test_cancel_running_and_queued(self):
+        """测试取消运行中和排队中的任务"""
+        import threading
+        from app.utils.analysis_jobs import AnalysisJobQueue
+
+        started = threading.Event()
+        calls = []
+
+        def runner(data, progress):
+            calls.append(data['source'])
+            started.set()
+            frame = 0
+            while True:
+                frame += 1
+                try:
+                    progress(frame, None)
+                except Exception as e:
+                    # 分析过程包装异常时仍按取消处理
+                    raise Exception(f"Source processing failed: {e}")
+
+        queue = AnalysisJobQueue(max_workers=1, nice=0)
+        running = queue.submit(runner, {'source': 'a.mp4'})
+        queued = queue.submit(runner, {'source': 'b.mp4'})
+        assert started.wait(5)
+
+        assert queue.cancel(queued.id).status == 'cancelled'
+        queue.cancel(running.id)
+
+        assert self._wait(running) == 'cancelled'
+        assert running.error is None
+        assert calls == ['a.mp4']
+        assert queue.cancel('missing') is None
+
+    def test_failed_job_and_queue_limit(self):
+        """测试任务失败记录错误，排队数达到上限时拒绝提交"""
+        import threading
+        from app.utils.analysis_jobs import AnalysisJobQueue, AnalysisQueueFull
+
+        release = threading.Event()
+
+        def runner(data, progress):
+            release.wait(5)
+            raise ValueError('decode error')
+
+        queue = AnalysisJobQueue(max_workers=1, max_pending=1, nice=0)
+        first = queue.submit(runner, {'source': 'a.mp4'})
+        self._wait(first, statuses=('running',))
+        queue.submit(runner, {'source': 'b.mp4'})
+        with pytest.raises(AnalysisQueueFull):
+            queue.submit(runner, {'source': 'c.mp4'})
+        assert queue.stats() == {'workers': 1, 'max_pending': 1, 'queued': 1, 'running': 1}
+
+        release.set()
+        assert self._wait(first) == 'failed'
+        assert first.error == 'decode error'
+
+    def test_finished_jobs_evicted(self):
+        """测试只保留最近的已结束任务"""
+        from app.utils.analysis_jobs import AnalysisJobQueue
+
+        queue = AnalysisJobQueue(max_workers=1, retention=2, nice=0)
+        jobs = [queue.submit(lambda data, progress: {}, {'source': f'{i}.mp4'}) for i in range(4)]
+        for job in jobs:
+            self._wait(job)
+
+        assert [job.id for job in queue.list()] == [job.id for job in jobs[2:]]
+
+
+class TestImageBatchAnalyzer:
+    """图片集批量分析测试"""
+
+    @staticmethod
+    def _yolo():
+        """模拟YOLOIntegration：每张图片检测到一辆car和一个非目标类别"""
+        import torch
+        from app.utils.inference_profile import InferenceProfile
+
+        def predict(frames, **kwargs):
+            results = []
+            for _ in frames:
+                result = Mock(spec=['boxes'])
+                result.boxes = Mock(data=torch.tensor([[10., 10., 30., 20., 0.9, 2.], [0., 0., 5., 5., 0.8, 0.]]))
+                results.append(result)
+            return results
+
+        yolo = Mock()
+        yolo.TARGET_CLASSES = {2: 'car', 7: 'truck'}
+        yolo.special_vehicles = {}
+        yolo.device = 'cpu'
+        yolo.profile = InferenceProfile(imgsz=320)
+        yolo.acquire_model.return_value.model.predict.side_effect = predict
+        return yolo
+
+    def test_list_images(self, tmp_path, write_images):
+        """测试目录按文件名排序，路径列表校验扩展名和文件存在"""
+        from app.utils.image_batch import ImageBatchAnalyzer
+
+        write_images(tmp_path, 3, size=(60, 40))
+        (tmp_path / 'notes.txt').write_text('x')
+
+        images = ImageBatchAnalyzer.list_images(str(tmp_path))
+        assert [os.path.basename(p) for p in images] == ['0000.jpg', '0001.jpg', '0002.jpg']
+        assert ImageBatchAnalyzer.is_image_set(str(tmp_path))
+        assert ImageBatchAnalyzer.is_image_set(images[:1])
+        assert ImageBatchAnalyzer.is_image_set(str(tmp_path / '*.jpg'))
+        assert not ImageBatchAnalyzer.is_image_set(images[0])
+        assert len(ImageBatchAnalyzer.list_images(str(tmp_path / '000[12].jpg'))) == 2
+
+        with pytest.raises(ValueError):
+            ImageBatchAnalyzer.list_images([str(tmp_path / 'notes.txt')])
+        with pytest.raises(FileNotFoundError):
+            ImageBatchAnalyzer.list_images([str(tmp_path / 'missing.jpg')])
+
+    def test_analyze_in_batches(self, tmp_path, write_images):
+        """测试分批推理、类别过滤、无法解码的图片计数和合并结果文件"""
+        from app.utils.image_batch import ImageBatchAnalyzer
+        from app.utils.detection_artifact import DetectionArtifact
+
+        images_dir = tmp_path / 'snapshots'
+        images_dir.mkdir()
+        write_images(images_dir, 5, size=(60, 40))
+        (images_dir / '0002.jpg').write_bytes(b'broken')
+        yolo = self._yolo()
+        progress = []
+
+        analyzer = ImageBatchAnalyzer(yolo, batch_size=2, decode_threads=2)
+        summary = analyzer.analyze(ImageBatchAnalyzer.list_images(str(images_dir)), 'snapshots', str(tmp_path),
+                                   save_images=True, progress=lambda done, total: progress.append((done, total)))
+
+        predict = yolo.acquire_model.return_value.model.predict
+        assert [len(call.args[0]) for call in predict.call_args_list] == [2, 1, 1]
+        assert predict.call_args.kwargs['classes'] == [2, 7]
+        assert predict.call_args.kwargs['imgsz'] == 320
+        yolo.acquire_model.return_value.release.assert_called_once()
+        assert progress == [(2, 5), (4, 5), (5, 5)]
+
+        assert summary['total_frames'] == 4
+        assert summary['failed_images'] == 1
+        assert summary['total_objects'] == 4
+        page = DetectionArtifact.read_page(summary['detections_path'])
+        assert [f['frame'] for f in page['frames']] == [0, 1, 3, 4]
+        assert page['frames'][2]['image'].endswith('0003.jpg')
+        assert page['frames'][0]['detections'] == [{'track_id': None, 'class': 'car', 'position': [20.0, 15.0, 20.0, 10.0]}]
+        assert len(os.listdir(summary['output_path'])) == 4
+
+    def test_analyze_outputs_unique_per_job(self, tmp_path, write_images):
+        """测试路径列表分析的结果文件和标注图片每次唯一，不同目录的同名图片不互相覆盖"""
+        from app.utils.image_batch import ImageBatchAnalyzer
+
+        for folder in ('a', 'b'):
+            (tmp_path / folder).mkdir()
+            write_images(tmp_path / folder, 1, size=(60, 40))
+        images = [str(tmp_path / 'a' / '0000.jpg'), str(tmp_path / 'b' / '0000.jpg')]
+
+        analyzer = ImageBatchAnalyzer(self._yolo(), decode_threads=1)
+        assert analyzer.batch_size == ImageBatchAnalyzer.CPU_BATCH_SIZE
+        first = analyzer.analyze(images, 'images', str(tmp_path), save_images=True)
+        second = analyzer.analyze(images, 'images', str(tmp_path), save_images=True)
+
+        assert first['detections_path'] != second['detections_path']
+        assert first['output_path'] != second['output_path']
+        assert sorted(os.listdir(first['output_path'])) == ['000000_0000.jpg', '000001_0000.jpg']
+
+
+class TestPipelineMetrics:
+    """流水线阶段耗时与Prometheus指标测试"""
+
+    def test_histogram_buckets(self):
+        """测试耗时按上限落入对应分桶(含上限)"""
+        from app.utils.metrics import LatencyHistogram
+
+        histogram = LatencyHistogram()
+        for seconds in (0.0005, 0.001, 0.03, 10.0):
+            histogram.observe(seconds)
+
+        snapshot = histogram.snapshot()
+        assert snapshot['count'] == 4
+        assert snapshot['sum'] == pytest.approx(10.0315)
+        assert snapshot['buckets'][0] == 2
+        assert snapshot['buckets'][LatencyHistogram.BUCKETS.index(0.05)] == 1
+        assert snapshot['buckets'][-1] == 1
+
+    def test_snapshot_and_remove(self):
+        """测试按摄像头记录阶段耗时和计数器，停止后清除"""
+        from app.utils.metrics import PipelineMetrics
+
+        registry = PipelineMetrics(enabled=True)
+        registry.histogram(1, 'decode').observe(0.002)
+        registry.observe(1, 'decode', 0.004)
+        registry.count(1, 'db_writes.violations', 2)
+
+        snapshot = registry.snapshot(1)
+        assert snapshot['stages']['decode']['count'] == 2
+        assert snapshot['counters'] == {'db_writes.violations': 2}
+        assert registry.snapshot(2) == {'stages': {}, 'counters': {}}
+
+        registry.remove(1)
+        assert registry.snapshot(1) == {'stages': {}, 'counters': {}}
+
+    def test_disabled(self):
+        """测试关闭后不记录"""
+        from app.utils.metrics import PipelineMetrics
+
+        registry = PipelineMetrics(enabled=False)
+        registry.observe(1, 'decode', 0.01)
+        registry.count(1, 'db_writes.detections')
+        registry.histogram(None, 'decode').observe(0.01)
+
+        assert registry.snapshot(1) == {'stages': {}, 'counters': {}}
+
+    def test_render_prometheus(self):
+        """测试Prometheus文本格式：直方图累积分桶、队列、数据库写入和摄像头数"""
+        from app.utils.metrics import LatencyHistogram, render_metrics
+
+        histogram = LatencyHistogram()
+        histogram.observe(0.003)
+        histogram.observe(0.2)
+        status = {
+            1: {
+                'status': 'running',
+                'pipeline': {
+                    'frames': 10,
+                    'queues': {'live': {'depth': 1, 'enqueued': 10, 'dropped': 3, 'blocked_seconds': 0.0}},
+                    'metrics': {'stages': {'inference': histogram.snapshot()},
+                                'counters': {'db_writes.violations': 2}}
+                }
+            },
+            2: {'status': 'starting'}
+        }
+
+        text = render_metrics(status, {'queued': 1, 'running': 0})
+        lines = text.splitlines()
+
+        assert '# TYPE vehicle_detection_stage_seconds histogram' in lines
+        assert 'vehicle_detection_stage_seconds_bucket{camera="1",stage="inference",le="0.0025"} 0' in lines
+        assert 'vehicle_detection_stage_seconds_bucket{camera="1",stage="inference",le="0.005"} 1' in lines
+        assert 'vehicle_detection_stage_seconds_bucket{camera="1",stage="inference",le="+Inf"} 2' in lines
+        assert 'vehicle_detection_stage_seconds_count{camera="1",stage="inference"} 2' in lines
+        assert 'vehicle_detection_queue_dropped_total{camera="1",queue="live"} 3' in lines
+        assert 'vehicle_detection_frames_total{camera="1"} 10' in lines
+        assert 'vehicle_detection_db_writes_total{camera="1",table="violations"} 2' in lines
+        assert 'vehicle_detection_active_cameras 2' in lines
+        assert 'vehicle_detection_cameras{status="starting"} 1' in lines
+        assert 'vehicle_detection_analysis_jobs{state="queued"} 1' in lines
+
+    def test_annotator_records_stage(self):
+        """测试标注渲染记录annotate阶段耗时"""
+        import numpy as np
+        import torch
+        from ultralytics.engine.results import Results
+        from app.utils.annotation import FrameAnnotator, AnnotatedFrame
+        from app.utils.metrics import metrics
+
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        result = Results(frame, path='', names={2: 'car'},
+                         boxes=torch.tensor([[20, 20, 60, 60, 1, 0.9, 2]], dtype=torch.float32))
+        try:
+            AnnotatedFrame(result, FrameAnnotator({2: 'car'}, camera_id='metrics-test')).image()
+            assert metrics.snapshot('metrics-test')['stages']['annotate']['count'] == 1
+        finally:
+            metrics.remove('metrics-test')
+
+
+class TestIoUTracker:
+    """轻量IoU跟踪器测试"""
+
+    @staticmethod
+    def _boxes(rows):
+        import numpy as np
+        from ultralytics.engine.results import Boxes
+
+        data = np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+        return Boxes(data, (360, 640))
+
+    def test_iou_matrix(self):
+        """测试IoU矩阵"""
+        import numpy as np
+        from app.utils.iou_tracker import iou_matrix
+
+        iou = iou_matrix(np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=float),
+                         np.array([[0, 0, 10, 10], [5, 0, 15, 10]], dtype=float))
+
+        assert iou.shape == (2, 2)
+        assert iou[0, 0] == pytest.approx(1.0)
+        assert iou[0, 1] == pytest.approx(50 / 150)
+        assert iou[1].tolist() == [0.0, 0.0]
+        assert iou_matrix(np.zeros((0, 4)), np.zeros((3, 4))).shape == (0, 3)
+
+    def test_greedy_match(self):
+        """测试按IoU从高到低贪心匹配，低于阈值不匹配"""
+        import numpy as np
+        from app.utils.iou_tracker import greedy_match
+
+        rows, cols = greedy_match(np.array([[0.9, 0.8], [0.85, 0.1], [0.2, 0.25]]), 0.3)
+
+        assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 0)]
+        rows, cols = greedy_match(np.array([[0.9, 0.8], [0.85, 0.4]]), 0.3)
+        assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 0), (1, 1)]
+
+    def test_ids_stable_for_moving_objects(self):
+        """测试移动目标保持ID，输出格式与Ultralytics跟踪器一致"""
+        from app.utils.iou_tracker import IoUTracker
+
+        tracker = IoUTracker()
+        for step in range(6):
+            x = 10 + step * 8
+            tracks = tracker.update(self._boxes([[x, 20, x + 40, 60, 0.9, 2],
+                                                 [300 - x, 100, 340 - x, 140, 0.8, 7]]))
+
+        assert tracks.shape == (2, 8)
+        assert sorted(tracks[:, 4].astype(int).tolist()) == [1, 2]
+        # 检测索引列对应输入顺序，类别和置信度来自检测
+        by_index = {int(row[7]): row for row in tracks}
+        assert int(by_index[0][6]) == 2 and int(by_index[1][6]) == 7
+        assert by_index[0][:4].tolist() == [50.0, 20.0, 90.0, 60.0]
+
+    def test_lifecycle(self):
+        """测试新目标确认、低置信度不建新目标、丢失超时后删除且ID不复用"""
+        from app.utils.iou_tracker import IoUTracker
+
+        tracker = IoUTracker({'min_hits': 2, 'track_buffer': 3}, frame_rate=30)
+        assert tracker.update(self._boxes([[0, 0, 20, 20, 0.9, 2]]))[:, 4].tolist() == [1]
+        tracker.update(self._boxes([[1, 0, 21, 20, 0.9, 2]]))
+        tracker.update(self._boxes([[2, 0, 22, 20, 0.9, 2]]))
+
+        # 首帧之后出现的目标需要累计匹配min_hits帧才输出
+        tracks = tracker.update(self._boxes([[3, 0, 23, 20, 0.9, 2], [100, 100, 140, 140, 0.9, 5]]))
+        assert tracks[:, 4].tolist() == [1]
+        tracks = tracker.update(self._boxes([[4, 0, 24, 20, 0.9, 2], [101, 100, 141, 140, 0.9, 5]]))
+        assert sorted(tracks[:, 4].tolist()) == [1, 2]
+
+        # 低于new_track_thresh的检测不创建目标
+        assert len(tracker.update(self._boxes([[300, 300, 320, 320, 0.1, 2]]))) == 0
+        for _ in range(3):
+            tracker.update(self._boxes([]))
+        assert len(tracker) == 0
+
+        tracker.update(self._boxes([[0, 0, 20, 20, 0.9, 2]]))
+        assert tracker.update(self._boxes([[0, 0, 20, 20, 0.9, 2]]))[:, 4].tolist() == [3]
+
+    def test_class_aware_matching(self):
+        """测试不同类别的重叠检测不继承ID"""
+        from app.utils.iou_tracker import IoUTracker
+
+        tracker = IoUTracker({'min_hits': 1})
+        tracker.update(self._boxes([[0, 0, 20, 20, 0.9, 2]]))
+        tracks = tracker.update(self._boxes([[0, 0, 20, 20, 0.9, 7]]))
+
+        assert tracks[:, 4].tolist() == [2]
+
+    def test_camera_tracker_with_iou_config(self):
+        """测试CameraTracker按iou配置创建跟踪器，更新和外推保持ID"""
+        import numpy as np
+        import torch
+        from ultralytics.engine.results import Results
+        from app.utils.inference_engine import CameraTracker
+        from app.utils.yolo_integration import YOLOIntegration
+
+        tracker = CameraTracker(YOLOIntegration.TRACKER_OPTIONS['iou'], frame_rate=25)
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        tracked = None
+        for step in range(5):
+            x = 10 + step * 10
+            result = Results(frame, path='', names={2: 'car'},
+                             boxes=torch.tensor([[x, 20, x + 30, 50, 0.9, 2]], dtype=torch.float32))
+            tracked = tracker.update(result)
+
+        assert tracked.boxes.id.int().tolist() == [1]
+        propagated = tracker.propagate(frame)
+        assert propagated.boxes.id.int().tolist() == [1]
+        assert int(propagated.boxes.cls[0]) == 2
+        # 匀速运动外推位置继续向右
+        assert float(propagated.boxes.xyxy[0, 0]) > float(tracked.boxes.xyxy[0, 0])
+
+    @patch('app.utils.yolo_integration.os.path.exists', return_value=True)
+    def test_iou_requires_batched_mode(self, mock_exists):
+        """测试IoU跟踪器仅支持batched实时检测"""
+        from app.utils.yolo_integration import YOLOIntegration
+
+        with pytest.raises(ValueError, match='batched'):
+            YOLOIntegration('yolov8n.pt', tracker_type='iou', inference_mode='stream')
+        yolo = YOLOIntegration('yolov8n.pt', tracker_type='iou', inference_mode='batched')
+        assert yolo.tracking_config.endswith('iou.yaml')
+        with pytest.raises(Exception, match='not supported for file analysis'):
+            yolo.process_source('video.mp4')
+
+
+class TestCoreBudget:
+    """CPU核心预算测试"""
+
+    @staticmethod
+    def _budget(cores, pinning=False):
+        from app.utils.cpu_budget import CoreBudget
+
+        budget = CoreBudget(pinning=pinning)
+        budget.configure(cores=cores)
+        return budget
+
+    def test_split_cores_between_cameras(self):
+        """测试核心按摄像头均分，线程数之和等于预算，核心互不重叠"""
+        budget = self._budget(range(8))
+        for camera_id in (1, 2, 3):
+            budget.acquire(camera_id)
+
+        allocations = [budget.allocation(camera_id) for camera_id in (1, 2, 3)]
+
+        assert sum(allocation['threads'] for allocation in allocations) == 8
+        assert sorted(allocation['threads'] for allocation in allocations) == [2, 3, 3]
+        cores = [core for allocation in allocations for core in allocation['cores']]
+        assert sorted(cores) == list(range(8))
+        assert budget.allocation(4) is None
+
+    def test_rebalance_on_release(self):
+        """测试摄像头停止后剩余摄像头分得全部核心"""
+        budget = self._budget(range(4))
+        budget.acquire(1)
+        budget.acquire(2)
+        assert budget.allocation(1)['threads'] == 2
+
+        budget.release(2)
+
+        assert budget.allocation(1) == {'threads': 4, 'cores': [0, 1, 2, 3], 'pinned': False, 'cameras': 1}
+        assert budget.stats()['units'] == {'1': budget.allocation(1)}
+
+    def test_oversubscribed_budget_shares_cores(self):
+        """测试摄像头数超过核心数时每个摄像头1个线程，核心循环共享"""
+        budget = self._budget([0, 1])
+        for camera_id in (1, 2, 3):
+            budget.acquire(camera_id)
+
+        assert [budget.allocation(camera_id)['threads'] for camera_id in (1, 2, 3)] == [1, 1, 1]
+        assert [budget.allocation(camera_id)['cores'] for camera_id in (1, 2, 3)] == [[0], [1], [0]]
+
+    def test_units_weighted_by_cameras(self):
+        """测试工作进程分组按摄像头数分配核心，组内摄像头共享分配"""
+        budget = self._budget(range(6))
+        budget.acquire(1, unit='worker:gate')
+        budget.acquire(2, unit='worker:gate')
+        budget.acquire(3, unit='worker:yard')
+
+        gate = budget.unit_allocation('worker:gate')
+        assert gate == {'threads': 4, 'cores': [0, 1, 2, 3], 'pinned': False, 'cameras': 2}
+        assert budget.allocation(2) == gate
+        assert budget.unit_allocation('worker:yard')['cores'] == [4, 5]
+
+    @patch('app.utils.cpu_budget.os.sched_setaffinity', create=True)
+    @patch('torch.set_num_threads')
+    def test_sync_applies_once_per_version(self, mock_threads, mock_affinity):
+        """测试推理线程只在分配变化后重新设置线程数和亲和性"""
+        budget = self._budget(range(4), pinning=True)
+        budget.acquire(1)
+        budget.acquire(2)
+
+        budget.sync(1)
+        budget.sync(1)
+        mock_threads.assert_called_once_with(2)
+        mock_affinity.assert_called_once_with(0, [0, 1])
+
+        # 批量推理引擎线程使用所有摄像头的分配之和
+        budget.sync(1, 2)
+        mock_threads.assert_called_with(4)
+        mock_affinity.assert_called_with(0, [0, 1, 2, 3])
+
+        budget.release(2)
+        budget.sync(1)
+        assert mock_threads.call_count == 3
+        mock_threads.assert_called_with(4)
+
+    @patch('torch.set_num_threads')
+    def test_sync_without_pinning(self, mock_threads):
+        """测试未启用绑定时只设置线程数，未登记的摄像头不做设置"""
+        budget = self._budget(range(2))
+        budget.sync(7)
+        mock_threads.assert_not_called()
+
+        budget.acquire(7)
+        with patch('app.utils.cpu_budget.os.sched_setaffinity', create=True) as mock_affinity:
+            budget.sync(7)
+        mock_threads.assert_called_once_with(2)
+        mock_affinity.assert_not_called()
+
+
+class TestModelCascade:
+    """两级检测级联测试"""
+
+    FRAME = (360, 640)
+
+    @staticmethod
+    def _handle(make_result, crops, rows_for_crop):
+        """模拟第二级模型：记录裁剪尺寸，按裁剪返回裁剪坐标下的检测"""
+        handle = MagicMock()
+
+        def predict(images, **kwargs):
+            crops.append(([image.shape[:2] for image in images], kwargs))
+            return [make_result(rows_for_crop(index, image), image.shape[:2]) for index, image in enumerate(images)]
+
+        handle.model.predict.side_effect = predict
+        return handle
+
+    @staticmethod
+    def _cascade(restricted_areas=None, **config):
+        from app.utils.cascade import ModelCascade
+
+        return ModelCascade.from_config({'model_path': 'yolov8m.pt', **config}, restricted_areas)
+
+    def test_from_config(self):
+        """测试未配置时不启用，未知字段和缺少模型报错"""
+        from app.utils.cascade import ModelCascade
+
+        assert ModelCascade.from_config(None) is None
+        assert ModelCascade.from_config({}) is None
+        with pytest.raises(ValueError):
+            ModelCascade.from_config({'model_path': 'yolov8m.pt', 'threshold': 0.5})
+        with pytest.raises(ValueError):
+            ModelCascade.from_config({'interval': 3})
+        with pytest.raises(ValueError):
+            ModelCascade.from_config({'model_path': 'yolov8m.pt', 'interval': 0})
+
+        areas = [{'name': 'A', 'points': [[0, 0], [10, 0], [10, 10]]}]
+        assert self._cascade(areas).areas == [[[0, 0], [10, 0], [10, 10]]]
+        assert self._cascade(areas, areas=False).areas == []
+
+    def test_low_confidence_detection_replaced(self, make_result):
+        """测试低置信度目标由第二级结果替换，高置信度目标保留"""
+        import numpy as np
+
+        crops = []
+        cascade = self._cascade(conf_threshold=0.5, padding=0.5, imgsz=160)
+        cascade.open(self._handle(make_result, crops, lambda index, image: [[20, 20, 60, 60, 0.9, 7]]))
+        frame = np.zeros((*self.FRAME, 3), dtype=np.uint8)
+        result = make_result([[100, 100, 140, 140, 0.3, 2], [300, 100, 360, 160, 0.9, 2]], self.FRAME)
+
+        refined = cascade.refine(result, frame, {'classes': [2, 7], 'imgsz': 640, 'conf': 0.25})
+
+        # 低置信度目标外扩后裁剪：(80,80)-(160,160)
+        assert crops[0][0] == [(80, 80)]
+        assert crops[0][1]['imgsz'] == 160
+        assert crops[0][1]['classes'] == [2, 7]
+        rows = refined.boxes.data.numpy().tolist()
+        assert [300.0, 100.0, 360.0, 160.0, pytest.approx(0.9), 2.0] in rows
+        assert [100.0, 100.0, 140.0, 140.0, pytest.approx(0.9), 7.0] in rows
+        assert len(rows) == 2
+        stats = cascade.stats()
+        assert stats['runs'] == 1 and stats['replaced'] == 1 and stats['added'] == 1
+        assert stats['crops'] == {'low_conf': 1, 'area': 0}
+
+    def test_second_stage_rate_limited(self, make_result):
+        """测试第二级每interval帧最多运行一次，高置信度帧不触发"""
+        import numpy as np
+
+        crops = []
+        cascade = self._cascade(interval=3)
+        cascade.open(self._handle(make_result, crops, lambda index, image: []))
+        frame = np.zeros((*self.FRAME, 3), dtype=np.uint8)
+
+        assert cascade.refine(make_result([[0, 0, 40, 40, 0.9, 2]], self.FRAME), frame) is not None
+        for _ in range(5):
+            cascade.refine(make_result([[100, 100, 140, 140, 0.3, 2]], self.FRAME), frame)
+
+        assert len(crops) == 2
+        stats = cascade.stats()
+        assert stats['frames'] == 6
+        assert stats['runs'] == 2
+        assert stats['run_ratio'] == pytest.approx(0.333)
+        assert stats['rate_limited'] == 3
+        # 第二级未检出，低置信度目标被移除
+        assert stats['replaced'] == 2 and stats['added'] == 0
+
+    def test_restricted_area_crops(self, make_result):
+        """测试禁停区域按解码缩放比例裁剪复检，区域内的低置信度目标不重复裁剪"""
+        import numpy as np
+
+        crops = []
+        areas = [{'points': [[200, 200], [400, 200], [400, 400], [200, 400]]}]
+        cascade = self._cascade(areas, padding=0)
+        cascade.open(self._handle(make_result, crops, lambda index, image: [[10, 10, 50, 50, 0.8, 2], [12, 11, 51, 50, 0.6, 2]]))
+        cascade.scale = 0.5
+        frame = np.zeros((*self.FRAME, 3), dtype=np.uint8)
+
+        refined = cascade.refine(make_result([[120, 120, 140, 140, 0.3, 2]], self.FRAME), frame)
+
+        assert crops[0][0] == [(100, 100)]
+        # 同类重叠的第二级检测只保留置信度最高的一个
+        assert refined.boxes.data.numpy().tolist() == [[110.0, 110.0, 150.0, 150.0, pytest.approx(0.8), 2.0]]
+        assert cascade.stats()['crops'] == {'low_conf': 0, 'area': 1}
+
+    def test_areas_checked_only_with_low_confidence_inside(self, make_result):
+        """测试禁停区域内没有低置信度目标时不复检该区域，没有低置信度目标时不运行第二级"""
+        import numpy as np
+
+        crops = []
+        areas = [{'points': [[0, 0], [100, 0], [100, 100], [0, 100]]}]
+        cascade = self._cascade(areas, padding=0, interval=1)
+        cascade.open(self._handle(make_result, crops, lambda index, image: []))
+        frame = np.zeros((*self.FRAME, 3), dtype=np.uint8)
+
+        cascade.refine(make_result([[20, 20, 60, 60, 0.9, 2]], self.FRAME), frame)
+        assert crops == []
+        cascade.refine(make_result([[300, 200, 340, 240, 0.3, 2]], self.FRAME), frame)
+        assert crops[0][0] == [(40, 40)]
+        assert cascade.stats()['crops'] == {'low_conf': 1, 'area': 0}
+
+    def test_imgsz_scaled_to_crop_resolution(self, make_result):
+        """测试大裁剪区域的第二级推理尺寸按第一级分辨率放大"""
+        import numpy as np
+
+        crops = []
+        areas = [{'points': [[0, 0], [640, 0], [640, 360], [0, 360]]}]
+        cascade = self._cascade(areas, padding=0, imgsz=320)
+        cascade.open(self._handle(make_result, crops, lambda index, image: []))
+        frame = np.zeros((*self.FRAME, 3), dtype=np.uint8)
+
+        cascade.refine(make_result([[300, 200, 340, 240, 0.3, 2]], self.FRAME), frame, {'imgsz': 640})
+
+        assert crops[0][0] == [(360, 640)]
+        assert crops[0][1]['imgsz'] == 640
+        # ROI推理时按第一级输入尺寸计算分辨率
+        assert cascade.imgsz_for([(0, 0, 640, 360)], (180, 320, 3), 320) == 640
+        assert cascade.imgsz_for([(0, 0, 80, 80)], (360, 640, 3), 640) == 320
+
+    def test_closed_cascade_passthrough(self, make_result):
+        """测试未绑定或已归还模型句柄时原样返回"""
+        import numpy as np
+
+        cascade = self._cascade()
+        result = make_result([[100, 100, 140, 140, 0.3, 2]], self.FRAME)
+        assert cascade.refine(result, np.zeros((*self.FRAME, 3), dtype=np.uint8)) is result
+
+        handle = MagicMock()
+        cascade.open(handle)
+        cascade.close()
+        handle.release.assert_called_once()
+        assert cascade.handle is None
+
+    def test_engine_refines_before_tracking(self, app_context, make_result):
+        """测试引擎在跟踪器更新前执行级联复检并记录cascade阶段耗时"""
+        import numpy as np
+        from app.utils.inference_engine import BatchInferenceEngine
+
+        handle = MagicMock()
+        handle.model.predict.side_effect = lambda frames, **kwargs: [
+            make_result([[300, 200, 340, 240, 0.3, 2]], self.FRAME) for _ in frames]
+        crops = []
+        cascade = self._cascade(padding=0)
+        cascade.open(self._handle(make_result, crops, lambda index, image: [[5, 5, 35, 35, 0.8, 2]]))
+        tracker = Mock()
+        tracker.update.side_effect = lambda result: result
+        engine = BatchInferenceEngine(handle, classes=[2], batch_size=1, max_wait_ms=0)
+        channel = engine.attach(1, tracker, cascade)
+
+        with patch('app.utils.inference_engine.metrics') as mock_metrics:
+            result = channel.infer(np.zeros((*self.FRAME, 3), dtype=np.uint8), timeout=5, options={'imgsz': 320})
+
+        assert result.boxes.data.tolist() == [[305.0, 205.0, 335.0, 235.0, 0.800000011920929, 2.0]]
+        assert crops[0][1]['classes'] == [2]
+        tracker.update.assert_called_once_with(result)
+        assert 'cascade' in [call.args[1] for call in mock_metrics.observe.call_args_list]
+        channel.close()
+
+    def test_engine_batches_second_stage_across_cameras(self, app_context, make_result):
+        """测试同一周期内多个摄像头的第二级复检合并为一次推理，不复检的摄像头先完成"""
+        import threading
+        import numpy as np
+        from app.utils.inference_engine import BatchInferenceEngine
+
+        handle = MagicMock()
+        handle.model.predict.side_effect = lambda frames, **kwargs: [
+            make_result([[300, 200, 340, 240, 0.3 if frame[0, 0, 0] else 0.9, 2]], self.FRAME) for frame in frames]
+        crops = []
+        second = self._handle(make_result, crops, lambda index, image: [])
+        updates = []
+
+        def tracker(camera_id):
+            mock = Mock()
+            mock.update.side_effect = lambda result: updates.append(camera_id) or result
+            return mock
+
+        engine = BatchInferenceEngine(handle, classes=[2], batch_size=3, max_wait_ms=2000)
+        channels = {camera_id: engine.attach(camera_id, tracker(camera_id), self._cascade(padding=0).open(second))
+                    for camera_id in (1, 2)}
+        channels[3] = engine.attach(3, tracker(3), self._cascade(padding=0).open(second))
+        # 像素值为1的帧第一级返回低置信度目标，需要复检
+        frames = {1: 1, 2: 1, 3: 0}
+        results = {}
+
+        def infer(camera_id):
+            frame = np.full((*self.FRAME, 3), frames[camera_id], dtype=np.uint8)
+            results[camera_id] = channels[camera_id].infer(frame, timeout=5)
+
+        threads = [threading.Thread(target=infer, args=(camera_id,)) for camera_id in channels]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        assert len(handle.model.predict.call_args_list) == 1
+        assert [shapes for shapes, _ in crops] == [[(40, 40), (40, 40)]]
+        assert updates[0] == 3 and sorted(updates[1:]) == [1, 2]
+        assert len(results[1]) == 0 and len(results[3]) == 1
+        for channel in channels.values():
+            channel.close()
+
+    @patch('app.utils.yolo_integration.os.path.exists', return_value=True)
+    @patch('app.utils.yolo_integration.FrameSource')
+    def test_batched_setup_failure_releases_resources(self, mock_source, mock_exists):
+        """测试获取第二级模型或打开推理通道失败时释放已获取的视频流和模型句柄"""
+        from app.utils.yolo_integration import YOLOIntegration
+
+        source = mock_source.return_value.open.return_value
+        source.nominal_fps = 25
+        yolo = YOLOIntegration('yolov8n.pt', inference_mode='batched', cascade={'model_path': 'yolov8m.pt'})
+
+        with patch('app.utils.yolo_integration.model_registry.acquire', side_effect=FileNotFoundError('m')), \
+                pytest.raises(FileNotFoundError):
+            next(yolo._iter_batched_results(1, 'rtsp://camera/stream'))
+        source.release.assert_called_once()
+
+        source.release.reset_mock()
+        handle = MagicMock()
+        with patch('app.utils.yolo_integration.model_registry.acquire', return_value=handle), \
+                patch('app.utils.yolo_integration.inference_engines.open_channel',
+                      side_effect=RuntimeError('engine')), \
+                pytest.raises(RuntimeError):
+            next(yolo._iter_batched_results(1, 'rtsp://camera/stream'))
+        handle.release.assert_called_once()
+        source.release.assert_called_once()
+        assert yolo.cascade.handle is None
+
+    @patch('app.utils.yolo_integration.os.path.exists', return_value=True)
+    def test_yolo_cascade_requires_batched_mode(self, mock_exists):
+        """测试级联仅支持batched实时检测，第二级模型位于模型目录"""
+        from app.utils.yolo_integration import YOLOIntegration
+
+        with pytest.raises(ValueError, match='batched'):
+            YOLOIntegration('yolov8n.pt', inference_mode='stream', cascade={'model_path': 'yolov8m.pt'})
+        yolo = YOLOIntegration('yolov8n.pt', inference_mode='batched', cascade={'model_path': 'yolov8m.pt'})
+        assert yolo.cascade.model_path == os.path.join(yolo.model_dir, 'yolov8m.pt')
+
+        mock_exists.side_effect = lambda path: not path.endswith('yolov8m.pt')
+        with pytest.raises(FileNotFoundError):
+            YOLOIntegration('yolov8n.pt', inference_mode='batched', cascade={'model_path': 'yolov8m.pt'})